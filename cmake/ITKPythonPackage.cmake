@@ -218,6 +218,323 @@ function(ipp_list_to_string separator input_list output_string_var)
   set(${output_string_var} ${_string} PARENT_SCOPE)
 endfunction()
 
+# Version of the format of the wheel partition manifest. Increment it when the
+# content of the manifest or the way the partition is computed changes.
+set(IPP_WHEEL_PARTITION_MANIFEST_VERSION 1)
+
+# ipp_wheel_partition_key(<output_var>)
+#
+# Compute the key identifying the partition of ITK modules into wheels. It
+# changes when any of the following changes:
+#
+#  * the ITK sources: git revision and locally modified ``itk-module.cmake``
+#    files, or the content of all ``itk-module.cmake`` files if ITK_SOURCE_DIR
+#    is not a git checkout,
+#  * the ITK build configuration (``ITKConfig.cmake`` lists enabled modules),
+#  * the wheel definitions (``WHEEL_NAMES.txt``, ``CMakeLists.txt`` and this file).
+#
+function(ipp_wheel_partition_key output_var)
+  set(content "version:${IPP_WHEEL_PARTITION_MANIFEST_VERSION}\n")
+
+  set(revision "")
+  if(EXISTS "${ITK_SOURCE_DIR}/.git")
+    find_package(Git QUIET)
+  endif()
+  if(GIT_FOUND AND EXISTS "${ITK_SOURCE_DIR}/.git")
+    execute_process(
+      COMMAND ${GIT_EXECUTABLE} rev-parse HEAD
+      WORKING_DIRECTORY ${ITK_SOURCE_DIR}
+      OUTPUT_VARIABLE revision
+      RESULT_VARIABLE result
+      OUTPUT_STRIP_TRAILING_WHITESPACE
+      ERROR_QUIET
+      )
+    if(NOT result EQUAL 0)
+      set(revision "")
+    endif()
+  endif()
+
+  if(revision)
+    # Module definitions modified or added on top of the revision
+    execute_process(
+      COMMAND ${GIT_EXECUTABLE} diff --no-ext-diff HEAD -- "Modules/*/itk-module.cmake"
+      WORKING_DIRECTORY ${ITK_SOURCE_DIR}
+      OUTPUT_VARIABLE modified_modules
+      ERROR_QUIET
+      )
+    execute_process(
+      COMMAND ${GIT_EXECUTABLE} ls-files --others --exclude-standard -- "Modules/*/itk-module.cmake"
+      WORKING_DIRECTORY ${ITK_SOURCE_DIR}
+      OUTPUT_VARIABLE added_modules
+      ERROR_QUIET
+      )
+    string(SHA256 local_changes "${modified_modules}${added_modules}")
+    string(APPEND content "revision:${revision}\nlocal_changes:${local_changes}\n")
+  else()
+    file(GLOB_RECURSE module_files "${ITK_SOURCE_DIR}/Modules/itk-module.cmake")
+    list(SORT module_files)
+    foreach(module_file IN LISTS module_files)
+      file(RELATIVE_PATH module_path "${ITK_SOURCE_DIR}" "${module_file}")
+      file(SHA256 "${module_file}" module_hash)
+      string(APPEND content "${module_path}:${module_hash}\n")
+    endforeach()
+  endif()
+
+  foreach(input_file IN ITEMS
+      "${ITK_BINARY_DIR}/ITKConfig.cmake"
+      "${CMAKE_SOURCE_DIR}/scripts/WHEEL_NAMES.txt"
+      "${CMAKE_SOURCE_DIR}/CMakeLists.txt"
+      "${CMAKE_CURRENT_FUNCTION_LIST_FILE}"
+      )
+    set(input_hash "missing")
+    if(EXISTS "${input_file}")
+      file(SHA256 "${input_file}" input_hash)
+    endif()
+    get_filename_component(input_name "${input_file}" NAME)
+    string(APPEND content "${input_name}:${input_hash}\n")
+  endforeach()
+
+  string(SHA256 key "${content}")
+  set(${output_var} ${key} PARENT_SCOPE)
+endfunction()
+
+function(_ipp_json_array output_var)
+  set(items "")
+  foreach(item IN LISTS ARGN)
+    list(APPEND items "\"${item}\"")
+  endforeach()
+  list(JOIN items ", " items)
+  set(${output_var} "[${items}]" PARENT_SCOPE)
+endfunction()
+
+# ipp_write_wheel_partition_manifest(<manifest_file> <key>)
+#
+# Write the partition of ITK modules into wheels as a JSON manifest. The
+# following variables are expected to be set:
+#
+#  * ``ITK_WHEEL_GROUPS``: topologically sorted wheel groups
+#  * ``ITK_GROUP_<group>_DEPENDS``: dependencies of each wheel group
+#  * ``ITK_WHEEL_<group>_MODULES``: modules packaged in each wheel group
+#  * ``ITK_MODULE_<module>_GROUP`` and ``ITK_MODULE_<module>_DEPENDS``
+#
+# The manifest is written into a temporary file renamed once complete, so that
+# concurrent configures never read a partial manifest.
+#
+function(ipp_write_wheel_partition_manifest manifest_file key)
+  set(groups_json "")
+  set(wheels_json "")
+  set(modules_json "")
+  foreach(group IN LISTS ITK_WHEEL_GROUPS)
+    _ipp_json_array(depends_json ${ITK_GROUP_${group}_DEPENDS})
+    list(APPEND groups_json "    \"${group}\": ${depends_json}")
+    _ipp_json_array(wheel_modules_json ${ITK_WHEEL_${group}_MODULES})
+    list(APPEND wheels_json "    \"${group}\": ${wheel_modules_json}")
+    foreach(module IN LISTS ITK_WHEEL_${group}_MODULES)
+      ipp_is_module_python_wrapped(${module} is_wrapped)
+      _ipp_json_array(depends_json ${ITK_MODULE_${module}_DEPENDS})
+      list(APPEND modules_json
+        "    \"${module}\": {\"group\": \"${ITK_MODULE_${module}_GROUP}\", \"wheel_group\": \"${group}\", \"wrapped\": ${is_wrapped}, \"depends\": ${depends_json}}")
+    endforeach()
+  endforeach()
+  _ipp_json_array(wheel_groups_json ${ITK_WHEEL_GROUPS})
+  list(JOIN groups_json ",\n" groups_json)
+  list(JOIN wheels_json ",\n" wheels_json)
+  list(JOIN modules_json ",\n" modules_json)
+
+  set(content "{
+  \"version\": ${IPP_WHEEL_PARTITION_MANIFEST_VERSION},
+  \"key\": \"${key}\",
+  \"itk_source_dir\": \"${ITK_SOURCE_DIR}\",
+  \"itk_binary_dir\": \"${ITK_BINARY_DIR}\",
+  \"wheel_groups\": ${wheel_groups_json},
+  \"group_depends\": {
+${groups_json}
+  },
+  \"wheels\": {
+${wheels_json}
+  },
+  \"modules\": {
+${modules_json}
+  }
+}
+")
+  string(RANDOM LENGTH 8 suffix)
+  set(tmp_file "${manifest_file}.${suffix}.tmp")
+  file(WRITE "${tmp_file}" "${content}")
+  file(RENAME "${tmp_file}" "${manifest_file}")
+endfunction()
+
+# ipp_read_wheel_partition_manifest(<manifest_file> <key> <found_var>)
+#
+# If ``<manifest_file>`` exists and was computed for ``<key>``, set
+# ``ITK_WHEEL_GROUPS`` and ``ITK_WHEEL_<group>_MODULES`` in the calling scope
+# and set ``<found_var>`` to 1. Otherwise, set ``<found_var>`` to 0.
+#
+function(ipp_read_wheel_partition_manifest manifest_file key found_var)
+  set(${found_var} 0 PARENT_SCOPE)
+  if(NOT EXISTS "${manifest_file}")
+    return()
+  endif()
+  file(READ "${manifest_file}" manifest)
+  string(JSON manifest_key ERROR_VARIABLE error GET "${manifest}" key)
+  if(error OR NOT manifest_key STREQUAL key)
+    return()
+  endif()
+
+  set(wheel_groups "")
+  string(JSON length LENGTH "${manifest}" wheel_groups)
+  math(EXPR last "${length} - 1")
+  foreach(index RANGE ${last})
+    string(JSON group GET "${manifest}" wheel_groups ${index})
+    list(APPEND wheel_groups ${group})
+
+    set(modules "")
+    string(JSON modules_length LENGTH "${manifest}" wheels ${group})
+    if(modules_length GREATER 0)
+      math(EXPR modules_last "${modules_length} - 1")
+      foreach(module_index RANGE ${modules_last})
+        string(JSON module GET "${manifest}" wheels ${group} ${module_index})
+        list(APPEND modules ${module})
+      endforeach()
+    endif()
+    set(ITK_WHEEL_${group}_MODULES ${modules} PARENT_SCOPE)
+  endforeach()
+  set(ITK_WHEEL_GROUPS ${wheel_groups} PARENT_SCOPE)
+  set(${found_var} 1 PARENT_SCOPE)
+endfunction()
+
+# ipp_record_inputs(<record_file> <inputs> <changed_var>)
+#
+# Compare <inputs>, a list of "<name>=<value>" items, with the inputs recorded
+# in <record_file> by the previous call, display the items that were added,
+# removed or changed, and record <inputs>. <changed_var> is set to 1 if the
+# digest of the inputs differs from the recorded one, or if no inputs were
+# recorded, and to 0 otherwise.
+#
+# Example:
+#
+#   ipp_record_inputs(${CMAKE_BINARY_DIR}/Inputs.txt "A=1;B=2" changed)
+#
+# Output, if "A=0;B=2;C=3" was previously recorded:
+#
+#   changed: A=0 -> A=1
+#   removed: C=3
+#
+function(ipp_record_inputs record_file inputs changed_var)
+  string(SHA256 digest "${inputs}")
+  set(changed 1)
+  if(NOT EXISTS ${record_file})
+    message(STATUS "SuperBuild -   No inputs recorded in ${record_file}")
+  else()
+    file(STRINGS ${record_file} recorded)
+    list(POP_FRONT recorded recorded_digest)
+    if(recorded_digest STREQUAL "digest=${digest}")
+      set(changed 0)
+    else()
+      # Index the recorded items by name
+      set(recorded_names)
+      foreach(item IN LISTS recorded)
+        string(FIND "${item}" "=" index)
+        string(SUBSTRING "${item}" 0 ${index} name)
+        list(APPEND recorded_names "${name}")
+        set(_recorded_${name} "${item}")
+      endforeach()
+      set(names)
+      foreach(item IN LISTS inputs)
+        string(FIND "${item}" "=" index)
+        string(SUBSTRING "${item}" 0 ${index} name)
+        list(APPEND names "${name}")
+        if(NOT name IN_LIST recorded_names)
+          message(STATUS "SuperBuild -     added: ${item}")
+        elseif(NOT _recorded_${name} STREQUAL item)
+          message(STATUS "SuperBuild -     changed: ${_recorded_${name}} -> ${item}")
+        endif()
+      endforeach()
+      foreach(name IN LISTS recorded_names)
+        if(NOT name IN_LIST names)
+          message(STATUS "SuperBuild -     removed: ${_recorded_${name}}")
+        endif()
+      endforeach()
+    endif()
+  endif()
+  if(changed)
+    list(JOIN inputs "\n" content)
+    file(WRITE ${record_file} "digest=${digest}\n${content}\n")
+  endif()
+  set(${changed_var} ${changed} PARENT_SCOPE)
+endfunction()
+
+macro(_ipp_normalize_option value_var)
+  string(TOUPPER "${${value_var}}" _ipp_upper_value)
+  if(_ipp_upper_value MATCHES "^(ON|YES|TRUE|Y|1)$")
+    set(${value_var} ON)
+  elseif(_ipp_upper_value MATCHES "^(OFF|NO|FALSE|N|0)$")
+    set(${value_var} OFF)
+  endif()
+endmacro()
+
+# ipp_write_wrapping_profile(<output_file> <profile> <itk_cache_file>)
+#
+# Write the wrapping profile of the wheels and the ``ITK_WRAP_*`` options
+# defined in the cache of the calling project as a JSON file, for example:
+#
+#   {"profile": "standard", "options": {"ITK_WRAP_IMAGE_DIMS": "2;3", ...}}
+#
+# If ``<itk_cache_file>`` is not empty, these options must have the same values
+# in this ITK cache. This prevents packaging the wheels of a profile from an ITK
+# build tree configured for another one. An empty ``<profile>`` is recorded as
+# ``custom``.
+#
+function(ipp_write_wrapping_profile output_file profile itk_cache_file)
+  get_cmake_property(variables CACHE_VARIABLES)
+  set(options "")
+  foreach(variable IN LISTS variables)
+    if(variable MATCHES "^ITK_WRAP_")
+      list(APPEND options ${variable})
+    endif()
+  endforeach()
+  list(SORT options)
+
+  if(itk_cache_file)
+    # Read the names first: file(STRINGS) splits values holding a list.
+    file(STRINGS "${itk_cache_file}" entries REGEX "^ITK_WRAP_[A-Za-z0-9_]+:")
+    set(itk_options "")
+    foreach(entry IN LISTS entries)
+      if(entry MATCHES "^(ITK_WRAP_[A-Za-z0-9_]+):")
+        list(APPEND itk_options ${CMAKE_MATCH_1})
+      endif()
+    endforeach()
+    get_filename_component(itk_cache_dir "${itk_cache_file}" DIRECTORY)
+    load_cache("${itk_cache_dir}" READ_WITH_PREFIX _itk_ ${itk_options})
+    set(mismatches "")
+    foreach(option IN LISTS options)
+      set(expected "${${option}}")
+      set(actual "${_itk_${option}}")
+      _ipp_normalize_option(expected)
+      _ipp_normalize_option(actual)
+      if(NOT expected STREQUAL actual)
+        string(APPEND mismatches "\n  ${option}: '${expected}' requested, '${actual}' in ${itk_cache_file}")
+      endif()
+    endforeach()
+    if(mismatches)
+      message(FATAL_ERROR "The ITK build tree was not configured for wrapping profile '${profile}':${mismatches}")
+    endif()
+  endif()
+
+  if(profile STREQUAL "")
+    set(profile "custom")
+  endif()
+  set(content "{}")
+  string(JSON content SET "${content}" "profile" "\"${profile}\"")
+  string(JSON content SET "${content}" "options" "{}")
+  foreach(option IN LISTS options)
+    set(value "${${option}}")
+    _ipp_normalize_option(value)
+    string(JSON content SET "${content}" "options" "${option}" "\"${value}\"")
+  endforeach()
+  file(WRITE "${output_file}" "${content}\n")
+endfunction()
+
 # No-op function allowing to shut-up "Manually-specified variables were not used by the project"
 # warnings.
 function(ipp_unused_vars)
@@ -0,0 +1,145 @@
+# Functions evaluated at install time by the install rules of ITKPythonPackage.
+#
+# This file is included from ``install(CODE)`` rules, it must only define
+# functions usable in script mode.
+
+# ipp_install_timestamp(<output_var>)
+#
+# Set ``<output_var>`` to the current time expressed in microseconds.
+#
+function(ipp_install_timestamp output_var)
+  # Seconds since the epoch followed by the 6 digits of the microseconds
+  string(TIMESTAMP timestamp "%s%f" UTC)
+  set(${output_var} ${timestamp} PARENT_SCOPE)
+endfunction()
+
+# ipp_install_report(<label> <start_timestamp> <component_count>)
+#
+# Display the time elapsed since ``<start_timestamp>`` installing
+# ``<component_count>`` components for ``<label>``.
+#
+function(ipp_install_report label start_timestamp component_count)
+  ipp_install_timestamp(end_timestamp)
+  math(EXPR elapsed_ms "(${end_timestamp} - ${start_timestamp}) / 1000")
+  math(EXPR seconds "${elapsed_ms} / 1000")
+  math(EXPR milliseconds "${elapsed_ms} % 1000 + 1000")
+  string(SUBSTRING "${milliseconds}" 1 3 milliseconds)
+  message(STATUS "Installed ${component_count} component(s) for ${label} in ${seconds}.${milliseconds}s")
+endfunction()
+
+# ipp_install_components(<itk_binary_dir> <scripts_dir> <components>
+#                        [CHECK_MANIFEST])
+#
+# Install all ``<components>`` of the ITK build tree in a single evaluation of
+# its install scripts.
+#
+# The ``cmake_install.cmake`` scripts generated by CMake either install every
+# component or the single one named by ``CMAKE_INSTALL_COMPONENT``: installing
+# N components requires evaluating the whole script tree N times. Instead, the
+# scripts reachable from ``<itk_binary_dir>/cmake_install.cmake`` are copied in
+# ``<scripts_dir>`` with every component test rewritten as a test of the
+# ``IPP_INSTALL_COMPONENT_<component>`` variable, and the copy is evaluated once
+# with these variables set for ``<components>``.
+#
+# Copies are only re-written when the original script, or this file, is
+# newer. Install manifests are written in ``<scripts_dir>`` so that the ITK
+# build tree is left untouched.
+#
+# With ``CHECK_MANIFEST``, the original scripts are then evaluated once per
+# component, as done without ``ITKPythonPackage_SINGLE_PASS_INSTALL``, and an
+# error is reported if they do not install the same files. Like the
+# per-component install, this writes install manifests in the ITK build tree.
+#
+function(ipp_install_components itk_binary_dir scripts_dir components)
+  cmake_parse_arguments(PARSE_ARGV 3 _ipp "CHECK_MANIFEST" "" "")
+  string(REGEX REPLACE "([][+.*()^$?|\\])" "\\\\\\1" itk_binary_dir_regex "${itk_binary_dir}")
+  set(pending "${itk_binary_dir}/cmake_install.cmake")
+  set(script_count 0)
+  set(updated_count 0)
+  while(pending)
+    list(POP_FRONT pending script)
+    math(EXPR script_count "${script_count} + 1")
+    file(RELATIVE_PATH script_path "${itk_binary_dir}" "${script}")
+    set(copy "${scripts_dir}/${script_path}")
+    get_filename_component(script_dir "${script}" DIRECTORY)
+
+    file(READ "${script}" content)
+
+    # Scripts of sub-directories
+    string(REGEX MATCHALL "include\\(\"[^\"]*/cmake_install\\.cmake\"\\)" includes "${content}")
+    foreach(include IN LISTS includes)
+      string(REGEX REPLACE "^include\\(\"(.*)\"\\)$" "\\1" included "${include}")
+      string(REPLACE "\${CMAKE_CURRENT_LIST_DIR}" "${script_dir}" included "${included}")
+      list(APPEND pending "${included}")
+    endforeach()
+
+    if(NOT "${script}" IS_NEWER_THAN "${copy}"
+        AND NOT "${CMAKE_CURRENT_FUNCTION_LIST_FILE}" IS_NEWER_THAN "${copy}")
+      continue()
+    endif()
+    math(EXPR updated_count "${updated_count} + 1")
+
+    # Component tests, as generated by CMake >= 3.21 and by older versions.
+    string(REGEX REPLACE
+      "CMAKE_INSTALL_COMPONENT STREQUAL \"([^\"]*)\""
+      "IPP_INSTALL_COMPONENT_\\1"
+      content "${content}")
+    string(REGEX REPLACE
+      "\"x\\\${CMAKE_INSTALL_COMPONENT}x\" STREQUAL \"x([^\"]*)x\""
+      "IPP_INSTALL_COMPONENT_\\1"
+      content "${content}")
+    # Scripts of sub-directories and install manifests
+    string(REGEX REPLACE
+      "include\\(\"${itk_binary_dir_regex}/([^\"]*/)?cmake_install\\.cmake\"\\)"
+      "include(\"${scripts_dir}/\\1cmake_install.cmake\")"
+      content "${content}")
+    string(REPLACE "file(WRITE \"${itk_binary_dir}/" "file(WRITE \"${scripts_dir}/" content "${content}")
+
+    file(WRITE "${copy}" "${content}")
+  endwhile()
+  message(STATUS "Install scripts: ${script_count} (${updated_count} updated) [${scripts_dir}]")
+
+  foreach(component IN LISTS components)
+    set(IPP_INSTALL_COMPONENT_${component} 1)
+  endforeach()
+  # Any non-empty value disables the rules of the default component and
+  # selects the name of the install manifest.
+  set(CMAKE_INSTALL_COMPONENT "ITKPythonPackage")
+  set(CMAKE_INSTALL_DO_STRIP 1)
+  set(previous_files "${CMAKE_INSTALL_MANIFEST_FILES}")
+  set(CMAKE_INSTALL_MANIFEST_FILES "")
+  include("${scripts_dir}/cmake_install.cmake")
+  set(installed_files "${CMAKE_INSTALL_MANIFEST_FILES}")
+
+  if(_ipp_CHECK_MANIFEST)
+    set(CMAKE_INSTALL_MANIFEST_FILES "")
+    foreach(component IN LISTS components)
+      set(CMAKE_INSTALL_COMPONENT "${component}")
+      include("${itk_binary_dir}/cmake_install.cmake")
+    endforeach()
+    set(expected_files "${CMAKE_INSTALL_MANIFEST_FILES}")
+    foreach(files_var IN ITEMS installed_files expected_files)
+      list(REMOVE_DUPLICATES ${files_var})
+      list(SORT ${files_var})
+    endforeach()
+    if(NOT installed_files STREQUAL expected_files)
+      set(missing "${expected_files}")
+      set(unexpected "${installed_files}")
+      if(installed_files)
+        list(REMOVE_ITEM missing ${installed_files})
+      endif()
+      if(expected_files)
+        list(REMOVE_ITEM unexpected ${expected_files})
+      endif()
+      list(JOIN missing "\n  " missing)
+      list(JOIN unexpected "\n  " unexpected)
+      message(FATAL_ERROR "The single-pass install does not match the install of each component.\n"
+        "Missing files:\n  ${missing}\nUnexpected files:\n  ${unexpected}")
+    endif()
+    list(LENGTH installed_files file_count)
+    message(STATUS "Checked the ${file_count} file(s) installed in a single pass")
+  endif()
+
+  list(APPEND previous_files ${installed_files})
+  set(CMAKE_INSTALL_MANIFEST_FILES "${previous_files}" PARENT_SCOPE)
+endfunction()
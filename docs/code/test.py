@@ -6,62 +6,54 @@ import os
 import tempfile
 import shutil
 
+# Create input image for tests to avoid saving a binary file
+# in the git repository of this project.
+BASELINE = ("CreateBaseline.py", ["{baseline}"])
 
-def add_test(cmd):
-    cmd.insert(0, sys.executable)
-    subprocess.check_call(cmd)
-
-
-def cleanup(files):
-    for f in files:
-        if os.path.isdir(f):
-            shutil.rmtree(f)
-        else:
-            os.remove(f)
-
+# Tests run once the baseline image exists. In the arguments, "{baseline}" is
+# replaced by the path of the baseline image and "{temp}" by a temporary folder.
+TESTS = [
+    ("ReadMedianWrite.py", ["{baseline}", "{temp}/filtered_image.png"]),
+    ("ImplicitInstantiation.py", ["{baseline}"]),
+    ("ExplicitInstantiation.py", ["{baseline}"]),
+    ("Cast.py", ["{baseline}", "{temp}/filtered_image.png"]),
+    ("CompareITKTypes.py", []),
+    ("InstantiateITKObjects.py", []),
+    ("FilterParameters.py", ["{baseline}"]),
+    ("MixingITKAndNumPy.py", ["{baseline}", "{temp}/filtered_image.png"]),
+]
 
-# Create temporary folder to save output images
-temp_folder = tempfile.mkdtemp()
-# Change current working directory to find scripts
-dir_ = os.path.dirname(sys.argv[0])
-if len(dir_):
-    os.chdir(dir_)
 
-# Create input image for tests to avoid saving a binary file
-# in the git repository of this project.
-baseline_image = os.path.join(temp_folder, "baseline.png")
-add_test(["CreateBaseline.py", baseline_image])
+def test_args(args, baseline, temp):
+    return [
+        arg.replace("{baseline}", baseline).replace("{temp}", temp) for arg in args
+    ]
 
-# Run test ReadMedianWrite.py
-output_image = os.path.join(temp_folder, "filtered_image.png")
-add_test(["ReadMedianWrite.py", baseline_image, output_image])
-cleanup([output_image])
 
-# Run test ImplicitInstantiation.py
-add_test(["ImplicitInstantiation.py", baseline_image])
+def add_test(cmd):
+    cmd.insert(0, sys.executable)
+    subprocess.check_call(cmd)
 
-# Run test ExplicitInstantiation.py
-add_test(["ExplicitInstantiation.py", baseline_image])
 
-# Run test Cast.py
-output_image = os.path.join(temp_folder, "filtered_image.png")
-add_test(["Cast.py", baseline_image, output_image])
-cleanup([output_image])
+def main():
+    # Create temporary folder to save output images
+    temp_folder = tempfile.mkdtemp()
+    # Change current working directory to find scripts
+    dir_ = os.path.dirname(sys.argv[0])
+    if len(dir_):
+        os.chdir(dir_)
 
-# Run test CompareITKTypes.py
-add_test(["CompareITKTypes.py"])
+    baseline_image = os.path.join(temp_folder, "baseline.png")
+    script, args = BASELINE
+    add_test([script] + test_args(args, baseline_image, temp_folder))
 
-# Run test InstantiateITKObjects.py
-add_test(["InstantiateITKObjects.py"])
+    for script, args in TESTS:
+        add_test([script] + test_args(args, baseline_image, temp_folder))
 
-# Run test FilterParameters.py
-add_test(["FilterParameters.py", baseline_image])
+    # Must be last
+    # Remove temporary folder
+    shutil.rmtree(temp_folder)
 
-# Run test MixingITKAndNumPy.py
-output_image = os.path.join(temp_folder, "filtered_image.png")
-add_test(["MixingITKAndNumPy.py", baseline_image, output_image])
-cleanup([output_image])
 
-# Must be last
-# Remove baseline image and temporary folder
-cleanup([baseline_image, temp_folder])
+if __name__ == "__main__":
+    main()
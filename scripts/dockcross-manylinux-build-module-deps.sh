@@ -69,7 +69,9 @@ for MODULE_INFO in ${ITK_MODULE_PREQ_TOPLEVEL//:/ }; do
   fi
 
   echo "Building module dependency ${MODULE_NAME}"
+  trace_begin module-dep module=${MODULE_NAME} tag=${MODULE_TAG}
   ./dockcross-manylinux-download-cache-and-build-module-wheels.sh "$@"
+  trace_end $?
   popd
 
   echo "Cleaning up module dependency"
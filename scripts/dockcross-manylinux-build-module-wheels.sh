@@ -42,8 +42,16 @@
 #
 # `ITK_MODULE_NO_CLEANUP`: Option to skip cleanup steps.
 #
+# `ITK_COMPILER_CACHE`: Compiler cache used to build the module (ccache or sccache).
+#   The cache is stored in `ITK_COMPILER_CACHE_DIR` on the host (default is
+#   `~/.cache/itk-compiler-cache`) and mounted in the container.
+#
 # - `NO_SUDO`: Disable the use of superuser permissions for running docker.
 #
+# `ITK_BUILD_TRACE`: Trace file recording the timeline of the build, including
+#   the build of the module dependencies and the build in the container. Default
+#   is `logs/build-trace.jsonl`. See `internal/build_trace.py`.
+#
 ########################################################################
 
 # Handle case where the script directory is not the working directory
@@ -53,9 +61,16 @@ source "${script_dir}/oci_exe.sh"
 
 oci_exe=$(ociExe)
 
+# Record the timeline of the build, reported when the script exits
+source "${script_dir}/internal/build-trace.sh"
+trace_start $(pwd)/logs/build-trace.jsonl
+trap 'trace_report python3' EXIT
+
 if [[ -n ${ITK_MODULE_PREQ} ]]; then
   echo "Building module dependencies ${ITK_MODULE_PREQ}"
+  trace_begin module-deps
   source "${script_dir}/dockcross-manylinux-build-module-deps.sh"
+  trace_end
 fi
 
 # Set up paths and variables for build
@@ -64,7 +79,29 @@ chmod 777 $(pwd)/tools
 mkdir -p dist
 DOCKER_ARGS="-v $(pwd)/dist:/work/dist/ -v ${script_dir}/..:/ITKPythonPackage -v $(pwd)/tools:/tools"
 DOCKER_ARGS+=" -e MANYLINUX_VERSION"
+DOCKER_ARGS+=" -e ITK_WHEEL_REPAIR_JOBS"
+DOCKER_ARGS+=" -e ITK_WHEEL_REPAIR_CACHE_MAX_SIZE"
+DOCKER_ARGS+=" -e ITK_WHEEL_REPAIR_CACHE_MAX_AGE"
 DOCKER_ARGS+=" -e LD_LIBRARY_PATH"
+
+# Install the Python build requirements from the wheelhouse of the host, if any
+if [[ -n ${ITK_WHEELHOUSE} ]]; then
+  DOCKER_ARGS+=" -v ${ITK_WHEELHOUSE}:/wheelhouse -e ITK_WHEELHOUSE=/wheelhouse"
+fi
+
+# Share the compiler cache directory of the host with the container
+if [[ -n ${ITK_COMPILER_CACHE} ]]; then
+  ITK_COMPILER_CACHE_DIR=${ITK_COMPILER_CACHE_DIR:=${HOME}/.cache/itk-compiler-cache}
+  mkdir -p ${ITK_COMPILER_CACHE_DIR}
+  DOCKER_ARGS+=" -v ${ITK_COMPILER_CACHE_DIR}:/compiler-cache"
+  DOCKER_ARGS+=" -e ITK_COMPILER_CACHE -e ITK_COMPILER_CACHE_DIR=/compiler-cache"
+fi
+# Record the phases of the container build in the trace of this script
+if [[ -n ${ITK_BUILD_TRACE} ]]; then
+  DOCKER_ARGS+=" -v $(dirname ${ITK_BUILD_TRACE}):/trace"
+  DOCKER_ARGS+=" -e ITK_BUILD_TRACE=/trace/$(basename ${ITK_BUILD_TRACE})"
+  DOCKER_ARGS+=" -e ITK_BUILD_TRACE_PARENT -e ITK_BUILD_TRACE_TRACK"
+fi
 # Mount any shared libraries
 if [[ -n ${LD_LIBRARY_PATH} ]]; then
   for libpath in ${LD_LIBRARY_PATH//:/ }; do
@@ -88,16 +125,20 @@ if [[ "${TARGET_ARCH}" = "aarch64" ]]; then
 
   # Build wheels
   DOCKER_ARGS+=" -v $(pwd):/work/ --rm"
+  trace_begin container-build
   ${docker_prefix} $oci_exe run $DOCKER_ARGS ${CONTAINER_SOURCE} "/ITKPythonPackage/scripts/internal/manylinux-aarch64-build-module-wheels.sh" "$@"
+  trace_end $?
 else
   # Generate dockcross scripts
   $oci_exe run --rm ${CONTAINER_SOURCE} > /tmp/dockcross-manylinux-x64
   chmod u+x /tmp/dockcross-manylinux-x64
 
   # Build wheels
+  trace_begin container-build
   /tmp/dockcross-manylinux-x64 \
     -a "$DOCKER_ARGS" \
     "/ITKPythonPackage/scripts/internal/manylinux-build-module-wheels.sh" "$@"
+  trace_end $?
 fi
 
 if [[ -z ${ITK_MODULE_NO_CLEANUP} ]]; then
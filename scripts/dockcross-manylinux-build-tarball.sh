@@ -8,7 +8,8 @@
 
 zstd_exe=`(which zstd)`
 
-# Find an appropriately versioned zstd.
+# Find an appropriately versioned zstd, used to compress the tarball when the
+# zstandard Python package is not available.
 #
 # "--long" is introduced in zstd==v1.3.2
 # https://github.com/facebook/zstd/releases/tag/v1.3.2
@@ -31,14 +32,34 @@ fi
 
 # -----------------------------------------------------------------------
 
-tar -cf ITKPythonBuilds-linux.tar \
+# The tar stream is compressed on the fly into independent zstd frames. The
+# build cache is split in a shared part and one part per Python version,
+# ITKPythonBuilds-linux-<part>.tar.zst, listed with their sizes and hashes in
+# ITKPythonBuilds-linux.manifest.json. Module builds for a single Python
+# version only download the parts they need. Files that the ITK build trees of
+# the different Python versions have in common are stored once, in a common
+# part, and extracted as hard links.
+script_dir=$(cd $(dirname $0) || exit 1; pwd)
+python3 ${script_dir}/internal/build_cache_archive.py create-parts \
+  --output ./ITKPythonBuilds-linux.tar.zst \
+  --part-pattern 'ITKPythonPackage/ITK-cp*' \
+  --deduplicate \
+  --level 10 \
   ITKPythonPackage/ITK-* \
   ITKPythonPackage/oneTBB* \
   ITKPythonPackage/requirements-dev.txt \
   ITKPythonPackage/scripts
-$zstd_exe -f \
-  -10 \
-  -T6 \
-  --long=31 \
-  ./ITKPythonBuilds-linux.tar \
-  -o ./ITKPythonBuilds-linux.tar.zst
+
+# The download scripts of earlier releases fetch a single archive instead,
+# written too when ITKPYTHONBUILDS_LEGACY_ARCHIVE is set to 1. An index of its
+# frames and members is written next to it. It holds no hard links, as these
+# scripts extract the build tree of a single Python version with tar.
+if [[ "${ITKPYTHONBUILDS_LEGACY_ARCHIVE}" == "1" ]]; then
+  python3 ${script_dir}/internal/build_cache_archive.py create \
+    --output ./ITKPythonBuilds-linux.tar.zst \
+    --level 10 \
+    ITKPythonPackage/ITK-* \
+    ITKPythonPackage/oneTBB* \
+    ITKPythonPackage/requirements-dev.txt \
+    ITKPythonPackage/scripts
+fi
@@ -17,6 +17,21 @@
 #   export IMAGE_TAG=20221205-459c9f0
 #   scripts/dockcross-manylinux-build-module-wheels.sh cp39
 #
+# The wrapped pixel types and image dimensions are selected by exporting
+# ITK_WRAPPING_PROFILE (minimal, standard or full, the default). See
+# scripts/internal/wrapping_profiles.py.
+#
+# The import of the wheels is benchmarked by exporting ITK_IMPORT_BENCHMARK=1,
+# their throughput by exporting ITK_THROUGHPUT_BENCHMARK=1 and their memory use
+# by exporting ITK_MEMORY_BENCHMARK=1. The results are compared with the
+# results of a previous build in ITK_BENCHMARK_BASELINE_DIR. See
+# scripts/internal/import_benchmark.py, throughput_benchmark.py and
+# memory_benchmark.py.
+#
+# Compilation results can be cached by exporting ITK_COMPILER_CACHE (ccache or
+# sccache). The cache is stored in ITK_COMPILER_CACHE_DIR on the host (default is
+# ~/.cache/itk-compiler-cache) and mounted in the container.
+#
 script_dir=$(cd $(dirname $0) || exit 1; pwd)
 source "${script_dir}/oci_exe.sh"
 
@@ -42,6 +57,42 @@ pushd $script_dir/..
 mkdir -p dist
 DOCKER_ARGS="-v $(pwd)/dist:/work/dist/"
 DOCKER_ARGS+=" -e MANYLINUX_VERSION"
+DOCKER_ARGS+=" -e ITK_WHEEL_REPAIR_JOBS"
+DOCKER_ARGS+=" -e ITK_WHEEL_REPAIR_CACHE_MAX_SIZE"
+DOCKER_ARGS+=" -e ITK_WHEEL_REPAIR_CACHE_MAX_AGE"
+DOCKER_ARGS+=" -e ITK_CONCURRENT_BUILDS"
+DOCKER_ARGS+=" -e ITK_ABI3_SINGLE_BUILD"
+DOCKER_ARGS+=" -e ITK_WHEEL_PACKAGING_JOBS"
+DOCKER_ARGS+=" -e ITK_WRAPPING_COST_REPORT"
+DOCKER_ARGS+=" -e ITK_WRAPPING_PROFILE"
+DOCKER_ARGS+=" -e ITK_IMPORT_BENCHMARK"
+DOCKER_ARGS+=" -e ITK_THROUGHPUT_BENCHMARK"
+DOCKER_ARGS+=" -e ITK_MEMORY_BENCHMARK"
+
+# Compare the benchmarks with the results of a previous build, if any
+if [[ -n ${ITK_BENCHMARK_BASELINE_DIR} ]]; then
+  DOCKER_ARGS+=" -v ${ITK_BENCHMARK_BASELINE_DIR}:/benchmark-baseline"
+  DOCKER_ARGS+=" -e ITK_BENCHMARK_BASELINE_DIR=/benchmark-baseline"
+fi
+
+# Install the Python build requirements from the wheelhouse of the host, if any
+if [[ -n ${ITK_WHEELHOUSE} ]]; then
+  DOCKER_ARGS+=" -v ${ITK_WHEELHOUSE}:/wheelhouse -e ITK_WHEELHOUSE=/wheelhouse"
+fi
+
+# Share the compiler cache directory of the host with the container
+if [[ -n ${ITK_COMPILER_CACHE} ]]; then
+  ITK_COMPILER_CACHE_DIR=${ITK_COMPILER_CACHE_DIR:=${HOME}/.cache/itk-compiler-cache}
+  mkdir -p ${ITK_COMPILER_CACHE_DIR}
+  DOCKER_ARGS+=" -v ${ITK_COMPILER_CACHE_DIR}:/compiler-cache"
+  DOCKER_ARGS+=" -e ITK_COMPILER_CACHE -e ITK_COMPILER_CACHE_DIR=/compiler-cache"
+fi
+
+# Reduce the ITK build trees to the files used to build the given module
+if [[ -n ${ITK_MODULE_SDK_REFERENCE_MODULE} ]]; then
+  DOCKER_ARGS+=" -v $(cd ${ITK_MODULE_SDK_REFERENCE_MODULE} && pwd):/reference-module:ro"
+  DOCKER_ARGS+=" -e ITK_MODULE_SDK_REFERENCE_MODULE=/reference-module"
+fi
 /tmp/dockcross-manylinux-x64 \
   -a "$DOCKER_ARGS" \
   ./scripts/internal/manylinux-build-wheels.sh "$@"
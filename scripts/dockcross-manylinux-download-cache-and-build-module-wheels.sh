@@ -64,11 +64,21 @@ done
 # -----------------------------------------------------------------------
 # Download and extract cache
 
+download_start=$(date +%s)
 echo "Fetching https://raw.githubusercontent.com/${ITKPYTHONPACKAGE_ORG:=InsightSoftwareConsortium}/ITKPythonPackage/${ITKPYTHONPACKAGE_TAG:=v5.4.0}/scripts/dockcross-manylinux-download-cache.sh"
 curl -L https://raw.githubusercontent.com/${ITKPYTHONPACKAGE_ORG:=InsightSoftwareConsortium}/ITKPythonPackage/${ITKPYTHONPACKAGE_TAG:=v5.4.0}/scripts/dockcross-manylinux-download-cache.sh -O
 chmod u+x dockcross-manylinux-download-cache.sh
 ./dockcross-manylinux-download-cache.sh $1
 
+# Record the timeline of the module build in logs/build-trace.jsonl, reported
+# when the script exits.
+if [[ -f ./ITKPythonPackage/scripts/internal/build-trace.sh ]]; then
+  source ./ITKPythonPackage/scripts/internal/build-trace.sh
+  trace_start $(pwd)/logs/build-trace.jsonl
+  trap 'trace_report python3' EXIT
+  trace_record download ${download_start}
+fi
+
 # -----------------------------------------------------------------------
 # Build module wheels
 
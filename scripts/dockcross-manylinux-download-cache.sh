@@ -29,6 +29,10 @@
 #     build script source. Default is InsightSoftwareConsortium.
 #     Ignored if ITKPYTHONPACKAGE_TAG is empty.
 #
+# `ITKPYTHONBUILDS_URL`: URL of the directory containing the ITKPythonBuilds
+#     archives. Default is the ITKPythonBuilds release of ITK_PACKAGE_VERSION.
+#     Examples: "http://localhost:8000", "file:///path/to/archives"
+#
 ########################################################################
 
 # -----------------------------------------------------------------------
@@ -60,6 +64,8 @@ done
 
 # -----------------------------------------------------------------------
 # Verify that unzstd binary is available to decompress ITK build archives.
+# It is used by the extraction script when the zstandard Python package is
+# not available, and to extract the archive with tar otherwise.
 
 unzstd_exe=`(which unzstd)`
 
@@ -85,28 +91,64 @@ case ${TARGET_ARCH} in
         TARBALL_SPECIALIZATION="-manylinux${MANYLINUX_VERSION}_${TARGET_ARCH}"
         ;;
 esac
-TARBALL_NAME="ITKPythonBuilds-linux${TARBALL_SPECIALIZATION}.tar"
+TARBALL_NAME="ITKPythonBuilds-linux${TARBALL_SPECIALIZATION}.tar.zst"
+ITKPYTHONBUILDS_URL=${ITKPYTHONBUILDS_URL:=https://github.com/InsightSoftwareConsortium/ITKPythonBuilds/releases/download/${ITK_PACKAGE_VERSION:=v5.4.0}}
 
-if [[ ! -f ${TARBALL_NAME}.zst ]]; then
-  echo "Fetching https://github.com/InsightSoftwareConsortium/ITKPythonBuilds/releases/download/${ITK_PACKAGE_VERSION:=v5.4.0}/${TARBALL_NAME}.zst"
-  curl -L https://github.com/InsightSoftwareConsortium/ITKPythonBuilds/releases/download/${ITK_PACKAGE_VERSION:=v5.4.0}/${TARBALL_NAME}.zst -O
-fi
-if [[ ! -f ./${TARBALL_NAME}.zst ]]; then
-  echo "ERROR: can not find required binary './${TARBALL_NAME}.zst'"
-  exit 255
+# A previously downloaded archive is used if present.
+if [[ -f ./${TARBALL_NAME} ]]; then
+  TARBALL_SOURCE=./${TARBALL_NAME}
+else
+  TARBALL_SOURCE=${ITKPYTHONBUILDS_URL}/${TARBALL_NAME}
 fi
-${unzstd_exe} --long=31 ./${TARBALL_NAME}.zst -o ${TARBALL_NAME}
+
+EXTRACT_PATTERNS=()
 if [ "$#" -lt 1 ]; then
-  echo "Extracting all files";
-  tar xf ${TARBALL_NAME}
+  echo "Extracting all files from ${TARBALL_SOURCE}";
+else
+  echo "Extracting files relevant for: $1 from ${TARBALL_SOURCE}";
+  EXTRACT_PATTERNS=(
+    ITKPythonPackage/scripts/
+    ITKPythonPackage/ITK-source/
+    ITKPythonPackage/oneTBB-prefix/
+    "ITKPythonPackage/ITK-$1*"
+    )
+fi
+
+# The archive is streamed through the decompressor and only the requested
+# files are written, without storing the archive on disk. The extraction
+# script is taken from this script directory, or from ITKPYTHONPACKAGE_TAG when
+# this script was downloaded on its own. Without it, the whole archive is
+# extracted by tar.
+script_dir=$(cd $(dirname $0) || exit 1; pwd)
+extract_script=${script_dir}/internal/build_cache_archive.py
+if [[ ! -f ${extract_script} && -n ${ITKPYTHONPACKAGE_TAG} ]]; then
+  extract_script=$(mktemp -d)/build_cache_archive.py
+  curl -fsSL https://raw.githubusercontent.com/${ITKPYTHONPACKAGE_ORG:=InsightSoftwareConsortium}/ITKPythonPackage/${ITKPYTHONPACKAGE_TAG}/scripts/internal/build_cache_archive.py \
+    -o ${extract_script} || rm -f ${extract_script}
+fi
+
+fetch_tarball()
+{
+  if [[ -f ${TARBALL_SOURCE} ]]; then
+    cat ${TARBALL_SOURCE}
+  else
+    curl -fL ${TARBALL_SOURCE}
+  fi
+}
+
+if [[ -f ${extract_script} ]] && command -v python3 > /dev/null; then
+  # The build cache is split in parts, of which only the shared part and the
+  # part of the requested Python version are downloaded. The single archive of
+  # earlier releases is used when the release has no manifest.
+  if ! python3 ${extract_script} extract-parts ${TARBALL_SOURCE} ${1:+"ITK-$1*"}; then
+    python3 ${extract_script} extract ${TARBALL_SOURCE} "${EXTRACT_PATTERNS[@]}" || exit 1
+  fi
 else
-  echo "Extracting files relevant for: $1";
-  tar xf ${TARBALL_NAME} ITKPythonPackage/scripts/
-  tar xf ${TARBALL_NAME} ITKPythonPackage/ITK-source/
-  tar xf ${TARBALL_NAME} ITKPythonPackage/oneTBB-prefix/
-  tar xf ${TARBALL_NAME} --wildcards ITKPythonPackage/ITK-$1*
+  # Without Python, only the single archive, when the release provides it, is
+  # supported. Build trees of other Python versions may hold the targets of
+  # links, such as abi3 build trees: extract all files.
+  fetch_tarball | ${unzstd_exe} --long=31 -c | tar xf -
 fi
-rm ${TARBALL_NAME}
 
 ln -s ITKPythonPackage/oneTBB-prefix ./
 
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+
+"""CLI displaying and comparing the results of the benchmarks of the ITK wheels.
+
+The benchmark suites (``import_benchmark.py``, ``throughput_benchmark.py``,
+``memory_benchmark.py``) write their results as a JSON object holding the
+environment of the run and a flat dictionary of metrics::
+
+    {
+      "version": 1,
+      "suite": "import",
+      "environment": {"python": "3.11.9", "platform": "Linux-...", ...},
+      "metrics": {
+        "import.warm": {"value": 0.412, "unit": "s", "better": "lower"},
+        ...
+      }
+    }
+
+Comparing the results of two builds flags the metrics that changed for the
+worse by more than a threshold, in percent of the baseline value. The default
+threshold depends on the unit of the metric (see ``DEFAULT_THRESHOLDS``) and
+is overridden by ``PATTERN=PERCENT`` thresholds, where ``PATTERN`` is matched
+against the metric names with ``fnmatch``, the last matching one winning.
+Changes smaller than the noise floor of the unit (``NOISE_FLOORS``) are never
+regressions.
+
+The suites install the wheels, run their probes in new interpreters and
+report their results with the helpers of this module.
+
+Usage::
+
+    benchmark_results.py show [-h] results
+    benchmark_results.py compare [-h] [--threshold PATTERN=PERCENT]
+                                 baseline current
+
+``compare`` exits with status 1 if a metric regressed.
+"""
+
+import argparse
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import sys
+
+from wheel_partition import format_size
+
+# Version of the format of the results. Increment it when their content
+# changes.
+RESULTS_VERSION = 1
+
+# Default regression thresholds, in percent, by unit.
+DEFAULT_THRESHOLDS = {
+    "s": 25.0,
+    "bytes": 10.0,
+    "count": 0.0,
+    "pixels/s": 15.0,
+    "ratio": 10.0,
+}
+DEFAULT_THRESHOLD = 10.0
+
+# Absolute changes ignored when comparing results, by unit.
+NOISE_FLOORS = {
+    "s": 0.005,
+    "bytes": 1024 * 1024,
+    "ratio": 0.02,
+}
+
+
+def environment(**extra):
+    """Return the description of the machine running a benchmark, updated
+    with `extra`."""
+    result = {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    result.update(extra)
+    return result
+
+
+def new_results(suite, environment_):
+    return {
+        "version": RESULTS_VERSION,
+        "suite": suite,
+        "environment": environment_,
+        "metrics": {},
+    }
+
+
+def add_metric(results, name, value, unit, better="lower"):
+    """Add the metric `name` to `results`. `better` is ``lower`` or
+    ``higher``."""
+    results["metrics"][name] = {"value": value, "unit": unit, "better": better}
+
+
+def write_results(results, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as file_:
+        json.dump(results, file_, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path, "r") as file_:
+        results = json.load(file_)
+    if results.get("version") != RESULTS_VERSION:
+        raise ValueError(
+            "%s: unsupported results version %s" % (path, results.get("version"))
+        )
+    return results
+
+
+def install_wheels(python_executable, wheels, target_dir):
+    """Install `wheels`, without their dependencies, in `target_dir`."""
+    subprocess.check_call(
+        [
+            python_executable,
+            "-m",
+            "pip",
+            "install",
+            "--quiet",
+            "--no-deps",
+            "--no-index",
+            "--target",
+            target_dir,
+        ]
+        + list(wheels)
+    )
+
+
+def run_probe(python_executable, probe, config, site_dir=None, work_dir=None, env=None):
+    """Run the code `probe` in a new interpreter, with the JSON of `config` as
+    argument, and return the JSON object printed on the last line of its
+    output, or ``None`` if it printed nothing.
+
+    The interpreter imports from `site_dir` if it is given, and runs in
+    `work_dir` with the environment `env` (default: ``os.environ``).
+    """
+    env = dict(os.environ if env is None else env)
+    if site_dir:
+        env["PYTHONPATH"] = site_dir
+    output = subprocess.check_output(
+        [python_executable, "-c", probe, json.dumps(config)],
+        cwd=work_dir,
+        env=env,
+    )
+    lines = output.decode().strip().splitlines()
+    return json.loads(lines[-1]) if lines else None
+
+
+def parse_size(value):
+    """Return the list of the lengths of the ``LxMxN`` image size `value`."""
+    try:
+        size = [int(length) for length in value.lower().split("x")]
+    except ValueError:
+        size = []
+    if len(size) not in (2, 3) or min(size) < 1:
+        raise ValueError("Invalid size '%s', expected WIDTHxHEIGHT[xDEPTH]" % value)
+    return size
+
+
+def parse_thresholds(values):
+    """Return the ``(pattern, percent)`` pairs of the ``PATTERN=PERCENT``
+    strings `values`."""
+    thresholds = []
+    for value in values or []:
+        pattern, separator, percent = value.rpartition("=")
+        try:
+            if not separator or not pattern:
+                raise ValueError()
+            thresholds.append((pattern, float(percent)))
+        except ValueError:
+            raise ValueError(
+                "Invalid threshold '%s', expected PATTERN=PERCENT" % value
+            ) from None
+    return thresholds
+
+
+def threshold_of(name, unit, thresholds):
+    threshold = DEFAULT_THRESHOLDS.get(unit, DEFAULT_THRESHOLD)
+    for pattern, percent in thresholds:
+        if fnmatch.fnmatchcase(name, pattern):
+            threshold = percent
+    return threshold
+
+
+def format_value(value, unit):
+    if value is None:
+        return "-"
+    if unit == "s":
+        if value < 1.0:
+            return "%.1fms" % (value * 1000.0)
+        return "%.2fs" % value
+    if unit == "bytes":
+        return format_size(value)
+    if unit == "count":
+        return "%d" % value
+    if unit == "pixels/s":
+        return "%.1fMpx/s" % (value / 1e6)
+    if unit == "ratio":
+        return "%.2f" % value
+    return "%.3g %s" % (value, unit)
+
+
+def compare(baseline, current, thresholds=None):
+    """Return one ``(name, unit, baseline value, current value, change in
+    percent, threshold, status)`` tuple per metric of `baseline` or `current`.
+
+    ``status`` is ``regressed``, ``improved``, ``ok``, ``new`` or ``missing``.
+    """
+    rows = []
+    names = sorted(set(baseline["metrics"]) | set(current["metrics"]))
+    for name in names:
+        before = baseline["metrics"].get(name)
+        after = current["metrics"].get(name)
+        metric = after or before
+        unit = metric["unit"]
+        threshold = threshold_of(name, unit, thresholds or [])
+        before_value = before["value"] if before else None
+        after_value = after["value"] if after else None
+        if before_value is None or after_value is None:
+            status = "new" if before_value is None else "missing"
+            rows.append(
+                (name, unit, before_value, after_value, None, threshold, status)
+            )
+            continue
+        delta = after_value - before_value
+        if metric.get("better", "lower") == "higher":
+            delta = -delta
+        if before_value:
+            change = 100.0 * (after_value - before_value) / abs(before_value)
+            worse = 100.0 * delta / abs(before_value)
+        else:
+            change = None
+            worse = float("inf") if delta > 0 else 0.0
+        if abs(delta) <= NOISE_FLOORS.get(unit, 0):
+            status = "ok"
+        elif worse > threshold:
+            status = "regressed"
+        elif delta < 0:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((name, unit, before_value, after_value, change, threshold, status))
+    return rows
+
+
+_ROW_FORMAT = "%-45s %12s %12s %9s %9s  %s"
+
+
+def print_results(results):
+    print(
+        "Suite %s, %s"
+        % (
+            results["suite"],
+            ", ".join(
+                "%s: %s" % item for item in sorted(results["environment"].items())
+            ),
+        )
+    )
+    for name, metric in sorted(results["metrics"].items()):
+        print("%-45s %12s" % (name, format_value(metric["value"], metric["unit"])))
+
+
+def print_comparison(rows):
+    """Print the comparison `rows` and return the number of regressions."""
+    print(_ROW_FORMAT % ("METRIC", "BASELINE", "CURRENT", "CHANGE", "THRESHOLD", ""))
+    regressions = 0
+    for name, unit, before, after, change, threshold, status in rows:
+        if status == "regressed":
+            regressions += 1
+        print(
+            _ROW_FORMAT
+            % (
+                name,
+                format_value(before, unit),
+                format_value(after, unit),
+                "-" if change is None else "%+.1f%%" % change,
+                "%.0f%%" % threshold,
+                "" if status == "ok" else status.upper(),
+            )
+        )
+    print("")
+    print("%d regression(s) in %d metric(s)" % (regressions, len(rows)))
+    return regressions
+
+
+def report_results(results, output, baseline=None, thresholds=None, errors=()):
+    """Write `results` to `output`, display them and compare them with the
+    results read from `baseline`, if any.
+
+    Exit with status 1 if there are `errors` or if a metric regressed.
+    """
+    write_results(results, output)
+    print_results(results)
+    print("Wrote results to %s" % output)
+    failed = False
+    if errors:
+        print("")
+        for error in errors:
+            print("Error: %s" % error)
+        failed = True
+    if baseline:
+        print("")
+        regressions = print_comparison(
+            compare(load_results(baseline), results, thresholds)
+        )
+        failed = failed or regressions > 0
+    if failed:
+        sys.stdout.flush()
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    show_parser = subparsers.add_parser("show", help="Display benchmark results")
+    show_parser.add_argument("results")
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare benchmark results with a baseline"
+    )
+    compare_parser.add_argument(
+        "--threshold",
+        metavar="PATTERN=PERCENT",
+        action="append",
+        default=[],
+        help="Regression threshold of the metrics matching PATTERN, can be repeated",
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+
+    args = parser.parse_args()
+
+    if args.command == "show":
+        print_results(load_results(args.results))
+    elif args.command == "compare":
+        try:
+            thresholds = parse_thresholds(args.threshold)
+        except ValueError as error:
+            parser.error(str(error))
+        regressions = print_comparison(
+            compare(load_results(args.baseline), load_results(args.current), thresholds)
+        )
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
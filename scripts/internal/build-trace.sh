@@ -0,0 +1,113 @@
+# Functions recording the phases of a build in the trace file set by
+# ITK_BUILD_TRACE. See build_trace.py for the format of the trace and its
+# report. The functions do nothing when ITK_BUILD_TRACE is not set.
+#
+#   trace_start <default trace file>
+#       Record the phases of this script and of the scripts it runs in the given
+#       file, unless a calling script already set ITK_BUILD_TRACE.
+#
+#   trace_begin [--track <track>] <name> [<key>=<value> ...]
+#       Begin a phase nested in the current one. The phase belongs to the track
+#       of the current phase unless another one is given, for example the name
+#       of an interpreter.
+#
+#   trace_end [<status>]
+#       End the current phase.
+#
+#   trace_record <name> <start time> [<key>=<value> ...]
+#       Record a phase that began at the given time, as printed by
+#       `date +%s`, and ends now. Used for phases that happened before these
+#       functions were available, such as the download of this file.
+#
+#   trace_report <python executable>
+#       Print the phases and the slowest ninja targets of the build, and write
+#       the timeline in Chrome trace event format next to the trace file. Only
+#       done by the script calling trace_start.
+
+_trace_script_dir=$(cd $(dirname ${BASH_SOURCE[0]}) || exit 1; pwd)
+# Keep the state of a script sourcing this file more than once
+_trace_spans=("${_trace_spans[@]}")
+_trace_owner=${_trace_owner:-0}
+
+trace_start()
+{
+  if [[ -z ${ITK_BUILD_TRACE} ]]; then
+    mkdir -p $(dirname $1)
+    export ITK_BUILD_TRACE=$(cd $(dirname $1) && pwd)/$(basename $1)
+    rm -f ${ITK_BUILD_TRACE}
+    _trace_owner=1
+  fi
+}
+
+_trace_time()
+{
+  local now
+  now=$(date +%s.%N)
+  if [[ ${now} == *N ]]; then
+    # date does not support %N on macOS
+    now=$(python3 -c 'import time; print(time.time())')
+  fi
+  echo ${now}
+}
+
+_trace_json_string()
+{
+  local value=${1//\\/\\\\}
+  value=${value//\"/\\\"}
+  printf '"%s"' "${value}"
+}
+
+trace_begin()
+{
+  [[ -n ${ITK_BUILD_TRACE} ]] || return 0
+  local track=${ITK_BUILD_TRACE_TRACK:-main}
+  if [[ $1 == --track ]]; then
+    track=$2
+    shift 2
+  fi
+  local name=$1
+  shift
+  local id=sh$$-${RANDOM}${RANDOM}-${#_trace_spans[@]}
+  local args="" item
+  for item in "$@"; do
+    [[ -z ${args} ]] || args+=", "
+    args+="$(_trace_json_string "${item%%=*}"): $(_trace_json_string "${item#*=}")"
+  done
+  local parent=null
+  if [[ -n ${ITK_BUILD_TRACE_PARENT} ]]; then
+    parent=$(_trace_json_string ${ITK_BUILD_TRACE_PARENT})
+  fi
+  local time=${_trace_begin_time:-$(_trace_time)}
+  echo "{\"args\": {${args}}, \"event\": \"begin\", \"id\": \"${id}\", \"name\": $(_trace_json_string "${name}"), \"parent\": ${parent}, \"pid\": $$, \"time\": ${time}, \"track\": $(_trace_json_string "${track}")}" >> ${ITK_BUILD_TRACE}
+  _trace_spans+=("${id}|${ITK_BUILD_TRACE_PARENT}|${ITK_BUILD_TRACE_TRACK}")
+  export ITK_BUILD_TRACE_PARENT=${id}
+  export ITK_BUILD_TRACE_TRACK=${track}
+}
+
+trace_end()
+{
+  [[ -n ${ITK_BUILD_TRACE} && ${#_trace_spans[@]} -gt 0 ]] || return 0
+  local index=$(( ${#_trace_spans[@]} - 1 ))
+  local id parent track
+  IFS='|' read -r id parent track <<< "${_trace_spans[${index}]}"
+  unset "_trace_spans[${index}]"
+  echo "{\"event\": \"end\", \"id\": \"${id}\", \"status\": ${1:-0}, \"time\": $(_trace_time)}" >> ${ITK_BUILD_TRACE}
+  export ITK_BUILD_TRACE_PARENT=${parent}
+  export ITK_BUILD_TRACE_TRACK=${track}
+}
+
+trace_record()
+{
+  [[ -n ${ITK_BUILD_TRACE} ]] || return 0
+  local name=$1
+  local start=$2
+  shift 2
+  _trace_begin_time=${start} trace_begin ${name} "$@"
+  trace_end
+}
+
+trace_report()
+{
+  [[ -n ${ITK_BUILD_TRACE} && ${_trace_owner} == 1 ]] || return 0
+  $1 ${_trace_script_dir}/build_trace.py report ${ITK_BUILD_TRACE} || true
+}
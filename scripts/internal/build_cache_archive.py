@@ -0,0 +1,1278 @@
+#!/usr/bin/env python
+
+"""CLI creating seekable zstd compressed tarballs of the ITK build cache.
+
+The ITKPythonBuilds tarballs used to be written as a ``.tar`` file first and
+then compressed by a second ``zstd`` pass, doubling the disk I/O and the disk
+space needed to produce them.
+
+This script streams the tar archive directly into the compressor. The stream
+is cut into chunks compressed independently, in parallel, as separate zstd
+frames. The concatenation of these frames is a regular ``.tar.zst`` file that
+``unzstd`` and ``tar`` read as before, and an index written next to it
+(``<archive>.index.json``) records the compressed and uncompressed offsets of
+every frame and the offset of every archive member, so that consumers can
+decompress only the frames containing the members they need, in parallel.
+
+The ``extract`` command reads such a tarball, from a local file or a URL, and
+extracts the members matching the given patterns, as well as the targets of
+the links they contain, in a single pass and without writing the tarball to
+disk. When the index is available next to the tarball, only the frames
+containing the selected members are downloaded, using HTTP range requests, and
+they are decompressed in parallel. Otherwise the whole tarball is streamed
+through the decompressor, which also supports tarballs created by
+``tar`` and ``zstd``.
+
+The ``create-parts`` command splits the tarball: each path matching a part
+pattern, like the ITK build tree of an interpreter, is written in a tarball of
+its own, the other paths in a shared tarball, and a manifest
+(``<stem>.manifest.json``) records the size and the hash of every part. With
+``--deduplicate``, the files that several of these parts have in common are
+stored once, in a common part. The ``extract-parts`` command downloads and extracts the shared part and the
+requested parts only, verifying their sizes and hashes before extracting them.
+
+Frames are compressed and decompressed with the ``zstandard`` Python package
+when it is available, or with the ``zstd`` command line tool otherwise.
+
+Usage::
+
+    build_cache_archive.py create [-h] --output OUTPUT [--directory DIRECTORY]
+                                  [--level LEVEL] [--threads THREADS]
+                                  [--frame-size FRAME_SIZE] [--deduplicate]
+                                  path [path ...]
+    build_cache_archive.py extract [-h] [--directory DIRECTORY]
+                                   [--threads THREADS] [--no-index]
+                                   source [pattern ...]
+    build_cache_archive.py create-parts [-h] --output OUTPUT
+                                        [--part-pattern PART_PATTERN]
+                                        [--directory DIRECTORY] [--level LEVEL]
+                                        [--threads THREADS]
+                                        [--frame-size FRAME_SIZE]
+                                        [--deduplicate]
+                                        path [path ...]
+    build_cache_archive.py extract-parts [-h] [--directory DIRECTORY]
+                                         source [pattern ...]
+
+The patterns of ``extract`` are matched against member names with shell-style
+wildcards, a pattern also selecting the content of the directory it matches.
+The patterns of ``extract-parts`` are matched against part names.
+
+For example::
+
+    build_cache_archive.py create --output ITKPythonBuilds-linux.tar.zst \\
+      ITKPythonPackage/ITK-* ITKPythonPackage/oneTBB* \\
+      ITKPythonPackage/requirements-dev.txt ITKPythonPackage/scripts
+
+    build_cache_archive.py extract \\
+      https://github.com/InsightSoftwareConsortium/ITKPythonBuilds/releases/download/v5.4.0/ITKPythonBuilds-linux.tar.zst \\
+      ITKPythonPackage/scripts/ 'ITKPythonPackage/ITK-cp39*'
+"""
+
+import argparse
+import bisect
+import collections
+import concurrent.futures
+import fnmatch
+import hashlib
+import json
+import os
+import posixpath
+import shutil
+import stat
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".index.json"
+
+DEFAULT_LEVEL = 10
+DEFAULT_FRAME_SIZE_MIB = 64
+
+MANIFEST_VERSION = 2
+MANIFEST_SUFFIX = ".manifest.json"
+ARCHIVE_SUFFIX = ".tar.zst"
+
+# Name of the part holding the paths not matching any part pattern.
+SHARED_PART = "shared"
+
+# Name of the part holding, with deduplication, the files that several parts
+# have in common, and the directory they are stored in, named after their
+# hash and permissions. The directory is removed once the parts are extracted.
+COMMON_PART = "common"
+COMMON_DIR = ".build-cache-common"
+
+MIB = 1024**2
+
+# Largest window accepted when decompressing, matching "zstd --long=31".
+MAX_WINDOW_LOG = 31
+
+# Largest window used when compressing, which decoders accept without raising
+# their default memory limit.
+MAX_COMPRESSION_WINDOW_LOG = 27
+
+
+def index_path(archive_path):
+    return archive_path + INDEX_SUFFIX
+
+
+def archive_stem(archive_path):
+    if archive_path.endswith(ARCHIVE_SUFFIX):
+        return archive_path[: -len(ARCHIVE_SUFFIX)]
+    return archive_path
+
+
+def manifest_path(archive_path):
+    return archive_stem(archive_path) + MANIFEST_SUFFIX
+
+
+def part_path(archive_path, part_name):
+    return "%s-%s%s" % (archive_stem(archive_path), part_name, ARCHIVE_SUFFIX)
+
+
+def default_threads():
+    return os.cpu_count() or 1
+
+
+def long_window_log(frame_size):
+    """Return the window log matching `frame_size`, bounded by
+    :data:`MAX_COMPRESSION_WINDOW_LOG` so that the frames can also be
+    decompressed without ``--long``."""
+    window_log = 10
+    while (1 << window_log) < frame_size and window_log < MAX_COMPRESSION_WINDOW_LOG:
+        window_log += 1
+    return window_log
+
+
+class FrameCompressor(object):
+    """Compress chunks of data into independent zstd frames."""
+
+    def __init__(self, level=DEFAULT_LEVEL, frame_size=DEFAULT_FRAME_SIZE_MIB * MIB):
+        self.level = level
+        self.window_log = long_window_log(frame_size)
+        self.zstd_executable = None
+        if zstandard is None:
+            self.zstd_executable = shutil.which("zstd")
+            if self.zstd_executable is None:
+                raise FileNotFoundError(
+                    "Neither the zstandard Python package nor the zstd executable "
+                    "are available"
+                )
+
+    @property
+    def backend(self):
+        if zstandard is not None:
+            return "zstandard %s" % zstandard.__version__
+        return self.zstd_executable
+
+    def compress(self, data):
+        if zstandard is not None:
+            parameters = zstandard.ZstdCompressionParameters.from_level(
+                self.level,
+                window_log=self.window_log,
+                enable_ldm=True,
+                write_content_size=True,
+                write_checksum=True,
+            )
+            return zstandard.ZstdCompressor(compression_params=parameters).compress(
+                data
+            )
+        return subprocess.run(
+            [
+                self.zstd_executable,
+                "-q",
+                "-c",
+                "-%d" % self.level,
+                "--long=%d" % self.window_log,
+                "--single-thread",
+            ],
+            input=data,
+            stdout=subprocess.PIPE,
+            check=True,
+        ).stdout
+
+
+class Decompressor(object):
+    """Decompress zstd frames and streams."""
+
+    def __init__(self):
+        self.zstd_executable = None
+        if zstandard is None:
+            self.zstd_executable = shutil.which("zstd")
+            if self.zstd_executable is None:
+                raise FileNotFoundError(
+                    "Neither the zstandard Python package nor the zstd executable "
+                    "are available"
+                )
+
+    def _command(self):
+        return [self.zstd_executable, "-q", "-d", "-c", "--long=%d" % MAX_WINDOW_LOG]
+
+    def decompress(self, data, size):
+        """Return the content of the frame `data`, of uncompressed `size`."""
+        if zstandard is not None:
+            decompressor = zstandard.ZstdDecompressor(
+                max_window_size=1 << MAX_WINDOW_LOG
+            )
+            return decompressor.decompress(data, max_output_size=size)
+        return subprocess.run(
+            self._command(), input=data, stdout=subprocess.PIPE, check=True
+        ).stdout
+
+    def stream(self, input_file):
+        """Return a file object reading the decompressed content of the
+        `input_file` stream, and a function to call once it was read, with
+        ``abort=True`` if it was not read completely."""
+        if zstandard is not None:
+            decompressor = zstandard.ZstdDecompressor(
+                max_window_size=1 << MAX_WINDOW_LOG
+            )
+            reader = decompressor.stream_reader(input_file, read_across_frames=True)
+            return reader, lambda abort=False: reader.close()
+
+        process = subprocess.Popen(
+            self._command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE
+        )
+
+        def feed():
+            try:
+                shutil.copyfileobj(input_file, process.stdin, MIB)
+            except BrokenPipeError:
+                pass
+            finally:
+                process.stdin.close()
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+
+        def close(abort=False):
+            if abort:
+                process.kill()
+            else:
+                # Read the end of the output, for example the padding following
+                # the end of the tar archive, so that the process can exit.
+                while process.stdout.read(MIB):
+                    pass
+            process.stdout.close()
+            feeder.join()
+            if process.wait() != 0 and not abort:
+                raise subprocess.CalledProcessError(process.returncode, process.args)
+
+        return process.stdout, close
+
+
+class FrameWriter(object):
+    """File-like object receiving the tar stream and writing it as
+    independently compressed zstd frames.
+
+    Chunks are compressed by a pool of `threads` workers and written in order.
+    At most ``2 * threads`` chunks are in flight, bounding memory usage.
+    """
+
+    def __init__(self, output_file, compressor, frame_size, threads):
+        self.output_file = output_file
+        self.compressor = compressor
+        self.frame_size = frame_size
+        self.position = 0
+        self.frames = []
+        self._buffer = []
+        self._buffer_size = 0
+        self._compressed_offset = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+        self._pending = collections.deque()
+        self._max_pending = 2 * threads
+
+    def write(self, data):
+        self._buffer.append(bytes(data))
+        self._buffer_size += len(data)
+        self.position += len(data)
+        while self._buffer_size >= self.frame_size:
+            joined = b"".join(self._buffer)
+            self._buffer = [joined[self.frame_size :]]
+            self._buffer_size = len(self._buffer[0])
+            self._submit(joined[: self.frame_size])
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def cut(self, minimum_size):
+        """End the current frame if it holds at least `minimum_size` bytes.
+
+        Called between archive members so that small members are not split
+        across frames."""
+        if self._buffer_size and self._buffer_size >= minimum_size:
+            data = b"".join(self._buffer)
+            self._buffer = []
+            self._buffer_size = 0
+            self._submit(data)
+
+    def _submit(self, data):
+        uncompressed_offset = self.position - self._buffer_size - len(data)
+        future = self._executor.submit(self.compressor.compress, data)
+        self._pending.append((future, uncompressed_offset, len(data)))
+        while len(self._pending) > self._max_pending:
+            self._write_pending()
+
+    def _write_pending(self):
+        future, uncompressed_offset, uncompressed_size = self._pending.popleft()
+        compressed = future.result()
+        self.output_file.write(compressed)
+        self.frames.append(
+            [
+                self._compressed_offset,
+                len(compressed),
+                uncompressed_offset,
+                uncompressed_size,
+            ]
+        )
+        self._compressed_offset += len(compressed)
+
+    def close(self):
+        self.cut(0)
+        while self._pending:
+            self._write_pending()
+        self._executor.shutdown()
+
+
+def iter_paths(paths):
+    """Yield `paths` and, for directories that are not symbolic links, all
+    the entries below them in a deterministic order."""
+    for path in paths:
+        yield path
+        if os.path.islink(path) or not os.path.isdir(path):
+            continue
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for name in sorted(dirnames + filenames):
+                yield os.path.join(dirpath, name)
+
+
+def file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file_:
+        for chunk in iter(lambda: file_.read(MIB), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def duplicate_candidates(paths, threads):
+    """Return the content hash of the regular files of `paths` having the
+    same size and permissions as another file, keyed by path."""
+    groups = collections.defaultdict(list)
+    for path in paths:
+        status = os.lstat(path)
+        if stat.S_ISREG(status.st_mode) and status.st_size:
+            groups[(status.st_size, stat.S_IMODE(status.st_mode))].append(path)
+    candidates = [path for group in groups.values() if len(group) > 1 for path in group]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        return dict(zip(candidates, executor.map(file_sha256, candidates)))
+
+
+def create_archive(
+    output_path,
+    paths,
+    directory=None,
+    level=DEFAULT_LEVEL,
+    threads=None,
+    frame_size=DEFAULT_FRAME_SIZE_MIB * MIB,
+    deduplicate=False,
+    hard_links=None,
+):
+    """Write the seekable tarball `output_path` of `paths`, relative to
+    `directory`, and its index. Return the index.
+
+    If `deduplicate` is true, files with the same content and permissions as
+    a file archived before, for example the files that the ITK build trees of
+    different interpreters have in common, are stored as hard links to it.
+
+    `hard_links` maps paths to the name of a member of another tarball, which
+    must be extracted first, the files are stored as hard links to.
+    """
+    hard_links = hard_links or {}
+    if threads is None:
+        threads = default_threads()
+    output_path = os.path.abspath(output_path)
+    compressor = FrameCompressor(level, frame_size)
+    print(
+        "Creating %s [%s, level %d, %d thread(s), %d MiB frames]"
+        % (output_path, compressor.backend, level, threads, frame_size // MIB)
+    )
+    sys.stdout.flush()
+
+    members = []
+    temp_path = output_path + ".part"
+    current_dir = os.getcwd()
+    deduplicated_size = 0
+    try:
+        if directory:
+            os.chdir(directory)
+        all_paths = list(iter_paths(paths))
+        digests = duplicate_candidates(all_paths, threads) if deduplicate else {}
+        first_names = {}
+        with open(temp_path, "wb") as output_file:
+            writer = FrameWriter(output_file, compressor, frame_size, threads)
+            # The non-streaming mode writes every member directly to the
+            # writer, keeping member offsets exact.
+            with tarfile.open(
+                fileobj=writer, mode="w", format=tarfile.PAX_FORMAT
+            ) as archive:
+                for path in all_paths:
+                    # Start a new frame once the current one is mostly full,
+                    # so that most members are contained in a single frame.
+                    writer.cut(frame_size // 2)
+                    offset = archive.offset
+                    digest = digests.get(path)
+                    linkname = hard_links.get(os.path.normpath(path))
+                    tarinfo = archive.gettarinfo(path)
+                    if linkname is not None and tarinfo.isreg():
+                        deduplicated_size += tarinfo.size
+                        tarinfo.type = tarfile.LNKTYPE
+                        tarinfo.linkname = linkname
+                        tarinfo.size = 0
+                    elif digest is not None and tarinfo.isreg():
+                        key = (digest, tarinfo.mode)
+                        if key in first_names:
+                            deduplicated_size += tarinfo.size
+                            tarinfo.type = tarfile.LNKTYPE
+                            tarinfo.linkname = first_names[key]
+                            tarinfo.size = 0
+                        else:
+                            first_names[key] = tarinfo.name
+                    if tarinfo.isreg():
+                        with open(path, "rb") as file_:
+                            archive.addfile(tarinfo, file_)
+                    else:
+                        archive.addfile(tarinfo)
+                    member = archive.members[-1]
+                    entry = [member.name, offset, archive.offset - offset]
+                    if member.issym() or member.islnk():
+                        entry += [member.type.decode("ascii"), member.linkname]
+                    members.append(entry)
+            writer.close()
+    finally:
+        os.chdir(current_dir)
+
+    index = {
+        "version": INDEX_VERSION,
+        "archive": os.path.basename(output_path),
+        "uncompressed_size": writer.position,
+        "compressed_size": os.path.getsize(temp_path),
+        # [compressed_offset, compressed_size, uncompressed_offset, uncompressed_size]
+        "frames": writer.frames,
+        # [name, uncompressed_offset, uncompressed_size] of the tar entries,
+        # followed by the tar type and the link target for links
+        "members": members,
+    }
+    if deduplicate:
+        print(
+            "Stored %.1f MiB of duplicated files as hard links"
+            % (deduplicated_size / MIB)
+        )
+    os.replace(temp_path, output_path)
+    with open(index_path(output_path), "w") as index_file:
+        json.dump(index, index_file, separators=(",", ":"))
+    return index
+
+
+def common_hard_links(root, parts, threads):
+    """Find the regular files that several of the `parts` matching a pattern
+    have in common.
+
+    Return a dictionary mapping these files to the name of their common
+    copy, and a dictionary mapping the names of the common copies to one of
+    the files, paths being relative to `root`.
+    """
+    part_of_file = {}
+    for name, part_paths in parts.items():
+        if name == SHARED_PART:
+            continue
+        for path in iter_paths([os.path.join(root, part_paths[0])]):
+            part_of_file[path] = name
+    digests = duplicate_candidates(list(part_of_file), threads)
+    files_of_key = collections.defaultdict(list)
+    for path in sorted(digests):
+        mode = stat.S_IMODE(os.lstat(path).st_mode)
+        files_of_key[(digests[path], mode)].append(path)
+    hard_links = {}
+    common_files = {}
+    for (digest, mode), paths in sorted(files_of_key.items()):
+        if len(set(part_of_file[path] for path in paths)) < 2:
+            continue
+        common_name = "%s/%s-%04o" % (COMMON_DIR, digest, mode)
+        common_files[common_name] = os.path.relpath(paths[0], root)
+        for path in paths:
+            hard_links[os.path.relpath(path, root)] = common_name
+    return hard_links, common_files
+
+
+def create_parts(
+    output_path,
+    paths,
+    part_patterns,
+    directory=None,
+    level=DEFAULT_LEVEL,
+    threads=None,
+    frame_size=DEFAULT_FRAME_SIZE_MIB * MIB,
+    deduplicate=False,
+):
+    """Write the paths matching `part_patterns` in a tarball of their own,
+    the other paths in the shared tarball, and the manifest describing them.
+
+    The tarballs are named after `output_path`: ``<stem>-<part>.tar.zst``, the
+    part of a path matching a pattern being its base name. Return the
+    manifest.
+
+    If `deduplicate` is true, the files found in several of the parts matching
+    a pattern, like the files that the ITK build trees of different
+    interpreters have in common, are stored once in the common part, which the
+    parts linking to them require. Files duplicated within a part are stored
+    as hard links too.
+    """
+    parts = collections.OrderedDict([(SHARED_PART, [])])
+    for path in paths:
+        normalized = path.replace(os.sep, "/").rstrip("/")
+        if any(fnmatch.fnmatchcase(normalized, pattern) for pattern in part_patterns):
+            parts[posixpath.basename(normalized)] = [normalized]
+        else:
+            parts[SHARED_PART].append(path)
+
+    # A part whose path is a link to another part, like the build trees of
+    # interpreters sharing an abi3 build, requires it.
+    part_of_path = dict(
+        (part_paths[0], name)
+        for name, part_paths in parts.items()
+        if name != SHARED_PART
+    )
+    root = directory or "."
+    if threads is None:
+        threads = default_threads()
+    hard_links, common_files = (
+        common_hard_links(root, parts, threads) if deduplicate else ({}, {})
+    )
+    manifest = {"version": MANIFEST_VERSION, "parts": []}
+
+    def add_part(name, part_paths, part_directory, requires):
+        path = part_path(output_path, name)
+        index = create_archive(
+            path,
+            part_paths,
+            part_directory,
+            level,
+            threads,
+            frame_size,
+            deduplicate,
+            hard_links,
+        )
+        manifest["parts"].append(
+            {
+                "name": name,
+                "file": os.path.basename(path),
+                "size": index["compressed_size"],
+                "uncompressed_size": index["uncompressed_size"],
+                "sha256": file_sha256(path),
+                "requires": requires,
+            }
+        )
+
+    for name, part_paths in parts.items():
+        if not part_paths:
+            continue
+        requires = []
+        if name != SHARED_PART:
+            requires.append(SHARED_PART)
+            if any(link.startswith(part_paths[0] + "/") for link in hard_links):
+                requires.append(COMMON_PART)
+            if os.path.islink(os.path.join(root, part_paths[0])):
+                target = link_target(
+                    part_paths[0],
+                    os.readlink(os.path.join(root, part_paths[0])),
+                    False,
+                )
+                if target in part_of_path:
+                    requires.append(part_of_path[target])
+        add_part(name, part_paths, directory, requires)
+        if name == SHARED_PART and common_files:
+            # The common files are archived from hard links to one of their
+            # copies, named after their hash and permissions.
+            staging_dir = tempfile.mkdtemp(prefix=".build-cache-", dir=root)
+            try:
+                for common_name, path in common_files.items():
+                    staging_path = os.path.join(staging_dir, common_name)
+                    os.makedirs(os.path.dirname(staging_path), exist_ok=True)
+                    os.link(os.path.join(root, path), staging_path)
+                add_part(COMMON_PART, [COMMON_DIR], staging_dir, [])
+            finally:
+                shutil.rmtree(staging_dir)
+    with open(manifest_path(output_path), "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
+
+
+def local_path(source):
+    """Return the path of `source`, a local path or a ``file://`` URL, or
+    ``None`` if it is an HTTP URL."""
+    parsed = urllib.parse.urlparse(source)
+    if parsed.scheme == "file":
+        return urllib.request.url2pathname(parsed.path)
+    if parsed.scheme in ("http", "https"):
+        return None
+    return source
+
+
+def open_source(source, start=0, end=None):
+    """Open `source`, a URL or a local path, for reading from byte `start`.
+
+    With HTTP, only the bytes up to `end` (excluded) are requested when
+    `start` or `end` is given. Servers ignoring range requests are supported,
+    the bytes preceding `start` are then skipped.
+    """
+    path = local_path(source)
+    if path is None:
+        request = urllib.request.Request(source)
+        if start or end is not None:
+            request.add_header(
+                "Range",
+                "bytes=%d-%s" % (start, "" if end is None else "%d" % (end - 1)),
+            )
+        response = urllib.request.urlopen(request)
+        if start and response.status != 206:
+            skip(response, start)
+        return response
+    input_file = open(path, "rb")
+    input_file.seek(start)
+    return input_file
+
+
+def read_exactly(input_file, size):
+    chunks = []
+    while size:
+        chunk = input_file.read(min(size, MIB))
+        if not chunk:
+            raise EOFError("Unexpected end of the archive")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def skip(input_file, size):
+    while size:
+        size -= len(read_exactly(input_file, min(size, MIB)))
+
+
+def load_index(source):
+    """Return the index of the tarball `source`, or ``None`` if it has none."""
+    try:
+        with open_source(index_path(source)) as index_file:
+            index = json.loads(index_file.read().decode("utf-8"))
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    return index
+
+
+class Selection(object):
+    """Archive members matching a list of patterns.
+
+    A pattern matches member names with shell-style wildcards, and also
+    selects the content of the directories it matches. Without patterns, all
+    members are selected unless `select_all` is false.
+    """
+
+    def __init__(self, patterns, select_all=True):
+        self.patterns = [pattern.rstrip("/") for pattern in patterns]
+        self.select_all = select_all
+        self.prefixes = set()
+
+    def add(self, name):
+        """Select `name`, and the content of `name` if it is a directory."""
+        self.prefixes.add(name.rstrip("/"))
+
+    def __contains__(self, name):
+        if not self.patterns and self.select_all:
+            return True
+        name = name.rstrip("/")
+        parts = name.split("/")
+        for length in range(1, len(parts) + 1):
+            path = "/".join(parts[:length])
+            if path in self.prefixes:
+                return True
+            for pattern in self.patterns:
+                if fnmatch.fnmatchcase(path, pattern):
+                    return True
+        return False
+
+
+def link_target(name, linkname, hard):
+    """Return the name of the archive member targeted by a link, or ``None``
+    if it is outside of the archive."""
+    if hard:
+        return linkname
+    if posixpath.isabs(linkname):
+        return None
+    target = posixpath.normpath(posixpath.join(posixpath.dirname(name), linkname))
+    if target.startswith("../") or target == "..":
+        return None
+    return target
+
+
+class IterStream(object):
+    """Read-only file object returning the chunks produced by an iterator."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.chunk = b""
+        self.position = 0
+
+    def read(self, size=-1):
+        data = []
+        while size:
+            if self.position == len(self.chunk):
+                self.chunk = next(self.chunks, None)
+                self.position = 0
+                if self.chunk is None:
+                    self.chunk = b""
+                    break
+            end = len(self.chunk) if size < 0 else self.position + size
+            part = self.chunk[self.position : end]
+            self.position += len(part)
+            if size > 0:
+                size -= len(part)
+            data.append(part)
+        return b"".join(data)
+
+
+def iter_frames(source, frames, needed, decompressor, threads):
+    """Yield the ``(frame, content)`` of the frames with indices `needed`,
+    in order.
+
+    Consecutive frames are read with a single request and up to
+    ``2 * threads`` frames are decompressed at the same time.
+    """
+    runs = []
+    for frame_index in needed:
+        if runs and runs[-1][-1] == frame_index - 1:
+            runs[-1].append(frame_index)
+        else:
+            runs.append([frame_index])
+
+    pending = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        for run in runs:
+            first, last = frames[run[0]], frames[run[-1]]
+            with open_source(source, first[0], last[0] + last[1]) as input_file:
+                for frame_index in run:
+                    frame = frames[frame_index]
+                    data = read_exactly(input_file, frame[1])
+                    future = executor.submit(decompressor.decompress, data, frame[3])
+                    pending.append((frame, future))
+                    while len(pending) > 2 * threads:
+                        frame, future = pending.popleft()
+                        yield frame, future.result()
+        while pending:
+            frame, future = pending.popleft()
+            yield frame, future.result()
+
+
+def iter_ranges(source, index, ranges, decompressor, threads):
+    """Yield the uncompressed content of the sorted, non-overlapping
+    ``(start, end)`` `ranges` of the indexed tarball `source`."""
+    frames = index["frames"]
+    frame_starts = [frame[2] for frame in frames]
+    needed = set()
+    for start, end in ranges:
+        first = bisect.bisect_right(frame_starts, start) - 1
+        last = bisect.bisect_left(frame_starts, end) - 1
+        needed.update(range(first, last + 1))
+
+    range_index = 0
+    for frame, data in iter_frames(
+        source, frames, sorted(needed), decompressor, threads
+    ):
+        frame_start, frame_end = frame[2], frame[2] + frame[3]
+        while range_index < len(ranges) and ranges[range_index][0] < frame_end:
+            start, end = ranges[range_index]
+            yield data[max(start, frame_start) - frame_start : end - frame_start]
+            if end > frame_end:
+                break
+            range_index += 1
+
+
+def extract_member(archive, member, directory):
+    if hasattr(tarfile, "tar_filter"):
+        archive.extract(member, directory, filter="tar")
+    else:
+        archive.extract(member, directory)
+
+
+def relocate_member(member, relocate):
+    """Update `member` for the members of `relocate`, a dictionary mapping the
+    targets of hard links that are not extracted to the path of their first
+    link: targets are extracted at this path and the other links point to it.
+
+    Return ``False`` if `member` is a link that must not be extracted because
+    its content is extracted at its path.
+    """
+    if member.name in relocate:
+        member.name = relocate[member.name]
+    elif member.islnk() and member.linkname in relocate:
+        if relocate[member.linkname] == member.name:
+            return False
+        member.linkname = relocate[member.linkname]
+    return True
+
+
+def extract_indexed(source, index, directory, selection, threads):
+    """Extract the members of `selection` from the indexed tarball `source`,
+    reading only the frames containing them."""
+    members = index["members"]
+    hard_link_type = tarfile.LNKTYPE.decode("ascii")
+    # Select the targets of the selected symbolic links, and their own targets.
+    selected_count = -1
+    while True:
+        selected = [member for member in members if member[0] in selection]
+        if len(selected) == selected_count:
+            break
+        selected_count = len(selected)
+        for member in selected:
+            if len(member) > 3 and member[3] != hard_link_type:
+                target = link_target(member[0], member[4], False)
+                if target is not None and target not in selection:
+                    selection.add(target)
+
+    # The content of hard links whose target is not selected, for example
+    # files of a build tree also found in the build tree of another
+    # interpreter, is extracted at the path of the first link.
+    selected_names = set(member[0] for member in selected)
+    relocate = {}
+    for member in selected:
+        if len(member) > 3 and member[3] == hard_link_type:
+            if member[4] not in selected_names:
+                relocate.setdefault(member[4], member[0])
+    if relocate:
+        selected = [
+            member
+            for member in members
+            if member[0] in selected_names or member[0] in relocate
+        ]
+
+    ranges = []
+    for member in selected:
+        start, end = member[1], member[1] + member[2]
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    print("Extracting %d of %d members from %s" % (len(selected), len(members), source))
+    sys.stdout.flush()
+
+    decompressor = Decompressor()
+    chunks = iter_ranges(source, index, ranges, decompressor, threads)
+    extracted = []
+    with tarfile.open(fileobj=IterStream(chunks), mode="r|") as archive:
+        for member in archive:
+            if not relocate_member(member, relocate):
+                continue
+            extract_member(archive, member, directory)
+            extracted.append(member.name)
+    return extracted
+
+
+def extract_stream(source, directory, selection, relocate=None):
+    """Extract the members of `selection` from the tarball `source`, read in
+    a single pass. See :func:`relocate_member` for `relocate`.
+
+    Return the extracted members, and what remains to be extracted with
+    another pass: the targets of symbolic links preceding the links in the
+    archive, and a dictionary mapping hard links to their target when the
+    target was skipped.
+    """
+    decompressor = Decompressor()
+    relocate = relocate or {}
+    extracted = set()
+    seen = set()
+    missing = set()
+    hard_links = {}
+    with open_source(source) as input_file:
+        stream, close = decompressor.stream(input_file)
+        try:
+            with tarfile.open(fileobj=stream, mode="r|") as archive:
+                for member in archive:
+                    name = member.name.rstrip("/")
+                    seen.add(name)
+                    if name not in relocate and name not in selection:
+                        continue
+                    if member.issym():
+                        target = link_target(name, member.linkname, False)
+                        if target is not None and target not in selection:
+                            selection.add(target)
+                            if target in seen:
+                                missing.add(target)
+                    elif (
+                        member.islnk()
+                        and member.linkname not in relocate
+                        and member.linkname not in extracted
+                    ):
+                        hard_links[name] = member.linkname
+                        continue
+                    if not relocate_member(member, relocate):
+                        continue
+                    extract_member(archive, member, directory)
+                    extracted.add(name)
+        except BaseException:
+            close(abort=True)
+            raise
+        close()
+    return extracted, missing, hard_links
+
+
+def extract_archive(source, directory=".", patterns=(), threads=None, use_index=True):
+    """Extract the members of the tarball `source` matching `patterns` (all
+    members if empty) and the targets of the links they contain into
+    `directory`. Return the names of the extracted members."""
+    if threads is None:
+        threads = default_threads()
+    os.makedirs(directory, exist_ok=True)
+    selection = Selection(patterns)
+    index = load_index(source) if use_index else None
+    if index is not None:
+        return extract_indexed(source, index, directory, selection, threads)
+
+    print("Extracting %s" % source)
+    sys.stdout.flush()
+    extracted, missing, hard_links = extract_stream(source, directory, selection)
+    extracted = sorted(extracted)
+    while missing or hard_links:
+        # Link targets preceding their links are only known once the links are
+        # read, extract them with another pass.
+        print(
+            "Extracting %d link target(s) skipped by the previous pass"
+            % len(missing | set(hard_links.values()))
+        )
+        sys.stdout.flush()
+        selection = Selection(sorted(missing), select_all=False)
+        relocate = {}
+        for name, target in sorted(hard_links.items()):
+            if target not in selection:
+                relocate.setdefault(target, name)
+        more, missing, more_hard_links = extract_stream(
+            source, directory, selection, relocate=relocate
+        )
+        extracted += sorted(more)
+        for name, target in sorted(hard_links.items()):
+            content_name = relocate.get(target, target)
+            if content_name != name:
+                link_path = os.path.join(directory, name)
+                if os.path.lexists(link_path):
+                    os.remove(link_path)
+                os.link(os.path.join(directory, content_name), link_path)
+                extracted.append(name)
+        hard_links = more_hard_links
+    return extracted
+
+
+def load_manifest(source):
+    """Return the manifest of the parts of the tarball `source`, or ``None``
+    if it has none."""
+    try:
+        with open_source(manifest_path(source)) as manifest_file:
+            manifest = json.loads(manifest_file.read().decode("utf-8"))
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def select_parts(manifest, patterns):
+    """Return the parts of `manifest` whose name matches `patterns`, all
+    parts if empty, with the parts they require, in manifest order."""
+    parts = manifest["parts"]
+    names = set(
+        part["name"]
+        for part in parts
+        if not patterns
+        or any(fnmatch.fnmatchcase(part["name"], pattern) for pattern in patterns)
+    )
+    names.add(SHARED_PART)
+    while True:
+        required = set(
+            name
+            for part in parts
+            if part["name"] in names
+            for name in part.get("requires", [])
+        )
+        if required <= names:
+            break
+        names |= required
+    return [part for part in parts if part["name"] in names]
+
+
+def verify_part(path, part):
+    """Raise ``ValueError`` if the size or the hash of the part file `path`
+    do not match its manifest entry `part`."""
+    size = os.path.getsize(path)
+    if size != part["size"]:
+        raise ValueError(
+            "Size mismatch for %s: expected %d bytes, got %d"
+            % (part["file"], part["size"], size)
+        )
+    sha256 = file_sha256(path)
+    if sha256 != part["sha256"]:
+        raise ValueError(
+            "Hash mismatch for %s: expected %s, got %s"
+            % (part["file"], part["sha256"], sha256)
+        )
+
+
+def download_part(source, part, directory):
+    """Download the part `source` in a temporary file of `directory`, reading
+    no more than the size recorded in its manifest entry `part`. Return the
+    path of the file."""
+    fd, path = tempfile.mkstemp(prefix=".", suffix=ARCHIVE_SUFFIX, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as output_file:
+            with open_source(source) as input_file:
+                remaining = part["size"] + 1
+                while remaining:
+                    chunk = input_file.read(min(remaining, MIB))
+                    if not chunk:
+                        break
+                    output_file.write(chunk)
+                    remaining -= len(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def extract_parts(source, directory=".", patterns=(), manifest=None):
+    """Extract the parts of the tarball `source` whose name matches
+    `patterns`, and the parts they require.
+
+    The size and the hash of every part are verified before it is extracted.
+    Parts at an HTTP URL are downloaded in a temporary file first. Files
+    stored in the common part are extracted as hard links to their copy,
+    which is then removed.
+
+    Return the names of the extracted members.
+    """
+    if manifest is None:
+        manifest = load_manifest(source)
+        if manifest is None:
+            raise ValueError("%s has no manifest" % source)
+    os.makedirs(directory, exist_ok=True)
+    parts = select_parts(manifest, patterns)
+    print(
+        "Extracting parts %s (%.1f of %.1f MiB) of %s"
+        % (
+            ", ".join(part["name"] for part in parts),
+            sum(part["size"] for part in parts) / MIB,
+            sum(part["size"] for part in manifest["parts"]) / MIB,
+            source,
+        )
+    )
+    sys.stdout.flush()
+
+    # Parts are named after the tarball, which may have been renamed since
+    # the manifest was written.
+    extracted = []
+    for part in parts:
+        part_source = part_path(source, part["name"])
+        path = local_path(part_source)
+        downloaded = path is None
+        if downloaded:
+            path = download_part(part_source, part, directory)
+        try:
+            verify_part(path, part)
+            more, _, hard_links = extract_stream(path, directory, Selection([]))
+        finally:
+            if downloaded:
+                os.remove(path)
+        # Hard links to the members of the parts extracted before
+        for name, target in sorted(hard_links.items()):
+            target_path = os.path.join(directory, target)
+            if not os.path.exists(target_path):
+                raise ValueError(
+                    "Missing target %s of %s in %s" % (target, name, part["file"])
+                )
+            link_path = os.path.join(directory, name)
+            if os.path.lexists(link_path):
+                os.remove(link_path)
+            os.makedirs(os.path.dirname(link_path), exist_ok=True)
+            os.link(target_path, link_path)
+            more.add(name)
+        extracted += sorted(more)
+    shutil.rmtree(os.path.join(directory, COMMON_DIR), ignore_errors=True)
+    return [
+        name
+        for name in extracted
+        if name != COMMON_DIR and not name.startswith(COMMON_DIR + "/")
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    create_parser = subparsers.add_parser("create", help="Create a tarball")
+    create_parser.add_argument("--output", required=True, help="Tarball to write")
+    parts_parser = subparsers.add_parser(
+        "create-parts",
+        help="Create one tarball per path matching a part pattern, a shared "
+        "tarball for the other paths, and their manifest",
+    )
+    parts_parser.add_argument(
+        "--output",
+        required=True,
+        help="Tarball the names of the parts and of the manifest are based on",
+    )
+    parts_parser.add_argument(
+        "--part-pattern",
+        action="append",
+        default=[],
+        help="Paths matching this pattern are written in their own tarball, "
+        "can be repeated",
+    )
+    for subparser in [create_parser, parts_parser]:
+        subparser.add_argument(
+            "--directory",
+            "-C",
+            default=None,
+            help="Directory the paths are relative to (default: current directory)",
+        )
+        subparser.add_argument("--level", type=int, default=DEFAULT_LEVEL)
+        subparser.add_argument(
+            "--threads",
+            type=int,
+            default=None,
+            help="Number of compression threads (default: number of cores)",
+        )
+        subparser.add_argument(
+            "--frame-size",
+            type=int,
+            default=DEFAULT_FRAME_SIZE_MIB,
+            help="Uncompressed size of the frames in MiB",
+        )
+        subparser.add_argument(
+            "--deduplicate",
+            action="store_true",
+            help="Store files with the same content and permissions as a "
+            "previously archived file as hard links to it",
+        )
+        subparser.add_argument("paths", nargs="+", help="Paths to archive")
+
+    extract_parser = subparsers.add_parser(
+        "extract", help="Extract members of a tarball"
+    )
+    extract_parser.add_argument(
+        "--directory",
+        "-C",
+        default=".",
+        help="Directory where the members are extracted",
+    )
+    extract_parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Number of decompression threads (default: number of cores)",
+    )
+    extract_parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Stream the whole tarball even if its index is available",
+    )
+    extract_parser.add_argument("source", help="URL or path of the tarball")
+    extract_parser.add_argument(
+        "patterns", nargs="*", help="Members to extract (default: all)"
+    )
+
+    extract_parts_parser = subparsers.add_parser(
+        "extract-parts", help="Extract parts of a tarball listed in its manifest"
+    )
+    extract_parts_parser.add_argument(
+        "--directory",
+        "-C",
+        default=".",
+        help="Directory where the parts are extracted",
+    )
+    extract_parts_parser.add_argument(
+        "source",
+        help="URL or path of the tarball the names of the parts and of the "
+        "manifest are based on",
+    )
+    extract_parts_parser.add_argument(
+        "patterns",
+        nargs="*",
+        help="Parts to extract in addition to the shared part (default: all)",
+    )
+
+    args = parser.parse_args()
+
+    if args.command in ("extract", "extract-parts"):
+        try:
+            if args.command == "extract":
+                extracted = extract_archive(
+                    args.source,
+                    args.directory,
+                    args.patterns,
+                    threads=args.threads,
+                    use_index=not args.no_index,
+                )
+            else:
+                extracted = extract_parts(args.source, args.directory, args.patterns)
+        except (OSError, EOFError, ValueError, tarfile.TarError) as exc:
+            print("error: %s" % exc, file=sys.stderr)
+            sys.exit(1)
+        print("Extracted %d members in %s" % (len(extracted), args.directory))
+    elif args.command == "create-parts":
+        manifest = create_parts(
+            args.output,
+            args.paths,
+            args.part_pattern,
+            directory=args.directory,
+            level=args.level,
+            threads=args.threads,
+            frame_size=args.frame_size * MIB,
+            deduplicate=args.deduplicate,
+        )
+        for part in manifest["parts"]:
+            print("%-60s %10.1f MiB" % (part["file"], part["size"] / MIB))
+    elif args.command == "create":
+        index = create_archive(
+            args.output,
+            args.paths,
+            directory=args.directory,
+            level=args.level,
+            threads=args.threads,
+            frame_size=args.frame_size * MIB,
+            deduplicate=args.deduplicate,
+        )
+        print(
+            "Wrote %d members in %d frames: %.1f MiB compressed to %.1f MiB"
+            % (
+                len(index["members"]),
+                len(index["frames"]),
+                index["uncompressed_size"] / MIB,
+                index["compressed_size"] / MIB,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+
+"""CLI provisioning the Python environments used by the build drivers.
+
+Every driver run used to create the virtual environment of each interpreter
+again and to re-install its build requirements with ``pip install --upgrade``.
+Instead, this script:
+
+* creates a virtual environment only if it does not exist yet (see
+  :func:`ensure_venv`),
+* records in the environment a fingerprint of what was installed in it: the
+  interpreter version, the requested packages, the content of the
+  requirement files and the list of files of the wheelhouse, if any (see
+  :func:`provision`). Installation is skipped when the fingerprint matches,
+* installs from a local wheelhouse when ``ITK_WHEELHOUSE`` names an existing
+  directory, without accessing the package index. The wheelhouse is populated
+  beforehand with the ``wheelhouse`` command.
+
+Usage::
+
+    build_env.py provision [-h] [--python PYTHON] [-r REQUIREMENT_FILE]
+                           [--wheelhouse WHEELHOUSE] [--force] [package ...]
+    build_env.py wheelhouse [-h] [--python PYTHON] [-r REQUIREMENT_FILE]
+                            [--wheelhouse WHEELHOUSE] [package ...]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+# Bump to re-install the requirements of all provisioned environments.
+PROVISION_VERSION = 1
+
+# Name of the file recording the fingerprint, stored in the environment prefix.
+FINGERPRINT_FILE = "itk-build-env.json"
+
+
+def default_wheelhouse():
+    """Return the wheelhouse named by ``ITK_WHEELHOUSE`` if it exists, or
+    ``None``."""
+    wheelhouse = os.environ.get("ITK_WHEELHOUSE", "")
+    if wheelhouse and os.path.isdir(wheelhouse):
+        return wheelhouse
+    return None
+
+
+def venv_python(venv_dir):
+    if os.name == "nt":
+        return os.path.join(venv_dir, "Scripts", "python.exe")
+    return os.path.join(venv_dir, "bin", "python")
+
+
+def ensure_venv(venv_command, venv_dir):
+    """Create the virtual environment `venv_dir` using `venv_command` (for
+    example ``["virtualenv"]``) unless it already exists. Return ``True`` if
+    it was created."""
+    if os.path.exists(venv_python(venv_dir)):
+        return False
+    print("Creating python virtual environment: %s" % venv_dir)
+    subprocess.check_call(list(venv_command) + [venv_dir])
+    return True
+
+
+def interpreter_info(python_executable):
+    """Return the prefix and version of `python_executable`."""
+    output = subprocess.check_output(
+        [
+            python_executable,
+            "-c",
+            "import json, sys; "
+            "print(json.dumps({'prefix': sys.prefix, 'version': sys.version}))",
+        ],
+        universal_newlines=True,
+    )
+    return json.loads(output)
+
+
+def fingerprint(info, packages, requirement_files, wheelhouse):
+    """Return the fingerprint of the requirements installed in an environment."""
+    content = {
+        "provision_version": PROVISION_VERSION,
+        "python_version": info["version"],
+        "packages": list(packages),
+        "requirements": [],
+        "wheelhouse": None,
+    }
+    for requirement_file in requirement_files:
+        with open(requirement_file, "rb") as file_:
+            content["requirements"].append(hashlib.sha256(file_.read()).hexdigest())
+    if wheelhouse:
+        content["wheelhouse"] = sorted(os.listdir(wheelhouse))
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def read_fingerprint(prefix):
+    try:
+        with open(os.path.join(prefix, FINGERPRINT_FILE), "r") as file_:
+            return json.load(file_).get("fingerprint")
+    except (OSError, ValueError):
+        return None
+
+
+def write_fingerprint(prefix, value):
+    try:
+        with open(os.path.join(prefix, FINGERPRINT_FILE), "w") as file_:
+            json.dump({"fingerprint": value}, file_)
+    except OSError as exc:
+        print("Could not record the environment fingerprint: %s" % exc)
+
+
+def pip_requirement_args(packages, requirement_files):
+    args = []
+    for requirement_file in requirement_files:
+        args += ["-r", requirement_file]
+    return args + list(packages)
+
+
+def provision(
+    python_executable,
+    packages=(),
+    requirement_files=(),
+    wheelhouse=None,
+    force=False,
+):
+    """Install `packages` and `requirement_files` in the environment of
+    `python_executable` unless they are already installed.
+
+    If `wheelhouse` is ``None``, the wheelhouse named by ``ITK_WHEELHOUSE`` is
+    used if it exists. Return ``True`` if pip was run.
+    """
+    if not packages and not requirement_files:
+        return False
+    if wheelhouse is None:
+        wheelhouse = default_wheelhouse()
+    info = interpreter_info(python_executable)
+    value = fingerprint(info, packages, requirement_files, wheelhouse)
+    if not force and read_fingerprint(info["prefix"]) == value:
+        print("Python environment %s is up-to-date" % info["prefix"])
+        return False
+
+    args = [python_executable, "-m", "pip", "install", "--upgrade"]
+    if wheelhouse:
+        args += ["--no-index", "--find-links", wheelhouse]
+    subprocess.check_call(args + pip_requirement_args(packages, requirement_files))
+    write_fingerprint(info["prefix"], value)
+    return True
+
+
+def populate_wheelhouse(
+    python_executable, wheelhouse, packages=(), requirement_files=()
+):
+    """Store in `wheelhouse` the wheels of `packages` and `requirement_files`,
+    and of their dependencies, for the interpreter `python_executable`."""
+    os.makedirs(wheelhouse, exist_ok=True)
+    subprocess.check_call(
+        [python_executable, "-m", "pip", "wheel", "--wheel-dir", wheelhouse]
+        + pip_requirement_args(packages, requirement_files)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+    for name, help_ in [
+        ("provision", "Install the requirements unless already installed"),
+        ("wheelhouse", "Download the wheels of the requirements"),
+    ]:
+        subparser = subparsers.add_parser(name, help=help_)
+        subparser.add_argument(
+            "--python",
+            default=sys.executable,
+            help="Python interpreter of the environment",
+        )
+        subparser.add_argument(
+            "-r",
+            "--requirement",
+            dest="requirement_files",
+            action="append",
+            default=[],
+            help="Requirement file, can be repeated",
+        )
+        subparser.add_argument(
+            "--wheelhouse",
+            default=None,
+            help="Wheelhouse directory (default: value of ITK_WHEELHOUSE)",
+        )
+        subparser.add_argument("packages", nargs="*", help="Packages to install")
+    subparsers.choices["provision"].add_argument(
+        "--force", action="store_true", help="Install even if up-to-date"
+    )
+    args = parser.parse_args()
+
+    if args.command == "provision":
+        provision(
+            args.python,
+            args.packages,
+            args.requirement_files,
+            wheelhouse=args.wheelhouse,
+            force=args.force,
+        )
+    elif args.command == "wheelhouse":
+        wheelhouse = args.wheelhouse or os.environ.get("ITK_WHEELHOUSE")
+        if not wheelhouse:
+            parser.error("--wheelhouse or ITK_WHEELHOUSE is required")
+        populate_wheelhouse(
+            args.python, wheelhouse, args.packages, args.requirement_files
+        )
+
+
+if __name__ == "__main__":
+    main()
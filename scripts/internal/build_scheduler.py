@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+
+"""CLI running one build command per Python interpreter concurrently.
+
+The per-interpreter ITK builds are independent from each other. Instead of
+building them one after the other, this script runs them at the same time while
+sharing a single core and memory budget between them: each running build is
+given a number of ``ninja -j`` slots through an environment variable, and the
+slots released by a completed build are handed over to the builds started after
+it.
+
+Usage::
+
+    build_scheduler.py [-h] [--max-concurrent MAX_CONCURRENT] [--cores CORES]
+                       [--memory MEMORY] [--memory-per-job MEMORY_PER_JOB]
+                       [--jobs-env JOBS_ENV] [--log-dir LOG_DIR]
+                       command item [item ...]
+
+For example, the following runs ``manylinux-build-itk-python.sh <PYBIN>`` for
+every interpreter with ``ITK_BUILD_JOBS`` set to the allotted number of slots::
+
+    build_scheduler.py --log-dir /work/logs \\
+      scripts/internal/manylinux-build-itk-python.sh \\
+      /opt/python/cp39-cp39/bin /opt/python/cp310-cp310/bin
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from build_trace import Span
+
+# Memory needed by a single compile job of the wrapped ITK sources. Some of the
+# SWIG generated translation units require well above 1 GiB.
+DEFAULT_MEMORY_PER_JOB_GIB = 2.0
+
+GIB = 1024**3
+
+
+def cpu_count():
+    """Return the number of cores usable by this process."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def available_memory():
+    """Return the memory available for building in bytes, or ``None`` if it
+    can not be determined."""
+    try:
+        with open("/proc/meminfo", "r") as file_:
+            for line in file_:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def total_job_slots(cores, memory, memory_per_job):
+    """Return the number of compile jobs allowed to run at the same time
+    given a core count and a memory budget expressed in bytes."""
+    slots = cores
+    if memory is not None and memory_per_job > 0:
+        slots = min(slots, int(memory // memory_per_job))
+    return max(1, slots)
+
+
+def item_label(item):
+    """Return a short name for `item` used to prefix logs.
+
+    For interpreter directories like ``/opt/python/cp39-cp39/bin``, the name
+    of the interpreter (``cp39-cp39``) is returned.
+    """
+    label = os.path.basename(os.path.normpath(item))
+    if label == "bin":
+        label = os.path.basename(os.path.dirname(os.path.normpath(item)))
+    return label
+
+
+class Build(object):
+    """A build command associated with one item (usually an interpreter)."""
+
+    def __init__(self, command, item):
+        self.command = command
+        self.item = item
+        self.label = item_label(item)
+        self.slots = 0
+        self.process = None
+        self.returncode = None
+        self.start_time = None
+        self.end_time = None
+        self.span = None
+        self._reader = None
+
+    @property
+    def duration(self):
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.time()) - self.start_time
+
+    def start(self, slots, jobs_env, log_dir, output_lock):
+        self.slots = slots
+        self.span = Span(
+            "itk-build", track=self.label, item=self.item, slots=slots
+        ).begin()
+        env = self.span.environ()
+        env[jobs_env] = str(slots)
+        log_file = None
+        if log_dir:
+            log_file = open(os.path.join(log_dir, "%s.log" % self.label), "w")
+        self.start_time = time.time()
+        self.process = subprocess.Popen(
+            list(self.command) + [self.item],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            bufsize=1,
+        )
+        self._reader = threading.Thread(
+            target=self._forward_output, args=(log_file, output_lock)
+        )
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _forward_output(self, log_file, output_lock):
+        prefix = "[%s] " % self.label
+        for line in self.process.stdout:
+            if log_file is not None:
+                log_file.write(line)
+            with output_lock:
+                sys.stdout.write(prefix + line)
+                sys.stdout.flush()
+        if log_file is not None:
+            log_file.close()
+
+    def poll(self):
+        if self.process.poll() is None:
+            return False
+        self._reader.join()
+        self.returncode = self.process.returncode
+        self.end_time = time.time()
+        self.span.finish(self.returncode)
+        return True
+
+
+def schedule(
+    command,
+    items,
+    max_concurrent=None,
+    cores=None,
+    memory=None,
+    memory_per_job=DEFAULT_MEMORY_PER_JOB_GIB * GIB,
+    jobs_env="ITK_BUILD_JOBS",
+    log_dir=None,
+    poll_interval=1.0,
+):
+    """Run ``command + [item]`` for every item concurrently and return the
+    list of completed :class:`Build` objects.
+
+    The number of compile job slots is derived from `cores` and `memory` (in
+    bytes). At most `max_concurrent` builds run at the same time and the free
+    slots are evenly split between the builds started together.
+    """
+    if cores is None:
+        cores = cpu_count()
+    if memory is None:
+        memory = available_memory()
+    total_slots = total_job_slots(cores, memory, memory_per_job)
+    if not max_concurrent:
+        max_concurrent = len(items)
+    max_concurrent = max(1, min(max_concurrent, len(items), total_slots))
+
+    print(
+        "Scheduling %d build(s): %d concurrent, %d job slot(s) [cores: %d, memory: %s]"
+        % (
+            len(items),
+            max_concurrent,
+            total_slots,
+            cores,
+            "unknown" if memory is None else "%.1f GiB" % (memory / GIB),
+        )
+    )
+
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    output_lock = threading.Lock()
+    pending = [Build(command, item) for item in items]
+    running = []
+    completed = []
+    free_slots = total_slots
+
+    while pending or running:
+        # Start as many builds as allowed, splitting the free slots evenly
+        # between the builds started in this round.
+        while pending and len(running) < max_concurrent:
+            starting = min(max_concurrent - len(running), len(pending))
+            slots = max(1, free_slots // starting)
+            build = pending.pop(0)
+            with output_lock:
+                print("[%s] Starting with %d job slot(s)" % (build.label, slots))
+            build.start(slots, jobs_env, log_dir, output_lock)
+            free_slots -= slots
+            running.append(build)
+
+        time.sleep(poll_interval)
+
+        for build in list(running):
+            if not build.poll():
+                continue
+            running.remove(build)
+            completed.append(build)
+            free_slots += build.slots
+            with output_lock:
+                print(
+                    "[%s] Finished in %.1fs (exit code %d)"
+                    % (build.label, build.duration, build.returncode)
+                )
+
+    return completed
+
+
+def print_summary(builds):
+    print("")
+    print("Build summary:")
+    for build in builds:
+        status = "OK" if build.returncode == 0 else "FAILED"
+        print(
+            "  %-20s %-7s %8.1fs  %d job slot(s)"
+            % (build.label, status, build.duration, build.slots)
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=int(os.environ.get("ITK_CONCURRENT_BUILDS", "0")),
+        help="Maximum number of builds running at the same time (0: no limit)",
+    )
+    parser.add_argument(
+        "--cores",
+        type=int,
+        default=None,
+        help="Number of cores shared by the builds (default: all usable cores)",
+    )
+    parser.add_argument(
+        "--memory",
+        type=float,
+        default=None,
+        help="Memory in GiB shared by the builds (default: available memory)",
+    )
+    parser.add_argument(
+        "--memory-per-job",
+        type=float,
+        default=DEFAULT_MEMORY_PER_JOB_GIB,
+        help="Memory in GiB reserved for each compile job",
+    )
+    parser.add_argument(
+        "--jobs-env",
+        default="ITK_BUILD_JOBS",
+        help="Environment variable receiving the number of allotted job slots",
+    )
+    parser.add_argument(
+        "--log-dir", default=None, help="Directory where build logs are written"
+    )
+    parser.add_argument("command", help="Build command run for every item")
+    parser.add_argument("items", nargs="+", help="Items passed to the build command")
+    args = parser.parse_args()
+
+    builds = schedule(
+        [args.command],
+        args.items,
+        max_concurrent=args.max_concurrent,
+        cores=args.cores,
+        memory=None if args.memory is None else args.memory * GIB,
+        memory_per_job=args.memory_per_job * GIB,
+        jobs_env=args.jobs_env,
+        log_dir=args.log_dir,
+    )
+    print_summary(builds)
+    if any(build.returncode != 0 for build in builds):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+#!/usr/bin/env python
+
+"""CLI reporting the timeline of the phases of a build.
+
+The build drivers record the beginning and the end of each of their phases
+(download, superbuild, configuration and build of the ITK tree of each
+interpreter, packaging of each wheel, repair, tests) in the JSON lines file set
+by the ``ITK_BUILD_TRACE`` environment variable. Nothing is recorded when it is
+not set. Each line is one event::
+
+    {"event": "begin", "id": "...", "parent": "...", "name": "ninja",
+     "track": "cp311-cp311", "time": 1700000000.25, "pid": 42,
+     "args": {"ninja_log": "/work/ITK-cp311-.../.ninja_log"}}
+    {"event": "end", "id": "...", "time": 1700003600.5, "status": 0}
+
+Spans are nested: a span started while another one is open in the same thread,
+or in a process started from it, has this span as parent. They are also grouped
+in tracks, one per interpreter and one per wheel, so that phases running
+concurrently are displayed side by side. The identifier and track of the
+innermost span are passed to child processes through ``ITK_BUILD_TRACE_PARENT``
+and ``ITK_BUILD_TRACE_TRACK``.
+
+Spans recorded from the shell scripts use the ``trace_begin`` and ``trace_end``
+functions of ``build-trace.sh``, spans recorded from Python use :func:`span`.
+
+Usage::
+
+    build_trace.py report [-h] [--chrome CHROME] [--ninja-log NINJA_LOG]
+                          [--top TOP] trace
+
+``report`` prints the phases with their duration and the slowest targets found
+in the ``.ninja_log`` files of the ninja invocations of the build, and writes
+the timeline in the Chrome trace event format, which can be loaded in
+``chrome://tracing`` or https://ui.perfetto.dev.
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+TRACE_ENV = "ITK_BUILD_TRACE"
+PARENT_ENV = "ITK_BUILD_TRACE_PARENT"
+TRACK_ENV = "ITK_BUILD_TRACE_TRACK"
+
+DEFAULT_TRACK = "main"
+
+_write_lock = threading.Lock()
+_local = threading.local()
+_counter = itertools.count()
+_process_id = uuid.uuid4().hex[:8]
+
+
+def trace_path():
+    """Return the path of the trace file, or ``None`` if tracing is off."""
+    return os.environ.get(TRACE_ENV) or None
+
+
+def start_trace(default_path):
+    """Record the spans of this process and of its children in `default_path`
+    unless ``ITK_BUILD_TRACE`` is already set by a calling driver, and return
+    ``True`` if this call started the trace.
+
+    A new trace replaces the previous one.
+    """
+    if trace_path() is not None:
+        return False
+    path = os.path.abspath(default_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+    os.environ[TRACE_ENV] = path
+    return True
+
+
+def write_event(event):
+    path = trace_path()
+    if path is None:
+        return
+    line = json.dumps(event, sort_keys=True) + "\n"
+    with _write_lock:
+        with open(path, "a") as file_:
+            file_.write(line)
+
+
+def _open_spans():
+    if not hasattr(_local, "spans"):
+        _local.spans = []
+    return _local.spans
+
+
+def current_span():
+    """Return the innermost :class:`Span` open in this thread, if any."""
+    spans = _open_spans()
+    return spans[-1] if spans else None
+
+
+def current_track():
+    span_ = current_span()
+    if span_ is not None:
+        return span_.track
+    return os.environ.get(TRACK_ENV) or DEFAULT_TRACK
+
+
+class Span(object):
+    """A phase of the build.
+
+    By default, the span is nested in the innermost span open in this thread,
+    or in the span of the calling process, and belongs to the same track.
+    """
+
+    def __init__(self, name, track=None, parent=None, **args):
+        current = current_span()
+        if parent is None:
+            parent = current.id if current else os.environ.get(PARENT_ENV)
+        self.id = "%s-%d" % (_process_id, next(_counter))
+        self.name = name
+        self.parent = parent or None
+        self.track = track or current_track()
+        self.args = args
+        self.start = None
+        self.end = None
+        self.status = None
+
+    def begin(self):
+        self.start = time.time()
+        write_event(
+            {
+                "event": "begin",
+                "id": self.id,
+                "parent": self.parent,
+                "name": self.name,
+                "track": self.track,
+                "time": self.start,
+                "pid": os.getpid(),
+                "args": self.args,
+            }
+        )
+        return self
+
+    def finish(self, status=0):
+        self.end = time.time()
+        self.status = status
+        write_event({"event": "end", "id": self.id, "time": self.end, "status": status})
+
+    def environ(self, env=None):
+        """Return a copy of `env` (default: ``os.environ``) nesting the spans
+        of a child process in this span."""
+        env = dict(os.environ if env is None else env)
+        env[PARENT_ENV] = self.id
+        env[TRACK_ENV] = self.track
+        return env
+
+
+@contextlib.contextmanager
+def span(name, track=None, **args):
+    """Context manager recording the enclosed code as a :class:`Span`.
+
+    The span ends with status 0, or with the exit code of the
+    ``subprocess.CalledProcessError`` (1 for other exceptions) raised by the
+    enclosed code. In the main thread, the processes started in the span are
+    nested in it. Other threads pass :meth:`Span.environ` to the processes
+    they start.
+    """
+    span_ = Span(name, track=track, **args).begin()
+    spans = _open_spans()
+    spans.append(span_)
+    saved_env = None
+    if threading.current_thread() is threading.main_thread():
+        saved_env = dict((var, os.environ.get(var)) for var in (PARENT_ENV, TRACK_ENV))
+        os.environ.update(span_.environ({}))
+    status = 0
+    try:
+        yield span_
+    except BaseException as exc:
+        status = getattr(exc, "returncode", None) or 1
+        raise
+    finally:
+        spans.pop()
+        if saved_env is not None:
+            for var, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(var, None)
+                else:
+                    os.environ[var] = value
+        span_.finish(status)
+
+
+def load_spans(path):
+    """Return the spans recorded in the trace file `path`, ordered by start
+    time.
+
+    Spans without end event, for example because the build was interrupted,
+    end with the last event of the trace and have a ``None`` status.
+    """
+    spans = {}
+    last_time = 0.0
+    with open(path, "r") as file_:
+        for line in file_:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                # Partially written line of an interrupted build
+                continue
+            last_time = max(last_time, event["time"])
+            if event["event"] == "begin":
+                span_ = Span.__new__(Span)
+                span_.id = event["id"]
+                span_.parent = event.get("parent")
+                span_.name = event["name"]
+                span_.track = event.get("track") or DEFAULT_TRACK
+                span_.args = event.get("args") or {}
+                span_.start = event["time"]
+                span_.end = None
+                span_.status = None
+                spans[span_.id] = span_
+            elif event["event"] == "end" and event["id"] in spans:
+                spans[event["id"]].end = event["time"]
+                spans[event["id"]].status = event.get("status")
+    for span_ in spans.values():
+        if span_.end is None:
+            span_.end = last_time
+        if span_.parent not in spans:
+            span_.parent = None
+    return sorted(spans.values(), key=lambda s: (s.start, -s.end))
+
+
+class NinjaTarget(object):
+    """One command of a ``.ninja_log``, with times in seconds relative to the
+    start of ninja."""
+
+    def __init__(self, outputs, start, end):
+        self.outputs = outputs
+        self.start = start
+        self.end = end
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+def read_ninja_log(path, last_run_only=True):
+    """Return the :class:`NinjaTarget` of the last ninja run recorded in the
+    ``.ninja_log`` file `path`.
+
+    Commands are logged as they complete, so their end times only decrease
+    where a new run starts. The outputs of a command producing several of them
+    are grouped. If `last_run_only` is False, the last command of every output
+    is returned instead, whichever run executed it; the start and end times of
+    commands of different runs are then not comparable.
+    """
+    runs = [[]]
+    previous_end = -1
+    with open(path, "r") as file_:
+        for line in file_:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 5:
+                continue
+            start, end = int(fields[0]), int(fields[1])
+            if end < previous_end:
+                runs.append([])
+            previous_end = end
+            runs[-1].append((start, end, fields[4], fields[3]))
+    if last_run_only:
+        commands = [(0,) + command for command in runs[-1]]
+    else:
+        latest = {}
+        for index, run in enumerate(runs):
+            for command in run:
+                latest[command[3]] = (index,) + command
+        commands = sorted(latest.values())
+    targets = {}
+    for run, start, end, command_hash, output in commands:
+        key = (run, start, end, command_hash)
+        if key in targets:
+            targets[key].outputs.append(output)
+        else:
+            targets[key] = NinjaTarget([output], start / 1000.0, end / 1000.0)
+    return sorted(targets.values(), key=lambda t: t.start)
+
+
+def ninja_runs(spans, extra_logs=()):
+    """Return ``(span, targets)`` for every span recording a ninja run, and
+    ``(None, targets)`` for every log of `extra_logs`."""
+    runs = []
+    for span_ in spans:
+        path = span_.args.get("ninja_log")
+        if path and os.path.exists(path):
+            runs.append((span_, read_ninja_log(path)))
+    for path in extra_logs:
+        if os.path.isdir(path):
+            path = os.path.join(path, ".ninja_log")
+        runs.append((None, read_ninja_log(path)))
+    return runs
+
+
+def chrome_trace(spans, runs):
+    """Return the timeline in the Chrome trace event format.
+
+    Each track is displayed as a thread. The commands of a ninja run are laid
+    out on additional threads below the track of the run, one per command
+    running at the same time.
+    """
+    origin = min([s.start for s in spans] or [0.0])
+    events = []
+    tids = {}
+
+    def tid(track):
+        if track not in tids:
+            tids[track] = len(tids) + 1
+            events.append(
+                {
+                    "ph": "M",
+                    "name": "thread_name",
+                    "pid": 1,
+                    "tid": tids[track],
+                    "args": {"name": track},
+                }
+            )
+            events.append(
+                {
+                    "ph": "M",
+                    "name": "thread_sort_index",
+                    "pid": 1,
+                    "tid": tids[track],
+                    "args": {"sort_index": tids[track]},
+                }
+            )
+        return tids[track]
+
+    def microseconds(seconds):
+        return int(round(seconds * 1e6))
+
+    for span_ in spans:
+        args = dict(span_.args)
+        args["status"] = span_.status
+        events.append(
+            {
+                "ph": "X",
+                "name": span_.name,
+                "cat": "phase",
+                "pid": 1,
+                "tid": tid(span_.track),
+                "ts": microseconds(span_.start - origin),
+                "dur": microseconds(span_.end - span_.start),
+                "args": args,
+            }
+        )
+
+    for index, (span_, targets) in enumerate(runs):
+        if span_ is not None:
+            track, start = span_.track, span_.start - origin
+        else:
+            track, start = "ninja-log-%d" % index, 0.0
+        lanes = []
+        for target in targets:
+            for lane, lane_end in enumerate(lanes):
+                if lane_end <= target.start:
+                    break
+            else:
+                lane = len(lanes)
+                lanes.append(0.0)
+            lanes[lane] = target.end
+            events.append(
+                {
+                    "ph": "X",
+                    "name": os.path.basename(target.outputs[0]),
+                    "cat": "ninja",
+                    "pid": 1,
+                    "tid": tid("%s ninja %d" % (track, lane + 1)),
+                    "ts": microseconds(start + target.start),
+                    "dur": microseconds(target.duration),
+                    "args": {"outputs": target.outputs},
+                }
+            )
+
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    if hours:
+        return "%dh%02dm%02ds" % (hours, minutes, seconds)
+    if minutes:
+        return "%dm%04.1fs" % (minutes, seconds)
+    return "%.1fs" % seconds
+
+
+def print_report(spans, runs, top=20):
+    children = {}
+    for span_ in spans:
+        children.setdefault(span_.parent, []).append(span_)
+
+    print("Build phases:")
+
+    def print_span(span_, depth):
+        status = span_.status
+        if status is None:
+            status = "incomplete"
+        elif status == 0:
+            status = ""
+        else:
+            status = "FAILED (%s)" % status
+        print(
+            "  %10s  %-60s %-20s %s"
+            % (
+                format_duration(span_.end - span_.start),
+                "  " * depth + span_.name,
+                span_.track,
+                status,
+            )
+        )
+        for child in children.get(span_.id, []):
+            print_span(child, depth + 1)
+
+    for span_ in children.get(None, []):
+        print_span(span_, 0)
+
+    targets = []
+    for span_, run_targets in runs:
+        track = span_.track if span_ is not None else ""
+        targets.extend((target, track) for target in run_targets)
+    if not targets:
+        return
+    targets.sort(key=lambda item: item[0].duration, reverse=True)
+    print("")
+    print("Slowest ninja targets:")
+    for target, track in targets[:top]:
+        output = target.outputs[0]
+        if len(target.outputs) > 1:
+            output += " (+%d)" % (len(target.outputs) - 1)
+        print("  %10s  %-20s %s" % (format_duration(target.duration), track, output))
+
+
+def chrome_trace_path(trace):
+    return os.path.splitext(trace)[0] + ".json"
+
+
+def report(trace=None, chrome=None, ninja_logs=(), top=20):
+    """Print the phases of the build recorded in `trace` (default: the trace
+    of this build) and its `top` slowest ninja targets, and write its timeline
+    in Chrome trace event format in `chrome` (default: the trace path with a
+    ``.json`` extension)."""
+    if trace is None:
+        trace = trace_path()
+    if trace is None or not os.path.exists(trace):
+        return
+    if chrome is None:
+        chrome = chrome_trace_path(trace)
+    spans = load_spans(trace)
+    runs = ninja_runs(spans, ninja_logs)
+    print_report(spans, runs, top=top)
+    with open(chrome, "w") as file_:
+        json.dump(chrome_trace(spans, runs), file_)
+    print("")
+    print("Timeline written to %s" % chrome)
+    sys.stdout.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    report_parser = subparsers.add_parser(
+        "report", help="Print the phases and slowest targets of a build"
+    )
+    report_parser.add_argument("trace", help="Trace file written by the build")
+    report_parser.add_argument(
+        "--chrome",
+        help="Path of the timeline in Chrome trace event format (default: the "
+        "trace path with a .json extension)",
+    )
+    report_parser.add_argument(
+        "--ninja-log",
+        action="append",
+        default=[],
+        help="Additional .ninja_log file, or build directory, to report",
+    )
+    report_parser.add_argument(
+        "--top", type=int, default=20, help="Number of slowest targets to list"
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "report":
+        if not os.path.exists(args.trace):
+            print("Trace file %s not found" % args.trace, file=sys.stderr)
+            return 1
+        report(args.trace, args.chrome, args.ninja_log, args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+
+"""Compiler cache (ccache or sccache) support shared by the build drivers.
+
+The cache tool is selected with a single option, the ``ITK_COMPILER_CACHE``
+environment variable (``ccache`` or ``sccache``). When it is set, the drivers:
+
+* pass the tool as ``CMAKE_<LANG>_COMPILER_LAUNCHER`` to every ITK, oneTBB and
+  module build (see :func:`cmake_launcher_args`),
+* configure the tool through the environment (see :func:`cache_environment`)
+  so that the cache directory can be shared between build trees, interpreters
+  and containers,
+* end each build with a hit/miss report (see :func:`report`).
+
+The cache directory defaults to ``ITK_COMPILER_CACHE_DIR``. With ccache, paths
+below the base directory (``ITK_COMPILER_CACHE_BASEDIR``) are rewritten as
+relative paths so that build trees of different interpreters, or checkouts in
+different locations, share cache entries.
+
+Usage::
+
+    compiler_cache.py shell-env [--stats-log STATS_LOG]
+    compiler_cache.py cmake-args
+    compiler_cache.py report [--stats-log STATS_LOG]
+
+``shell-env`` prints ``export`` statements to be evaluated by the shell scripts.
+``cmake-args`` prints the CMake launcher options one per line, so that the
+shell scripts read them as an array whatever the path of the launcher.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+SUPPORTED_TOOLS = ["ccache", "sccache"]
+
+# ccache statistics counters reported in a stats log, grouped by outcome.
+CCACHE_HIT_COUNTERS = [
+    "direct_cache_hit",
+    "preprocessed_cache_hit",
+    "remote_storage_hit",
+]
+CCACHE_MISS_COUNTERS = ["cache_miss"]
+
+
+def selected_tool(tool=None):
+    """Return the name of the requested compiler cache tool or ``None``.
+
+    If `tool` is not provided, the ``ITK_COMPILER_CACHE`` environment variable
+    is used.
+    """
+    if tool is None:
+        tool = os.environ.get("ITK_COMPILER_CACHE", "")
+    tool = tool.strip().lower()
+    if not tool or tool in ["0", "off", "none"]:
+        return None
+    if tool not in SUPPORTED_TOOLS:
+        raise ValueError(
+            "Unsupported compiler cache '%s'. Supported values are: %s"
+            % (tool, ", ".join(SUPPORTED_TOOLS))
+        )
+    return tool
+
+
+def compiler_launcher(tool=None):
+    """Return the path of the compiler cache executable or ``None`` if no
+    compiler cache is requested."""
+    tool = selected_tool(tool)
+    if tool is None:
+        return None
+    executable = shutil.which(tool)
+    if executable is None:
+        raise FileNotFoundError(
+            "Compiler cache '%s' was requested but could not be found in PATH" % tool
+        )
+    return executable
+
+
+def cmake_launcher_args(launcher):
+    """Return the CMake options associated with compiler `launcher`."""
+    if not launcher:
+        return []
+    launcher = launcher.replace("\\", "/")
+    return [
+        "-DCMAKE_C_COMPILER_LAUNCHER:FILEPATH=%s" % launcher,
+        "-DCMAKE_CXX_COMPILER_LAUNCHER:FILEPATH=%s" % launcher,
+    ]
+
+
+def default_cache_dir():
+    return os.environ.get(
+        "ITK_COMPILER_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "itk-compiler-cache"),
+    )
+
+
+def cache_environment(tool, cache_dir=None, base_dir=None, stats_log=None):
+    """Return the environment variables configuring `tool`.
+
+    `stats_log` is a file where ccache records the outcome of every compilation,
+    allowing to report statistics for a single build even if the cache directory
+    is used by concurrent builds.
+    """
+    tool = selected_tool(tool)
+    if tool is None:
+        return {}
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    if base_dir is None:
+        base_dir = os.environ.get("ITK_COMPILER_CACHE_BASEDIR")
+    env = {}
+    if tool == "ccache":
+        env["CCACHE_DIR"] = os.path.join(cache_dir, "ccache")
+        # Hash the compiler content instead of its mtime: compilers are
+        # re-installed in fresh containers.
+        env["CCACHE_COMPILERCHECK"] = "content"
+        # Sources are checked out again for every build, ignore the mtime of
+        # included files and rely on their content.
+        env["CCACHE_SLOPPINESS"] = "include_file_ctime,include_file_mtime,time_macros"
+        env["CCACHE_NOHASHDIR"] = "1"
+        env["CCACHE_MAXSIZE"] = os.environ.get("CCACHE_MAXSIZE", "20G")
+        if base_dir:
+            env["CCACHE_BASEDIR"] = base_dir
+        if stats_log:
+            env["CCACHE_STATSLOG"] = stats_log
+    elif tool == "sccache":
+        env["SCCACHE_DIR"] = os.path.join(cache_dir, "sccache")
+        env["SCCACHE_CACHE_SIZE"] = os.environ.get("SCCACHE_CACHE_SIZE", "20G")
+    return env
+
+
+def read_ccache_stats_log(stats_log):
+    """Return a dictionary of counters read from a ccache stats log."""
+    counters = {}
+    with open(stats_log, "r") as file_:
+        for line in file_:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            counters[line] = counters.get(line, 0) + 1
+    return counters
+
+
+def report(tool=None, stats_log=None, title="Compiler cache"):
+    """Print a hit/miss report and return a ``(hits, misses)`` tuple.
+
+    For ccache, the report is computed from `stats_log` if it exists, otherwise
+    the global statistics of the cache are displayed.
+    """
+    tool = selected_tool(tool)
+    if tool is None:
+        return None
+    hits = misses = None
+    if tool == "ccache" and stats_log and os.path.exists(stats_log):
+        counters = read_ccache_stats_log(stats_log)
+        hits = sum(counters.get(name, 0) for name in CCACHE_HIT_COUNTERS)
+        misses = sum(counters.get(name, 0) for name in CCACHE_MISS_COUNTERS)
+        others = sum(counters.values()) - hits - misses
+    elif tool == "sccache":
+        try:
+            stats = json.loads(
+                subprocess.check_output(
+                    [compiler_launcher(tool), "--show-stats", "--stats-format=json"]
+                )
+            )["stats"]
+            hits = sum(stats["cache_hits"]["counts"].values())
+            misses = sum(stats["cache_misses"]["counts"].values())
+            others = stats.get("non_cacheable_compilations", 0)
+        except (subprocess.CalledProcessError, KeyError, ValueError):
+            pass
+    if hits is None:
+        subprocess.call([compiler_launcher(tool), "--show-stats"])
+        return None
+    total = hits + misses
+    print("")
+    print("%s [%s]:" % (title, tool))
+    print("  hits:     %d" % hits)
+    print("  misses:   %d" % misses)
+    print("  other:    %d" % others)
+    if total:
+        print("  hit rate: %.1f%%" % (100.0 * hits / total))
+    return hits, misses
+
+
+def shell_quote(value):
+    return "'%s'" % value.replace("'", "'\"'\"'")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--tool",
+        default=None,
+        help="Compiler cache tool (default: value of ITK_COMPILER_CACHE)",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+    shell_env = subparsers.add_parser(
+        "shell-env", help="Print export statements configuring the cache"
+    )
+    shell_env.add_argument("--stats-log", default=None)
+    subparsers.add_parser("cmake-args", help="Print the CMake launcher options")
+    report_parser = subparsers.add_parser("report", help="Print a hit/miss report")
+    report_parser.add_argument("--stats-log", default=None)
+    report_parser.add_argument("--title", default="Compiler cache")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "shell-env":
+            env = cache_environment(args.tool, stats_log=args.stats_log)
+            for name, value in sorted(env.items()):
+                print("export %s=%s" % (name, shell_quote(value)))
+        elif args.command == "cmake-args":
+            for arg in cmake_launcher_args(compiler_launcher(args.tool)):
+                print(arg)
+        elif args.command == "report":
+            report(args.tool, args.stats_log, args.title)
+    except (ValueError, FileNotFoundError) as exc:
+        print("error: %s" % exc, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
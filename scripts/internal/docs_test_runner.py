@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+
+"""CLI running the documentation tests of the ITK wheels concurrently.
+
+The tests are the examples of ``docs/code`` listed in ``docs/code/test.py``,
+which runs them one after the other, each in a new interpreter paying for the
+whole ``import itk``. This runner imports ``itk`` once, loading every module
+unless ``--lazy`` is given, and then forks a worker per example, up to
+``--jobs`` at the same time. Each worker runs its example in its own temporary
+directory, holding a copy of the baseline image created by
+``CreateBaseline.py``, with its output written to a log file.
+
+Forking is the default on Linux only, as forking a process which has loaded
+system frameworks is not safe on macOS. Elsewhere, or with ``--no-fork``, each
+example runs in a new interpreter instead, still concurrently.
+
+An example running longer than its timeout is killed and fails. The results are
+printed, and written in JUnit XML with ``--junit-xml``.
+
+Usage::
+
+    docs_test_runner.py [-h] [--jobs JOBS] [--timeout TIMEOUT]
+                        [--test-timeout SCRIPT=SECONDS] [--junit-xml JUNIT_XML]
+                        [--log-dir LOG_DIR] [--lazy] [--fork | --no-fork]
+
+The command exits with status 1 if a test failed.
+"""
+
+import argparse
+import importlib.util
+import os
+import runpy
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import xml.etree.ElementTree as ElementTree
+
+from build_scheduler import cpu_count
+
+DOCS_CODE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "docs", "code")
+)
+
+DEFAULT_TIMEOUT = 300.0
+
+# Interval between two checks of the state of the running tests
+_POLL_INTERVAL = 0.02
+
+
+def load_tests(docs_code_dir=DOCS_CODE_DIR):
+    """Return the ``test.py`` module of `docs_code_dir`, which defines the
+    ``BASELINE`` and ``TESTS`` examples."""
+    spec = importlib.util.spec_from_file_location(
+        "docs_code_test", os.path.join(docs_code_dir, "test.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def preload_itk(lazy=False):
+    if not lazy:
+        import itkConfig
+
+        itkConfig.LazyLoading = False
+    import itk  # noqa: F401
+
+
+class ForkedTest:
+    """Example run in a child of this process, which has imported ``itk``."""
+
+    def __init__(self, script, args, cwd, log_path):
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self.pid = os.fork()
+        if self.pid == 0:
+            self._run_child(script, args, cwd, log_path)
+        self.exit_code = None
+
+    @staticmethod
+    def _run_child(script, args, cwd, log_path):
+        exit_code = 1
+        try:
+            log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.dup2(log_fd, 1)
+            os.dup2(log_fd, 2)
+            os.close(log_fd)
+            # Write to the log even if the streams of the parent were replaced
+            sys.stdout = open(1, "w", closefd=False)
+            sys.stderr = open(2, "w", closefd=False)
+            os.chdir(cwd)
+            sys.argv = [script] + list(args)
+            try:
+                runpy.run_path(script, run_name="__main__")
+                exit_code = 0
+            except SystemExit as error:
+                if error.code is None or isinstance(error.code, int):
+                    exit_code = error.code or 0
+                else:
+                    print(error.code, file=sys.stderr)
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(exit_code)
+
+    def poll(self):
+        if self.exit_code is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                self.exit_code = _exit_code(status)
+        return self.exit_code
+
+    def kill(self):
+        os.kill(self.pid, signal.SIGKILL)
+        self.exit_code = _exit_code(os.waitpid(self.pid, 0)[1])
+
+
+class SubprocessTest:
+    """Example run in a new interpreter."""
+
+    def __init__(self, script, args, cwd, log_path):
+        with open(log_path, "wb") as log:
+            self.process = subprocess.Popen(
+                [sys.executable, script] + list(args),
+                cwd=cwd,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+
+    def poll(self):
+        return self.process.poll()
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+
+def _exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class TestResult:
+    def __init__(self, name, log_path):
+        self.name = name
+        self.log_path = log_path
+        self.exit_code = None
+        self.timed_out = False
+        self.duration = 0.0
+        # Output of the test, read once it finished, as its log file may be
+        # removed with the temporary directory of the run.
+        self.output = None
+
+    @property
+    def passed(self):
+        return self.exit_code == 0 and not self.timed_out
+
+    def read_log(self):
+        try:
+            with open(self.log_path, "r", errors="replace") as file_:
+                return file_.read()
+        except OSError:
+            return ""
+
+    def log(self):
+        if self.output is None:
+            return self.read_log()
+        return self.output
+
+    def message(self):
+        if self.timed_out:
+            return "Timed out after %.1fs" % self.duration
+        if self.exit_code < 0:
+            return "Killed by signal %d" % -self.exit_code
+        return "Exit code %d" % self.exit_code
+
+
+def run_tests(
+    tests, jobs=None, timeouts=None, default_timeout=DEFAULT_TIMEOUT, use_fork=True
+):
+    """Run the `tests`, ``(name, script, args, cwd, log_path)`` tuples, and
+    return their results in the same order.
+
+    `timeouts` maps test names to their timeout in seconds.
+    """
+    jobs = jobs or cpu_count()
+    timeouts = timeouts or {}
+    test_class = ForkedTest if use_fork else SubprocessTest
+    pending = list(tests)
+    running = []
+    results = []
+    while pending or running:
+        while pending and len(running) < jobs:
+            name, script, args, cwd, log_path = pending.pop(0)
+            result = TestResult(name, log_path)
+            results.append(result)
+            running.append(
+                (result, test_class(script, args, cwd, log_path), time.monotonic())
+            )
+        time.sleep(_POLL_INTERVAL)
+        still_running = []
+        for result, test, start in running:
+            exit_code = test.poll()
+            result.duration = time.monotonic() - start
+            if exit_code is None and result.duration > timeouts.get(
+                result.name, default_timeout
+            ):
+                result.timed_out = True
+                test.kill()
+                exit_code = -signal.SIGKILL if use_fork else -1
+            if exit_code is None:
+                still_running.append((result, test, start))
+                continue
+            result.exit_code = exit_code
+            result.output = result.read_log()
+            print(
+                "%-30s %s (%.2fs)"
+                % (result.name, "ok" if result.passed else "FAILED", result.duration)
+            )
+            sys.stdout.flush()
+        running = still_running
+    return results
+
+
+def write_junit_xml(results, path, suite_name="docs"):
+    suite = ElementTree.Element(
+        "testsuite",
+        name=suite_name,
+        tests=str(len(results)),
+        failures=str(sum(1 for result in results if not result.passed)),
+        errors="0",
+        time="%.3f" % sum(result.duration for result in results),
+    )
+    for result in results:
+        case = ElementTree.SubElement(
+            suite,
+            "testcase",
+            classname="%s.%s" % (suite_name, os.path.splitext(result.name)[0]),
+            name=result.name,
+            time="%.3f" % result.duration,
+        )
+        if not result.passed:
+            failure = ElementTree.SubElement(
+                case,
+                "failure",
+                message=result.message(),
+                type="timeout" if result.timed_out else "failure",
+            )
+            failure.text = result.log()
+        ElementTree.SubElement(case, "system-out").text = result.log()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    ElementTree.ElementTree(suite).write(path, encoding="utf-8", xml_declaration=True)
+
+
+def run(
+    jobs=None,
+    timeouts=None,
+    default_timeout=DEFAULT_TIMEOUT,
+    junit_xml=None,
+    log_dir=None,
+    lazy=False,
+    use_fork=None,
+    docs_code_dir=DOCS_CODE_DIR,
+):
+    """Run the documentation tests and return their results."""
+    if use_fork is None:
+        use_fork = sys.platform.startswith("linux")
+    definitions = load_tests(docs_code_dir)
+    if use_fork:
+        preload_itk(lazy)
+    work_dir = tempfile.mkdtemp(prefix="ipp-docs-tests-")
+    try:
+        log_dir = log_dir or os.path.join(work_dir, "logs")
+        os.makedirs(log_dir, exist_ok=True)
+
+        def test_tuple(script, args, temp):
+            name = os.path.basename(script)
+            return (
+                name,
+                os.path.join(docs_code_dir, script),
+                definitions.test_args(args, os.path.join(temp, "baseline.png"), temp),
+                temp,
+                os.path.join(log_dir, os.path.splitext(name)[0] + ".log"),
+            )
+
+        baseline_dir = os.path.join(
+            work_dir, os.path.splitext(definitions.BASELINE[0])[0]
+        )
+        os.makedirs(baseline_dir)
+        results = run_tests(
+            [test_tuple(*definitions.BASELINE, baseline_dir)],
+            jobs=1,
+            timeouts=timeouts,
+            default_timeout=default_timeout,
+            use_fork=use_fork,
+        )
+        if results[0].passed:
+            tests = []
+            for script, args in definitions.TESTS:
+                temp = os.path.join(work_dir, os.path.splitext(script)[0])
+                os.makedirs(temp)
+                shutil.copy(os.path.join(baseline_dir, "baseline.png"), temp)
+                tests.append(test_tuple(script, args, temp))
+            results += run_tests(
+                tests,
+                jobs=jobs,
+                timeouts=timeouts,
+                default_timeout=default_timeout,
+                use_fork=use_fork,
+            )
+        if junit_xml:
+            write_junit_xml(results, junit_xml)
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def parse_timeouts(values):
+    timeouts = {}
+    for value in values or []:
+        name, separator, seconds = value.rpartition("=")
+        try:
+            if not separator or not name:
+                raise ValueError()
+            timeouts[name] = float(seconds)
+        except ValueError:
+            raise ValueError(
+                "Invalid timeout '%s', expected SCRIPT=SECONDS" % value
+            ) from None
+    return timeouts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of tests run at the same time (default: number of cores)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="Timeout of each test, in seconds",
+    )
+    parser.add_argument(
+        "--test-timeout",
+        metavar="SCRIPT=SECONDS",
+        action="append",
+        default=[],
+        help="Timeout of the test of SCRIPT, for example "
+        "MixingITKAndNumPy.py=600. Can be repeated.",
+    )
+    parser.add_argument(
+        "--junit-xml", default=None, help="JUnit XML file written with the results"
+    )
+    parser.add_argument(
+        "--log-dir",
+        default=None,
+        help="Directory keeping the output of each test (default: temporary)",
+    )
+    parser.add_argument(
+        "--lazy",
+        action="store_true",
+        help="Do not load every ITK module before forking the tests",
+    )
+    parser.add_argument(
+        "--fork",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="Fork the tests from this process, instead of running each in a "
+        "new interpreter (default: on Linux only)",
+    )
+    args = parser.parse_args()
+
+    try:
+        timeouts = parse_timeouts(args.test_timeout)
+    except ValueError as error:
+        parser.error(str(error))
+
+    start = time.monotonic()
+    results = run(
+        jobs=args.jobs,
+        timeouts=timeouts,
+        default_timeout=args.timeout,
+        junit_xml=args.junit_xml,
+        log_dir=args.log_dir,
+        lazy=args.lazy,
+        use_fork=args.fork,
+    )
+    failed = [result for result in results if not result.passed]
+    for result in failed:
+        print("")
+        print("%s: %s" % (result.name, result.message()))
+        print(result.log())
+    print(
+        "%d test(s) passed, %d failed in %.2fs"
+        % (len(results) - len(failed), len(failed), time.monotonic() - start)
+    )
+    if args.junit_xml:
+        print("Wrote JUnit XML to %s" % args.junit_xml)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python
+
+"""CLI measuring the time and the resources taken by importing the ITK wheels.
+
+Every measurement runs in a new interpreter, importing the wheels given on the
+command line, installed in a temporary directory, or the ``itk`` package of the
+interpreter if no wheel is given. The metrics are:
+
+* ``import.cold``: ``import itk`` without any Python bytecode cache, so that
+  every module is compiled again. With ``--drop-caches``, the file system cache
+  is also dropped before each run, which requires root privileges on Linux.
+* ``import.warm``: ``import itk`` once the bytecode is cached.
+* ``import.eager``: ``import itk`` loading every ITK module, as done with
+  ``itkConfig.LazyLoading = False``.
+* ``first_access.<wheel>``: access to a class of the wheel right after the lazy
+  ``import itk``, which loads the modules of the class (see
+  ``FIRST_ACCESS_ATTRIBUTES``).
+* ``libraries.lazy``, ``libraries.eager``, ``libraries.first_access.<wheel>``:
+  number of shared libraries of ITK loaded by the interpreter.
+* ``rss.lazy``, ``rss.eager``: peak resident set size of the interpreter.
+
+Times are the median of ``--repeat`` runs. The results are written as JSON
+(see ``benchmark_results.py``) and compared with the results of another build
+with ``--baseline``, or later with ``benchmark_results.py compare``.
+
+Usage::
+
+    import_benchmark.py [-h] [--python PYTHON] [--repeat REPEAT]
+                        [--attribute WHEEL=ATTRIBUTE] [--drop-caches]
+                        [--output OUTPUT] [--baseline BASELINE]
+                        [--threshold PATTERN=PERCENT]
+                        [wheel ...]
+
+The command exits with status 1 if a metric regressed compared to the
+baseline.
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmark_results import (
+    add_metric,
+    environment,
+    install_wheels,
+    new_results,
+    parse_thresholds,
+    report_results,
+    run_probe,
+)
+
+# Class accessed to measure the first access to the modules of each wheel.
+FIRST_ACCESS_ATTRIBUTES = {
+    "itk-core": "Image",
+    "itk-numerics": "AmoebaOptimizer",
+    "itk-io": "ImageFileReader",
+    "itk-filtering": "MedianImageFilter",
+    "itk-registration": "ImageRegistrationMethodv4",
+    "itk-segmentation": "ConnectedThresholdImageFilter",
+}
+
+# Code run by every measurement in a new interpreter. It prints the measured
+# values as JSON.
+_PROBE = r"""
+import json
+import os
+import sys
+import time
+
+config = json.loads(sys.argv[1])
+
+
+def itk_libraries():
+    paths = set()
+    if sys.platform.startswith("linux"):
+        with open("/proc/self/maps", "r") as maps:
+            for line in maps:
+                fields = line.split(None, 5)
+                if len(fields) == 6 and ".so" in os.path.basename(fields[5]):
+                    paths.add(fields[5].strip())
+    elif sys.platform == "darwin":
+        import ctypes
+
+        dyld = ctypes.CDLL(None)
+        dyld._dyld_get_image_name.restype = ctypes.c_char_p
+        for index in range(dyld._dyld_image_count()):
+            paths.add(dyld._dyld_get_image_name(index).decode())
+    else:
+        return None
+    return len([path for path in paths if "itk" in os.path.basename(path).lower()])
+
+
+def peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+start = time.perf_counter()
+if config["eager"]:
+    import itkConfig
+
+    itkConfig.LazyLoading = False
+import itk
+
+result = {"import": time.perf_counter() - start}
+if config["attribute"]:
+    start = time.perf_counter()
+    getattr(itk, config["attribute"])
+    result["access"] = time.perf_counter() - start
+result["libraries"] = itk_libraries()
+result["rss"] = peak_rss()
+result["python"] = "%d.%d.%d" % sys.version_info[:3]
+print(json.dumps(result))
+"""
+
+
+def drop_file_system_caches():
+    if sys.platform.startswith("linux"):
+        subprocess.check_call(["sync"])
+        with open("/proc/sys/vm/drop_caches", "w") as file_:
+            file_.write("3\n")
+    elif sys.platform == "darwin":
+        subprocess.check_call(["purge"])
+    else:
+        raise RuntimeError("Dropping the file system caches is not supported")
+
+
+class Probe:
+    """Run the probe in new interpreters importing from `site_dir`, or from
+    the default paths of `python_executable` if `site_dir` is ``None``."""
+
+    def __init__(self, python_executable, site_dir, work_dir):
+        self.python_executable = python_executable
+        self.site_dir = site_dir
+        self.work_dir = work_dir
+        self.warm_cache_dir = os.path.join(work_dir, "pycache-warm")
+        self.runs = 0
+
+    def run(self, eager=False, attribute=None, cold=False, drop_caches=False):
+        env = dict(os.environ)
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        if cold:
+            self.runs += 1
+            cache_dir = os.path.join(self.work_dir, "pycache-cold-%d" % self.runs)
+        else:
+            cache_dir = self.warm_cache_dir
+        env["PYTHONPYCACHEPREFIX"] = cache_dir
+        if drop_caches:
+            drop_file_system_caches()
+        config = {"eager": eager, "attribute": attribute}
+        result = run_probe(
+            self.python_executable,
+            _PROBE,
+            config,
+            site_dir=self.site_dir,
+            work_dir=self.work_dir,
+            env=env,
+        )
+        if cold:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        return result
+
+    def median(self, key, repeat, **kwargs):
+        """Return the median of `key` over `repeat` runs, and the result of
+        the last run."""
+        results = [self.run(**kwargs) for _ in range(repeat)]
+        return statistics.median(result[key] for result in results), results[-1]
+
+
+def wheel_name(wheel):
+    """Return the distribution name of `wheel` as written in
+    ``WHEEL_NAMES.txt`` (``itk_core-...whl`` -> ``itk-core``)."""
+    return os.path.basename(wheel).split("-")[0].replace("_", "-")
+
+
+def run(
+    wheels,
+    python_executable=None,
+    repeat=5,
+    attributes=None,
+    drop_caches=False,
+):
+    """Return the results of the import benchmark of `wheels`, or of the
+    ``itk`` package of `python_executable` if `wheels` is empty."""
+    python_executable = python_executable or sys.executable
+    if attributes is None:
+        attributes = dict(FIRST_ACCESS_ATTRIBUTES)
+    if wheels:
+        names = set(wheel_name(wheel) for wheel in wheels)
+        attributes = dict(
+            (name, attribute) for name, attribute in attributes.items() if name in names
+        )
+    work_dir = tempfile.mkdtemp(prefix="ipp-import-benchmark-")
+    try:
+        site_dir = None
+        if wheels:
+            site_dir = os.path.join(work_dir, "site")
+            install_wheels(python_executable, wheels, site_dir)
+        probe = Probe(python_executable, site_dir, work_dir)
+
+        cold, _ = probe.median("import", repeat, cold=True, drop_caches=drop_caches)
+        # Warm up the bytecode and file system caches
+        probe.run(eager=True)
+        warm, lazy = probe.median("import", repeat)
+        eager_time, eager = probe.median("import", repeat, eager=True)
+
+        results = new_results(
+            "import",
+            environment(
+                python=lazy["python"],
+                wheels=sorted(os.path.basename(wheel) for wheel in wheels),
+                repeat=repeat,
+            ),
+        )
+        add_metric(results, "import.cold", cold, "s")
+        add_metric(results, "import.warm", warm, "s")
+        add_metric(results, "import.eager", eager_time, "s")
+        for mode, result in [("lazy", lazy), ("eager", eager)]:
+            if result["libraries"] is not None:
+                add_metric(results, "libraries.%s" % mode, result["libraries"], "count")
+            if result["rss"] is not None:
+                add_metric(results, "rss.%s" % mode, result["rss"], "bytes")
+        for name, attribute in sorted(attributes.items()):
+            access, result = probe.median("access", repeat, attribute=attribute)
+            add_metric(results, "first_access.%s" % name, access, "s")
+            if result["libraries"] is not None:
+                add_metric(
+                    results,
+                    "libraries.first_access.%s" % name,
+                    result["libraries"],
+                    "count",
+                )
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def parse_attributes(values):
+    attributes = dict(FIRST_ACCESS_ATTRIBUTES)
+    for value in values or []:
+        name, separator, attribute = value.partition("=")
+        if not separator or not name:
+            raise ValueError("Invalid attribute '%s', expected WHEEL=ATTRIBUTE" % value)
+        if attribute:
+            attributes[name] = attribute
+        else:
+            attributes.pop(name, None)
+    return attributes
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--python",
+        default=sys.executable,
+        help="Interpreter compatible with the wheels, numpy must be installed",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Number of runs of each measurement"
+    )
+    parser.add_argument(
+        "--attribute",
+        metavar="WHEEL=ATTRIBUTE",
+        action="append",
+        default=[],
+        help="Class accessed to measure the first access to a wheel, nothing "
+        "is measured for the wheel if ATTRIBUTE is empty. Can be repeated.",
+    )
+    parser.add_argument(
+        "--drop-caches",
+        action="store_true",
+        help="Drop the file system caches before each cold import",
+    )
+    parser.add_argument(
+        "--output", default="import-benchmark.json", help="Output JSON file"
+    )
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        help="Results of another build to compare with",
+    )
+    parser.add_argument(
+        "--threshold",
+        metavar="PATTERN=PERCENT",
+        action="append",
+        default=[],
+        help="Regression threshold of the metrics matching PATTERN, see "
+        "benchmark_results.py. Can be repeated.",
+    )
+    parser.add_argument(
+        "wheels",
+        metavar="wheel",
+        nargs="*",
+        help="Wheels to benchmark (default: the installed itk package)",
+    )
+    args = parser.parse_args()
+
+    try:
+        attributes = parse_attributes(args.attribute)
+        thresholds = parse_thresholds(args.threshold)
+    except ValueError as error:
+        parser.error(str(error))
+
+    results = run(
+        args.wheels,
+        python_executable=args.python,
+        repeat=args.repeat,
+        attributes=attributes,
+        drop_caches=args.drop_caches,
+    )
+    report_results(results, args.output, args.baseline, thresholds)
+
+
+if __name__ == "__main__":
+    main()
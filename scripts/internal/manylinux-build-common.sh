@@ -23,6 +23,18 @@ else
   done
 fi
 
+# python_minor_version <python_bin_dir>
+#
+# Print the minor version of the CPython interpreter associated with a
+# directory like /opt/python/cp311-cp311/bin (e.g. 11).
+python_minor_version()
+{
+  local version
+  version=$(basename $(dirname $1))
+  version=${version%%-*}
+  echo ${version#cp3}
+}
+
 # i686 or x86_64 ?
 case $(uname -m) in
     i686)
@@ -82,4 +94,34 @@ fi
 
 MANYLINUX_VERSION=${MANYLINUX_VERSION:=_2_28}
 
+# -----------------------------------------------------------------------
+# Compiler cache
+#
+# Set ITK_COMPILER_CACHE to ccache or sccache to cache compilation results in
+# ITK_COMPILER_CACHE_DIR. The dockcross-manylinux-*.sh scripts bind-mount this
+# directory from the host so that it is shared between containers.
+#
+# COMPILER_LAUNCHER_ARGS is set to the array of the corresponding CMake options.
+ITK_COMPILER_CACHE=${ITK_COMPILER_CACHE:=}
+COMPILER_LAUNCHER_ARGS=()
+if [[ -n ${ITK_COMPILER_CACHE} ]]; then
+  export ITK_COMPILER_CACHE
+  export ITK_COMPILER_CACHE_DIR=${ITK_COMPILER_CACHE_DIR:=/work/compiler-cache}
+  export ITK_COMPILER_CACHE_BASEDIR=${ITK_COMPILER_CACHE_BASEDIR:=/work}
+  eval "$(${PYBINARIES[0]}/python ${script_dir}/compiler_cache.py shell-env)"
+  mapfile -t COMPILER_LAUNCHER_ARGS < <(${PYBINARIES[0]}/python ${script_dir}/compiler_cache.py cmake-args)
+  echo "Using compiler cache: ${COMPILER_LAUNCHER_ARGS[*]}"
+fi
+
+# -----------------------------------------------------------------------
+# Wheel repair cache
+#
+# The changes made by auditwheel are cached in ITK_WHEEL_REPAIR_CACHE_DIR, below
+# the mounted /work directory so that wheels whose libraries did not change are
+# not repaired again by later builds. The cache is pruned down to
+# ITK_WHEEL_REPAIR_CACHE_MAX_SIZE, unused entries are removed after
+# ITK_WHEEL_REPAIR_CACHE_MAX_AGE days. Set ITK_WHEEL_REPAIR_JOBS to bound the
+# number of wheels repaired at the same time.
+export ITK_WHEEL_REPAIR_CACHE_DIR=${ITK_WHEEL_REPAIR_CACHE_DIR:=/work/build/wheel-repair-cache}
+
 echo "Building wheels for $ARCH using manylinux${MANYLINUX_VERSION}"
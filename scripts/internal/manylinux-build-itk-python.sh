@@ -0,0 +1,150 @@
+#!/usr/bin/env bash
+
+# Configure and build the wrapped ITK tree associated with one Python interpreter,
+# and compute the partition of its modules into wheels.
+#
+# This script is called by manylinux-build-wheels.sh, either directly or through
+# build_scheduler.py when building for several interpreters concurrently.
+#
+# Usage:
+#
+#   manylinux-build-itk-python.sh /opt/python/cp39-cp39/bin
+#
+# The following environment variables are expected:
+#
+# `ARCH`: Target architecture (x86, x64, aarch64), set by manylinux-build-common.sh.
+#
+# `MANYLINUX_VERSION`: manylinux specialization (e.g. _2_28).
+#
+# `ITK_BUILD_JOBS`: Number of parallel ninja jobs. Default is the number of cores.
+#
+# `ITK_BUILD_LOAD`: Do not start new ninja jobs while the load average is greater
+#   than this value. Default is the number of cores.
+#
+# `ITK_COMPILER_CACHE`: Compiler cache, configured by manylinux-build-common.sh.
+#   Its CMake launcher options are read from compiler_cache.py.
+#
+# `ITK_ABI3_SINGLE_BUILD`: If set to 1 and the interpreter is CPython >= 3.11, build
+#   against the Python limited API so that the tree can be used by all later versions.
+#
+# `ITK_WRAPPING_PROFILE`: Wrapping profile selecting the wrapped pixel types and
+#   image dimensions (minimal, standard or full), see wrapping_profiles.py.
+#   Default is full.
+#
+# `ITK_BUILD_TRACE`: Trace file recording the timeline of the build, see
+#   build_trace.py.
+#
+# `ITK_WRAPPING_COST_REPORT`: If set to 1, attribute the build time and installed
+#   size of the tree to its modules and wheels in
+#   /work/logs/wrapping-cost-<python version>.json, see wrapping_cost.py.
+#
+
+set -e -x
+
+script_dir=$(cd $(dirname $0) || exit 1; pwd)
+source "${script_dir}/build-trace.sh"
+
+PYBIN=$1
+if [[ -z ${PYBIN} || -z ${ARCH} || -z ${MANYLINUX_VERSION} ]]; then
+  echo "Usage: ARCH=<arch> MANYLINUX_VERSION=<version> $0 <python_bin_dir>" 1>&2
+  exit 1
+fi
+
+n_processors=$(nproc)
+ITK_BUILD_JOBS=${ITK_BUILD_JOBS:=${n_processors}}
+ITK_BUILD_LOAD=${ITK_BUILD_LOAD:=${n_processors}}
+
+Python3_EXECUTABLE=${PYBIN}/python3
+Python3_INCLUDE_DIR=$( find -L ${PYBIN}/../include/ -name Python.h -exec dirname {} \; )
+
+echo ""
+echo "Python3_EXECUTABLE:${Python3_EXECUTABLE}"
+echo "Python3_INCLUDE_DIR:${Python3_INCLUDE_DIR}"
+
+build_type="Release"
+compile_flags="-O3 -DNDEBUG"
+source_path=/work/ITK-source/ITK
+build_path=/work/ITK-$(basename $(dirname ${PYBIN}))-manylinux${MANYLINUX_VERSION}_${ARCH}
+tbb_dir=/work/oneTBB-prefix/lib/cmake/TBB
+
+py_version=$(basename $(dirname ${PYBIN}))
+py_minor=${py_version%%-*}
+py_minor=${py_minor#cp3}
+limited_api_args=()
+if [[ ${ITK_ABI3_SINGLE_BUILD} == 1 && ${py_minor} -ge 11 ]]; then
+  limited_api_args+=(-DITK_USE_PYTHON_LIMITED_API:BOOL=ON)
+fi
+
+# CMake options enabling the compiler cache, one per line
+compiler_launcher_args=()
+if [[ -n ${ITK_COMPILER_CACHE} ]]; then
+  mapfile -t compiler_launcher_args < <(${PYBIN}/python ${script_dir}/compiler_cache.py cmake-args)
+fi
+
+# ITK_WRAP_* options of the wrapping profile
+wrapping_profile_args=$(${PYBIN}/python ${script_dir}/wrapping_profiles.py cmake-args)
+wrapping_profile_args=(${wrapping_profile_args})
+
+mkdir -p ${build_path}
+cd ${build_path}
+
+# Record the compiler cache outcome of this build only, other interpreters may
+# share the cache concurrently.
+compiler_cache_stats=${build_path}/compiler-cache-stats.log
+rm -f ${compiler_cache_stats}
+export CCACHE_STATSLOG=${compiler_cache_stats}
+
+trace_begin configure
+cmake \
+  -DCMAKE_BUILD_TYPE:STRING=${build_type} \
+  -DITK_SOURCE_DIR:PATH=${source_path} \
+  -DITK_BINARY_DIR:PATH=${build_path} \
+  -DBUILD_TESTING:BOOL=OFF \
+  -DPython3_EXECUTABLE:FILEPATH=${Python3_EXECUTABLE} \
+  -DPython3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR} \
+  -DCMAKE_CXX_COMPILER_TARGET:STRING=$(uname -m)-linux-gnu \
+  -DCMAKE_CXX_FLAGS:STRING="$compile_flags" \
+  -DCMAKE_C_FLAGS:STRING="$compile_flags" \
+  -DCMAKE_BUILD_TYPE:STRING="${build_type}" \
+  -DWRAP_ITK_INSTALL_COMPONENT_IDENTIFIER:STRING=PythonWheel \
+  -DWRAP_ITK_INSTALL_COMPONENT_PER_MODULE:BOOL=ON \
+  "${wrapping_profile_args[@]}" \
+  -DPY_SITE_PACKAGES_PATH:PATH="." \
+  -DITK_LEGACY_SILENT:BOOL=ON \
+  -DITK_WRAP_PYTHON:BOOL=ON \
+  -DITK_WRAP_DOC:BOOL=ON \
+  -DModule_ITKTBB:BOOL=ON \
+  -DTBB_DIR:PATH=${tbb_dir} \
+  "${limited_api_args[@]}" \
+  "${compiler_launcher_args[@]}" \
+  -G Ninja \
+  ${source_path}
+trace_end
+trace_begin ninja ninja_log=${build_path}/.ninja_log
+ninja -j${ITK_BUILD_JOBS} -l${ITK_BUILD_LOAD}
+trace_end
+
+# Compute the partition of ITK modules into wheels once, it is re-used when
+# packaging every wheel.
+trace_begin wheel-partition
+${PYBIN}/python ${script_dir}/wheel_partition.py manifest \
+  --itk-source-dir ${source_path} \
+  --itk-binary-dir ${build_path}
+trace_end
+
+if [[ ${ITK_WRAPPING_COST_REPORT} == 1 ]]; then
+  trace_begin wrapping-cost
+  mkdir -p /work/logs
+  ${PYBIN}/python ${script_dir}/wrapping_cost.py collect \
+    --itk-binary-dir ${build_path} \
+    --output /work/logs/wrapping-cost-${py_version}.json
+  ${PYBIN}/python ${script_dir}/wrapping_cost.py show --by wheel \
+    /work/logs/wrapping-cost-${py_version}.json
+  trace_end
+fi
+
+if [[ -n ${ITK_COMPILER_CACHE} ]]; then
+  ${PYBIN}/python ${script_dir}/compiler_cache.py report \
+    --stats-log ${compiler_cache_stats} \
+    --title "Compiler cache for $(basename ${build_path})"
+fi
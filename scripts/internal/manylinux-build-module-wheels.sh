@@ -69,6 +69,12 @@ script_dir=$(cd $(dirname $0) || exit 1; pwd)
 source "${script_dir}/manylinux-build-common.sh"
 # -----------------------------------------------------------------------
 
+# Record the timeline of the build in /work/logs/build-trace.jsonl, reported
+# when the script exits.
+source "${script_dir}/build-trace.sh"
+trace_start /work/logs/build-trace.jsonl
+trap "trace_report ${PYBINARIES[0]}/python" EXIT
+
 # Set up library paths in container so that shared libraries can be added to wheels
 sudo ldconfig
 export LD_LIBRARY_PATH=${LD_LIBRARY_PATH}:/work/oneTBB-prefix/lib:/usr/lib:/usr/lib64:/usr/local/lib:/usr/local/lib64
@@ -82,12 +88,18 @@ for PYBIN in "${PYBINARIES[@]}"; do
     echo "Python3_EXECUTABLE:${Python3_EXECUTABLE}"
     echo "Python3_INCLUDE_DIR:${Python3_INCLUDE_DIR}"
 
+    trace_begin --track $(basename $(dirname ${PYBIN})) build
+    trace_begin prepare-env
+    requirement_args=()
     if [[ -e /work/requirements-dev.txt ]]; then
-      ${PYBIN}/pip install --upgrade -r /work/requirements-dev.txt
+      requirement_args+=(-r /work/requirements-dev.txt)
     fi
     if [[ -e /ITKPythonPackage/requirements-dev.txt ]]; then
-      ${PYBIN}/pip install --upgrade -r /ITKPythonPackage/requirements-dev.txt
+      requirement_args+=(-r /ITKPythonPackage/requirements-dev.txt)
     fi
+    ${PYBIN}/python ${script_dir}/build_env.py provision \
+      --python ${PYBIN}/python "${requirement_args[@]}"
+    trace_end
     version=$(basename $(dirname ${PYBIN}))
     # Remove "m" -- not present in Python 3.8 and later
     version=${version:0:9}
@@ -108,6 +120,10 @@ for PYBIN in "${PYBINARIES[@]}"; do
     if test $py_minor -ge 11; then
       wheel_py_api=cp3$py_minor
     fi
+    compiler_cache_stats=/work/compiler-cache-stats-${version}.log
+    rm -f ${compiler_cache_stats}
+    export CCACHE_STATSLOG=${compiler_cache_stats}
+    trace_begin package-wheel
     ${PYBIN}/python -m build \
       --verbose \
       --wheel \
@@ -123,8 +139,18 @@ for PYBIN in "${PYBINARIES[@]}"; do
       --config-setting=cmake.define.BUILD_TESTING:BOOL=OFF \
       --config-setting=cmake.define.Python3_EXECUTABLE:FILEPATH=${Python3_EXECUTABLE} \
       --config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR} \
+      "${COMPILER_LAUNCHER_ARGS[@]/#-D/--config-setting=cmake.define.}" \
       ${CMAKE_OPTIONS//'-D'/'--config-setting=cmake.define.'} \
     || exit 1
+    trace_end
+
+    if [[ -n ${ITK_COMPILER_CACHE} ]]; then
+      ${Python3_EXECUTABLE} ${script_dir}/compiler_cache.py report \
+        --stats-log ${compiler_cache_stats} \
+        --title "Compiler cache for ${version}"
+      rm -f ${compiler_cache_stats}
+    fi
+    trace_end
 done
 
 # Convert list of excluded libs in --exclude_libs to auditwheel --exclude options
@@ -132,10 +158,16 @@ if test -n "$EXCLUDE_LIBS"; then
   AUDITWHEEL_EXCLUDE_ARGS="--exclude ${EXCLUDE_LIBS//;/ --exclude }"
 fi
 
+trace_begin repair-wheels
 sudo ${Python3_EXECUTABLE} -m pip install auditwheel
-for whl in dist/*linux*$(uname -m).whl; do
-  auditwheel repair ${whl} -w /work/dist/ ${AUDITWHEEL_EXCLUDE_ARGS}
-done
+${Python3_EXECUTABLE} ${script_dir}/wheel_repair.py \
+  --tool auditwheel \
+  --executable ${Python3_EXECUTABLE} \
+  --output-dir /work/dist \
+  --log-dir /work/logs/repair \
+  dist/*linux*$(uname -m).whl \
+  -- ${AUDITWHEEL_EXCLUDE_ARGS}
+trace_end
 
 if compgen -G "dist/itk*-linux*.whl" > /dev/null; then
   for itk_wheel in dist/itk*-linux*.whl; do
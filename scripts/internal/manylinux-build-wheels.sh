@@ -38,12 +38,58 @@ source "${script_dir}/manylinux-build-common.sh"
 
 # -----------------------------------------------------------------------
 
+# Record the timeline of the build in /work/logs/build-trace.jsonl, reported
+# when the script exits.
+source "${script_dir}/build-trace.sh"
+trace_start /work/logs/build-trace.jsonl
+trap "trace_report /opt/python/cp311-cp311/bin/python" EXIT
+
+# Wrapping profile selecting the wrapped pixel types and image dimensions, see
+# wrapping_profiles.py. The examples of docs/code are only run if the profile
+# wraps the types they use.
+export ITK_WRAPPING_PROFILE=${ITK_WRAPPING_PROFILE:=full}
+run_docs_tests=$(/opt/python/cp311-cp311/bin/python ${script_dir}/wrapping_profiles.py property docs_tests) || exit 1
+echo "Wrapping profile: ${ITK_WRAPPING_PROFILE}"
+
+# Set ITK_IMPORT_BENCHMARK=1 to measure the import of the installed wheels of
+# each interpreter, ITK_THROUGHPUT_BENCHMARK=1 to measure the throughput of the
+# workloads of the documentation examples, and ITK_MEMORY_BENCHMARK=1 to
+# measure the memory used by their workflows, in
+# /work/logs/<suite>-benchmark-<python version>.json, see import_benchmark.py,
+# throughput_benchmark.py and memory_benchmark.py. The wheels are imported from
+# the environment of the interpreter created by wheel_verify.py. The results
+# are compared with the results of the same interpreter in
+# ITK_BENCHMARK_BASELINE_DIR, if any, and the build fails if a metric
+# regressed.
+run_benchmark() {
+  local suite=$1
+  shift
+  local py_name=$(basename $(dirname ${PYBIN}))
+  local results=${suite}-benchmark-${py_name}.json
+  local baseline=()
+  if [[ -f ${ITK_BENCHMARK_BASELINE_DIR}/${results} ]]; then
+    baseline=(--baseline ${ITK_BENCHMARK_BASELINE_DIR}/${results})
+  fi
+  trace_begin --track ${py_name} ${suite}-benchmark
+  mkdir -p /work/logs
+  (cd $HOME && PYTHONPATH=/work/build/verify/${py_name}/site PYTHONNOUSERSITE=1 \
+    ${PYBIN}/python ${script_dir}/${suite}_benchmark.py \
+    --python ${PYBIN}/python \
+    --output /work/logs/${results} \
+    "${baseline[@]}" "$@") || exit 1
+  trace_end
+}
+
 # Build standalone project and populate archive cache
+trace_begin superbuild ninja_log=/work/ITK-source/.ninja_log
 mkdir -p /work/ITK-source
 pushd /work/ITK-source > /dev/null 2>&1
-  cmake -DITKPythonPackage_BUILD_PYTHON:PATH=0 -G Ninja ../
+  cmake -DITKPythonPackage_BUILD_PYTHON:PATH=0 \
+    -DITKPythonPackage_COMPILER_LAUNCHER:STRING=${ITK_COMPILER_CACHE} \
+    -G Ninja ../
   ninja
 popd > /dev/null 2>&1
+trace_end
 tbb_dir=/work/oneTBB-prefix/lib/cmake/TBB
 # So auditwheel can find the libs
 sudo ldconfig
@@ -52,8 +98,65 @@ export LD_LIBRARY_PATH=${LD_LIBRARY_PATH}:/work/oneTBB-prefix/lib:/usr/lib:/usr/
 # TODO: More work is required to re-enable this feature.
 SINGLE_WHEEL=0
 
+# Variables used by manylinux-build-itk-python.sh
+export ARCH
+export MANYLINUX_VERSION
+
+# Interpreters for which an ITK tree is built.
+#
+# With ITK_ABI3_SINGLE_BUILD=1, a single ITK tree is built against the Python
+# limited API using the oldest interpreter supporting the stable ABI (3.11). The
+# resulting abi3 wheels are packaged once and tested with every CPython >= 3.11.
+export ITK_ABI3_SINGLE_BUILD=${ITK_ABI3_SINGLE_BUILD:=0}
+BUILD_PYBINARIES=()
+abi3_pybin=""
+for PYBIN in "${PYBINARIES[@]}"; do
+  if [[ ${ITK_ABI3_SINGLE_BUILD} == 1 && $(python_minor_version ${PYBIN}) -ge 11 ]]; then
+    if [[ -z ${abi3_pybin} || $(python_minor_version ${PYBIN}) -lt $(python_minor_version ${abi3_pybin}) ]]; then
+      abi3_pybin=${PYBIN}
+    fi
+    continue
+  fi
+  BUILD_PYBINARIES+=(${PYBIN})
+done
+if [[ -n ${abi3_pybin} ]]; then
+  BUILD_PYBINARIES+=(${abi3_pybin})
+  echo "Building a single abi3 ITK tree using ${abi3_pybin}"
+fi
+
+# Build the wrapped ITK trees of all interpreters concurrently, sharing the
+# cores and memory of the host between them. Set ITK_CONCURRENT_BUILDS=1 to
+# build them one after the other.
+ITK_CONCURRENT_BUILDS=${ITK_CONCURRENT_BUILDS:=0}
+itk_trees_built=0
+if [[ ${SINGLE_WHEEL} == 0 && ${ITK_CONCURRENT_BUILDS} != 1 && ${#BUILD_PYBINARIES[@]} -gt 1 ]]; then
+  trace_begin itk-builds
+  ${BUILD_PYBINARIES[0]}/python ${script_dir}/build_scheduler.py \
+    --max-concurrent ${ITK_CONCURRENT_BUILDS} \
+    --log-dir /work/logs \
+    ${script_dir}/manylinux-build-itk-python.sh \
+    "${BUILD_PYBINARIES[@]}" \
+  || exit 1
+  trace_end
+  itk_trees_built=1
+fi
+
 # Compile wheels re-using standalone project and archive cache
 for PYBIN in "${PYBINARIES[@]}"; do
+    if [[ -n ${abi3_pybin} && ${PYBIN} != "${abi3_pybin}" && $(python_minor_version ${PYBIN}) -ge 11 ]]; then
+      # Wheels built with the abi3 interpreter are also used for this one. Point
+      # its build tree to the abi3 tree so that modules can still be built
+      # against ITK-<pyver>-manylinux<ver>_<arch>.
+      # A build tree left by an earlier build without abi3 is removed, as the
+      # link would otherwise be created inside of it.
+      abi3_build_path=ITK-$(basename $(dirname ${abi3_pybin}))-manylinux${MANYLINUX_VERSION}_${ARCH}
+      build_path=/work/ITK-$(basename $(dirname ${PYBIN}))-manylinux${MANYLINUX_VERSION}_${ARCH}
+      rm -rf ${build_path}
+      ln -sn ${abi3_build_path} ${build_path}
+      echo "Skipping ITK build for ${PYBIN}: re-using abi3 wheels built with ${abi3_pybin}"
+      continue
+    fi
+
     export Python3_EXECUTABLE=${PYBIN}/python3
     Python3_INCLUDE_DIR=$( find -L ${PYBIN}/../include/ -name Python.h -exec dirname {} \; )
 
@@ -61,8 +164,13 @@ for PYBIN in "${PYBINARIES[@]}"; do
     echo "Python3_EXECUTABLE:${Python3_EXECUTABLE}"
     echo "Python3_INCLUDE_DIR:${Python3_INCLUDE_DIR}"
 
-    # Install dependencies
-    ${PYBIN}/pip install --upgrade -r /work/requirements-dev.txt
+    trace_begin --track $(basename $(dirname ${PYBIN})) build
+
+    # Install dependencies, unless already installed
+    trace_begin prepare-env
+    ${PYBIN}/python ${script_dir}/build_env.py provision \
+      --python ${PYBIN}/python -r /work/requirements-dev.txt
+    trace_end
 
     build_type="Release"
     compile_flags="-O3 -DNDEBUG"
@@ -82,6 +190,7 @@ for PYBIN in "${PYBINARIES[@]}"; do
       # Configure pyproject.toml
       ${PYBIN}/python ${PYPROJECT_CONFIGURE} "itk"
       # Generate wheel
+      trace_begin package-wheel wheel=itk
       ${PYBIN}/python -m build \
             --verbose \
             --wheel \
@@ -100,7 +209,9 @@ for PYBIN in "${PYBINARIES[@]}"; do
             --config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR} \
             --config-setting=cmake.define.Module_ITKTBB:BOOL=ON \
             --config-setting=cmake.define.TBB_DIR:PATH=${tbb_dir} \
+            "${COMPILER_LAUNCHER_ARGS[@]/#-D/--config-setting=cmake.define.}" \
             .
+      trace_end
 
     else
 
@@ -109,107 +220,159 @@ for PYBIN in "${PYBINARIES[@]}"; do
       echo "#"
 
       # Build ITK python
-      (
-        mkdir -p ${build_path} \
-        && cd ${build_path} \
-        && cmake \
-          -DCMAKE_BUILD_TYPE:STRING=${build_type} \
-          -DITK_SOURCE_DIR:PATH=${source_path} \
-          -DITK_BINARY_DIR:PATH=${build_path} \
-          -DBUILD_TESTING:BOOL=OFF \
-          -DPython3_EXECUTABLE:FILEPATH=${Python3_EXECUTABLE} \
-          -DPython3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR} \
-          -DCMAKE_CXX_COMPILER_TARGET:STRING=$(uname -m)-linux-gnu \
-          -DCMAKE_CXX_FLAGS:STRING="$compile_flags" \
-          -DCMAKE_C_FLAGS:STRING="$compile_flags" \
-          -DCMAKE_BUILD_TYPE:STRING="${build_type}" \
-          -DWRAP_ITK_INSTALL_COMPONENT_IDENTIFIER:STRING=PythonWheel \
-          -DWRAP_ITK_INSTALL_COMPONENT_PER_MODULE:BOOL=ON \
-          -DITK_WRAP_unsigned_short:BOOL=ON \
-          -DITK_WRAP_double:BOOL=ON \
-          -DITK_WRAP_complex_double:BOOL=ON \
-          -DITK_WRAP_IMAGE_DIMS:STRING="2;3;4" \
-          -DPY_SITE_PACKAGES_PATH:PATH="." \
-          -DITK_LEGACY_SILENT:BOOL=ON \
-          -DITK_WRAP_PYTHON:BOOL=ON \
-          -DITK_WRAP_DOC:BOOL=ON \
-          -DModule_ITKTBB:BOOL=ON \
-          -DTBB_DIR:PATH=${tbb_dir} \
-          -G Ninja \
-          ${source_path} \
-        && ninja \
+      if [[ ${itk_trees_built} == 0 ]]; then
+        trace_begin itk-build
+        ${script_dir}/manylinux-build-itk-python.sh ${PYBIN} || exit 1
+        trace_end
+      fi
+
+      # Package the group wheels concurrently, each one in its own source and
+      # build directory. Set ITK_WHEEL_PACKAGING_JOBS to bound the number of
+      # wheels packaged at the same time.
+      trace_begin package-wheels
+      ${PYBIN}/python ${script_dir}/wheel_packaging.py \
+        --python ${PYBIN}/python \
+        --output-dir dist \
+        --staging-dir /work/build/wheels-$(basename $(dirname ${PYBIN})) \
+        --log-dir /work/logs/wheels-$(basename $(dirname ${PYBIN})) \
+        -- \
+        --config-setting=cmake.define.ITK_SOURCE_DIR:PATH=${source_path} \
+        --config-setting=cmake.define.ITK_BINARY_DIR:PATH=${build_path} \
+        --config-setting=cmake.define.ITKPythonPackage_ITK_BINARY_REUSE:BOOL=ON \
+        --config-setting=cmake.define.TBB_DIR:PATH=${tbb_dir} \
+        --config-setting=cmake.define.Python3_EXECUTABLE:FILEPATH=${Python3_EXECUTABLE} \
+        --config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR} \
+        "--config-setting=cmake.define.CMAKE_CXX_FLAGS:STRING=${compile_flags}" \
+        "--config-setting=cmake.define.CMAKE_C_FLAGS:STRING=${compile_flags}" \
         || exit 1
-      )
-
-      wheel_names=$(cat ${script_dir}/../WHEEL_NAMES.txt)
-      for wheel_name in ${wheel_names}; do
-        # Configure pyproject.toml
-        ${PYBIN}/python ${PYPROJECT_CONFIGURE} ${wheel_name}
-        # Generate wheel
-        ${PYBIN}/python -m build \
-          --verbose \
-          --wheel \
-          --outdir dist \
-          --no-isolation \
-          --skip-dependency-check \
-          --config-setting=cmake.define.ITK_SOURCE_DIR:PATH=${source_path} \
-          --config-setting=cmake.define.ITK_BINARY_DIR:PATH=${build_path} \
-          --config-setting=cmake.define.ITKPythonPackage_ITK_BINARY_REUSE:BOOL=ON \
-          --config-setting=cmake.define.ITKPythonPackage_WHEEL_NAME:STRING=${wheel_name} \
-          --config-setting=cmake.define.Python3_EXECUTABLE:FILEPATH=${Python3_EXECUTABLE} \
-          --config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR} \
-          --config-setting=cmake.define.CMAKE_CXX_FLAGS:STRING="${compile_flags}" \
-          --config-setting=cmake.define.CMAKE_C_FLAGS:STRING="${compile_flags}" \
-          . \
-          || exit 1
-      done
+      trace_end
     fi
 
     # Remove unnecessary files for building against ITK
+    trace_begin cleanup
     find ${build_path} -name '*.cpp' -delete -o -name '*.xml' -delete
     rm -rf ${build_path}/Wrapping/Generators/castxml*
     find ${build_path} -name '*.o' -delete
+    trace_end
+
+    # Keep only the files used by module builds, as traced while building the
+    # reference module, then verify that the module still builds.
+    if [[ -n ${ITK_MODULE_SDK_REFERENCE_MODULE} ]]; then
+      trace_begin module-sdk
+      sdk_trace=/work/logs/module-sdk-$(basename $(dirname ${PYBIN})).json
+      sdk_cmake_args=(
+        -DPython3_EXECUTABLE:FILEPATH=${Python3_EXECUTABLE}
+        -DPython3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR}
+        )
+      mkdir -p /work/logs
+      command -v strace > /dev/null || sudo yum -y install strace
+      ${PYBIN}/python ${script_dir}/module_sdk.py trace \
+        --itk-dir ${build_path} \
+        --module-dir ${ITK_MODULE_SDK_REFERENCE_MODULE} \
+        --output ${sdk_trace} \
+        -- "${sdk_cmake_args[@]}" \
+      && ${PYBIN}/python ${script_dir}/module_sdk.py slim \
+        --root ${build_path} \
+        --trace ${sdk_trace} \
+        --report ${sdk_trace%.json}-report.json \
+      && ${PYBIN}/python ${script_dir}/module_sdk.py verify \
+        --itk-dir ${build_path} \
+        --module-dir ${ITK_MODULE_SDK_REFERENCE_MODULE} \
+        -- "${sdk_cmake_args[@]}" \
+      || exit 1
+      trace_end
+    fi
 
+    trace_end
 done
 
 sudo /opt/python/cp311-cp311/bin/pip3 install auditwheel wheel
 
+# Repair the wheels concurrently, re-using the repairs of unchanged wheels
+trace_begin repair-wheels
 if test "${ARCH}" == "x64"; then
   # This step will fixup the wheel switching from 'linux' to 'manylinux<version>' tag
-  for whl in dist/itk_*linux_*.whl; do
-      /opt/python/cp311-cp311/bin/auditwheel repair --plat manylinux${MANYLINUX_VERSION}_x86_64 ${whl} -w /work/dist/
-  done
+  /opt/python/cp311-cp311/bin/python ${script_dir}/wheel_repair.py \
+    --tool auditwheel \
+    --output-dir /work/dist \
+    --log-dir /work/logs/repair \
+    dist/itk_*linux_*.whl \
+    -- --plat manylinux${MANYLINUX_VERSION}_x86_64
 else
-  for whl in dist/itk_*$(uname -m).whl; do
-      /opt/python/cp311-cp311/bin/auditwheel repair ${whl} -w /work/dist/
-  done
+  /opt/python/cp311-cp311/bin/python ${script_dir}/wheel_repair.py \
+    --tool auditwheel \
+    --output-dir /work/dist \
+    --log-dir /work/logs/repair \
+    dist/itk_*$(uname -m).whl
 fi
 
 # auditwheel does not process this "metawheel" correctly since it does not
-# have any native SO's.
-mkdir -p metawheel-dist
+# have any native SO's. Its platform tag is changed in place instead.
 for whl in dist/itk-*linux_*.whl; do
-  /opt/python/cp311-cp311/bin/wheel unpack --dest metawheel ${whl}
-  manylinux_version=manylinux${MANYLINUX_VERSION}
-  new_tag=$(basename ${whl/linux/${manylinux_version}} .whl)
-  sed -i "s/Tag: .*/Tag: ${new_tag}/" metawheel/itk-*/itk*.dist-info/WHEEL
-  /opt/python/cp311-cp311/bin/wheel pack --dest metawheel-dist metawheel/itk-*
-  mv metawheel-dist/*.whl dist/${new_tag}.whl
-  rm -rf metawheel
+  platform_tag=$(basename ${whl} .whl)
+  platform_tag=manylinux${MANYLINUX_VERSION}_${platform_tag##*-linux_}
+  /opt/python/cp311-cp311/bin/python ${script_dir}/wheel_edit.py retag \
+    --platform-tag ${platform_tag} --remove ${whl}
 done
-rm -rf metawheel-dist
-rm dist/itk-*-linux_*.whl
 rm dist/itk_*-linux_*.whl
+trace_end
+
+# Install the wheels and test them with every interpreter concurrently, each in
+# its own environment of /work/build/verify, see wheel_verify.py. numpy is
+# installed from ITK_WHEELHOUSE, or from a wheelhouse populated beforehand, so
+# that the verification does not access the network.
+verify_args=()
+if [[ -z ${ITK_WHEELHOUSE} ]]; then
+  trace_begin verify-wheelhouse
+  for PYBIN in "${PYBINARIES[@]}"; do
+    ${PYBIN}/python ${script_dir}/build_env.py wheelhouse \
+      --python ${PYBIN}/python --wheelhouse /work/build/verify-wheelhouse numpy
+  done
+  trace_end
+  verify_args+=(--find-links /work/build/verify-wheelhouse)
+fi
+if [[ ${run_docs_tests} != 1 ]]; then
+  verify_args+=(--no-docs-tests)
+fi
+for PYBIN in "${PYBINARIES[@]}"; do
+  verify_args+=(${PYBIN}/python)
+done
+trace_begin verify
+/opt/python/cp311-cp311/bin/python ${script_dir}/wheel_verify.py \
+  --dist-dir /work/dist \
+  --work-dir /work/build/verify \
+  --log-dir /work/logs/verify \
+  --output /work/logs/verify.json \
+  "${verify_args[@]}" || exit 1
+trace_end
 
-# Install packages and test
+# The benchmarks run one interpreter after the other, so that they do not
+# compete for the cores
 for PYBIN in "${PYBINARIES[@]}"; do
-    ${PYBIN}/pip install --user numpy
-    ${PYBIN}/pip install --upgrade pip
-    ${PYBIN}/pip install itk --user --no-cache-dir --no-index -f /work/dist
-    (cd $HOME && ${PYBIN}/python -c 'from itk import ITKCommon;')
-    (cd $HOME && ${PYBIN}/python -c 'import itk; image = itk.Image[itk.UC, 2].New()')
-    (cd $HOME && ${PYBIN}/python -c 'import itkConfig; itkConfig.LazyLoading = False; import itk;')
-    (cd $HOME && ${PYBIN}/python ${script_dir}/../../docs/code/test.py )
+    if [[ ${ITK_IMPORT_BENCHMARK} == 1 ]]; then
+      run_benchmark import
+    fi
+    if [[ ${ITK_THROUGHPUT_BENCHMARK} == 1 ]]; then
+      # The 3D images are only wrapped if the documentation examples can run
+      if [[ ${run_docs_tests} == 1 ]]; then
+        run_benchmark throughput
+      else
+        run_benchmark throughput --size 256x256 --size 2048x2048
+      fi
+    fi
+    if [[ ${ITK_MEMORY_BENCHMARK} == 1 ]]; then
+      if [[ ${run_docs_tests} == 1 ]]; then
+        run_benchmark memory
+      else
+        # The mesh of the mesh workflow is 3D
+        memory_args=(--size 2048x2048)
+        for workflow in read write median array_view_from_image array_from_image \
+            image_view_from_array image_from_array dict_from_image image_from_dict; do
+          memory_args+=(--workflow ${workflow})
+        done
+        run_benchmark memory "${memory_args[@]}"
+      fi
+    fi
 done
 
 rm -f dist/numpy*.whl
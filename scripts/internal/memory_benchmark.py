@@ -0,0 +1,375 @@
+#!/usr/bin/env python
+
+"""CLI measuring the memory used by the ITK wheels in the workflows of the
+documentation examples.
+
+The workflows are the operations of the examples of ``docs/code`` on a
+``float`` image of the size given with ``--size``, and on the mesh of
+``docs/data/cow.vtk``:
+
+* ``read``, ``write``: ``itk.imread`` and ``itk.imwrite`` of the image as
+  MetaImage (``ReadMedianWrite.py``).
+* ``median``: ``itk.median_image_filter(image, radius=2)``
+  (``ReadMedianWrite.py``).
+* ``array_view_from_image``, ``array_from_image``, ``image_view_from_array``,
+  ``image_from_array``, ``dict_from_image``, ``image_from_dict``: the NumPy
+  round-trips of ``MixingITKAndNumPy.py``.
+* ``mesh_dict``: ``itk.mesh_from_dict(itk.dict_from_mesh(mesh))``
+  (``MixingITKAndNumPy.py``).
+
+Every workflow runs in a new interpreter, importing the wheels given on the
+command line, installed in a temporary directory, or the ``itk`` package of the
+interpreter if no wheel is given. Its inputs are loaded and the workflow is run
+once to load the ITK modules it uses, then it is run again and measured:
+
+* ``<workflow>.peak_rss``: peak resident set size of the interpreter during the
+  run. The peak is reset before the run on Linux, it is the peak of the whole
+  interpreter elsewhere.
+* ``<workflow>.rss_increase``: increase of the peak resident set size during the
+  run compared to the resident set size before the run, on Linux only.
+* ``<workflow>.python_peak``: peak of the memory allocated by Python and NumPy
+  during the run, traced with ``tracemalloc``.
+* ``<workflow>.copies``: ``rss_increase`` in number of pixel buffers of the
+  image.
+
+The workflows documented as views (``array_view_from_image`` and
+``image_view_from_array``) must share the pixel buffer of their input, and
+allocate less than ``VIEW_TOLERANCE`` pixel buffer, otherwise the command fails.
+
+The results are written as JSON (see ``benchmark_results.py``) and compared with
+the results of another build with ``--baseline``, or later with
+``benchmark_results.py compare``.
+
+Usage::
+
+    memory_benchmark.py [-h] [--python PYTHON] [--size SIZE]
+                        [--workflow WORKFLOW] [--output OUTPUT]
+                        [--baseline BASELINE] [--threshold PATTERN=PERCENT]
+                        [wheel ...]
+
+The command exits with status 1 if a view copied its input, or if a metric
+regressed compared to the baseline.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmark_results import (
+    add_metric,
+    environment,
+    format_value,
+    install_wheels,
+    new_results,
+    parse_size,
+    parse_thresholds,
+    report_results,
+    run_probe,
+)
+
+WORKFLOWS = [
+    "read",
+    "write",
+    "median",
+    "array_view_from_image",
+    "array_from_image",
+    "image_view_from_array",
+    "image_from_array",
+    "dict_from_image",
+    "image_from_dict",
+    "mesh_dict",
+]
+VIEW_WORKFLOWS = ["array_view_from_image", "image_view_from_array"]
+# Workflows on the mesh, which have no pixel buffer
+MESH_WORKFLOWS = ["mesh_dict"]
+
+# Fraction of the pixel buffer that a view may allocate
+VIEW_TOLERANCE = 0.1
+
+DEFAULT_SIZE = "256x256x256"
+
+MESH_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "docs", "data", "cow.vtk"
+)
+
+# Code run in a new interpreter to create the input image if the workflow is
+# null, or to measure a workflow. It prints the measured values as JSON.
+_PROBE = r"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+
+config = json.loads(sys.argv[1])
+
+import itk
+
+image_path = os.path.join(config["work_dir"], "image.mha")
+output_path = os.path.join(config["work_dir"], "output.mha")
+
+if config["workflow"] is None:
+    shape = tuple(reversed(config["size"]))
+    array = np.random.default_rng(0).random(shape, dtype=np.float32)
+    itk.imwrite(itk.image_view_from_array(array), image_path)
+    sys.exit(0)
+
+
+def current_rss():
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss():
+    try:
+        with open("/proc/self/status", "r") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def load_image():
+    return itk.imread(image_path, itk.F)
+
+
+def load_array():
+    return itk.array_from_image(load_image())
+
+
+def load_dict():
+    return itk.dict_from_image(load_image())
+
+
+def load_mesh():
+    return itk.meshread(config["mesh"])
+
+
+workflows = {
+    "read": (None, lambda _: itk.imread(image_path, itk.F)),
+    "write": (load_image, lambda image: itk.imwrite(image, output_path)),
+    "median": (load_image, lambda image: itk.median_image_filter(image, radius=2)),
+    "array_view_from_image": (load_image, itk.array_view_from_image),
+    "array_from_image": (load_image, itk.array_from_image),
+    "image_view_from_array": (load_array, itk.image_view_from_array),
+    "image_from_array": (load_array, itk.image_from_array),
+    "dict_from_image": (load_image, itk.dict_from_image),
+    "image_from_dict": (load_dict, itk.image_from_dict),
+    "mesh_dict": (load_mesh, lambda mesh: itk.mesh_from_dict(itk.dict_from_mesh(mesh))),
+}
+
+
+def shares_buffer(name, data, output):
+    # Change the first pixel, a random value in [0, 1), through the output and
+    # look for the change in the input
+    if name == "array_view_from_image":
+        output[(0,) * output.ndim] = 42.0
+        return bool(data.GetPixel([0] * data.GetImageDimension()) == 42.0)
+    if name == "image_view_from_array":
+        data[(0,) * data.ndim] = 42.0
+        return bool(output.GetPixel([0] * data.ndim) == 42.0)
+    return None
+
+
+setup, run = workflows[config["workflow"]]
+data = setup() if setup else None
+run(data)
+gc.collect()
+rss_before = current_rss()
+peak_reset = reset_peak_rss()
+tracemalloc.start()
+output = run(data)
+python_peak = tracemalloc.get_traced_memory()[1]
+tracemalloc.stop()
+peak = peak_rss()
+result = {
+    "python": "%d.%d.%d" % sys.version_info[:3],
+    "itk": itk.Version.GetITKVersion(),
+    "peak_rss": peak,
+    "rss_increase": (
+        max(peak - rss_before, 0)
+        if peak_reset and None not in (peak, rss_before)
+        else None
+    ),
+    "peak_reset": peak_reset,
+    "python_peak": python_peak,
+    "shares_buffer": shares_buffer(config["workflow"], data, output),
+}
+print(json.dumps(result))
+"""
+
+
+def run_workflow(python_executable, site_dir, work_dir, workflow, size):
+    config = {
+        "workflow": workflow,
+        "size": size,
+        "work_dir": work_dir,
+        "mesh": os.path.abspath(MESH_PATH),
+    }
+    return run_probe(
+        python_executable, _PROBE, config, site_dir=site_dir, work_dir=work_dir
+    )
+
+
+def check_view(name, result, buffer_size):
+    """Return the reasons why the view workflow `name` copied its input, if
+    any."""
+    errors = []
+    if result["shares_buffer"] is False:
+        errors.append("%s does not share the pixel buffer of its input" % name)
+    limit = VIEW_TOLERANCE * buffer_size
+    for key in ("rss_increase", "python_peak"):
+        if result[key] is not None and result[key] > limit:
+            errors.append(
+                "%s allocated %s (%s), more than %.0f%% of the %s pixel buffer"
+                % (
+                    name,
+                    format_value(result[key], "bytes"),
+                    key,
+                    100.0 * VIEW_TOLERANCE,
+                    format_value(buffer_size, "bytes"),
+                )
+            )
+    return errors
+
+
+def run(wheels, python_executable=None, size=None, workflows=None):
+    """Return the results of the memory benchmark of `wheels`, or of the
+    ``itk`` package of `python_executable` if `wheels` is empty, and the list
+    of the errors of the view workflows.
+
+    `size` is the list of the image lengths, in ITK order.
+    """
+    python_executable = python_executable or sys.executable
+    size = size or parse_size(DEFAULT_SIZE)
+    workflows = workflows or WORKFLOWS
+    buffer_size = 4
+    for length in size:
+        buffer_size *= length
+    work_dir = tempfile.mkdtemp(prefix="ipp-memory-benchmark-")
+    try:
+        site_dir = None
+        if wheels:
+            site_dir = os.path.join(work_dir, "site")
+            install_wheels(python_executable, wheels, site_dir)
+        run_workflow(python_executable, site_dir, work_dir, None, size)
+        results = None
+        errors = []
+        for name in workflows:
+            print("Measuring %s" % name)
+            sys.stdout.flush()
+            result = run_workflow(python_executable, site_dir, work_dir, name, size)
+            if results is None:
+                results = new_results(
+                    "memory",
+                    environment(
+                        python=result["python"],
+                        itk=result["itk"],
+                        wheels=sorted(os.path.basename(wheel) for wheel in wheels),
+                        size="x".join(str(length) for length in size),
+                        peak_reset=result["peak_reset"],
+                    ),
+                )
+            for key in ("peak_rss", "rss_increase", "python_peak"):
+                if result[key] is not None:
+                    add_metric(results, "%s.%s" % (name, key), result[key], "bytes")
+            if result["rss_increase"] is not None and name not in MESH_WORKFLOWS:
+                add_metric(
+                    results,
+                    "%s.copies" % name,
+                    float(result["rss_increase"]) / buffer_size,
+                    "ratio",
+                )
+            if name in VIEW_WORKFLOWS:
+                errors.extend(check_view(name, result, buffer_size))
+        return results, errors
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--python",
+        default=sys.executable,
+        help="Interpreter compatible with the wheels, numpy must be installed",
+    )
+    parser.add_argument(
+        "--size",
+        default=DEFAULT_SIZE,
+        help="Image size, WIDTHxHEIGHT or WIDTHxHEIGHTxDEPTH",
+    )
+    parser.add_argument(
+        "--workflow",
+        choices=WORKFLOWS,
+        action="append",
+        default=[],
+        help="Workflow to measure. Can be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--output", default="memory-benchmark.json", help="Output JSON file"
+    )
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        help="Results of another build to compare with",
+    )
+    parser.add_argument(
+        "--threshold",
+        metavar="PATTERN=PERCENT",
+        action="append",
+        default=[],
+        help="Regression threshold of the metrics matching PATTERN, see "
+        "benchmark_results.py. Can be repeated.",
+    )
+    parser.add_argument(
+        "wheels",
+        metavar="wheel",
+        nargs="*",
+        help="Wheels to benchmark (default: the installed itk package)",
+    )
+    args = parser.parse_args()
+
+    try:
+        size = parse_size(args.size)
+        thresholds = parse_thresholds(args.threshold)
+    except ValueError as error:
+        parser.error(str(error))
+
+    results, errors = run(
+        args.wheels,
+        python_executable=args.python,
+        size=size,
+        workflows=[name for name in WORKFLOWS if name in args.workflow],
+    )
+    report_results(results, args.output, args.baseline, thresholds, errors)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+
+"""CLI reducing ITK build trees to the files used to build external modules.
+
+Module builds only need part of an ITK build tree through ``ITK_DIR``: CMake
+configuration files, the wrapping infrastructure, SWIG, headers and libraries.
+Object files, generated sources and the other intermediate build files are
+not used, yet they were archived and downloaded by every module build.
+
+This script:
+
+* traces the build of a reference module against an ITK build tree with
+  ``strace``, recording the files of the tree that the build accessed (see
+  :func:`trace_build`),
+* removes from the tree the files that are neither recorded by a trace nor
+  matched by the patterns of the files that other modules may use, like
+  headers and CMake files (see :func:`slim_tree`),
+* builds a module against the reduced tree, to verify that it is still
+  usable (see :func:`build_module`).
+
+Usage::
+
+    module_sdk.py trace [-h] --itk-dir ITK_DIR --module-dir MODULE_DIR
+                        [--build-dir BUILD_DIR] [--root ROOT] --output OUTPUT
+                        [-- CMAKE_ARGS ...]
+    module_sdk.py slim [-h] --root ROOT [--trace TRACE] [--dry-run]
+                       [--report REPORT]
+    module_sdk.py verify [-h] --itk-dir ITK_DIR --module-dir MODULE_DIR
+                         [--build-dir BUILD_DIR] [-- CMAKE_ARGS ...]
+
+Arguments following ``--`` are passed to CMake when configuring the module,
+for example::
+
+    module_sdk.py trace --itk-dir /work/ITK-cp39-cp39-manylinux_2_28_x64 \\
+      --root /work/ITK-cp39-cp39-manylinux_2_28_x64 --root /work/ITK-source/ITK \\
+      --module-dir /work/ITKSplitComponents --output /work/logs/module-sdk.json -- \\
+      -DPython3_EXECUTABLE:FILEPATH=/opt/python/cp39-cp39/bin/python
+"""
+
+import argparse
+import collections
+import fnmatch
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Files that builds of other modules may use, relative to the root of the
+# tree, even if the reference module build did not access them.
+KEEP_PATTERNS = [
+    "*.h",
+    "*.hh",
+    "*.hpp",
+    "*.hxx",
+    "*.txx",
+    "*.inc",
+    "*.cmake",
+    "*.cmake.in",
+    "*.so",
+    "*.so.*",
+    "*.a",
+    "*.dylib",
+    "*.lib",
+    "*.dll",
+    "bin/*",
+    "lib/*",
+    "CMake/*",
+    "Wrapping/*",
+    "*/wrapping/*",
+]
+
+# Files never used by module builds. They are removed even if they match
+# KEEP_PATTERNS, unless a trace recorded them.
+REMOVE_PATTERNS = [
+    "CMakeFiles/*",
+    "*/CMakeFiles/*",
+    "*.o",
+    "*.obj",
+    "*.d",
+    "*.cpp",
+    "*.xml",
+    "Wrapping/Generators/castxml*",
+    "Wrapping/Generators/CastXML/*",
+]
+
+# System calls whose first path argument is recorded by the trace, among the
+# calls of the "file" class traced by strace.
+TRACED_SYSCALLS = [
+    "open",
+    "openat",
+    "openat2",
+    "creat",
+    "stat",
+    "lstat",
+    "newfstatat",
+    "statx",
+    "access",
+    "faccessat",
+    "faccessat2",
+    "readlink",
+    "readlinkat",
+    "execve",
+]
+
+# Lines of a strace log written with "-f", for example:
+#   1234  openat(AT_FDCWD, "/work/ITK-build/ITKConfig.cmake", O_RDONLY) = 3
+# Calls interrupted by another process are split in two lines:
+#   1234  openat(AT_FDCWD, "/work/ITK-build/ITKConfig.cmake", O_RDONLY <unfinished ...>
+#   1234  <... openat resumed>) = 3
+STRACE_CALL = re.compile(r'^(\d+)\s+(\w+)\([^"]*"((?:[^"\\]|\\.)*)"')
+STRACE_RESUMED = re.compile(r"^(\d+)\s+<\.\.\. (\w+) resumed>")
+STRACE_RESULT = re.compile(r"\)\s+=\s+(-?\d+)")
+
+
+def matches(relative_path, patterns):
+    return any(fnmatch.fnmatchcase(relative_path, pattern) for pattern in patterns)
+
+
+def module_build_commands(itk_dir, module_dir, build_dir, cmake_args=()):
+    """Return the commands configuring and building `module_dir` against
+    `itk_dir`."""
+    return [
+        [
+            "cmake",
+            "-G",
+            "Ninja",
+            "-S",
+            module_dir,
+            "-B",
+            build_dir,
+            "-DITK_DIR:PATH=%s" % itk_dir,
+            "-DBUILD_TESTING:BOOL=OFF",
+        ]
+        + list(cmake_args),
+        ["cmake", "--build", build_dir],
+    ]
+
+
+def build_module(itk_dir, module_dir, build_dir=None, cmake_args=(), wrapper=()):
+    """Configure and build `module_dir` against `itk_dir`, optionally through
+    the `wrapper` command. Return ``True`` if the build succeeded."""
+    temp_dir = None
+    if build_dir is None:
+        temp_dir = tempfile.mkdtemp(prefix="module-sdk-")
+        build_dir = temp_dir
+    try:
+        for command in module_build_commands(
+            itk_dir, module_dir, build_dir, cmake_args
+        ):
+            print(" ".join(command))
+            sys.stdout.flush()
+            if subprocess.call(list(wrapper) + command) != 0:
+                return False
+        return True
+    finally:
+        if temp_dir is not None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def parse_strace_log(log_path, roots):
+    """Return the files below `roots` successfully accessed according to the
+    strace log `log_path`, relative to their root."""
+    # Roots are identified by their real path, and matched by both their real
+    # and absolute paths, which differ for build trees linked to another one.
+    prefixes = []
+    for root in roots:
+        for path in set([os.path.realpath(root), os.path.abspath(root)]):
+            prefixes.append((path + os.sep, os.path.realpath(root)))
+    accessed = collections.defaultdict(set)
+    unfinished = {}
+    with open(log_path, "r", errors="replace") as log_file:
+        for line in log_file:
+            call = STRACE_CALL.match(line)
+            if call:
+                pid, syscall, path = call.groups()
+                if line.rstrip().endswith("<unfinished ...>"):
+                    unfinished[pid] = path
+                    continue
+            else:
+                resumed = STRACE_RESUMED.match(line)
+                if not resumed:
+                    continue
+                pid, syscall = resumed.groups()
+                path = unfinished.pop(pid, None)
+            result = STRACE_RESULT.search(line)
+            if syscall not in TRACED_SYSCALLS or path is None or not result:
+                continue
+            if int(result.group(1)) < 0 or not os.path.isabs(path):
+                continue
+            path = os.path.normpath(path)
+            for prefix, root in prefixes:
+                if path.startswith(prefix):
+                    accessed[root].add(path[len(prefix) :])
+    return accessed
+
+
+def trace_build(itk_dir, module_dir, roots, build_dir=None, cmake_args=()):
+    """Build `module_dir` against `itk_dir` with strace and return the files
+    below `roots` accessed by the build, keyed by root."""
+    strace = shutil.which("strace")
+    if strace is None:
+        raise FileNotFoundError("strace is required to trace the module build")
+    log_dir = tempfile.mkdtemp(prefix="module-sdk-trace-")
+    try:
+        log_path = os.path.join(log_dir, "strace.log")
+        wrapper = [
+            strace,
+            "-f",
+            "-qq",
+            "-e",
+            "trace=file",
+            "-o",
+            log_path,
+            "-A",
+        ]
+        if not build_module(itk_dir, module_dir, build_dir, cmake_args, wrapper):
+            raise RuntimeError("The build of %s failed" % module_dir)
+        return parse_strace_log(log_path, roots)
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+def write_trace(output_path, accessed):
+    with open(output_path, "w") as output_file:
+        json.dump(
+            dict((root, sorted(paths)) for root, paths in accessed.items()),
+            output_file,
+            indent=2,
+        )
+
+
+def read_traces(trace_paths):
+    accessed = collections.defaultdict(set)
+    for trace_path in trace_paths:
+        with open(trace_path, "r") as trace_file:
+            for root, paths in json.load(trace_file).items():
+                accessed[os.path.realpath(root)].update(paths)
+    return accessed
+
+
+def slim_tree(root, traced=(), dry_run=False):
+    """Remove the files of `root` that are neither in `traced` nor matched by
+    KEEP_PATTERNS, and those matched by REMOVE_PATTERNS unless traced.
+
+    Symbolic links are kept. Return a report of the kept and removed files:
+    ``{"kept": [count, size], "removed": [count, size], "removed_by_extension":
+    {extension: [count, size]}}``.
+    """
+    traced = set(traced)
+    report = {
+        "root": root,
+        "kept": [0, 0],
+        "removed": [0, 0],
+        "removed_by_extension": collections.defaultdict(lambda: [0, 0]),
+    }
+    for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            relative_path = os.path.relpath(path, root).replace(os.sep, "/")
+            if os.path.islink(path):
+                continue
+            size = os.lstat(path).st_size
+            if relative_path in traced or (
+                matches(relative_path, KEEP_PATTERNS)
+                and not matches(relative_path, REMOVE_PATTERNS)
+            ):
+                report["kept"][0] += 1
+                report["kept"][1] += size
+                continue
+            report["removed"][0] += 1
+            report["removed"][1] += size
+            extension = os.path.splitext(filename)[1] or filename
+            report["removed_by_extension"][extension][0] += 1
+            report["removed_by_extension"][extension][1] += size
+            if not dry_run:
+                os.remove(path)
+        if not dry_run and dirpath != root and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    report["removed_by_extension"] = dict(report["removed_by_extension"])
+    return report
+
+
+def print_report(report, limit=15):
+    mib = 1024.0**2
+    print(
+        "%s: kept %d files (%.1f MiB), removed %d files (%.1f MiB)"
+        % (
+            report["root"],
+            report["kept"][0],
+            report["kept"][1] / mib,
+            report["removed"][0],
+            report["removed"][1] / mib,
+        )
+    )
+    extensions = sorted(
+        report["removed_by_extension"].items(), key=lambda item: -item[1][1]
+    )
+    for extension, (count, size) in extensions[:limit]:
+        print("  %-30s %8d files %10.1f MiB" % (extension, count, size / mib))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    trace_parser = subparsers.add_parser(
+        "trace", help="Record the files accessed by the build of a module"
+    )
+    verify_parser = subparsers.add_parser(
+        "verify", help="Build a module against an ITK build tree"
+    )
+    for subparser in [trace_parser, verify_parser]:
+        subparser.add_argument("--itk-dir", required=True, help="ITK build tree")
+        subparser.add_argument(
+            "--module-dir", required=True, help="Source directory of the module"
+        )
+        subparser.add_argument(
+            "--build-dir",
+            default=None,
+            help="Build directory of the module (default: temporary directory)",
+        )
+    trace_parser.add_argument(
+        "--root",
+        action="append",
+        default=[],
+        help="Directory whose accessed files are recorded, can be repeated "
+        "(default: ITK build tree)",
+    )
+    trace_parser.add_argument(
+        "--output", required=True, help="JSON file listing the accessed files"
+    )
+
+    slim_parser = subparsers.add_parser(
+        "slim", help="Remove the files not used by module builds"
+    )
+    slim_parser.add_argument(
+        "--root", required=True, action="append", help="Tree to reduce"
+    )
+    slim_parser.add_argument(
+        "--trace",
+        action="append",
+        default=[],
+        help="Files accessed by module builds, written by the trace command",
+    )
+    slim_parser.add_argument(
+        "--dry-run", action="store_true", help="Only report the files to remove"
+    )
+    slim_parser.add_argument(
+        "--report", default=None, help="JSON file receiving the report"
+    )
+
+    # Arguments of CMake follow "--", they are split before parsing.
+    argv = sys.argv[1:]
+    cmake_args = []
+    if "--" in argv:
+        separator = argv.index("--")
+        argv, cmake_args = argv[:separator], argv[separator + 1 :]
+    args = parser.parse_args(argv)
+
+    if args.command == "trace":
+        roots = args.root or [args.itk_dir]
+        try:
+            accessed = trace_build(
+                args.itk_dir, args.module_dir, roots, args.build_dir, cmake_args
+            )
+        except (OSError, RuntimeError) as exc:
+            print("error: %s" % exc, file=sys.stderr)
+            sys.exit(1)
+        write_trace(args.output, accessed)
+        for root in roots:
+            print(
+                "%s: %d files accessed"
+                % (root, len(accessed.get(os.path.realpath(root), ())))
+            )
+    elif args.command == "slim":
+        accessed = read_traces(args.trace)
+        reports = []
+        for root in args.root:
+            report = slim_tree(
+                root, accessed.get(os.path.realpath(root), ()), args.dry_run
+            )
+            print_report(report)
+            reports.append(report)
+        if args.report:
+            with open(args.report, "w") as report_file:
+                json.dump(reports, report_file, indent=2)
+    elif args.command == "verify":
+        if not build_module(args.itk_dir, args.module_dir, args.build_dir, cmake_args):
+            print(
+                "error: the build of %s against %s failed"
+                % (args.module_dir, args.itk_dir),
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        print("%s builds against %s" % (args.module_dir, args.itk_dir))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import json
+import sys
+
+import pytest
+
+import benchmark_results
+
+
+def make_results(metrics):
+    results = benchmark_results.new_results("test", {"python": "3.11"})
+    for name, (value, unit, better) in metrics.items():
+        benchmark_results.add_metric(results, name, value, unit, better=better)
+    return results
+
+
+BASELINE = make_results(
+    {
+        "import.warm": (0.400, "s", "lower"),
+        "import.eager": (2.0, "s", "lower"),
+        "rss.lazy": (100 * 1024 * 1024, "bytes", "lower"),
+        "median.256x256.t1": (1e7, "pixels/s", "higher"),
+        "libraries.lazy": (10, "count", "lower"),
+        "removed": (1.0, "s", "lower"),
+    }
+)
+
+
+def statuses(rows):
+    return dict((row[0], row[-1]) for row in rows)
+
+
+def test_compare():
+    current = make_results(
+        {
+            # +50%, above the 25% threshold of times
+            "import.warm": (0.600, "s", "lower"),
+            # -50%
+            "import.eager": (1.0, "s", "lower"),
+            # +0.5 MiB, below the noise floor of sizes
+            "rss.lazy": (100.5 * 1024 * 1024, "bytes", "lower"),
+            # -20% of a metric which is better when higher
+            "median.256x256.t1": (0.8e7, "pixels/s", "higher"),
+            # Any increase of a count is a regression
+            "libraries.lazy": (11, "count", "lower"),
+            "added": (1.0, "s", "lower"),
+        }
+    )
+    rows = benchmark_results.compare(BASELINE, current)
+    assert statuses(rows) == {
+        "added": "new",
+        "import.eager": "improved",
+        "import.warm": "regressed",
+        "libraries.lazy": "regressed",
+        "median.256x256.t1": "regressed",
+        "removed": "missing",
+        "rss.lazy": "ok",
+    }
+    row = dict((row[0], row) for row in rows)["import.warm"]
+    assert row[2:6] == (0.4, 0.6, pytest.approx(50.0), 25.0)
+
+
+def test_compare_thresholds():
+    current = make_results(
+        {
+            "import.warm": (0.600, "s", "lower"),
+            "import.eager": (2.8, "s", "lower"),
+        }
+    )
+    thresholds = benchmark_results.parse_thresholds(["import.*=30", "import.warm=60"])
+    rows = benchmark_results.compare(BASELINE, current, thresholds)
+    assert statuses(rows)["import.warm"] == "ok"
+    assert statuses(rows)["import.eager"] == "regressed"
+
+
+def test_compare_zero_baseline():
+    baseline = make_results({"errors": (0, "count", "lower")})
+    current = make_results({"errors": (1, "count", "lower")})
+    rows = benchmark_results.compare(baseline, current)
+    assert rows == [("errors", "count", 0, 1, None, 0.0, "regressed")]
+
+
+def test_parse_thresholds():
+    assert benchmark_results.parse_thresholds(["rss.*=5", "a=b=1.5"]) == [
+        ("rss.*", 5.0),
+        ("a=b", 1.5),
+    ]
+    for value in ("rss.*", "=5", "rss.*=high"):
+        with pytest.raises(ValueError, match="expected PATTERN=PERCENT"):
+            benchmark_results.parse_thresholds([value])
+
+
+def test_load_results_version(tmp_path):
+    path = str(tmp_path / "results.json")
+    benchmark_results.write_results(BASELINE, path)
+    assert benchmark_results.load_results(path) == BASELINE
+    with open(path, "w") as file_:
+        json.dump(dict(BASELINE, version=0), file_)
+    with pytest.raises(ValueError, match="unsupported results version 0"):
+        benchmark_results.load_results(path)
+
+
+def test_run_probe(tmp_path):
+    probe = (
+        "import json, os, sys\n"
+        "config = json.loads(sys.argv[1])\n"
+        "print('noise')\n"
+        "print(json.dumps({'value': config['value'], 'cwd': os.getcwd(), "
+        "'path': os.environ.get('PYTHONPATH')}))\n"
+    )
+    result = benchmark_results.run_probe(
+        sys.executable,
+        probe,
+        {"value": 42},
+        site_dir="site",
+        work_dir=str(tmp_path),
+        env={},
+    )
+    assert result == {"value": 42, "cwd": str(tmp_path), "path": "site"}
+    assert benchmark_results.run_probe(sys.executable, "pass", {}) is None
+
+
+@pytest.mark.parametrize(
+    "current_value, errors, failed",
+    [(0.4, (), False), (0.8, (), True), (0.4, ("view copied",), True)],
+)
+def test_report_results(tmp_path, capsys, current_value, errors, failed):
+    baseline = str(tmp_path / "baseline.json")
+    benchmark_results.write_results(BASELINE, baseline)
+    current = make_results({"import.warm": (current_value, "s", "lower")})
+    output = str(tmp_path / "current.json")
+    if failed:
+        with pytest.raises(SystemExit) as error:
+            benchmark_results.report_results(current, output, baseline, [], errors)
+        assert error.value.code == 1
+    else:
+        benchmark_results.report_results(current, output, baseline, [], errors)
+    assert benchmark_results.load_results(output) == current
+    out = capsys.readouterr().out
+    assert "Wrote results to %s" % output in out
+    assert ("REGRESSED" in out) == (current_value > 0.4)
+    for error in errors:
+        assert "Error: %s" % error in out
+
+
+def test_parse_size():
+    assert benchmark_results.parse_size("256x128") == [256, 128]
+    assert benchmark_results.parse_size("64X64x32") == [64, 64, 32]
+    for value in ("256", "1x2x3x4", "0x256", "axb", ""):
+        with pytest.raises(ValueError, match="expected WIDTHxHEIGHT"):
+            benchmark_results.parse_size(value)
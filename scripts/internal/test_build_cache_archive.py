@@ -0,0 +1,371 @@
+import functools
+import http.server
+import io
+import os
+import shutil
+import subprocess
+import tarfile
+import threading
+
+import pytest
+
+import build_cache_archive
+
+KIB = 1024
+
+
+def write_file(path, data, mode=0o644):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as file_:
+        file_.write(data)
+    os.chmod(path, mode)
+
+
+def make_tree(root):
+    """Write a build cache like tree: two ITK build trees having files in
+    common, a third one linked to the second, and shared scripts."""
+    package = os.path.join(root, "ITKPythonPackage")
+    shared_library = os.urandom(96 * KIB)
+    for tree in ("ITK-cp39", "ITK-cp310"):
+        tree_dir = os.path.join(package, tree)
+        write_file(os.path.join(tree_dir, "lib", "libITKCommon.so"), shared_library)
+        write_file(os.path.join(tree_dir, "Wrapping", "own.py"), tree.encode() * 1000)
+        write_file(
+            os.path.join(tree_dir, "bin", "tool"), b"#!/bin/sh\n" * 100, mode=0o755
+        )
+        write_file(os.path.join(tree_dir, "empty.txt"), b"")
+        os.symlink("lib/libITKCommon.so", os.path.join(tree_dir, "libITKCommon.so"))
+    os.symlink("ITK-cp310", os.path.join(package, "ITK-cp311"))
+    write_file(os.path.join(package, "scripts", "build.sh"), b"echo build\n" * 50)
+    write_file(os.path.join(package, "requirements-dev.txt"), b"ninja\n")
+    return package
+
+
+def tree_content(root):
+    """Return the content of the tree `root`, keyed by relative path."""
+    content = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            relative = os.path.relpath(path, root).replace(os.sep, "/")
+            if os.path.islink(path):
+                content[relative] = ("link", os.readlink(path))
+            elif os.path.isdir(path):
+                content[relative] = ("dir",)
+            else:
+                with open(path, "rb") as file_:
+                    content[relative] = (
+                        "file",
+                        file_.read(),
+                        os.stat(path).st_mode & 0o777,
+                    )
+    return content
+
+
+@pytest.fixture(params=["zstandard", "zstd"])
+def backend(request, monkeypatch):
+    if request.param == "zstandard":
+        if build_cache_archive.zstandard is None:
+            pytest.skip("zstandard is not installed")
+    else:
+        if shutil.which("zstd") is None:
+            pytest.skip("zstd is not installed")
+        monkeypatch.setattr(build_cache_archive, "zstandard", None)
+    return request.param
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    source = tmp_path / "source"
+    make_tree(str(source))
+    return str(source)
+
+
+def create(tmp_path, source_dir, deduplicate=True):
+    output = str(tmp_path / "cache.tar.zst")
+    index = build_cache_archive.create_archive(
+        output,
+        ["ITKPythonPackage"],
+        directory=source_dir,
+        level=3,
+        threads=2,
+        frame_size=64 * KIB,
+        deduplicate=deduplicate,
+    )
+    return output, index
+
+
+def test_create_archive_frames(tmp_path, source_dir, backend):
+    output, index = create(tmp_path, source_dir)
+    assert index["compressed_size"] == os.path.getsize(output)
+    assert len(index["frames"]) > 1
+    # The frames cover the archive without gaps
+    compressed_offset = uncompressed_offset = 0
+    for frame in index["frames"]:
+        assert frame[0] == compressed_offset
+        assert frame[2] == uncompressed_offset
+        compressed_offset += frame[1]
+        uncompressed_offset += frame[3]
+    assert compressed_offset == index["compressed_size"]
+    assert uncompressed_offset == index["uncompressed_size"]
+    assert build_cache_archive.load_index(output) == index
+
+    # The identical shared library of the second tree is stored as a hard link
+    members = dict((member[0], member) for member in index["members"])
+    second = members["ITKPythonPackage/ITK-cp39/lib/libITKCommon.so"]
+    assert second[3:] == ["1", "ITKPythonPackage/ITK-cp310/lib/libITKCommon.so"]
+    assert members["ITKPythonPackage/ITK-cp311"][3:] == ["2", "ITK-cp310"]
+
+
+@pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd is not installed")
+def test_archive_readable_by_zstd(tmp_path, source_dir, backend):
+    output, index = create(tmp_path, source_dir)
+    data = subprocess.check_output(["zstd", "-q", "-d", "-c", "--long=31", output])
+    assert len(data) == index["uncompressed_size"]
+    with tarfile.open(fileobj=io.BytesIO(data)) as archive:
+        assert [member[0] for member in index["members"]] == archive.getnames()
+
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_round_trip(tmp_path, source_dir, backend, use_index):
+    output, _ = create(tmp_path, source_dir)
+    directory = str(tmp_path / "extracted")
+    build_cache_archive.extract_archive(
+        output, directory, threads=2, use_index=use_index
+    )
+    assert tree_content(directory) == tree_content(source_dir)
+
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_extract_selection(tmp_path, source_dir, backend, use_index):
+    output, _ = create(tmp_path, source_dir)
+    directory = str(tmp_path / "extracted")
+    extracted = build_cache_archive.extract_archive(
+        output,
+        directory,
+        patterns=["ITKPythonPackage/ITK-cp311", "ITKPythonPackage/scripts/"],
+        threads=2,
+        use_index=use_index,
+    )
+    # The link to the tree of cp310 brings it along, and the hard link of
+    # cp39 is not extracted
+    assert "ITKPythonPackage/ITK-cp310/lib/libITKCommon.so" in extracted
+    assert "ITKPythonPackage/scripts/build.sh" in extracted
+    content = tree_content(directory)
+    expected = tree_content(source_dir)
+    for name in ("ITKPythonPackage/ITK-cp39", "ITKPythonPackage/requirements-dev.txt"):
+        assert name not in content
+    for name, value in content.items():
+        assert value == expected[name]
+    assert content["ITKPythonPackage/ITK-cp311"] == ("link", "ITK-cp310")
+
+
+def test_extract_hard_link_without_target(tmp_path, source_dir, backend):
+    # The content of a hard link whose target is not selected is extracted
+    # in its place.
+    output, _ = create(tmp_path, source_dir)
+    for use_index in (True, False):
+        directory = str(tmp_path / ("extracted-%s" % use_index))
+        build_cache_archive.extract_archive(
+            output,
+            directory,
+            patterns=["ITKPythonPackage/ITK-cp39"],
+            threads=2,
+            use_index=use_index,
+        )
+        expected = tree_content(source_dir)
+        name = "ITKPythonPackage/ITK-cp39/lib/libITKCommon.so"
+        assert tree_content(directory)[name] == expected[name]
+
+
+def create_parts(tmp_path, source_dir, deduplicate=False):
+    output = str(tmp_path / "cache.tar.zst")
+    paths = [
+        os.path.join("ITKPythonPackage", name)
+        for name in sorted(os.listdir(os.path.join(source_dir, "ITKPythonPackage")))
+    ]
+    manifest = build_cache_archive.create_parts(
+        output,
+        paths,
+        ["ITKPythonPackage/ITK-*"],
+        directory=source_dir,
+        level=3,
+        threads=2,
+        frame_size=64 * KIB,
+        deduplicate=deduplicate,
+    )
+    return output, manifest
+
+
+@pytest.fixture
+def http_root(tmp_path):
+    """Serve `tmp_path` over HTTP, yielding its URL."""
+    handler = functools.partial(
+        http.server.SimpleHTTPRequestHandler, directory=str(tmp_path)
+    )
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:%d" % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_parts_round_trip(tmp_path, source_dir, backend):
+    output, manifest = create_parts(tmp_path, source_dir)
+    parts = dict((part["name"], part) for part in manifest["parts"])
+    assert sorted(parts) == ["ITK-cp310", "ITK-cp311", "ITK-cp39", "shared"]
+    assert parts["ITK-cp311"]["requires"] == ["shared", "ITK-cp310"]
+    assert build_cache_archive.load_manifest(output) == manifest
+    for part in manifest["parts"]:
+        assert os.path.exists(str(tmp_path / part["file"]))
+
+    directory = str(tmp_path / "extracted")
+    build_cache_archive.extract_parts(output, directory, ["ITK-cp311"])
+    content = tree_content(directory)
+    expected = tree_content(source_dir)
+    assert "ITKPythonPackage/ITK-cp39" not in content
+    assert content == dict(
+        (name, value)
+        for name, value in expected.items()
+        if not name.startswith("ITKPythonPackage/ITK-cp39")
+    )
+
+    # A part whose content does not match the manifest is rejected
+    parts["shared"]["sha256"] = "0" * 64
+    with pytest.raises(ValueError, match="Hash mismatch for .*cache-shared.tar.zst"):
+        build_cache_archive.extract_parts(
+            output, str(tmp_path / "corrupted"), ["ITK-cp39"], manifest
+        )
+
+
+def test_select_parts():
+    manifest = {
+        "version": build_cache_archive.MANIFEST_VERSION,
+        "parts": [
+            {"name": "shared", "requires": []},
+            {"name": "common", "requires": []},
+            {"name": "ITK-cp39", "requires": ["shared", "common"]},
+            {"name": "ITK-cp310", "requires": ["shared", "common"]},
+            {"name": "ITK-cp311", "requires": ["shared", "ITK-cp310"]},
+            {"name": "ITK-cp312", "requires": ["shared"]},
+        ],
+    }
+
+    def names(patterns):
+        return [
+            part["name"]
+            for part in build_cache_archive.select_parts(manifest, patterns)
+        ]
+
+    assert names([]) == [
+        "shared",
+        "common",
+        "ITK-cp39",
+        "ITK-cp310",
+        "ITK-cp311",
+        "ITK-cp312",
+    ]
+    assert names(["ITK-cp39"]) == ["shared", "common", "ITK-cp39"]
+    assert names(["ITK-cp311"]) == ["shared", "common", "ITK-cp310", "ITK-cp311"]
+    assert names(["ITK-cp312"]) == ["shared", "ITK-cp312"]
+    assert names(["bogus"]) == ["shared"]
+
+
+def test_selection():
+    selection = build_cache_archive.Selection(["ITKPythonPackage/ITK-cp3*/", "*.txt"])
+    assert "ITKPythonPackage/ITK-cp39" in selection
+    assert "ITKPythonPackage/ITK-cp39/lib/libITKCommon.so" in selection
+    assert "ITKPythonPackage/scripts/build.sh" not in selection
+    assert "requirements.txt" in selection
+    selection.add("ITKPythonPackage/scripts")
+    assert "ITKPythonPackage/scripts/build.sh" in selection
+    assert "anything" in build_cache_archive.Selection([])
+    assert "anything" not in build_cache_archive.Selection([], select_all=False)
+
+
+def test_link_target():
+    link_target = build_cache_archive.link_target
+    assert link_target("a/b/link", "../c/file", False) == "a/c/file"
+    assert link_target("a/link", "../../outside", False) is None
+    assert link_target("a/link", "/absolute", False) is None
+    assert link_target("a/link", "a/b/file", True) == "a/b/file"
+
+
+def test_parts_common(tmp_path, source_dir, backend):
+    output, manifest = create_parts(tmp_path, source_dir, deduplicate=True)
+    parts = dict((part["name"], part) for part in manifest["parts"])
+    assert [part["name"] for part in manifest["parts"]] == [
+        "shared",
+        "common",
+        "ITK-cp310",
+        "ITK-cp311",
+        "ITK-cp39",
+    ]
+    assert parts["ITK-cp39"]["requires"] == ["shared", "common"]
+    assert parts["ITK-cp311"]["requires"] == ["shared", "ITK-cp310"]
+    # The library the build trees have in common is stored once
+    assert parts["ITK-cp39"]["uncompressed_size"] < 96 * KIB
+    assert parts["common"]["uncompressed_size"] > 96 * KIB
+
+    # Each build tree is complete on its own, without the common files
+    expected = tree_content(source_dir)
+    directory = str(tmp_path / "cp39")
+    extracted = build_cache_archive.extract_parts(output, directory, ["ITK-cp39"])
+    assert "ITKPythonPackage/ITK-cp39/lib/libITKCommon.so" in extracted
+    assert not any(name.startswith(".build-cache-common") for name in extracted)
+    assert tree_content(directory) == dict(
+        (name, value)
+        for name, value in expected.items()
+        if not name.startswith(
+            ("ITKPythonPackage/ITK-cp310", "ITKPythonPackage/ITK-cp311")
+        )
+    )
+
+    directory = str(tmp_path / "all")
+    build_cache_archive.extract_parts(output, directory)
+    assert tree_content(directory) == expected
+    assert os.path.samefile(
+        os.path.join(directory, "ITKPythonPackage/ITK-cp39/bin/tool"),
+        os.path.join(directory, "ITKPythonPackage/ITK-cp310/bin/tool"),
+    )
+
+    # The staging directory of the common files was removed
+    assert sorted(os.listdir(source_dir)) == ["ITKPythonPackage"]
+
+
+def test_extract_parts_verified_first(tmp_path, source_dir, backend, http_root):
+    output, manifest = create_parts(tmp_path, source_dir)
+    expected = tree_content(source_dir)
+
+    # Parts at a URL are downloaded, verified, extracted and removed
+    directory = tmp_path / "extracted"
+    build_cache_archive.extract_parts(
+        http_root + "/cache.tar.zst", str(directory), ["ITK-cp39"]
+    )
+    content = tree_content(str(directory))
+    assert "ITKPythonPackage/ITK-cp39/lib/libITKCommon.so" in content
+    assert all(value == expected[name] for name, value in content.items())
+
+    # A part whose size or content does not match the manifest is rejected
+    # before anything is extracted from it
+    with open(str(tmp_path / "cache-ITK-cp39.tar.zst"), "ab") as part_file:
+        part_file.write(b"\0")
+    for source in (output, http_root + "/cache.tar.zst"):
+        directory = tmp_path / "rejected"
+        with pytest.raises(ValueError, match="Size mismatch for cache-ITK-cp39"):
+            build_cache_archive.extract_parts(source, str(directory), ["ITK-cp39"])
+        assert sorted(os.listdir(str(directory))) == ["ITKPythonPackage"]
+        assert not os.path.exists(str(directory / "ITKPythonPackage" / "ITK-cp39"))
+        shutil.rmtree(str(directory))
+
+
+def test_long_window_log():
+    assert build_cache_archive.long_window_log(1) == 10
+    assert build_cache_archive.long_window_log(64 * KIB) == 16
+    assert build_cache_archive.long_window_log(64 * KIB + 1) == 17
+    assert (
+        build_cache_archive.long_window_log(1024 * build_cache_archive.MIB)
+        == build_cache_archive.MAX_COMPRESSION_WINDOW_LOG
+    )
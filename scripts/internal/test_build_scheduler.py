@@ -0,0 +1,104 @@
+import sys
+
+import pytest
+
+import build_scheduler
+from build_trace import TRACE_ENV
+
+GIB = build_scheduler.GIB
+
+# Build command printing its item and the allotted job slots, and running
+# long enough for the builds started together to overlap.
+COMMAND = [
+    sys.executable,
+    "-c",
+    "import os, sys, time\n"
+    "print(sys.argv[1], os.environ['ITK_BUILD_JOBS'])\n"
+    "time.sleep(0.3)\n",
+]
+
+
+@pytest.fixture(autouse=True)
+def no_trace(monkeypatch):
+    monkeypatch.delenv(TRACE_ENV, raising=False)
+
+
+def schedule(items, **kwargs):
+    kwargs.setdefault("memory", 64 * GIB)
+    return build_scheduler.schedule(COMMAND, items, poll_interval=0.05, **kwargs)
+
+
+def max_in_use(builds, weight=lambda build: 1):
+    """Return the largest sum of the `weight` of the `builds` running at the
+    same time, by default the largest number of concurrent builds."""
+    events = sorted(
+        [(build.start_time, weight(build)) for build in builds]
+        + [(build.end_time, -weight(build)) for build in builds]
+    )
+    in_use = largest = 0
+    for _, change in events:
+        in_use += change
+        largest = max(largest, in_use)
+    return largest
+
+
+def max_slots_in_use(builds):
+    return max_in_use(builds, lambda build: build.slots)
+
+
+def test_total_job_slots():
+    assert build_scheduler.total_job_slots(8, None, 2 * GIB) == 8
+    assert build_scheduler.total_job_slots(8, 64 * GIB, 2 * GIB) == 8
+    # Memory bound
+    assert build_scheduler.total_job_slots(8, 9 * GIB, 2 * GIB) == 4
+    assert build_scheduler.total_job_slots(8, 1 * GIB, 2 * GIB) == 1
+    assert build_scheduler.total_job_slots(8, 1 * GIB, 0) == 8
+
+
+@pytest.mark.parametrize("cores", [3, 10, 16])
+def test_schedule_slots_sum_to_budget(cores, capsys):
+    items = ["cp39", "cp310", "cp311"]
+    builds = schedule(items, cores=cores)
+    assert [build.item for build in builds if build.returncode == 0] == items
+    assert max_in_use(builds) == 3
+    assert max_slots_in_use(builds) == cores
+    # The builds running together share the whole budget, as evenly as possible
+    slots = [build.slots for build in builds]
+    assert sum(slots) == cores
+    assert max(slots) - min(slots) <= 1
+    out = capsys.readouterr().out
+    for build in builds:
+        assert "[%s] %s %d" % (build.label, build.item, build.slots) in out
+
+
+def test_schedule_single_item():
+    builds = schedule(["/opt/python/cp39-cp39/bin"], cores=8)
+    assert len(builds) == 1
+    assert builds[0].label == "cp39-cp39"
+    assert builds[0].slots == 8
+    assert builds[0].returncode == 0
+
+
+def test_schedule_more_items_than_cores():
+    items = ["cp39", "cp310", "cp311", "cp312", "cp313"]
+    builds = schedule(items, cores=2)
+    assert sorted(build.item for build in builds) == sorted(items)
+    # No more builds than job slots run at the same time. The last build may
+    # also be handed over the slot of the build completed with the one before.
+    assert max_in_use(builds) == 2
+    assert max_slots_in_use(builds) == 2
+    slots = dict((build.item, build.slots) for build in builds)
+    assert [slots[item] for item in items[:-1]] == [1] * (len(items) - 1)
+    assert slots[items[-1]] in (1, 2)
+
+
+def test_schedule_memory_and_max_concurrent():
+    items = ["cp39", "cp310", "cp311", "cp312"]
+    # 4 slots for 8 cores, 2 builds at a time: each build gets half of them,
+    # and the slots of a completed build are handed over to the next one
+    builds = schedule(items, cores=8, memory=8 * GIB, max_concurrent=2)
+    assert max_in_use(builds) == 2
+    assert max_slots_in_use(builds) == 4
+    slots = dict((build.item, build.slots) for build in builds)
+    assert [slots[item] for item in items[:-1]] == [2] * (len(items) - 1)
+    assert slots[items[-1]] in (2, 4)
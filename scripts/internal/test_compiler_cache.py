@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import compiler_cache
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "compiler_cache.py")
+
+
+@pytest.fixture
+def launcher_dir(tmp_path):
+    """Directory with a space in its name holding a fake ``ccache``."""
+    directory = tmp_path / "compiler cache"
+    directory.mkdir()
+    launcher = directory / "ccache"
+    launcher.write_text("#!/bin/sh\n")
+    launcher.chmod(0o755)
+    return directory
+
+
+def test_selected_tool(monkeypatch):
+    monkeypatch.setenv("ITK_COMPILER_CACHE", " CCache ")
+    assert compiler_cache.selected_tool() == "ccache"
+    for value in ("", "0", "off", "None"):
+        assert compiler_cache.selected_tool(value) is None
+    with pytest.raises(ValueError, match="Unsupported compiler cache 'distcc'"):
+        compiler_cache.selected_tool("distcc")
+
+
+def test_cmake_launcher_args():
+    assert compiler_cache.cmake_launcher_args(None) == []
+    assert compiler_cache.cmake_launcher_args("C:\\tools dir\\sccache.exe") == [
+        "-DCMAKE_C_COMPILER_LAUNCHER:FILEPATH=C:/tools dir/sccache.exe",
+        "-DCMAKE_CXX_COMPILER_LAUNCHER:FILEPATH=C:/tools dir/sccache.exe",
+    ]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="uses a shell script")
+def test_cmake_args_command(launcher_dir):
+    env = dict(os.environ, ITK_COMPILER_CACHE="ccache")
+    env["PATH"] = str(launcher_dir) + os.pathsep + env["PATH"]
+    output = subprocess.check_output(
+        [sys.executable, SCRIPT, "cmake-args"], env=env, text=True
+    )
+    # One option per line, whatever the path of the launcher
+    launcher = str(launcher_dir / "ccache")
+    assert output.splitlines() == [
+        "-DCMAKE_C_COMPILER_LAUNCHER:FILEPATH=%s" % launcher,
+        "-DCMAKE_CXX_COMPILER_LAUNCHER:FILEPATH=%s" % launcher,
+    ]
+
+    env["ITK_COMPILER_CACHE"] = ""
+    assert subprocess.check_output([sys.executable, SCRIPT, "cmake-args"], env=env) == (
+        b""
+    )
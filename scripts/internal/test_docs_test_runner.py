@@ -0,0 +1,251 @@
+import os
+import signal
+import xml.etree.ElementTree as ElementTree
+
+import pytest
+
+import docs_test_runner
+
+SCRIPTS = {
+    "ok.py": "import os, sys\nprint('args', sys.argv[1:], os.getcwd())\n",
+    "fail.py": "import sys\nprint('failing')\nsys.exit(3)\n",
+    "message.py": "import sys\nsys.exit('exit message')\n",
+    "raise.py": "raise RuntimeError('broken example')\n",
+    "killed.py": "import os, signal\nos.kill(os.getpid(), signal.SIGKILL)\n",
+    "slow.py": "import time\ntime.sleep(30)\n",
+}
+
+fork_modes = pytest.mark.parametrize(
+    "use_fork",
+    [
+        pytest.param(
+            True,
+            marks=pytest.mark.skipif(not hasattr(os, "fork"), reason="no fork"),
+        ),
+        False,
+    ],
+)
+
+
+def write_scripts(directory, scripts):
+    for name, code in scripts.items():
+        with open(os.path.join(directory, name), "w") as file_:
+            file_.write(code)
+
+
+def test_parse_timeouts():
+    assert docs_test_runner.parse_timeouts(None) == {}
+    assert docs_test_runner.parse_timeouts(["Cast.py=600", "a=b.py=1.5"]) == {
+        "Cast.py": 600.0,
+        "a=b.py": 1.5,
+    }
+    for value in ("Cast.py", "=600", "Cast.py=long"):
+        with pytest.raises(ValueError, match="expected SCRIPT=SECONDS"):
+            docs_test_runner.parse_timeouts([value])
+
+
+@fork_modes
+def test_run_tests(tmp_path, capsys, use_fork):
+    write_scripts(str(tmp_path), SCRIPTS)
+    log_dir = tmp_path / "logs"
+    log_dir.mkdir()
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    tests = [
+        (
+            name,
+            str(tmp_path / name),
+            ["first", "second"],
+            str(work_dir),
+            str(log_dir / (name + ".log")),
+        )
+        for name in sorted(SCRIPTS)
+    ]
+    results = docs_test_runner.run_tests(
+        tests,
+        jobs=3,
+        timeouts={"slow.py": 0.5},
+        default_timeout=20.0,
+        use_fork=use_fork,
+    )
+    assert [result.name for result in results] == sorted(SCRIPTS)
+    results = dict((result.name, result) for result in results)
+
+    assert results["ok.py"].passed
+    assert "args ['first', 'second'] %s" % work_dir in results["ok.py"].log()
+
+    assert results["fail.py"].exit_code == 3
+    assert results["fail.py"].message() == "Exit code 3"
+    assert "failing" in results["fail.py"].log()
+
+    assert results["message.py"].exit_code == 1
+    assert "exit message" in results["message.py"].log()
+
+    assert results["raise.py"].exit_code == 1
+    assert "RuntimeError: broken example" in results["raise.py"].log()
+
+    assert results["killed.py"].exit_code == -signal.SIGKILL
+    assert results["killed.py"].message() == "Killed by signal %d" % signal.SIGKILL
+
+    slow = results["slow.py"]
+    assert slow.timed_out and not slow.passed
+    assert 0.5 < slow.duration < 20.0
+    assert slow.message().startswith("Timed out after")
+
+    out = capsys.readouterr().out
+    assert "ok.py" in out and "FAILED" in out
+
+
+def test_write_junit_xml(tmp_path):
+    log_path = tmp_path / "fail.log"
+    log_path.write_text("Traceback\n")
+    passed = docs_test_runner.TestResult("ok.py", str(tmp_path / "missing.log"))
+    passed.exit_code = 0
+    passed.duration = 1.0
+    failed = docs_test_runner.TestResult("fail.py", str(log_path))
+    failed.exit_code = 2
+    failed.duration = 0.5
+    path = str(tmp_path / "reports" / "docs.xml")
+    docs_test_runner.write_junit_xml([passed, failed], path)
+
+    suite = ElementTree.parse(path).getroot()
+    assert suite.attrib["tests"] == "2"
+    assert suite.attrib["failures"] == "1"
+    assert suite.attrib["time"] == "1.500"
+    cases = suite.findall("testcase")
+    assert [case.attrib["classname"] for case in cases] == ["docs.ok", "docs.fail"]
+    assert cases[0].find("failure") is None
+    failure = cases[1].find("failure")
+    assert failure.attrib == {"message": "Exit code 2", "type": "failure"}
+    assert failure.text == "Traceback\n"
+
+
+DOCS_TEST = """
+BASELINE = ("CreateBaseline.py", ["{baseline}"])
+
+TESTS = [
+    ("ReadBaseline.py", ["{baseline}", "{temp}/output.txt"]),
+    ("NoArgs.py", []),
+]
+
+
+def test_args(args, baseline, temp):
+    return [
+        arg.replace("{baseline}", baseline).replace("{temp}", temp) for arg in args
+    ]
+"""
+
+DOCS_SCRIPTS = {
+    "CreateBaseline.py": (
+        "import sys\nwith open(sys.argv[1], 'w') as f:\n    f.write('baseline')\n"
+    ),
+    "ReadBaseline.py": (
+        "import sys\n"
+        "assert open(sys.argv[1]).read() == 'baseline'\n"
+        "open(sys.argv[2], 'w').write('done')\n"
+    ),
+    "NoArgs.py": "import sys\nassert sys.argv[1:] == []\n",
+}
+
+
+@fork_modes
+def test_run(tmp_path, monkeypatch, use_fork):
+    # The examples do not use itk
+    monkeypatch.setattr(docs_test_runner, "preload_itk", lambda lazy=False: None)
+    docs_code_dir = tmp_path / "code"
+    docs_code_dir.mkdir()
+    (docs_code_dir / "test.py").write_text(DOCS_TEST)
+    write_scripts(str(docs_code_dir), DOCS_SCRIPTS)
+    junit_xml = str(tmp_path / "docs.xml")
+    log_dir = str(tmp_path / "logs")
+
+    results = docs_test_runner.run(
+        jobs=2,
+        junit_xml=junit_xml,
+        log_dir=log_dir,
+        use_fork=use_fork,
+        docs_code_dir=str(docs_code_dir),
+    )
+    assert [(result.name, result.passed) for result in results] == [
+        ("CreateBaseline.py", True),
+        ("ReadBaseline.py", True),
+        ("NoArgs.py", True),
+    ]
+    assert sorted(os.listdir(log_dir)) == [
+        "CreateBaseline.log",
+        "NoArgs.log",
+        "ReadBaseline.log",
+    ]
+    assert ElementTree.parse(junit_xml).getroot().attrib["failures"] == "0"
+
+
+def test_run_failing_baseline(tmp_path):
+    docs_code_dir = tmp_path / "code"
+    docs_code_dir.mkdir()
+    (docs_code_dir / "test.py").write_text(DOCS_TEST)
+    write_scripts(
+        str(docs_code_dir), dict(DOCS_SCRIPTS, **{"CreateBaseline.py": "exit(1)\n"})
+    )
+    results = docs_test_runner.run(use_fork=False, docs_code_dir=str(docs_code_dir))
+    # The examples are not run without a baseline image
+    assert [(result.name, result.passed) for result in results] == [
+        ("CreateBaseline.py", False)
+    ]
+
+
+def test_main_prints_failure_log(tmp_path, monkeypatch, capsys):
+    docs_code_dir = tmp_path / "code"
+    docs_code_dir.mkdir()
+    (docs_code_dir / "test.py").write_text(DOCS_TEST)
+    write_scripts(
+        str(docs_code_dir),
+        dict(DOCS_SCRIPTS, **{"NoArgs.py": "print('broken example')\nexit(2)\n"}),
+    )
+    run = docs_test_runner.run
+    monkeypatch.setattr(
+        docs_test_runner,
+        "run",
+        lambda **kwargs: run(docs_code_dir=str(docs_code_dir), **kwargs),
+    )
+    monkeypatch.setattr("sys.argv", ["docs_test_runner.py", "--no-fork"])
+    with pytest.raises(SystemExit) as error:
+        docs_test_runner.main()
+    assert error.value.code == 1
+    # The log of the failed test is printed although the temporary directory
+    # holding it was removed
+    out = capsys.readouterr().out
+    assert "NoArgs.py: Exit code 2\nbroken example\n" in out
+    assert "2 test(s) passed, 1 failed" in out
+
+
+@pytest.mark.parametrize(
+    "args, use_fork", [([], None), (["--fork"], True), (["--no-fork"], False)]
+)
+def test_main_fork_option(monkeypatch, args, use_fork):
+    calls = []
+    monkeypatch.setattr(
+        docs_test_runner, "run", lambda **kwargs: calls.append(kwargs) or []
+    )
+    monkeypatch.setattr("sys.argv", ["docs_test_runner.py"] + args)
+    docs_test_runner.main()
+    assert calls[0]["use_fork"] is use_fork
+
+
+@pytest.mark.parametrize(
+    "platform, forked", [("linux", True), ("darwin", False), ("win32", False)]
+)
+def test_run_default_fork(tmp_path, monkeypatch, platform, forked):
+    monkeypatch.setattr("sys.platform", platform)
+    monkeypatch.setattr(docs_test_runner, "preload_itk", lambda lazy=False: None)
+    calls = []
+
+    def run_tests(tests, **kwargs):
+        calls.append(kwargs["use_fork"])
+        return [docs_test_runner.TestResult(tests[0][0], tests[0][4])]
+
+    monkeypatch.setattr(docs_test_runner, "run_tests", run_tests)
+    docs_code_dir = tmp_path / "code"
+    docs_code_dir.mkdir()
+    (docs_code_dir / "test.py").write_text(DOCS_TEST)
+    docs_test_runner.run(docs_code_dir=str(docs_code_dir))
+    assert calls == [forked]
@@ -0,0 +1,114 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+INSTALL_MODULE = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__), "..", "..", "cmake", "ITKPythonPackageInstall.cmake"
+    )
+)
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("cmake") is None, reason="cmake is not available"
+)
+
+PROJECT = """
+cmake_minimum_required(VERSION 3.16)
+project(components NONE)
+foreach(name IN ITEMS a b)
+  file(WRITE "${CMAKE_BINARY_DIR}/${name}.txt" "${name}")
+endforeach()
+install(FILES "${CMAKE_BINARY_DIR}/a.txt" DESTINATION lib COMPONENT A)
+install(FILES "${CMAKE_BINARY_DIR}/b.txt" DESTINATION lib COMPONENT B)
+# Scripts of the build tree other than install scripts must not be rewritten
+file(WRITE "${CMAKE_BINARY_DIR}/extra.cmake" "message(STATUS \\"extra script\\")\\n")
+install(CODE "include(\\"${CMAKE_BINARY_DIR}/extra.cmake\\")" COMPONENT A)
+add_subdirectory(sub)
+"""
+
+SUB_PROJECT = """
+file(WRITE "${CMAKE_CURRENT_BINARY_DIR}/c.txt" "c")
+install(FILES "${CMAKE_CURRENT_BINARY_DIR}/c.txt" DESTINATION sub COMPONENT A)
+install(FILES "${CMAKE_CURRENT_BINARY_DIR}/c.txt" DESTINATION other COMPONENT C)
+"""
+
+SCRIPT = """
+include("%(module)s")
+set(CMAKE_INSTALL_PREFIX "%(prefix)s")
+set(CMAKE_INSTALL_MANIFEST_FILES "%(prefix)s/previous.txt")
+ipp_install_components("%(build_dir)s" "%(scripts_dir)s" "%(components)s" %(check)s)
+list(JOIN CMAKE_INSTALL_MANIFEST_FILES "\\n" manifest)
+file(WRITE "%(manifest)s" "${manifest}")
+"""
+
+
+@pytest.fixture
+def build_dir(tmp_path):
+    source_dir = tmp_path / "source"
+    (source_dir / "sub").mkdir(parents=True)
+    (source_dir / "CMakeLists.txt").write_text(PROJECT)
+    (source_dir / "sub" / "CMakeLists.txt").write_text(SUB_PROJECT)
+    # Characters special in regular expressions
+    build_dir = tmp_path / "build (x+1)"
+    subprocess.check_call(
+        ["cmake", "-S", str(source_dir), "-B", str(build_dir)],
+        stdout=subprocess.DEVNULL,
+    )
+    return build_dir
+
+
+def install_components(tmp_path, build_dir, components, check=True):
+    script = tmp_path / "install.cmake"
+    manifest = tmp_path / "manifest.txt"
+    script.write_text(
+        SCRIPT
+        % {
+            "module": INSTALL_MODULE,
+            "prefix": tmp_path / "prefix",
+            "build_dir": build_dir,
+            "scripts_dir": tmp_path / "scripts",
+            "components": ";".join(components),
+            "check": "CHECK_MANIFEST" if check else "",
+            "manifest": manifest,
+        }
+    )
+    process = subprocess.run(
+        ["cmake", "-P", str(script)], capture_output=True, text=True
+    )
+    return process, manifest
+
+
+def test_install_components(tmp_path, build_dir):
+    process, manifest = install_components(tmp_path, build_dir, ["A", "C"])
+    assert process.returncode == 0, process.stderr
+    assert "extra script" in process.stdout
+    assert "Checked the 3 file(s) installed in a single pass" in process.stdout
+    prefix = tmp_path / "prefix"
+    files = manifest.read_text().splitlines()
+    # The files installed earlier are kept
+    assert files[0] == str(prefix / "previous.txt")
+    assert sorted(files[1:]) == [
+        str(prefix / "lib" / "a.txt"),
+        str(prefix / "other" / "c.txt"),
+        str(prefix / "sub" / "c.txt"),
+    ]
+    assert not (prefix / "lib" / "b.txt").exists()
+    # The install manifest of the single pass is not written in the build tree
+    assert (tmp_path / "scripts" / "install_manifest_ITKPythonPackage.txt").exists()
+    assert not (build_dir / "install_manifest_ITKPythonPackage.txt").exists()
+
+
+def test_install_components_manifest_mismatch(tmp_path, build_dir):
+    process, _ = install_components(tmp_path, build_dir, ["A"], check=False)
+    assert process.returncode == 0, process.stderr
+    # Make the copied script of the sub-directory skip component A
+    copy = tmp_path / "scripts" / "sub" / "cmake_install.cmake"
+    copy.write_text(
+        copy.read_text().replace("IPP_INSTALL_COMPONENT_A", "IPP_INSTALL_COMPONENT_Z")
+    )
+    process, _ = install_components(tmp_path, build_dir, ["A"])
+    assert process.returncode != 0
+    assert "does not match the install of each component" in process.stderr
+    assert str(tmp_path / "prefix" / "sub" / "c.txt") in process.stderr
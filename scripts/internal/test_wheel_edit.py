@@ -0,0 +1,216 @@
+import csv
+import io
+import os
+import struct
+import zipfile
+
+import pytest
+
+import wheel_edit
+
+DIST_INFO = "itk_core-5.4.0.dist-info"
+
+WHEEL = """Wheel-Version: 1.0
+Generator: scikit-build-core 0.10.7
+Root-Is-Purelib: false
+Tag: cp39-cp39-linux_x86_64
+
+"""
+
+MEMBERS = {
+    "itk/__init__.py": b"from itk.support import *\n",
+    "itk/libITKCommon.so": os.urandom(4096) + b"\0" * 65536,
+    "itk/Configuration/ITKCommonConfig.py": b"depends = ('ITKPyBase',)\n" * 100,
+    "itk/empty.txt": b"",
+}
+
+
+class UnseekableWriter:
+    """Stream making zipfile write the members with a data descriptor."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+    def flush(self):
+        pass
+
+
+def record_rows(members):
+    rows = [
+        [name, wheel_edit.record_hash(data), str(len(data))]
+        for name, data in members.items()
+    ]
+    return "".join("%s\n" % ",".join(row) for row in rows) + "%s/RECORD,,\n" % (
+        DIST_INFO
+    )
+
+
+def write_members(archive, members, zip64_names=()):
+    for name, data in members.items():
+        info = zipfile.ZipInfo(name, date_time=(2024, 1, 1, 0, 0, 0))
+        info.compress_type = (
+            zipfile.ZIP_STORED if name.endswith(".txt") else zipfile.ZIP_DEFLATED
+        )
+        with archive.open(info, "w", force_zip64=name in zip64_names) as member:
+            member.write(data)
+
+
+def make_wheel(directory, data_descriptors=False, zip64_names=()):
+    members = dict(MEMBERS)
+    members[DIST_INFO + "/METADATA"] = b"Metadata-Version: 2.1\nName: itk-core\n"
+    members[DIST_INFO + "/WHEEL"] = WHEEL.encode()
+    members[DIST_INFO + "/RECORD"] = record_rows(members).encode()
+    path = os.path.join(str(directory), "itk_core-5.4.0-cp39-cp39-linux_x86_64.whl")
+    if data_descriptors:
+        stream = UnseekableWriter()
+        with zipfile.ZipFile(stream, "w") as archive:
+            write_members(archive, members, zip64_names)
+        with open(path, "wb") as file_:
+            file_.write(stream.buffer.getvalue())
+    else:
+        with zipfile.ZipFile(path, "w") as archive:
+            write_members(archive, members, zip64_names)
+    return path
+
+
+def check_record(path, data_descriptors=False):
+    """Check that ``RECORD`` lists every member of the wheel at `path` with
+    its hash and size, and return the members."""
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        members = {name: archive.read(name) for name in archive.namelist()}
+        for info in archive.infolist():
+            assert (
+                data_descriptors or not info.flag_bits & wheel_edit.DATA_DESCRIPTOR_FLAG
+            )
+    record_name = DIST_INFO + "/RECORD"
+    rows = list(csv.reader(io.StringIO(members[record_name].decode())))
+    assert sorted(row[0] for row in rows) == sorted(members)
+    for name, digest, size in rows:
+        if name == record_name:
+            assert (digest, size) == ("", "")
+        else:
+            assert digest == wheel_edit.record_hash(members[name])
+            assert size == str(len(members[name]))
+    return members
+
+
+@pytest.fixture(params=["raw", "public"])
+def copy_mode(request, monkeypatch):
+    if request.param == "public":
+        monkeypatch.setattr(wheel_edit, "RAW_COPY_PYTHON_VERSIONS", ((0, 0), (0, 0)))
+    else:
+        monkeypatch.setattr(
+            wheel_edit,
+            "RAW_COPY_PYTHON_VERSIONS",
+            (wheel_edit.sys.version_info[:2],) * 2,
+        )
+    return request.param
+
+
+@pytest.mark.parametrize(
+    "data_descriptors, zip64_names",
+    [
+        (False, ()),
+        (True, ()),
+        (False, ("itk/libITKCommon.so", "itk/empty.txt")),
+        (True, ("itk/libITKCommon.so",)),
+    ],
+)
+def test_rename(tmp_path, copy_mode, data_descriptors, zip64_names):
+    path = make_wheel(tmp_path, data_descriptors, zip64_names)
+    assert wheel_edit.rename_member(
+        path, "itk/libITKCommon.so", "itk/libITKCommon-5.4.so"
+    )
+    members = check_record(path)
+    assert "itk/libITKCommon.so" not in members
+    assert members["itk/libITKCommon-5.4.so"] == MEMBERS["itk/libITKCommon.so"]
+    for name in ("itk/__init__.py", "itk/empty.txt"):
+        assert members[name] == MEMBERS[name]
+
+
+def test_rename_missing_member(tmp_path):
+    path = make_wheel(tmp_path)
+    assert not wheel_edit.rename_member(path, "itk/missing.so", "itk/other.so")
+    with pytest.raises(KeyError):
+        wheel_edit.edit_wheel(path, renames={"itk/missing.so": "itk/other.so"})
+
+
+@pytest.mark.parametrize("data_descriptors", [False, True])
+def test_retag(tmp_path, copy_mode, data_descriptors):
+    path = make_wheel(tmp_path, data_descriptors, ("itk/__init__.py",))
+    output_dir = tmp_path / "retagged"
+    output_dir.mkdir()
+    output_path = wheel_edit.retag_wheel(path, "manylinux_2_28_x86_64", str(output_dir))
+    assert os.path.basename(output_path) == (
+        "itk_core-5.4.0-cp39-cp39-manylinux_2_28_x86_64.whl"
+    )
+    assert os.path.exists(path)
+    members = check_record(output_path)
+    wheel = members[DIST_INFO + "/WHEEL"].decode()
+    assert wheel.startswith("Wheel-Version: 1.0\n")
+    assert wheel.endswith("Tag: cp39-cp39-manylinux_2_28_x86_64\n\n")
+    assert "linux_x86_64" not in wheel.replace("manylinux_2_28_x86_64", "")
+    for name, data in MEMBERS.items():
+        assert members[name] == data
+
+
+def test_edit_contents(tmp_path, copy_mode):
+    path = make_wheel(tmp_path, True)
+    output_path = str(tmp_path / "edited.whl")
+    wheel_edit.edit_wheel(
+        path,
+        output_path,
+        renames={"itk/__init__.py": "itk/_init.py"},
+        contents={"itk/_init.py": "import itk\n", "itk/added.py": b"pass\n"},
+    )
+    members = check_record(output_path)
+    assert members["itk/_init.py"] == b"import itk\n"
+    assert members["itk/added.py"] == b"pass\n"
+    assert "itk/__init__.py" not in members
+    # The source wheel is left untouched
+    check_record(path, data_descriptors=True)
+
+
+def test_strip_zip64_extra():
+    other = struct.pack("<2H", 0x5455, 5) + b"\x01" + b"\0" * 4
+    zip64 = struct.pack("<2HQ", wheel_edit.ZIP64_EXTRA_ID, 8, 1 << 33)
+    assert wheel_edit.strip_zip64_extra(zip64 + other) == other
+    assert wheel_edit.strip_zip64_extra(other + zip64) == other
+    assert wheel_edit.strip_zip64_extra(b"") == b""
+
+
+def test_copy_member_with_zip64_extra(tmp_path, copy_mode):
+    # A ZIP64 field kept in the central directory must not be duplicated in
+    # the copied member.
+    source_path = str(tmp_path / "source.zip")
+    info = zipfile.ZipInfo("data.bin", date_time=(2024, 1, 1, 0, 0, 0))
+    info.compress_type = zipfile.ZIP_DEFLATED
+    info.extra = struct.pack("<2HQ", wheel_edit.ZIP64_EXTRA_ID, 8, 0)
+    with zipfile.ZipFile(source_path, "w") as archive:
+        archive.writestr(info, b"data" * 1000)
+
+    target_path = str(tmp_path / "target.zip")
+    with zipfile.ZipFile(source_path) as archive, open(
+        source_path, "rb"
+    ) as source_file, zipfile.ZipFile(target_path, "w") as target:
+        wheel_edit.copy_member(
+            archive, source_file, archive.getinfo("data.bin"), target, "renamed.bin"
+        )
+    with zipfile.ZipFile(target_path) as archive:
+        assert archive.testzip() is None
+        assert archive.read("renamed.bin") == b"data" * 1000
+        assert archive.getinfo("renamed.bin").extra == b""
+
+
+def test_raw_copy_supported(monkeypatch):
+    with zipfile.ZipFile(io.BytesIO(), "w") as target:
+        monkeypatch.setattr(wheel_edit, "RAW_COPY_PYTHON_VERSIONS", ((3, 0), (99, 0)))
+        assert wheel_edit.raw_copy_supported(target)
+        with target.open("member", "w"):
+            assert not wheel_edit.raw_copy_supported(target)
+        monkeypatch.setattr(wheel_edit, "RAW_COPY_PYTHON_VERSIONS", ((2, 0), (2, 7)))
+        assert not wheel_edit.raw_copy_supported(target)
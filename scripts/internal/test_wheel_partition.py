@@ -0,0 +1,177 @@
+import json
+import sys
+
+import pytest
+
+import wheel_partition
+
+MIB = 1024 * 1024
+
+MANIFEST = {
+    "key": "0123456789abcdef",
+    "wheel_groups": ["Core", "IO", "Filtering", "Meta"],
+    "group_depends": {"Core": [], "IO": ["Core"], "Filtering": ["Core"], "Meta": []},
+    "modules": {
+        "ITKCommon": {"depends": [], "wheel_group": "Core"},
+        "ITKVTK": {"depends": ["ITKCommon"], "wheel_group": "Core"},
+        "ITKIOImageBase": {"depends": ["ITKCommon"], "wheel_group": "IO"},
+        "ITKIOPNG": {"depends": ["ITKIOImageBase"], "wheel_group": "IO"},
+        "ITKSmoothing": {"depends": ["ITKCommon"], "wheel_group": "Filtering"},
+        "ITKThresholding": {"depends": ["ITKCommon"], "wheel_group": "Filtering"},
+        "ITKMathematicalMorphology": {
+            "depends": ["ITKCommon"],
+            "wheel_group": "Filtering",
+        },
+    },
+}
+
+SIZES = {
+    "ITKCommon": 10 * MIB,
+    "ITKVTK": 1 * MIB,
+    "ITKIOImageBase": 5 * MIB,
+    "ITKIOPNG": 2 * MIB,
+    "ITKSmoothing": 3 * MIB,
+    "ITKThresholding": 4 * MIB,
+    "ITKMathematicalMorphology": 40 * MIB,
+}
+
+
+def current_assignment():
+    return {module: info["wheel_group"] for module, info in MANIFEST["modules"].items()}
+
+
+def test_group_sizes():
+    partition = wheel_partition.Partition(MANIFEST, SIZES)
+    assert partition.group_sizes(current_assignment()) == {
+        "Core": 11 * MIB,
+        "IO": 7 * MIB,
+        "Filtering": 47 * MIB,
+        "Meta": 0,
+    }
+
+
+def test_workload_bytes():
+    partition = wheel_partition.Partition(MANIFEST, SIZES)
+    assignment = current_assignment()
+    assert partition.workload_bytes(assignment, ["ITKIOPNG"]) == 18 * MIB
+    assert partition.workload_bytes(assignment, ["ITKSmoothing"]) == 58 * MIB
+
+
+def test_is_valid_move():
+    partition = wheel_partition.Partition(MANIFEST, SIZES)
+    assignment = current_assignment()
+    # IO does not depend on Filtering, nor the opposite
+    assert not partition.is_valid_move(assignment, ["ITKIOImageBase"], "Filtering")
+    assert not partition.is_valid_move(assignment, ["ITKIOPNG"], "Core")
+    # Unless the modules depending on it move along
+    assert partition.is_valid_move(assignment, ["ITKIOImageBase", "ITKIOPNG"], "Core")
+    assert partition.is_valid_move(assignment, ["ITKSmoothing"], "IO")
+    assert not partition.is_valid_move(assignment, ["ITKCommon"], "IO")
+
+
+def test_optimize():
+    partition = wheel_partition.Partition(MANIFEST, SIZES)
+    workloads = {"smoothing": {"modules": ["ITKSmoothing"], "weight": 1.0}}
+    proposed = wheel_partition.optimize(partition, current_assignment(), workloads)
+    # Only itk-core is installed, holding nothing but ITKSmoothing and its
+    # dependency
+    assert proposed["ITKSmoothing"] == "Core"
+    assert proposed["ITKVTK"] != "Core"
+    assert partition.cost(proposed, workloads) == 13 * MIB
+    assert not partition.unsatisfied_dependencies(proposed)
+    assert "Meta" not in proposed.values()
+
+
+def test_optimize_keeps_pinned_modules():
+    partition = wheel_partition.Partition(MANIFEST, SIZES)
+    workloads = {"smoothing": {"modules": ["ITKSmoothing"], "weight": 1.0}}
+    pinned = {"ITKMathematicalMorphology": "Filtering", "ITKVTK": "Core"}
+    proposed = wheel_partition.optimize(
+        partition, current_assignment(), workloads, pinned
+    )
+    assert proposed["ITKMathematicalMorphology"] == "Filtering"
+    assert proposed["ITKVTK"] == "Core"
+    assert partition.cost(proposed, workloads) == 14 * MIB
+
+
+def test_load_workloads(tmp_path):
+    path = tmp_path / "workloads.json"
+    path.write_text(
+        json.dumps(
+            {"io": ["ITKIOPNG"], "filter": {"modules": ["ITKSmoothing"], "weight": 3}}
+        )
+    )
+    workloads = wheel_partition.load_workloads(
+        str(path), ["smooth=ITKSmoothing,ITKThresholding"]
+    )
+    assert workloads == {
+        "io": {"modules": ["ITKIOPNG"], "weight": 1.0},
+        "filter": {"modules": ["ITKSmoothing"], "weight": 3.0},
+        "smooth": {"modules": ["ITKSmoothing", "ITKThresholding"], "weight": 1.0},
+    }
+
+
+def test_parse_pins():
+    assert wheel_partition.parse_pins(
+        ["ITKSmoothing=IO", "ITKIOPNG=Core"], MANIFEST
+    ) == {"ITKSmoothing": "IO", "ITKIOPNG": "Core"}
+    for value, message in (
+        ("ITKSmoothing", "expected MODULE=GROUP"),
+        ("=Core", "expected MODULE=GROUP"),
+        ("ITKSmoothing=", "expected MODULE=GROUP"),
+        ("ITKBogus=Core", "unknown module ITKBogus"),
+        ("ITKCommon=Bogus", "unknown wheel group Bogus"),
+        ("ITKCommon=Meta", "unknown wheel group Meta"),
+    ):
+        with pytest.raises(ValueError, match=message):
+            wheel_partition.parse_pins([value], MANIFEST)
+
+
+@pytest.fixture
+def optimize_args(tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps(MANIFEST))
+    sizes_path = tmp_path / "sizes.json"
+    sizes_path.write_text(json.dumps(SIZES))
+    return [
+        "wheel_partition.py",
+        "optimize",
+        "--manifest",
+        str(manifest_path),
+        "--sizes",
+        str(sizes_path),
+        "--workload",
+        "smoothing=ITKSmoothing",
+    ]
+
+
+@pytest.mark.parametrize(
+    "pin, message",
+    [
+        ("ITKCommon=Bogus", "unknown wheel group Bogus"),
+        ("ITKBogus=Core", "unknown module ITKBogus"),
+        # Moves ITKIOImageBase away from ITKIOPNG, which depends on it
+        ("ITKIOImageBase=Filtering", "ITKIOPNG depends on ITKIOImageBase"),
+    ],
+)
+def test_main_rejects_invalid_pins(optimize_args, monkeypatch, capsys, pin, message):
+    monkeypatch.setattr(sys, "argv", optimize_args + ["--pin", pin])
+    with pytest.raises(SystemExit) as error:
+        wheel_partition.main()
+    assert error.value.code == 2
+    assert message in capsys.readouterr().err
+
+
+def test_main_optimize(optimize_args, monkeypatch, capsys, tmp_path):
+    output = tmp_path / "proposed.json"
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        optimize_args + ["--pin", "ITKThresholding=Filtering", "--output", str(output)],
+    )
+    wheel_partition.main()
+    assert "module(s) moved" in capsys.readouterr().out
+    proposed = json.loads(output.read_text())
+    assert proposed["key"] == MANIFEST["key"]
+    assert "ITKThresholding" in proposed["wheels"]["Filtering"]
+    assert "ITKVTK" in proposed["wheels"]["Core"]
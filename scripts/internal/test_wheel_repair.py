@@ -0,0 +1,372 @@
+import csv
+import io
+import os
+import struct
+import sys
+import time
+import zipfile
+
+import pytest
+
+import wheel_edit
+import wheel_repair
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Repair tool grafting libtbb in the wheel, like auditwheel. Every call is
+# appended to the FAKE_TOOL_CALLS file.
+FAKE_TOOL = """#!{python}
+import os
+import sys
+import zipfile
+
+sys.path.insert(0, {script_dir!r})
+import wheel_edit
+
+if "--version" in sys.argv:
+    print("fake-auditwheel 1.0")
+    sys.exit(0)
+with open(os.environ["FAKE_TOOL_CALLS"], "a") as calls:
+    calls.write(sys.argv[-1] + "\\n")
+output_dir = sys.argv[sys.argv.index("-w") + 1]
+wheel_path = sys.argv[-1]
+output_path, contents = wheel_edit.retag_edit(
+    wheel_path, "manylinux_2_28_x86_64", output_dir
+)
+with zipfile.ZipFile(wheel_path) as archive:
+    library = archive.read("itk/libITKCommon.so")
+contents["itk/libITKCommon.so"] = library + b"rpath"
+with open(os.environ["FAKE_TBB"], "rb") as tbb:
+    contents["itk_core.libs/libtbb-1234.so.12"] = tbb.read()
+if os.environ.get("FAKE_LOAD_ORDER"):
+    release = "-".join(os.path.basename(wheel_path).split("-")[:2])
+    contents["itk_core.libs/.load-order"] = release
+wheel_edit.edit_wheel(wheel_path, output_path, contents=contents)
+"""
+
+
+def make_elf(needed, rpath=None, runpath=None):
+    """Return a 64-bit ELF shared library depending on `needed`."""
+    strings = [name.encode() for name in needed]
+    tags = [wheel_repair.DT_NEEDED] * len(needed)
+    for tag, value in (
+        (wheel_repair.DT_RPATH, rpath),
+        (wheel_repair.DT_RUNPATH, runpath),
+    ):
+        if value is not None:
+            strings.append(value.encode())
+            tags.append(tag)
+    string_table = 64 + 2 * 56
+    table = b"\0"
+    offsets = []
+    for string in strings:
+        offsets.append(len(table))
+        table += string + b"\0"
+    table += b"\0" * (-len(table) % 8)
+    entries = [(wheel_repair.DT_STRTAB, string_table)] + list(zip(tags, offsets))
+    dynamic = b"".join(struct.pack("<qQ", tag, value) for tag, value in entries)
+    dynamic += struct.pack("<qQ", wheel_repair.DT_NULL, 0)
+    dynamic_offset = string_table + len(table)
+    size = dynamic_offset + len(dynamic)
+    header = b"\x7fELF" + bytes([2, 1, 1]) + b"\0" * 9
+    header += struct.pack("<HHIQQQIHHHHHH", 3, 62, 1, 0, 64, 0, 0, 64, 56, 2, 64, 0, 0)
+    program_headers = struct.pack(
+        "<IIQQQQQQ", wheel_repair.PT_LOAD, 4, 0, 0, 0, size, size, 0x1000
+    ) + struct.pack(
+        "<IIQQQQQQ",
+        wheel_repair.PT_DYNAMIC,
+        4,
+        dynamic_offset,
+        dynamic_offset,
+        dynamic_offset,
+        len(dynamic),
+        len(dynamic),
+        8,
+    )
+    return header + program_headers + table + dynamic
+
+
+def make_pe(imports, delay_imports=()):
+    """Return a PE32+ DLL importing `imports` and `delay_imports`."""
+    section_offset = 0x200
+    section_address = 0x1000
+    descriptors_size = 20 * (len(imports) + 1) + 32 * (len(delay_imports) + 1)
+    names = b""
+    name_addresses = []
+    for name in list(imports) + list(delay_imports):
+        name_addresses.append(section_address + descriptors_size + len(names))
+        names += name.encode() + b"\0"
+    imports_data = (
+        b"".join(
+            struct.pack("<5I", 0, 0, 0, address, 0)
+            for address in name_addresses[: len(imports)]
+        )
+        + b"\0" * 20
+    )
+    delay_data = (
+        b"".join(
+            struct.pack("<8I", 1, address, 0, 0, 0, 0, 0, 0)
+            for address in name_addresses[len(imports) :]
+        )
+        + b"\0" * 32
+    )
+    section = imports_data + delay_data + names
+
+    directories = [(0, 0)] * 16
+    directories[wheel_repair.PE_IMPORT_DIRECTORY] = (section_address, len(imports_data))
+    if delay_imports:
+        directories[wheel_repair.PE_DELAY_IMPORT_DIRECTORY] = (
+            section_address + len(imports_data),
+            len(delay_data),
+        )
+    optional_header = struct.pack("<H", 0x20B) + b"\0" * 106 + struct.pack("<I", 16)
+    optional_header += b"".join(struct.pack("<II", *entry) for entry in directories)
+    section_header = b".idata\0\0" + struct.pack(
+        "<IIII", len(section), section_address, len(section), section_offset
+    )
+    section_header += b"\0" * 16
+    data = b"MZ" + b"\0" * 0x3A + struct.pack("<I", 0x40)
+    data += b"PE\0\0" + struct.pack("<HHIIIHH", 0x8664, 1, 0, 0, 0, 240, 0x2022)
+    data += optional_header + section_header
+    data += b"\0" * (section_offset - len(data))
+    return data + section
+
+
+def make_wheel(directory, version="5.4.0", library=None, members=None):
+    release = "itk_core-%s" % version
+    members = dict(members or {})
+    members["itk/__init__.py"] = b"from itk.support import *\n"
+    members["itk/libITKCommon.so"] = library or make_elf(["libtbb.so.12"])
+    members[release + ".dist-info/METADATA"] = (
+        "Metadata-Version: 2.1\nName: itk-core\nVersion: %s\n" % version
+    ).encode()
+    members[release + ".dist-info/WHEEL"] = (
+        b"Wheel-Version: 1.0\nRoot-Is-Purelib: false\nTag: cp311-cp311-linux_x86_64\n"
+    )
+    members[release + ".dist-info/RECORD"] = b""
+    path = os.path.join(str(directory), "%s-cp311-cp311-linux_x86_64.whl" % release)
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    # Fill RECORD
+    wheel_edit.edit_wheel(path)
+    return path
+
+
+@pytest.fixture
+def library_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "libraries"
+    directory.mkdir()
+    (directory / "libtbb.so.12").write_bytes(make_elf([]))
+    monkeypatch.setenv("LD_LIBRARY_PATH", str(directory))
+    monkeypatch.setenv("FAKE_TBB", str(directory / "libtbb.so.12"))
+    return directory
+
+
+@pytest.fixture
+def fake_tool(tmp_path, monkeypatch):
+    path = tmp_path / "fake-auditwheel"
+    path.write_text(FAKE_TOOL.format(python=sys.executable, script_dir=SCRIPT_DIR))
+    path.chmod(0o755)
+    calls = tmp_path / "calls.txt"
+    calls.write_text("")
+    monkeypatch.setenv("FAKE_TOOL_CALLS", str(calls))
+    return str(path), calls
+
+
+def wheel_key(path, tmp_path, command_key="auditwheel"):
+    analyzer = wheel_repair.LibraryAnalyzer("auditwheel", (), str(tmp_path / "cache"))
+    return wheel_repair.WheelInputs(path, analyzer).key(command_key)
+
+
+def test_elf_dependencies():
+    dependencies = wheel_repair.library_dependencies(
+        make_elf(["libtbb.so.12", "libc.so.6"], rpath="$ORIGIN/../lib:/opt/lib")
+    )
+    assert dependencies == {
+        "needed": ["libtbb.so.12", "libc.so.6"],
+        "rpath": ["$ORIGIN/../lib", "/opt/lib"],
+        "runpath": [],
+    }
+    assert wheel_repair.library_dependencies(make_elf([], runpath="/opt/lib")) == {
+        "needed": [],
+        "rpath": [],
+        "runpath": ["/opt/lib"],
+    }
+
+
+def test_pe_dependencies():
+    dependencies = wheel_repair.library_dependencies(
+        make_pe(["tbb12.dll", "KERNEL32.dll"], ["ITKCommon-5.4.dll"])
+    )
+    assert dependencies["needed"] == ["tbb12.dll", "KERNEL32.dll", "ITKCommon-5.4.dll"]
+
+
+def test_library_dependencies_of_other_files():
+    assert wheel_repair.library_dependencies(b"not a library") is None
+    assert wheel_repair.library_dependencies(b"\x7fELF\x02\x01") is None
+
+
+def test_ld_so_conf_dirs(tmp_path):
+    conf_dir = tmp_path / "ld.so.conf.d"
+    conf_dir.mkdir()
+    (conf_dir / "tbb.conf").write_text("/opt/tbb/lib\n")
+    conf = tmp_path / "ld.so.conf"
+    conf.write_text("# Comment\n/usr/local/lib\ninclude ld.so.conf.d/*.conf\n")
+    assert wheel_repair.ld_so_conf_dirs(str(conf)) == ["/usr/local/lib", "/opt/tbb/lib"]
+
+
+def test_add_path_dirs():
+    args = ["--no-mangle-all", "--add-path", os.pathsep.join(["/a", "/b"])]
+    assert wheel_repair.add_path_dirs(args + ["--add-path=/c"]) == ["/a", "/b", "/c"]
+
+
+def test_key_ignores_version(tmp_path, library_dir):
+    key = wheel_key(make_wheel(tmp_path), tmp_path)
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    assert wheel_key(make_wheel(other_dir, "5.5.0.dev20240101"), tmp_path) == key
+    assert (
+        wheel_key(make_wheel(other_dir, library=make_elf(["libz.so.1"])), tmp_path)
+        != key
+    )
+    assert wheel_key(make_wheel(tmp_path), tmp_path, "other arguments") != key
+
+
+def test_key_depends_on_external_libraries(tmp_path, library_dir):
+    path = make_wheel(tmp_path)
+    key = wheel_key(path, tmp_path)
+    (library_dir / "libtbb.so.12").write_bytes(make_elf(["libhwloc.so.15"]))
+    assert wheel_key(path, tmp_path) != key
+    # Dependencies of the external libraries are resolved too
+    changed_key = wheel_key(path, tmp_path)
+    (library_dir / "libhwloc.so.15").write_bytes(b"hwloc")
+    assert wheel_key(path, tmp_path) != changed_key
+
+
+def test_analysis_is_cached(tmp_path, library_dir):
+    cache_dir = str(tmp_path / "cache")
+    analyzer = wheel_repair.LibraryAnalyzer("auditwheel", (), cache_dir)
+    wheel_repair.WheelInputs(make_wheel(tmp_path), analyzer)
+    analyses = os.listdir(os.path.join(cache_dir, "analysis"))
+    assert analyses
+
+    calls = []
+    analyzer = wheel_repair.LibraryAnalyzer("auditwheel", (), cache_dir)
+    digest = wheel_repair.file_hash(str(library_dir / "libtbb.so.12"))
+    assert analyzer.dependencies(digest, lambda: calls.append(1)) == {
+        "needed": [],
+        "rpath": [],
+        "runpath": [],
+    }
+    assert not calls
+
+
+def check_wheel(path, version):
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        members = {name: archive.read(name) for name in archive.namelist()}
+    dist_info = "itk_core-%s.dist-info" % version
+    assert members[dist_info + "/WHEEL"].endswith(
+        b"Tag: cp311-cp311-manylinux_2_28_x86_64\n\n"
+    )
+    rows = csv.reader(io.StringIO(members[dist_info + "/RECORD"].decode()))
+    for name, digest, _ in rows:
+        if digest:
+            assert digest == wheel_edit.record_hash(members[name])
+    return members
+
+
+def repair(wheel_path, tool, cache_dir, tmp_path):
+    return wheel_repair.repair_wheels(
+        "auditwheel",
+        [wheel_path],
+        output_dir=str(tmp_path / "dist"),
+        executable=tool,
+        jobs=1,
+        cache_dir=cache_dir,
+    )[0]
+
+
+def test_repair_reuses_cache_across_versions(tmp_path, library_dir, fake_tool):
+    tool, calls = fake_tool
+    cache_dir = str(tmp_path / "cache")
+    first_dir = tmp_path / "first"
+    first_dir.mkdir()
+    first = repair(make_wheel(first_dir), tool, cache_dir, tmp_path)
+    assert first.succeeded and not first.cached
+    assert first.outputs == ["itk_core-5.4.0-cp311-cp311-manylinux_2_28_x86_64.whl"]
+
+    second_dir = tmp_path / "second"
+    second_dir.mkdir()
+    second = repair(make_wheel(second_dir, "5.4.1"), tool, cache_dir, tmp_path)
+    assert second.succeeded and second.cached
+    assert second.outputs == ["itk_core-5.4.1-cp311-cp311-manylinux_2_28_x86_64.whl"]
+    assert len(calls.read_text().splitlines()) == 1
+
+    expected = check_wheel(str(tmp_path / "dist" / first.outputs[0]), "5.4.0")
+    members = check_wheel(str(tmp_path / "dist" / second.outputs[0]), "5.4.1")
+    for name, data in expected.items():
+        if not wheel_repair.is_dist_info(name):
+            assert members[name] == data
+    assert members["itk/libITKCommon.so"].endswith(b"rpath")
+
+    # A new version of libtbb is grafted again
+    (library_dir / "libtbb.so.12").write_bytes(make_elf(["libc.so.6"]))
+    third = repair(make_wheel(second_dir, "5.4.1"), tool, cache_dir, tmp_path)
+    assert not third.cached
+    assert len(calls.read_text().splitlines()) == 2
+
+
+def test_repair_depending_on_version_is_not_reused(
+    tmp_path, library_dir, fake_tool, monkeypatch
+):
+    tool, calls = fake_tool
+    monkeypatch.setenv("FAKE_LOAD_ORDER", "1")
+    cache_dir = str(tmp_path / "cache")
+    first_dir = tmp_path / "first"
+    first_dir.mkdir()
+    assert not repair(make_wheel(first_dir), tool, cache_dir, tmp_path).cached
+    assert repair(make_wheel(first_dir), tool, cache_dir, tmp_path).cached
+    second = repair(make_wheel(first_dir, "5.4.1"), tool, cache_dir, tmp_path)
+    assert second.succeeded and not second.cached
+    with open(second.log_path) as log:
+        assert "depends on the version of itk_core-5.4.0" in log.read()
+
+
+def make_entry(cache_dir, key, size, used):
+    entry_dir = wheel_repair.entry_dir_of(cache_dir, key)
+    os.makedirs(os.path.join(entry_dir, "members"))
+    with open(os.path.join(entry_dir, "members", "0"), "wb") as member:
+        member.write(b"\0" * size)
+    entry_path = os.path.join(entry_dir, "entry.json")
+    with open(entry_path, "w") as entry:
+        entry.write("{}")
+    os.utime(entry_path, (used, used))
+    return entry_dir
+
+
+def test_prune_cache(tmp_path):
+    cache_dir = str(tmp_path)
+    now = time.time()
+    old = make_entry(cache_dir, "aa01", 10, now - 40 * 86400)
+    least_recent = make_entry(cache_dir, "bb02", 1000, now - 3600)
+    recent = make_entry(cache_dir, "cc03", 1000, now - 60)
+    legacy = os.path.join(cache_dir, "wheels", "aa", "aa01")
+    os.makedirs(legacy)
+    removed, freed = wheel_repair.prune_cache(cache_dir, 1500, 30 * 86400)
+    assert removed == 2
+    assert freed >= 1010
+    assert not os.path.exists(old)
+    assert not os.path.exists(least_recent)
+    assert os.path.exists(recent)
+    assert not os.path.exists(os.path.join(cache_dir, "wheels"))
+
+
+def test_parse_cache_size():
+    assert wheel_repair.parse_cache_size("5G") == 5 << 30
+    assert wheel_repair.parse_cache_size("512m") == 512 << 20
+    assert wheel_repair.parse_cache_size("1.5KB") == 1536
+    assert wheel_repair.parse_cache_size(100) == 100
+    with pytest.raises(ValueError):
+        wheel_repair.parse_cache_size("big")
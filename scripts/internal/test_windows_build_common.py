@@ -0,0 +1,29 @@
+import pytest
+
+from windows_build_common import python_arch, split_abi3_py_envs
+
+
+def test_python_arch():
+    assert python_arch("311-x64") == "x64"
+    assert python_arch("39-x86") == "x86"
+
+
+@pytest.mark.parametrize(
+    "py_envs, build_py_envs, abi3_aliases",
+    [
+        (["39-x64", "310-x64"], ["39-x64", "310-x64"], {}),
+        (
+            ["39-x64", "312-x64", "311-x64", "313-x64"],
+            ["39-x64", "311-x64"],
+            {"312-x64": "311-x64", "313-x64": "311-x64"},
+        ),
+        # Environments of different architectures do not share a build
+        (
+            ["311-x64", "312-x64", "312-x86", "313-x86", "310-x86"],
+            ["311-x64", "312-x86", "310-x86"],
+            {"312-x64": "311-x64", "313-x86": "312-x86"},
+        ),
+    ],
+)
+def test_split_abi3_py_envs(py_envs, build_py_envs, abi3_aliases):
+    assert split_abi3_py_envs(py_envs) == (build_py_envs, abi3_aliases)
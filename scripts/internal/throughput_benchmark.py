@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+
+"""CLI measuring the throughput of the ITK wheels on the workloads of the
+documentation examples.
+
+The workloads are the operations run by the examples of ``docs/code`` on a
+synthetic image, a noisy sphere, of each size given with ``--size``:
+
+* ``imwrite``, ``imread``: writing and reading the image as MetaImage
+  (``ReadMedianWrite.py``).
+* ``median``: ``itk.median_image_filter(image, radius=2)`` on an ``unsigned
+  char`` image (``ReadMedianWrite.py``).
+* ``anti_alias``: ``itk.anti_alias_binary_image_filter(image,
+  number_of_iterations=3)`` on a ``float`` binary image
+  (``FilterParameters.py``).
+* ``cast``: ``image.astype(itk.UC)`` of a ``float`` image (``Cast.py``).
+* ``array_view``, ``array_copy``: ``itk.array_view_from_image`` and
+  ``itk.array_from_image`` (``MixingITKAndNumPy.py``).
+
+The multi-threaded workloads (``median``, ``anti_alias`` and ``cast``) run with
+every number of threads given with ``--threads``, by default the powers of two
+up to the number of cores, and this number. The others run with one thread.
+
+The metrics are named ``<workload>.<size>.t<threads>`` and hold the throughput
+in pixels per second, the median of ``--repeat`` runs following a warm-up run.
+``scaling.<workload>.<size>.t<threads>`` is the scaling efficiency of the
+multi-threaded workloads: their throughput divided by the throughput with one
+thread times the number of threads.
+
+Every size is measured in a new interpreter, importing the wheels given on the
+command line, installed in a temporary directory, or the ``itk`` package of the
+interpreter if no wheel is given. The results are written as JSON (see
+``benchmark_results.py``) and compared with the results of another build with
+``--baseline``, or later with ``benchmark_results.py compare``.
+
+Usage::
+
+    throughput_benchmark.py [-h] [--python PYTHON] [--size SIZE]
+                            [--threads THREADS] [--workload WORKLOAD]
+                            [--repeat REPEAT] [--output OUTPUT]
+                            [--baseline BASELINE]
+                            [--threshold PATTERN=PERCENT]
+                            [wheel ...]
+
+The command exits with status 1 if a metric regressed compared to the
+baseline.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmark_results import (
+    add_metric,
+    environment,
+    install_wheels,
+    new_results,
+    parse_size,
+    parse_thresholds,
+    report_results,
+    run_probe,
+)
+from build_scheduler import cpu_count
+
+WORKLOADS = [
+    "imwrite",
+    "imread",
+    "median",
+    "anti_alias",
+    "cast",
+    "array_view",
+    "array_copy",
+]
+THREADED_WORKLOADS = ["median", "anti_alias", "cast"]
+
+DEFAULT_SIZES = ["256x256", "2048x2048", "64x64x64", "256x256x256"]
+
+# Code run in a new interpreter for each image size. It prints the median time
+# of each workload and number of threads as JSON.
+_PROBE = r"""
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+config = json.loads(sys.argv[1])
+
+import itk
+
+# The image is given in ITK (xyz) order, NumPy arrays are in zyx order
+shape = tuple(reversed(config["size"]))
+center = [(length - 1) / 2.0 for length in shape]
+radius = min(shape) / 3.0
+distance = sum(
+    ((axis - center[dimension]) / radius) ** 2
+    for dimension, axis in enumerate(np.ogrid[tuple(slice(0, n) for n in shape)])
+)
+mask = distance <= 1.0
+del distance
+noise = np.random.default_rng(0).integers(0, 56, size=shape, dtype=np.uint8)
+uc_image = itk.image_from_array(np.where(mask, np.uint8(200), np.uint8(0)) + noise)
+binary_image = itk.image_from_array(mask.astype(np.float32))
+float_image = uc_image.astype(itk.F)
+del mask, noise
+path = os.path.join(config["work_dir"], "image.mha")
+itk.imwrite(uc_image, path)
+
+workloads = {
+    "imwrite": lambda: itk.imwrite(uc_image, path),
+    "imread": lambda: itk.imread(path),
+    "median": lambda: itk.median_image_filter(uc_image, radius=2),
+    "anti_alias": lambda: itk.anti_alias_binary_image_filter(
+        binary_image, number_of_iterations=3
+    ),
+    "cast": lambda: float_image.astype(itk.UC),
+    "array_view": lambda: itk.array_view_from_image(uc_image),
+    "array_copy": lambda: itk.array_from_image(uc_image),
+}
+
+
+def median_time(function):
+    function()
+    times = []
+    for _ in range(config["repeat"]):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+itk.MultiThreaderBase.SetGlobalMaximumNumberOfThreads(max(config["threads"]))
+result = {
+    "python": "%d.%d.%d" % sys.version_info[:3],
+    "itk": itk.Version.GetITKVersion(),
+    "times": [],
+}
+for name in config["workloads"]:
+    threads = config["threads"] if name in config["threaded"] else [1]
+    for count in threads:
+        itk.MultiThreaderBase.SetGlobalDefaultNumberOfThreads(count)
+        result["times"].append([name, count, median_time(workloads[name])])
+print(json.dumps(result))
+"""
+
+
+def default_threads():
+    """Return the powers of two up to the number of cores, and this number."""
+    cores = cpu_count()
+    threads = []
+    count = 1
+    while count < cores:
+        threads.append(count)
+        count *= 2
+    threads.append(cores)
+    return threads
+
+
+def run_size(python_executable, site_dir, work_dir, size, threads, workloads, repeat):
+    config = {
+        "size": size,
+        "threads": threads,
+        "workloads": workloads,
+        "threaded": THREADED_WORKLOADS,
+        "repeat": repeat,
+        "work_dir": work_dir,
+    }
+    return run_probe(
+        python_executable, _PROBE, config, site_dir=site_dir, work_dir=work_dir
+    )
+
+
+def run(
+    wheels,
+    python_executable=None,
+    sizes=None,
+    threads=None,
+    workloads=None,
+    repeat=3,
+):
+    """Return the results of the throughput benchmark of `wheels`, or of the
+    ``itk`` package of `python_executable` if `wheels` is empty.
+
+    `sizes` are lists of image lengths, in ITK order.
+    """
+    python_executable = python_executable or sys.executable
+    sizes = sizes or [parse_size(size) for size in DEFAULT_SIZES]
+    threads = sorted(set(threads or default_threads()))
+    workloads = workloads or WORKLOADS
+    work_dir = tempfile.mkdtemp(prefix="ipp-throughput-benchmark-")
+    try:
+        site_dir = None
+        if wheels:
+            site_dir = os.path.join(work_dir, "site")
+            install_wheels(python_executable, wheels, site_dir)
+        results = None
+        for size in sizes:
+            size_name = "x".join(str(length) for length in size)
+            print("Measuring %s images" % size_name)
+            sys.stdout.flush()
+            result = run_size(
+                python_executable, site_dir, work_dir, size, threads, workloads, repeat
+            )
+            if results is None:
+                results = new_results(
+                    "throughput",
+                    environment(
+                        python=result["python"],
+                        itk=result["itk"],
+                        wheels=sorted(os.path.basename(wheel) for wheel in wheels),
+                        threads=threads,
+                        repeat=repeat,
+                    ),
+                )
+            pixels = 1
+            for length in size:
+                pixels *= length
+            single_thread = {}
+            for name, count, seconds in result["times"]:
+                throughput = pixels / seconds
+                metric = "%s.%s.t%d" % (name, size_name, count)
+                add_metric(results, metric, throughput, "pixels/s", better="higher")
+                if name not in THREADED_WORKLOADS:
+                    continue
+                if count == 1:
+                    single_thread[name] = throughput
+                elif name in single_thread:
+                    add_metric(
+                        results,
+                        "scaling." + metric,
+                        throughput / (count * single_thread[name]),
+                        "ratio",
+                        better="higher",
+                    )
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--python",
+        default=sys.executable,
+        help="Interpreter compatible with the wheels, numpy must be installed",
+    )
+    parser.add_argument(
+        "--size",
+        action="append",
+        default=[],
+        help="Image size, WIDTHxHEIGHT or WIDTHxHEIGHTxDEPTH. Can be repeated "
+        "(default: %s)" % ", ".join(DEFAULT_SIZES),
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        action="append",
+        default=[],
+        help="Number of threads of the multi-threaded workloads. Can be repeated "
+        "(default: powers of two up to the number of cores, and this number)",
+    )
+    parser.add_argument(
+        "--workload",
+        choices=WORKLOADS,
+        action="append",
+        default=[],
+        help="Workload to measure. Can be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Number of runs of each measurement"
+    )
+    parser.add_argument(
+        "--output", default="throughput-benchmark.json", help="Output JSON file"
+    )
+    parser.add_argument(
+        "--baseline",
+        default=None,
+        help="Results of another build to compare with",
+    )
+    parser.add_argument(
+        "--threshold",
+        metavar="PATTERN=PERCENT",
+        action="append",
+        default=[],
+        help="Regression threshold of the metrics matching PATTERN, see "
+        "benchmark_results.py. Can be repeated.",
+    )
+    parser.add_argument(
+        "wheels",
+        metavar="wheel",
+        nargs="*",
+        help="Wheels to benchmark (default: the installed itk package)",
+    )
+    args = parser.parse_args()
+
+    try:
+        sizes = [parse_size(size) for size in args.size]
+        thresholds = parse_thresholds(args.threshold)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.threads and min(args.threads) < 1:
+        parser.error("The number of threads must be positive")
+
+    results = run(
+        args.wheels,
+        python_executable=args.python,
+        sizes=sizes,
+        threads=args.threads,
+        workloads=[name for name in WORKLOADS if name in args.workload],
+        repeat=args.repeat,
+    )
+    report_results(results, args.output, args.baseline, thresholds)
+
+
+if __name__ == "__main__":
+    main()
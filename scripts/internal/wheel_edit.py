@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+
+"""CLI editing the members of a wheel without unpacking and repacking it.
+
+Unpacking a wheel with ``wheel unpack`` and packing it again with ``wheel pack``
+decompresses and recompresses every member, which takes a while for wheels
+containing hundreds of MB of shared libraries, only to rename one file or to
+change the tags listed in ``WHEEL``.
+
+This script writes a new archive in which the compressed data of every
+untouched member is copied verbatim, only renamed or rewritten members are
+recompressed, and ``RECORD`` is updated accordingly. With a Python version
+outside of ``RAW_COPY_PYTHON_VERSIONS``, untouched members are recompressed
+too, through the public ``zipfile`` API.
+
+Usage::
+
+    wheel_edit.py retag [-h] --platform-tag PLATFORM_TAG [--output-dir OUTPUT_DIR]
+                        [--remove] wheel [wheel ...]
+    wheel_edit.py rename [-h] wheel SOURCE DESTINATION
+
+For example, the following changes the platform tag of the ``itk`` meta wheel
+from ``linux_x86_64`` to ``manylinux_2_28_x86_64``::
+
+    wheel_edit.py retag --platform-tag manylinux_2_28_x86_64 --remove \\
+      dist/itk-5.4.0-cp39-cp39-linux_x86_64.whl
+"""
+
+import argparse
+import base64
+import copy
+import csv
+import email
+import hashlib
+import io
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import zipfile
+
+# Layout of the local file header preceding the data of every archive member
+# (see zipfile.structFileHeader).
+LOCAL_HEADER_FORMAT = "<4s2B4HL2L2H"
+LOCAL_HEADER_SIZE = struct.calcsize(LOCAL_HEADER_FORMAT)
+
+# Flag indicating that CRC and sizes follow the data instead of being stored
+# in the local header.
+DATA_DESCRIPTOR_FLAG = 0x08
+
+# Identifier of the extra field holding the 64-bit sizes and offset of a
+# member, written again by zipfile when needed.
+ZIP64_EXTRA_ID = 0x0001
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Copying the compressed data of a member verbatim requires registering it in
+# the archive like ZipFile does, through attributes that are not part of the
+# zipfile API. They were checked for the CPython versions in this range,
+# members are decompressed and compressed again with other versions.
+RAW_COPY_PYTHON_VERSIONS = ((3, 7), (3, 13))
+_RAW_COPY_ATTRIBUTES = ("fp", "filelist", "NameToInfo", "start_dir", "_didModify")
+
+
+def record_digest(sha256):
+    """Return the digest of the ``hashlib.sha256`` object `sha256` in the
+    format used by ``RECORD``."""
+    digest = sha256.digest()
+    return "sha256=" + base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def record_hash(data):
+    """Return the hash of `data` in the format used by ``RECORD``."""
+    return record_digest(hashlib.sha256(data))
+
+
+def dist_info_dir(archive):
+    """Return the name of the ``.dist-info`` directory of the wheel."""
+    for name in archive.namelist():
+        top_level = name.split("/")[0]
+        if top_level.endswith(".dist-info") and name == top_level + "/RECORD":
+            return top_level
+    raise ValueError("%s does not contain a RECORD file" % archive.filename)
+
+
+def read_metadata(wheel_path):
+    """Return the ``METADATA`` of the wheel as an email message."""
+    with zipfile.ZipFile(wheel_path) as archive:
+        metadata_name = dist_info_dir(archive) + "/METADATA"
+        return email.message_from_bytes(archive.read(metadata_name))
+
+
+def parse_wheel_filename(wheel_path):
+    """Return the ``(distribution, version, build, tag)`` components of the
+    name of a wheel, `build` being ``None`` if the name has no build tag."""
+    stem = os.path.basename(wheel_path)[: -len(".whl")]
+    parts = stem.split("-")
+    if len(parts) == 5:
+        return parts[0], parts[1], None, "-".join(parts[2:])
+    if len(parts) == 6:
+        return parts[0], parts[1], parts[2], "-".join(parts[3:])
+    raise ValueError("Invalid wheel filename: %s" % os.path.basename(wheel_path))
+
+
+def strip_zip64_extra(extra):
+    """Return the extra fields `extra` without the ZIP64 field."""
+    fields = []
+    offset = 0
+    while offset + 4 <= len(extra):
+        field_id, size = struct.unpack("<2H", extra[offset : offset + 4])
+        if field_id != ZIP64_EXTRA_ID:
+            fields.append(extra[offset : offset + 4 + size])
+        offset += 4 + size
+    return b"".join(fields) + extra[offset:]
+
+
+def raw_copy_supported(target):
+    """Return ``True`` if compressed data can be copied verbatim to the
+    archive `target`."""
+    low, high = RAW_COPY_PYTHON_VERSIONS
+    return (
+        low <= sys.version_info[:2] <= high
+        and all(hasattr(target, name) for name in _RAW_COPY_ATTRIBUTES)
+        and not getattr(target, "_writing", False)
+    )
+
+
+def _target_info(info, name):
+    target_info = copy.copy(info)
+    target_info.filename = name
+    target_info.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+    target_info.extra = strip_zip64_extra(info.extra)
+    return target_info
+
+
+def _raw_copy_member(source_file, info, target, name):
+    source_file.seek(info.header_offset)
+    header = struct.unpack(LOCAL_HEADER_FORMAT, source_file.read(LOCAL_HEADER_SIZE))
+    source_file.seek(header[10] + header[11], os.SEEK_CUR)
+
+    target_info = _target_info(info, name)
+    target_info.header_offset = target.fp.tell()
+    target.fp.write(target_info.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = source_file.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise ValueError("Truncated member %s" % info.filename)
+        target.fp.write(chunk)
+        remaining -= len(chunk)
+
+    # Register the member like ZipFile.write() does, so that it is listed in
+    # the central directory written when closing the archive.
+    target.filelist.append(target_info)
+    target.NameToInfo[name] = target_info
+    target.start_dir = target.fp.tell()
+    target._didModify = True
+
+
+def copy_member(archive, source_file, info, target, name):
+    """Copy member `info` of `archive` to the archive `target` opened for
+    writing, as `name`.
+
+    The compressed data, read from the raw `source_file`, is copied verbatim
+    if :func:`raw_copy_supported`, otherwise the member is decompressed and
+    compressed again with the same method.
+    """
+    if raw_copy_supported(target):
+        _raw_copy_member(source_file, info, target, name)
+        return
+    target_info = _target_info(info, name)
+    with archive.open(info) as source, target.open(
+        target_info, "w", force_zip64=info.file_size > zipfile.ZIP64_LIMIT
+    ) as destination:
+        shutil.copyfileobj(source, destination, COPY_CHUNK_SIZE)
+
+
+def edit_wheel(
+    wheel_path, output_path=None, renames=None, contents=None, files=None, removals=()
+):
+    """Write a copy of `wheel_path` with members renamed, rewritten and
+    removed.
+
+    `renames` maps member names to their new name, `contents` maps member
+    names (after renaming) to their new content and `files` to the path of
+    the file holding their new content, members not found in the wheel are
+    added. Members named in `removals` are left out. Other members are copied
+    with :func:`copy_member` and ``RECORD`` is updated. If `output_path` is
+    ``None``, the wheel is edited in place.
+
+    Return the path of the written wheel.
+    """
+    renames = dict(renames or {})
+    contents = dict(contents or {})
+    files = dict(files or {})
+    removals = set(removals)
+    if output_path is None:
+        output_path = wheel_path
+
+    with zipfile.ZipFile(wheel_path) as archive:
+        record_name = dist_info_dir(archive) + "/RECORD"
+        missing = [name for name in renames if name not in archive.NameToInfo]
+        if missing:
+            raise KeyError(
+                "%s does not contain %s" % (wheel_path, ", ".join(sorted(missing)))
+            )
+
+        rows = {}
+        for row in csv.reader(io.TextIOWrapper(archive.open(record_name), "utf-8")):
+            if row:
+                rows[row[0]] = row
+
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        handle, temp_path = tempfile.mkstemp(
+            prefix=".wheel-edit-", suffix=".whl", dir=output_dir
+        )
+        os.close(handle)
+        try:
+            with open(wheel_path, "rb") as source_file, zipfile.ZipFile(
+                temp_path, "w", compression=zipfile.ZIP_DEFLATED
+            ) as target:
+                record = []
+                for info in archive.infolist():
+                    if info.filename == record_name:
+                        continue
+                    name = renames.get(info.filename, info.filename)
+                    row = rows.get(info.filename, [name, "", ""])
+                    if name in contents or name in files or name in removals:
+                        continue
+                    copy_member(archive, source_file, info, target, name)
+                    record.append([name] + row[1:])
+                for name, data in contents.items():
+                    if isinstance(data, str):
+                        data = data.encode("utf-8")
+                    info = archive.NameToInfo.get(name)
+                    for old_name, new_name in renames.items():
+                        if new_name == name:
+                            info = archive.NameToInfo[old_name]
+                    if info is not None:
+                        info = _target_info(info, name)
+                        info.compress_type = zipfile.ZIP_DEFLATED
+                        target.writestr(info, data)
+                    else:
+                        target.writestr(name, data)
+                    record.append([name, record_hash(data), str(len(data))])
+                for name, path in files.items():
+                    info = zipfile.ZipInfo.from_file(path, name)
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    sha256 = hashlib.sha256()
+                    with open(path, "rb") as source, target.open(
+                        info, "w", force_zip64=info.file_size > zipfile.ZIP64_LIMIT
+                    ) as destination:
+                        for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b""):
+                            sha256.update(chunk)
+                            destination.write(chunk)
+                    record.append([name, record_digest(sha256), str(info.file_size)])
+                record.append([record_name, "", ""])
+                record_file = io.StringIO()
+                csv.writer(record_file, lineterminator="\n").writerows(record)
+                target.writestr(record_name, record_file.getvalue())
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    # Replaced once the source archive is closed, which is required on Windows
+    # when editing in place.
+    shutil.copymode(wheel_path, temp_path)
+    os.replace(temp_path, output_path)
+    return output_path
+
+
+def rename_member(wheel_path, source, destination):
+    """Rename member `source` of `wheel_path` in place. Return ``False`` if
+    the wheel does not contain `source`."""
+    with zipfile.ZipFile(wheel_path) as archive:
+        if source not in archive.NameToInfo:
+            return False
+    edit_wheel(wheel_path, renames={source: destination})
+    return True
+
+
+def retag_edit(wheel_path, platform_tag, output_dir=None):
+    """Return the path of the copy of `wheel_path` whose platform tag is
+    `platform_tag`, in `output_dir`, and the :func:`edit_wheel` `contents`
+    updating the ``Tag`` entries of ``WHEEL`` accordingly."""
+    distribution, version, build, tag = parse_wheel_filename(wheel_path)
+    python_tag, abi_tag = tag.split("-")[:2]
+    new_tag = "-".join([python_tag, abi_tag, platform_tag])
+    name_parts = [distribution, version] + ([build] if build else []) + [new_tag]
+    if output_dir is None:
+        output_dir = os.path.dirname(os.path.abspath(wheel_path))
+    output_path = os.path.join(output_dir, "-".join(name_parts) + ".whl")
+
+    with zipfile.ZipFile(wheel_path) as archive:
+        wheel_name = dist_info_dir(archive) + "/WHEEL"
+        lines = archive.read(wheel_name).decode("utf-8").splitlines()
+    tags = [
+        "-".join([python, abi, platform_tag])
+        for python in python_tag.split(".")
+        for abi in abi_tag.split(".")
+    ]
+    lines = [line for line in lines if not line.startswith("Tag:")]
+    while lines and not lines[-1].strip():
+        lines.pop()
+    lines += ["Tag: %s" % tag for tag in tags]
+    return output_path, {wheel_name: "\n".join(lines) + "\n\n"}
+
+
+def retag_wheel(wheel_path, platform_tag, output_dir=None):
+    """Write a copy of `wheel_path` whose platform tag is `platform_tag`,
+    updating both its filename and the ``Tag`` entries of ``WHEEL``.
+
+    Return the path of the written wheel.
+    """
+    output_path, contents = retag_edit(wheel_path, platform_tag, output_dir)
+    return edit_wheel(wheel_path, output_path, contents=contents)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    retag_parser = subparsers.add_parser(
+        "retag", help="Change the platform tag of wheels"
+    )
+    retag_parser.add_argument("--platform-tag", required=True)
+    retag_parser.add_argument(
+        "--output-dir",
+        default=None,
+        help="Directory receiving the wheels (default: directory of each wheel)",
+    )
+    retag_parser.add_argument(
+        "--remove", action="store_true", help="Remove the original wheels"
+    )
+    retag_parser.add_argument("wheels", nargs="+")
+
+    rename_parser = subparsers.add_parser(
+        "rename", help="Rename a member of a wheel in place"
+    )
+    rename_parser.add_argument("wheel")
+    rename_parser.add_argument("source")
+    rename_parser.add_argument("destination")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "retag":
+            for wheel_path in args.wheels:
+                output_path = retag_wheel(
+                    wheel_path, args.platform_tag, args.output_dir
+                )
+                print("Wrote %s" % output_path)
+                if args.remove and os.path.abspath(output_path) != os.path.abspath(
+                    wheel_path
+                ):
+                    os.remove(wheel_path)
+        elif args.command == "rename":
+            if not rename_member(args.wheel, args.source, args.destination):
+                print("%s does not contain %s" % (args.wheel, args.source))
+    except (KeyError, ValueError) as exc:
+        print("error: %s" % exc, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+
+"""CLI packaging the ITK group wheels of one interpreter concurrently.
+
+Once the wrapped ITK tree of an interpreter is built, every group wheel
+(``itk-core``, ``itk-io``, ...) is produced by a ``python -m build`` call that
+re-uses that tree (``ITKPythonPackage_ITK_BINARY_REUSE``) and only installs
+the components associated with the wheel. These calls are independent from
+each other but can not share the ``pyproject.toml`` and build directory of the
+``ITKPythonPackage`` source tree.
+
+This script gives each wheel its own staged source directory, containing its
+configured ``pyproject.toml`` and links to the ``ITKPythonPackage`` sources,
+and its own build directory. The wheels are then packaged by a bounded pool of
+workers. A wheel failing to build does not stop the others: the outcome of
+every wheel is reported once all of them are done.
+
+Usage::
+
+    wheel_packaging.py [-h] [--python PYTHON] [--jobs JOBS]
+                       [--output-dir OUTPUT_DIR] [--staging-dir STAGING_DIR]
+                       [--log-dir LOG_DIR] [--wheel-names WHEEL_NAME ...]
+                       [--wrapping-profile WRAPPING_PROFILE]
+                       [-- BUILD_ARGS ...]
+
+Arguments following ``--`` are passed to ``python -m build``, for example::
+
+    wheel_packaging.py --output-dir dist -- \\
+      --config-setting=cmake.define.ITK_BINARY_DIR:PATH=/work/ITK-cp39-cp39-manylinux_2_28_x64
+"""
+
+import argparse
+import concurrent.futures
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from build_trace import Span, current_track
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, "..", ".."))
+
+# Entries of the ITKPythonPackage source tree needed to package a wheel.
+STAGED_ENTRIES = [
+    "CMakeLists.txt",
+    "cmake",
+    "scripts",
+    "itkVersion.py",
+    "LICENSE",
+    "README.md",
+    "ITK-source",
+]
+
+# Number of lines of a failed build log displayed in the summary.
+LOG_TAIL_LINES = 40
+
+
+def get_wheel_names(root_dir=ROOT_DIR):
+    with open(os.path.join(root_dir, "scripts", "WHEEL_NAMES.txt"), "r") as _file:
+        return [line.strip() for line in _file.readlines() if line.strip()]
+
+
+def default_jobs(wheel_count):
+    """Return the number of wheels packaged at the same time.
+
+    Packaging mostly installs already built files, a small number of workers
+    is enough to keep the disk busy. ``ITK_WHEEL_PACKAGING_JOBS`` overrides
+    the default.
+    """
+    jobs = int(os.environ.get("ITK_WHEEL_PACKAGING_JOBS", "0"))
+    if jobs <= 0:
+        jobs = min(4, os.cpu_count() or 1)
+    return max(1, min(jobs, wheel_count))
+
+
+def link_path(source, destination):
+    """Make `destination` point to `source`.
+
+    Symbolic links are used when possible. On Windows, where creating them
+    requires privileges, directories are linked using junctions and files are
+    copied.
+    """
+    if os.path.islink(destination) and os.readlink(destination) == source:
+        return
+    if os.path.lexists(destination):
+        if os.path.islink(destination) or os.path.isfile(destination):
+            os.remove(destination)
+        else:
+            shutil.rmtree(destination)
+    try:
+        os.symlink(source, destination, target_is_directory=os.path.isdir(source))
+    except OSError:
+        if os.path.isdir(source):
+            subprocess.check_call(["cmd", "/c", "mklink", "/J", destination, source])
+        else:
+            shutil.copy2(source, destination)
+
+
+def stage_source_dirs(
+    python_executable,
+    wheel_names,
+    staging_dir,
+    root_dir=ROOT_DIR,
+    wrapping_profile=None,
+):
+    """Create the source directory used to package each of `wheel_names` and
+    return a dictionary associating wheel names with these directories.
+
+    The ``pyproject.toml`` files of all wheels are configured by a single
+    ``pyproject_configure.py --all`` call, which leaves unchanged files
+    untouched so that existing build directories can be re-used. They select
+    `wrapping_profile`, or the profile named by ``ITK_WRAPPING_PROFILE`` if it
+    is ``None``.
+    """
+    source_dirs = {}
+    for wheel_name in wheel_names:
+        source_dir = os.path.join(staging_dir, wheel_name)
+        os.makedirs(source_dir, exist_ok=True)
+        for entry in STAGED_ENTRIES:
+            source = os.path.join(root_dir, entry)
+            if os.path.exists(source):
+                link_path(source, os.path.join(source_dir, entry))
+        source_dirs[wheel_name] = source_dir
+    profile_args = []
+    if wrapping_profile:
+        profile_args = ["--wrapping-profile", wrapping_profile]
+    subprocess.check_call(
+        [
+            python_executable,
+            os.path.join(root_dir, "scripts", "pyproject_configure.py"),
+            "--all",
+            "--output-dir",
+            staging_dir,
+        ]
+        + profile_args
+        + list(wheel_names)
+    )
+    return source_dirs
+
+
+class WheelBuild(object):
+    """Outcome of the packaging of one wheel."""
+
+    def __init__(self, wheel_name, log_path):
+        self.wheel_name = wheel_name
+        self.log_path = log_path
+        self.returncode = None
+        self.duration = 0.0
+
+    @property
+    def succeeded(self):
+        return self.returncode == 0
+
+
+def package_wheel(python_executable, source_dir, output_dir, build_args, build):
+    """Run ``python -m build`` for the staged `source_dir`, writing its output
+    to the log of `build`."""
+    command = [
+        python_executable,
+        "-m",
+        "build",
+        "--verbose",
+        "--wheel",
+        "--outdir",
+        output_dir,
+        "--no-isolation",
+        "--skip-dependency-check",
+        "--config-setting=build-dir=%s"
+        % os.path.join(source_dir, "build", "{wheel_tag}").replace("\\", "/"),
+        "--config-setting=cmake.define.ITKPythonPackage_WHEEL_NAME:STRING=%s"
+        % build.wheel_name,
+    ]
+    command += list(build_args) + [source_dir]
+    start_time = time.time()
+    span = Span(
+        "package-wheel",
+        track="%s/%s" % (current_track(), build.wheel_name),
+        wheel=build.wheel_name,
+        log=build.log_path,
+    ).begin()
+    with open(build.log_path, "w") as log_file:
+        log_file.write(" ".join(command) + "\n")
+        log_file.flush()
+        build.returncode = subprocess.call(
+            command,
+            cwd=source_dir,
+            env=span.environ(),
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+        )
+    span.finish(build.returncode)
+    build.duration = time.time() - start_time
+    return build
+
+
+def package_wheels(
+    python_executable,
+    build_args,
+    wheel_names=None,
+    output_dir="dist",
+    staging_dir=None,
+    log_dir=None,
+    jobs=None,
+    root_dir=ROOT_DIR,
+    wrapping_profile=None,
+):
+    """Package `wheel_names` concurrently and return the list of
+    :class:`WheelBuild` in the order of `wheel_names`."""
+    if wheel_names is None:
+        wheel_names = get_wheel_names(root_dir)
+    if staging_dir is None:
+        staging_dir = os.path.join(root_dir, "build", "wheels")
+    if log_dir is None:
+        log_dir = os.path.join(staging_dir, "logs")
+    if jobs is None:
+        jobs = default_jobs(len(wheel_names))
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(log_dir, exist_ok=True)
+
+    # Staging is fast and writes into the shared staging directory, it is
+    # done before starting the workers.
+    source_dirs = stage_source_dirs(
+        python_executable, wheel_names, staging_dir, root_dir, wrapping_profile
+    )
+
+    print(
+        "Packaging %d wheel(s) using %d worker(s), logs are written in %s"
+        % (len(wheel_names), jobs, log_dir)
+    )
+    sys.stdout.flush()
+
+    builds = [
+        WheelBuild(wheel_name, os.path.join(log_dir, "%s.log" % wheel_name))
+        for wheel_name in wheel_names
+    ]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(
+                package_wheel,
+                python_executable,
+                source_dirs[build.wheel_name],
+                output_dir,
+                build_args,
+                build,
+            )
+            for build in builds
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            build = future.result()
+            print(
+                "[%s] %s in %.1fs"
+                % (
+                    build.wheel_name,
+                    "Packaged" if build.succeeded else "FAILED",
+                    build.duration,
+                )
+            )
+            sys.stdout.flush()
+    return builds
+
+
+def print_summary(builds):
+    for build in builds:
+        if build.succeeded:
+            continue
+        print("")
+        print("Last lines of %s:" % build.log_path)
+        with open(build.log_path, "r") as log_file:
+            lines = log_file.readlines()
+        sys.stdout.writelines(lines[-LOG_TAIL_LINES:])
+    print("")
+    print("Wheel packaging summary:")
+    for build in builds:
+        status = "OK" if build.succeeded else "FAILED"
+        print("  %-20s %-7s %8.1fs" % (build.wheel_name, status, build.duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--python",
+        default=sys.executable,
+        help="Python interpreter used to package the wheels",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of wheels packaged at the same time "
+        "(default: ITK_WHEEL_PACKAGING_JOBS or up to 4)",
+    )
+    parser.add_argument(
+        "--output-dir", default="dist", help="Directory receiving the wheels"
+    )
+    parser.add_argument(
+        "--staging-dir",
+        default=None,
+        help="Directory containing the source and build directory of each "
+        "wheel (default: <root>/build/wheels)",
+    )
+    parser.add_argument(
+        "--log-dir",
+        default=None,
+        help="Directory where packaging logs are written "
+        "(default: <staging-dir>/logs)",
+    )
+    parser.add_argument(
+        "--wheel-names",
+        nargs="+",
+        default=None,
+        help="Wheels to package (default: all wheels of WHEEL_NAMES.txt)",
+    )
+    parser.add_argument(
+        "--wrapping-profile",
+        default=None,
+        help="Wrapping profile of the wheels (default: ITK_WRAPPING_PROFILE or "
+        "full)",
+    )
+    parser.add_argument(
+        "build_args",
+        nargs=argparse.REMAINDER,
+        help="Arguments passed to 'python -m build' after '--'",
+    )
+    args = parser.parse_args()
+
+    build_args = args.build_args
+    if build_args and build_args[0] == "--":
+        build_args = build_args[1:]
+
+    builds = package_wheels(
+        args.python,
+        build_args,
+        wheel_names=args.wheel_names,
+        output_dir=args.output_dir,
+        staging_dir=args.staging_dir,
+        log_dir=args.log_dir,
+        jobs=args.jobs,
+        wrapping_profile=args.wrapping_profile,
+    )
+    print_summary(builds)
+    if not all(build.succeeded for build in builds):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
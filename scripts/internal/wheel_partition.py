@@ -0,0 +1,632 @@
+#!/usr/bin/env python
+
+"""CLI computing and displaying the partition of ITK modules into wheels.
+
+When configuring a group wheel (``itk-core``, ``itk-io``, ...), the
+``ITKPythonPackage`` project associates every ITK module with exactly one
+wheel. This partition only depends on the ITK sources, the ITK build
+configuration and the wheel definitions. It is computed once per ITK build
+tree and stored in a JSON manifest (``ITKPythonPackageWheelPartition.json`` in
+the ITK build directory by default) re-used by the configuration of every
+other wheel.
+
+Usage::
+
+    wheel_partition.py manifest [-h] --itk-source-dir ITK_SOURCE_DIR
+                                --itk-binary-dir ITK_BINARY_DIR
+                                [--manifest MANIFEST] [--force]
+                                [--cmake CMAKE]
+    wheel_partition.py show [-h] manifest
+    wheel_partition.py sizes [-h] --itk-binary-dir ITK_BINARY_DIR
+                             [--manifest MANIFEST] [--output OUTPUT]
+                             [--jobs JOBS] [--cmake CMAKE]
+    wheel_partition.py optimize [-h] --manifest MANIFEST --sizes SIZES
+                                [--workloads WORKLOADS]
+                                [--workload NAME=MODULE[,MODULE...]]
+                                [--pin MODULE=GROUP] [--no-default-pins]
+                                [--output OUTPUT]
+
+``manifest`` computes the manifest, unless it is up-to-date, by running a
+partition-only configuration of the ``ITKPythonPackage`` project.
+``show`` displays the modules packaged in each wheel.
+
+``sizes`` measures the installed size of the ``<module>PythonWheelRuntimeLibraries``
+component of every module.
+
+``optimize`` proposes a partition minimizing the bytes installed by a set of
+workloads. A workload lists the ITK modules it uses, it installs ``itk-core``,
+the wheels containing these modules and the wheels they depend on. Workloads
+are read from a JSON file associating each workload name with either a list of
+modules or an object ``{"modules": [...], "weight": <weight>}``. Starting from
+the current partition, modules are moved between wheels as long as the
+weighted total decreases and the partition stays valid: the dependencies of a
+module are packaged in its wheel or in a wheel it depends on. The dependencies
+between wheels are not modified.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, "..", ".."))
+
+MANIFEST_NAME = "ITKPythonPackageWheelPartition.json"
+
+# Modules explicitly packaged in itk-core by CMakeLists.txt regardless of the
+# modules depending on them. They are kept there unless --no-default-pins is
+# given.
+DEFAULT_PINNED_MODULES = {"ITKBridgeNumPy": "Core", "ITKVTK": "Core"}
+
+# Group installed by every workload, it provides the "itk" Python package.
+BASE_GROUP = "Core"
+
+# Groups not allowed to contain modules: itk-meta is a pure Python wheel only
+# depending on the other wheels.
+EMPTY_GROUPS = ["Meta"]
+
+
+def default_manifest_path(itk_binary_dir):
+    return os.path.join(itk_binary_dir, MANIFEST_NAME)
+
+
+def load_manifest(manifest_path):
+    """Return the content of a wheel partition manifest."""
+    with open(manifest_path, "r") as file_:
+        return json.load(file_)
+
+
+def group_to_wheel(group):
+    return "itk-%s" % group.lower()
+
+
+def compute_manifest(
+    itk_source_dir,
+    itk_binary_dir,
+    manifest_path=None,
+    force=False,
+    cmake_executable="cmake",
+):
+    """Write the wheel partition manifest associated with an ITK build tree
+    and return its path.
+
+    The manifest is only recomputed if it is missing, out-of-date or if
+    `force` is True.
+    """
+    if manifest_path is None:
+        manifest_path = default_manifest_path(itk_binary_dir)
+    build_dir = tempfile.mkdtemp(prefix="ipp-wheel-partition-")
+    # Nothing is built, prefer the generator with the fastest configuration.
+    generator_args = []
+    if shutil.which("ninja"):
+        generator_args = ["-G", "Ninja"]
+    try:
+        subprocess.check_call(
+            [cmake_executable]
+            + generator_args
+            + [
+                "-S",
+                ROOT_DIR,
+                "-B",
+                build_dir,
+                "-DITKPythonPackage_SUPERBUILD:BOOL=0",
+                "-DITKPythonPackage_WHEEL_NAME:STRING=itk-core",
+                "-DITKPythonPackage_WHEEL_PARTITION_ONLY:BOOL=ON",
+                "-DITKPythonPackage_WHEEL_PARTITION_FORCE:BOOL=%s"
+                % ("ON" if force else "OFF"),
+                "-DITKPythonPackage_WHEEL_PARTITION_MANIFEST:FILEPATH=%s"
+                % os.path.abspath(manifest_path),
+                "-DITK_SOURCE_DIR:PATH=%s" % os.path.abspath(itk_source_dir),
+                "-DITK_BINARY_DIR:PATH=%s" % os.path.abspath(itk_binary_dir),
+            ]
+        )
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return manifest_path
+
+
+def print_manifest(manifest):
+    print("Wheel partition [key: %s]" % manifest["key"])
+    for group in manifest["wheel_groups"]:
+        modules = manifest["wheels"][group]
+        print("")
+        print(
+            "%s (%d module(s), depends on: %s)"
+            % (
+                group_to_wheel(group),
+                len(modules),
+                ", ".join(
+                    group_to_wheel(dep) for dep in manifest["group_depends"][group]
+                )
+                or "-",
+            )
+        )
+        for module in modules:
+            print("  %s" % module)
+
+
+def directory_size(path):
+    """Return the total size in bytes of the files below `path`."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.lstat(os.path.join(root, name)).st_size
+    return total
+
+
+def measure_component_size(itk_binary_dir, module, cmake_executable="cmake"):
+    """Return the installed size in bytes of the Python wheel component of
+    `module`."""
+    prefix = tempfile.mkdtemp(prefix="ipp-component-size-")
+    try:
+        subprocess.check_call(
+            [
+                cmake_executable,
+                "--install",
+                itk_binary_dir,
+                "--component",
+                "%sPythonWheelRuntimeLibraries" % module,
+                "--prefix",
+                prefix,
+                "--strip",
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+        return directory_size(prefix)
+    finally:
+        shutil.rmtree(prefix, ignore_errors=True)
+
+
+def measure_sizes(itk_binary_dir, modules, jobs=None, cmake_executable="cmake"):
+    """Return a dictionary associating each of `modules` with its installed
+    size in bytes."""
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        sizes = executor.map(
+            lambda module: measure_component_size(
+                itk_binary_dir, module, cmake_executable
+            ),
+            modules,
+        )
+        return dict(zip(modules, sizes))
+
+
+class Partition(object):
+    """Association of modules with wheel groups, and the wheel group
+    dependency graph it must comply with."""
+
+    def __init__(self, manifest, sizes):
+        self.groups = list(manifest["wheel_groups"])
+        self.group_depends = manifest["group_depends"]
+        self.module_depends = {
+            module: [dep for dep in info["depends"] if dep in manifest["modules"]]
+            for module, info in manifest["modules"].items()
+        }
+        self.module_dependees = {module: [] for module in self.module_depends}
+        for module, depends in self.module_depends.items():
+            for dep in depends:
+                self.module_dependees[dep].append(module)
+        self.sizes = sizes
+        # Groups installed along with each group, including itself.
+        self.closures = {group: self._closure(group) for group in self.groups}
+
+    def _closure(self, group):
+        closure = set([group])
+        pending = [group]
+        while pending:
+            for dep in self.group_depends.get(pending.pop(), []):
+                if dep not in closure:
+                    closure.add(dep)
+                    pending.append(dep)
+        return closure
+
+    def is_valid_move(self, assignment, modules, group):
+        """Return True if moving `modules` into `group` keeps the
+        dependencies of every module satisfied."""
+        moved = set(modules)
+
+        def group_of(module):
+            return group if module in moved else assignment[module]
+
+        for module in moved:
+            for dep in self.module_depends[module]:
+                if group_of(dep) not in self.closures[group]:
+                    return False
+            for dependee in self.module_dependees[module]:
+                if group not in self.closures[group_of(dependee)]:
+                    return False
+        return True
+
+    def unsatisfied_dependencies(self, assignment):
+        """Return the ``(module, dependency)`` pairs for which the dependency
+        is not packaged in the wheel of the module or a wheel it depends on."""
+        return [
+            (module, dep)
+            for module, depends in sorted(self.module_depends.items())
+            for dep in depends
+            if assignment[dep] not in self.closures[assignment[module]]
+        ]
+
+    def group_sizes(self, assignment):
+        sizes = dict((group, 0) for group in self.groups)
+        for module, group in assignment.items():
+            sizes[group] += self.sizes.get(module, 0)
+        return sizes
+
+    def installed_groups(self, assignment, workload_modules):
+        groups = set(self.closures.get(BASE_GROUP, [BASE_GROUP]))
+        for module in workload_modules:
+            groups |= self.closures[assignment[module]]
+        return groups
+
+    def workload_bytes(self, assignment, workload_modules, group_sizes=None):
+        if group_sizes is None:
+            group_sizes = self.group_sizes(assignment)
+        return sum(
+            group_sizes[group]
+            for group in self.installed_groups(assignment, workload_modules)
+        )
+
+    def cost(self, assignment, workloads):
+        group_sizes = self.group_sizes(assignment)
+        return sum(
+            workload["weight"]
+            * self.workload_bytes(assignment, workload["modules"], group_sizes)
+            for workload in workloads.values()
+        )
+
+    def same_group_dependees(self, assignment, module):
+        """Return `module` and the modules of its group depending on it,
+        directly or not."""
+        group = assignment[module]
+        result = [module]
+        seen = set(result)
+        index = 0
+        while index < len(result):
+            for dependee in self.module_dependees[result[index]]:
+                if dependee not in seen and assignment[dependee] == group:
+                    seen.add(dependee)
+                    result.append(dependee)
+            index += 1
+        return result
+
+
+def optimize(partition, assignment, workloads, pinned=None, max_passes=100):
+    """Return an assignment improving `assignment` for `workloads` using a
+    greedy local search.
+
+    Every pass considers moving each module, alone or along with the modules
+    of its wheel depending on it, into every other wheel group and applies the
+    best valid move, until no move reduces the cost.
+    """
+    if pinned is None:
+        pinned = {}
+    assignment = dict(assignment)
+    for module, group in pinned.items():
+        if module in assignment:
+            assignment[module] = group
+    cost = partition.cost(assignment, workloads)
+    for _ in range(max_passes):
+        best = None
+        for module in sorted(assignment):
+            if module in pinned:
+                continue
+            candidates = [[module]]
+            dependees = partition.same_group_dependees(assignment, module)
+            if len(dependees) > 1 and not any(dep in pinned for dep in dependees):
+                candidates.append(dependees)
+            for modules in candidates:
+                for group in partition.groups:
+                    if group == assignment[module] or group in EMPTY_GROUPS:
+                        continue
+                    if not partition.is_valid_move(assignment, modules, group):
+                        continue
+                    moved = dict(assignment)
+                    for moved_module in modules:
+                        moved[moved_module] = group
+                    moved_cost = partition.cost(moved, workloads)
+                    if moved_cost < cost and (best is None or moved_cost < best[0]):
+                        best = (moved_cost, moved)
+        if best is None:
+            break
+        cost, assignment = best
+    return assignment
+
+
+def load_workloads(workloads_file=None, workload_args=None):
+    """Return a dictionary associating workload names with a dictionary
+    providing their ``modules`` and ``weight``."""
+    workloads = {}
+    if workloads_file:
+        with open(workloads_file, "r") as file_:
+            for name, value in json.load(file_).items():
+                if isinstance(value, list):
+                    value = {"modules": value}
+                workloads[name] = {
+                    "modules": list(value["modules"]),
+                    "weight": float(value.get("weight", 1.0)),
+                }
+    for workload_arg in workload_args or []:
+        name, _, modules = workload_arg.partition("=")
+        workloads[name] = {
+            "modules": [module for module in modules.split(",") if module],
+            "weight": 1.0,
+        }
+    return workloads
+
+
+def parse_pins(values, manifest):
+    """Return the dictionary associating modules with the wheel group they
+    are pinned to by the ``MODULE=GROUP`` `values`.
+
+    Raise ``ValueError`` if a module is not in `manifest` or a group can not
+    receive modules.
+    """
+    groups = [group for group in manifest["wheel_groups"] if group not in EMPTY_GROUPS]
+    pinned = {}
+    for value in values:
+        module, separator, group = value.partition("=")
+        if not separator or not module or not group:
+            raise ValueError("Invalid pin '%s', expected MODULE=GROUP" % value)
+        if module not in manifest["modules"]:
+            raise ValueError("Invalid pin '%s': unknown module %s" % (value, module))
+        if group not in groups:
+            raise ValueError(
+                "Invalid pin '%s': unknown wheel group %s, expected one of: %s"
+                % (value, group, ", ".join(groups))
+            )
+        pinned[module] = group
+    return pinned
+
+
+def format_size(size):
+    return "%.1f MiB" % (size / (1024.0 * 1024.0))
+
+
+def print_comparison(partition, current, proposed, workloads):
+    current_sizes = partition.group_sizes(current)
+    proposed_sizes = partition.group_sizes(proposed)
+
+    def count(assignment, group):
+        return sum(1 for value in assignment.values() if value == group)
+
+    print("")
+    print(
+        "%-20s %9s %12s %9s %12s"
+        % ("WHEEL", "MODULES", "CURRENT", "MODULES", "PROPOSED")
+    )
+    for group in partition.groups:
+        print(
+            "%-20s %9d %12s %9d %12s"
+            % (
+                group_to_wheel(group),
+                count(current, group),
+                format_size(current_sizes[group]),
+                count(proposed, group),
+                format_size(proposed_sizes[group]),
+            )
+        )
+
+    print("")
+    print(
+        "%-30s %6s %12s %12s %8s"
+        % ("WORKLOAD", "WEIGHT", "CURRENT", "PROPOSED", "CHANGE")
+    )
+    for name, workload in sorted(workloads.items()):
+        before = partition.workload_bytes(current, workload["modules"], current_sizes)
+        after = partition.workload_bytes(proposed, workload["modules"], proposed_sizes)
+        print(
+            "%-30s %6.1f %12s %12s %7.1f%%"
+            % (
+                name,
+                workload["weight"],
+                format_size(before),
+                format_size(after),
+                100.0 * (after - before) / before if before else 0.0,
+            )
+        )
+
+    moves = sorted(
+        (module, current[module], proposed[module])
+        for module in current
+        if current[module] != proposed[module]
+    )
+    print("")
+    print("%d module(s) moved:" % len(moves))
+    for module, before, after in moves:
+        print(
+            "  %-40s %s -> %s (%s)"
+            % (
+                module,
+                group_to_wheel(before),
+                group_to_wheel(after),
+                format_size(partition.sizes.get(module, 0)),
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    manifest_parser = subparsers.add_parser(
+        "manifest", help="Compute the wheel partition manifest of an ITK build tree"
+    )
+    manifest_parser.add_argument("--itk-source-dir", required=True)
+    manifest_parser.add_argument("--itk-binary-dir", required=True)
+    manifest_parser.add_argument(
+        "--manifest",
+        default=None,
+        help="Manifest path (default: <itk-binary-dir>/%s)" % MANIFEST_NAME,
+    )
+    manifest_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Compute the partition even if the manifest is up-to-date",
+    )
+    manifest_parser.add_argument("--cmake", default="cmake", help="CMake executable")
+
+    show_parser = subparsers.add_parser(
+        "show", help="Display the modules packaged in each wheel"
+    )
+    show_parser.add_argument("manifest")
+
+    sizes_parser = subparsers.add_parser(
+        "sizes", help="Measure the installed size of the component of every module"
+    )
+    sizes_parser.add_argument("--itk-binary-dir", required=True)
+    sizes_parser.add_argument(
+        "--manifest",
+        default=None,
+        help="Manifest listing the modules (default: <itk-binary-dir>/%s)"
+        % MANIFEST_NAME,
+    )
+    sizes_parser.add_argument(
+        "--output", default="wheel-partition-sizes.json", help="Output JSON file"
+    )
+    sizes_parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of concurrent installs"
+    )
+    sizes_parser.add_argument("--cmake", default="cmake", help="CMake executable")
+
+    optimize_parser = subparsers.add_parser(
+        "optimize", help="Propose a partition minimizing the bytes installed"
+    )
+    optimize_parser.add_argument("--manifest", required=True)
+    optimize_parser.add_argument(
+        "--sizes", required=True, help="JSON file written by the 'sizes' command"
+    )
+    optimize_parser.add_argument(
+        "--workloads", default=None, help="JSON file describing the workloads"
+    )
+    optimize_parser.add_argument(
+        "--workload",
+        action="append",
+        default=[],
+        metavar="NAME=MODULE[,MODULE...]",
+        help="Workload using the given modules, may be repeated",
+    )
+    optimize_parser.add_argument(
+        "--pin",
+        action="append",
+        default=[],
+        metavar="MODULE=GROUP",
+        help="Keep MODULE in wheel group GROUP (e.g. ITKVTK=Core)",
+    )
+    optimize_parser.add_argument(
+        "--no-default-pins",
+        action="store_true",
+        help="Allow moving %s" % ", ".join(sorted(DEFAULT_PINNED_MODULES)),
+    )
+    optimize_parser.add_argument(
+        "--output", default=None, help="Write the proposed partition as JSON"
+    )
+    args = parser.parse_args()
+
+    if args.command == "manifest":
+        try:
+            manifest_path = compute_manifest(
+                args.itk_source_dir,
+                args.itk_binary_dir,
+                manifest_path=args.manifest,
+                force=args.force,
+                cmake_executable=args.cmake,
+            )
+        except subprocess.CalledProcessError as exc:
+            print("error: %s" % exc, file=sys.stderr)
+            sys.exit(1)
+        print_manifest(load_manifest(manifest_path))
+    elif args.command == "show":
+        print_manifest(load_manifest(args.manifest))
+    elif args.command == "sizes":
+        manifest = load_manifest(
+            args.manifest or default_manifest_path(args.itk_binary_dir)
+        )
+        sizes = measure_sizes(
+            args.itk_binary_dir,
+            sorted(manifest["modules"]),
+            jobs=args.jobs,
+            cmake_executable=args.cmake,
+        )
+        with open(args.output, "w") as file_:
+            json.dump(sizes, file_, indent=2, sort_keys=True)
+        print(
+            "Wrote sizes of %d module(s) [%s] to %s"
+            % (len(sizes), format_size(sum(sizes.values())), args.output)
+        )
+    elif args.command == "optimize":
+        manifest = load_manifest(args.manifest)
+        with open(args.sizes, "r") as file_:
+            sizes = json.load(file_)
+        workloads = load_workloads(args.workloads, args.workload)
+        if not workloads:
+            parser.error("at least one workload is required")
+        current = {
+            module: info["wheel_group"] for module, info in manifest["modules"].items()
+        }
+        for workload_name, workload in workloads.items():
+            unknown = [
+                module for module in workload["modules"] if module not in current
+            ]
+            if unknown:
+                parser.error(
+                    "workload '%s' uses unknown module(s): %s"
+                    % (workload_name, ", ".join(unknown))
+                )
+        pinned = {} if args.no_default_pins else dict(DEFAULT_PINNED_MODULES)
+        try:
+            pinned.update(parse_pins(args.pin, manifest))
+        except ValueError as exc:
+            parser.error(str(exc))
+
+        partition = Partition(manifest, sizes)
+        pinned_assignment = dict(current)
+        pinned_assignment.update(
+            (module, group) for module, group in pinned.items() if module in current
+        )
+        broken = set(partition.unsatisfied_dependencies(pinned_assignment)) - set(
+            partition.unsatisfied_dependencies(current)
+        )
+        if broken:
+            parser.error(
+                "the pins break module dependencies: %s"
+                % ", ".join(
+                    "%s depends on %s" % (module, dep) for module, dep in sorted(broken)
+                )
+            )
+        for module, dep in partition.unsatisfied_dependencies(current):
+            print(
+                "warning: current partition packages %s in %s but its dependency "
+                "%s in %s"
+                % (
+                    module,
+                    group_to_wheel(current[module]),
+                    dep,
+                    group_to_wheel(current[dep]),
+                ),
+                file=sys.stderr,
+            )
+        proposed = optimize(partition, current, workloads, pinned)
+        print_comparison(partition, current, proposed, workloads)
+        if args.output:
+            wheels = dict((group, []) for group in partition.groups)
+            for module in sorted(proposed):
+                wheels[proposed[module]].append(module)
+            with open(args.output, "w") as file_:
+                json.dump(
+                    {"key": manifest["key"], "wheels": wheels},
+                    file_,
+                    indent=2,
+                )
+
+
+if __name__ == "__main__":
+    main()
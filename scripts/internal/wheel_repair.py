@@ -0,0 +1,1004 @@
+#!/usr/bin/env python
+
+"""CLI repairing wheels concurrently with auditwheel or delvewheel.
+
+Repairing a wheel copies the external shared libraries it depends on into the
+wheel and rewrites the dependent libraries accordingly. The repair tools
+(``auditwheel`` on Linux, ``delvewheel`` on Windows) process one wheel at a
+time and analyze every library of the wheel each time they run.
+
+This script runs one repair per wheel in a pool of worker processes, each
+writing to its own output directory and log. The changes made by a repair are
+also stored in a cache, keyed by:
+
+* the repair tool version and its arguments,
+* the name of the distribution and its Python and ABI tags,
+* the names of the members of the wheel, and the content hash of its shared
+  libraries,
+* the content hash of the external libraries these depend on, found like the
+  dynamic loader (``RPATH``, ``LD_LIBRARY_PATH``, ``RUNPATH``,
+  ``/etc/ld.so.conf`` and the default directories) for ``auditwheel``, or in
+  the ``--add-path`` directories and ``PATH`` for ``delvewheel``.
+
+The dependencies of every library are read from its ELF dynamic section or PE
+import tables, and cached by content hash. The version of the wheel and the
+content of its ``.dist-info`` directory are not part of the key: a wheel whose
+libraries did not change, for example in a nightly build where only the
+version did, is repaired by applying the cached changes to its members instead
+of being analyzed and repaired again. An entry is not applied if another
+member modified by the repair changed, or if the changes mention the version of
+the repaired wheel.
+
+Entries unused for ``--cache-max-age`` days are removed after each run, then
+the least recently used ones until the cache fits in ``--cache-max-size``.
+
+Usage::
+
+    wheel_repair.py [-h] --tool {auditwheel,delvewheel} [--executable EXECUTABLE]
+                    [--output-dir OUTPUT_DIR] [--jobs JOBS]
+                    [--cache-dir CACHE_DIR] [--cache-max-size CACHE_MAX_SIZE]
+                    [--cache-max-age CACHE_MAX_AGE] [--no-cache]
+                    [--log-dir LOG_DIR]
+                    wheel [wheel ...] [-- TOOL_ARGS ...]
+
+Arguments following ``--`` are passed to the ``repair`` command of the tool,
+for example::
+
+    wheel_repair.py --tool auditwheel --output-dir /work/dist dist/itk_*.whl -- \\
+      --plat manylinux_2_28_x86_64
+"""
+
+import argparse
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+from build_trace import Span, current_track
+from wheel_edit import edit_wheel, parse_wheel_filename, retag_edit
+
+SUPPORTED_TOOLS = ["auditwheel", "delvewheel"]
+
+# Suffixes of the archive members analyzed by the repair tools.
+SHARED_LIBRARY_SUFFIXES = (".so", ".pyd", ".dll", ".dylib")
+
+# Bump to invalidate the cache entries.
+CACHE_VERSION = 2
+
+DEFAULT_CACHE_MAX_SIZE = "5G"
+DEFAULT_CACHE_MAX_AGE_DAYS = 30.0
+
+# Age after which the temporary directory of an entry being stored is
+# considered left over by an interrupted repair.
+TEMP_MAX_AGE = 24 * 3600.0
+
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+# Directories searched by the dynamic loader after the ones of ld.so.conf.
+DEFAULT_LIBRARY_DIRS = ["/lib64", "/usr/lib64", "/lib", "/usr/lib"]
+
+# Windows API sets, which are resolved by the loader and not found on disk.
+API_SET_PREFIXES = ("api-ms-win-", "ext-ms-")
+
+# ELF dynamic section tags
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_RPATH = 15
+DT_RUNPATH = 29
+PT_LOAD = 1
+PT_DYNAMIC = 2
+
+# Indices of the import and delay-load import tables among the data
+# directories of a PE file.
+PE_IMPORT_DIRECTORY = 1
+PE_DELAY_IMPORT_DIRECTORY = 13
+
+# Number of lines of a failed repair log displayed in the summary.
+LOG_TAIL_LINES = 40
+
+
+def default_jobs(wheel_count):
+    """Return the number of wheels repaired at the same time.
+
+    ``ITK_WHEEL_REPAIR_JOBS`` overrides the default, the number of cores.
+    """
+    jobs = int(os.environ.get("ITK_WHEEL_REPAIR_JOBS", "0"))
+    if jobs <= 0:
+        jobs = os.cpu_count() or 1
+    return max(1, min(jobs, wheel_count))
+
+
+def default_cache_dir():
+    return os.environ.get(
+        "ITK_WHEEL_REPAIR_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "itk-wheel-repair"),
+    )
+
+
+def default_cache_max_size():
+    """Return the maximum size of the cache, in bytes.
+
+    ``ITK_WHEEL_REPAIR_CACHE_MAX_SIZE`` overrides the default, 5G.
+    """
+    return parse_cache_size(
+        os.environ.get("ITK_WHEEL_REPAIR_CACHE_MAX_SIZE", DEFAULT_CACHE_MAX_SIZE)
+    )
+
+
+def default_cache_max_age():
+    """Return the age of the unused entries removed from the cache, in days.
+
+    ``ITK_WHEEL_REPAIR_CACHE_MAX_AGE`` overrides the default, 30 days.
+    """
+    return float(
+        os.environ.get("ITK_WHEEL_REPAIR_CACHE_MAX_AGE", DEFAULT_CACHE_MAX_AGE_DAYS)
+    )
+
+
+def parse_cache_size(value):
+    """Return the number of bytes of `value`, a number optionally followed by
+    ``K``, ``M``, ``G`` or ``T``."""
+    text = str(value).strip().upper()
+    if text.endswith("B"):
+        text = text[:-1]
+    unit = text[-1:] if text[-1:] in SIZE_UNITS else ""
+    try:
+        size = float(text[: len(text) - len(unit)])
+    except ValueError:
+        size = -1
+    if size < 0:
+        raise ValueError("Invalid cache size '%s', expected for example 5G" % value)
+    return int(size * SIZE_UNITS[unit])
+
+
+def is_shared_library(name):
+    return name.endswith(SHARED_LIBRARY_SUFFIXES) or ".so." in os.path.basename(name)
+
+
+def is_dist_info(name):
+    return name.split("/")[0].endswith(".dist-info")
+
+
+def tool_command(tool, executable=None):
+    """Return the command line running `tool`, optionally through the given
+    `executable` (the tool itself, or a Python interpreter providing it)."""
+    if executable is None:
+        return [sys.executable, "-m", tool]
+    name = os.path.basename(executable).lower()
+    if name.startswith("python"):
+        return [executable, "-m", tool]
+    return [executable]
+
+
+def tool_version(command):
+    try:
+        return subprocess.check_output(
+            command + ["--version"], stderr=subprocess.STDOUT, universal_newlines=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def member_hash(archive, info):
+    sha256 = hashlib.sha256()
+    with archive.open(info) as member:
+        for chunk in iter(lambda: member.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def file_hash(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file_:
+        for chunk in iter(lambda: file_.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _c_string(data, offset):
+    return data[offset : data.index(b"\0", offset)].decode("utf-8", "replace")
+
+
+def elf_dependencies(data):
+    """Return the ``DT_NEEDED`` entries and the ``RPATH`` and ``RUNPATH``
+    directories of the ELF file `data`."""
+    is_64 = data[4] == 2
+    endian = "<" if data[5] == 1 else ">"
+    if is_64:
+        header = struct.unpack_from(endian + "HHIQQQIHHHHHH", data, 16)
+        program_header_format = endian + "IIQQQQQQ"
+        dynamic_format = endian + "qQ"
+    else:
+        header = struct.unpack_from(endian + "HHIIIIIHHHHHH", data, 16)
+        program_header_format = endian + "IIIIIIII"
+        dynamic_format = endian + "iI"
+    program_headers, entry_size, entry_count = header[4], header[8], header[9]
+
+    loads = []
+    dynamic = None
+    for index in range(entry_count):
+        fields = struct.unpack_from(
+            program_header_format, data, program_headers + index * entry_size
+        )
+        if is_64:
+            kind, offset, address, size = fields[0], fields[2], fields[3], fields[5]
+        else:
+            kind, offset, address, size = fields[0], fields[1], fields[2], fields[4]
+        if kind == PT_LOAD:
+            loads.append((address, offset, size))
+        elif kind == PT_DYNAMIC:
+            dynamic = (offset, size)
+    dependencies = {"needed": [], "rpath": [], "runpath": []}
+    if dynamic is None:
+        return dependencies
+
+    entries = []
+    string_table = None
+    entry_size = struct.calcsize(dynamic_format)
+    for offset in range(dynamic[0], dynamic[0] + dynamic[1], entry_size):
+        tag, value = struct.unpack_from(dynamic_format, data, offset)
+        if tag == DT_NULL:
+            break
+        if tag == DT_STRTAB:
+            string_table = value
+        entries.append((tag, value))
+    for address, offset, size in loads:
+        if string_table is not None and address <= string_table < address + size:
+            string_table = string_table - address + offset
+            break
+    else:
+        return dependencies
+    for tag, value in entries:
+        if tag == DT_NEEDED:
+            dependencies["needed"].append(_c_string(data, string_table + value))
+        elif tag in (DT_RPATH, DT_RUNPATH):
+            key = "rpath" if tag == DT_RPATH else "runpath"
+            directories = _c_string(data, string_table + value).split(":")
+            dependencies[key].extend(
+                directory for directory in directories if directory
+            )
+    return dependencies
+
+
+def pe_dependencies(data):
+    """Return the DLLs imported by the PE file `data`, including the ones
+    loaded on first use."""
+    pe_header = struct.unpack_from("<I", data, 0x3C)[0]
+    if data[pe_header : pe_header + 4] != b"PE\0\0":
+        return None
+    section_count, optional_size = struct.unpack_from("<2xH12xH", data, pe_header + 4)
+    optional_header = pe_header + 24
+    magic = struct.unpack_from("<H", data, optional_header)[0]
+    directories = optional_header + (96 if magic == 0x10B else 112)
+    directory_count = struct.unpack_from("<I", data, directories - 4)[0]
+    sections = [
+        struct.unpack_from("<8xIIII", data, optional_header + optional_size + 40 * i)
+        for i in range(section_count)
+    ]
+
+    def offset_of(address):
+        for virtual_address, virtual_size, raw_size, raw_offset in (
+            (section[1], section[0], section[2], section[3]) for section in sections
+        ):
+            if (
+                virtual_address
+                <= address
+                < virtual_address + max(virtual_size, raw_size)
+            ):
+                return address - virtual_address + raw_offset
+        raise ValueError("Invalid relative virtual address %#x" % address)
+
+    needed = []
+    for index, descriptor_size, name_field in (
+        (PE_IMPORT_DIRECTORY, 20, 12),
+        (PE_DELAY_IMPORT_DIRECTORY, 32, 4),
+    ):
+        if index >= directory_count:
+            continue
+        address = struct.unpack_from("<I", data, directories + 8 * index)[0]
+        if not address:
+            continue
+        offset = offset_of(address)
+        while True:
+            name = struct.unpack_from("<I", data, offset + name_field)[0]
+            if not name:
+                break
+            needed.append(_c_string(data, offset_of(name)))
+            offset += descriptor_size
+    return {"needed": needed, "rpath": [], "runpath": []}
+
+
+def library_dependencies(data):
+    """Return the dependencies of the shared library `data`, ``None`` if it is
+    neither an ELF nor a PE file."""
+    try:
+        if data[:4] == b"\x7fELF":
+            return elf_dependencies(data)
+        if data[:2] == b"MZ":
+            return pe_dependencies(data)
+    except (struct.error, ValueError, IndexError):
+        pass
+    return None
+
+
+def ld_so_conf_dirs(path="/etc/ld.so.conf", visited=None):
+    """Return the directories listed in the ld.so configuration `path`,
+    following its ``include`` directives."""
+    visited = set() if visited is None else visited
+    if path in visited:
+        return []
+    visited.add(path)
+    directories = []
+    try:
+        with open(path, "r") as conf:
+            lines = conf.read().splitlines()
+    except OSError:
+        return directories
+    for line in lines:
+        line = line.split("#")[0].strip()
+        if line.startswith("include"):
+            for pattern in line.split()[1:]:
+                if not os.path.isabs(pattern):
+                    pattern = os.path.join(os.path.dirname(path), pattern)
+                for included in sorted(glob.glob(pattern)):
+                    directories.extend(ld_so_conf_dirs(included, visited))
+        elif line:
+            directories.append(line)
+    return directories
+
+
+def add_path_dirs(tool_args):
+    """Return the directories given to the ``--add-path`` options of
+    delvewheel in `tool_args`."""
+    directories = []
+    tool_args = list(tool_args)
+    for index, arg in enumerate(tool_args):
+        value = None
+        if arg == "--add-path" and index + 1 < len(tool_args):
+            value = tool_args[index + 1]
+        elif arg.startswith("--add-path="):
+            value = arg.split("=", 1)[1]
+        if value:
+            directories.extend(path for path in value.split(os.pathsep) if path)
+    return directories
+
+
+class LibraryAnalyzer(object):
+    """Resolves the external libraries that the libraries of wheels depend on,
+    the way `tool` finds them.
+
+    The dependencies of each library are cached by content hash, in memory and
+    in the ``analysis`` directory of `cache_dir`.
+    """
+
+    def __init__(self, tool, tool_args=(), cache_dir=None):
+        self.tool = tool
+        self.cache_dir = cache_dir
+        self._dependencies = {}
+        self._file_hashes = {}
+        if tool == "delvewheel":
+            self.search_dirs = add_path_dirs(tool_args) + os.environ.get(
+                "PATH", ""
+            ).split(os.pathsep)
+        else:
+            self.library_path = [
+                path
+                for path in os.environ.get("LD_LIBRARY_PATH", "").split(":")
+                if path
+            ]
+            self.search_dirs = ld_so_conf_dirs() + DEFAULT_LIBRARY_DIRS
+
+    def dependencies(self, digest, read):
+        """Return the dependencies of the library of content hash `digest`,
+        calling `read` to get its content if they are not cached yet."""
+        if digest in self._dependencies:
+            return self._dependencies[digest]
+        path = None
+        if self.cache_dir:
+            path = os.path.join(
+                self.cache_dir, "analysis", digest[:2], digest + ".json"
+            )
+            try:
+                with open(path, "r") as analysis_file:
+                    dependencies = json.load(analysis_file)
+                os.utime(path)
+            except (OSError, ValueError):
+                pass
+            else:
+                self._dependencies[digest] = dependencies
+                return dependencies
+        dependencies = library_dependencies(read())
+        if path:
+            try:
+                write_json_atomically(path, dependencies)
+            except OSError:
+                pass
+        self._dependencies[digest] = dependencies
+        return dependencies
+
+    def file_hash(self, path):
+        status = os.stat(path)
+        key = (os.path.realpath(path), status.st_size, status.st_mtime_ns)
+        if key not in self._file_hashes:
+            self._file_hashes[key] = file_hash(path)
+        return self._file_hashes[key]
+
+    def file_dependencies(self, path):
+        def read():
+            with open(path, "rb") as library:
+                return library.read()
+
+        return self.dependencies(self.file_hash(path), read)
+
+    def find(self, name, dependencies, origin):
+        """Return the path of library `name` needed by a library of the given
+        `dependencies` located in `origin`, ``None`` if it is not found."""
+        if self.tool == "delvewheel":
+            directories = self.search_dirs
+        else:
+            if "/" in name:
+                return name if os.path.isfile(name) else None
+
+            def expand(paths):
+                for path in paths:
+                    if "$ORIGIN" in path or "${ORIGIN}" in path:
+                        # Relative to a member of the wheel, not on disk
+                        if origin is None:
+                            continue
+                        path = path.replace("${ORIGIN}", origin)
+                        path = path.replace("$ORIGIN", origin)
+                    yield path
+
+            directories = []
+            if not dependencies["runpath"]:
+                directories.extend(expand(dependencies["rpath"]))
+            directories.extend(self.library_path)
+            directories.extend(expand(dependencies["runpath"]))
+            directories.extend(self.search_dirs)
+        for directory in directories:
+            if not os.path.isabs(directory):
+                continue
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def external_libraries(self, libraries):
+        """Return the content hash of the external libraries that the
+        `libraries` of a wheel, ``{member name: dependencies}``, depend on
+        directly or through other external libraries, ``None`` for the ones
+        that are not found."""
+        windows = self.tool == "delvewheel"
+
+        def normalize(name):
+            return name.lower() if windows else name
+
+        internal = set(normalize(os.path.basename(name)) for name in libraries)
+        pending = [(dependencies, None) for dependencies in libraries.values()]
+        external = {}
+        while pending:
+            dependencies, origin = pending.pop()
+            if not dependencies:
+                continue
+            for name in dependencies["needed"]:
+                key = normalize(name)
+                if key in internal or key in external:
+                    continue
+                if windows and key.startswith(API_SET_PREFIXES):
+                    continue
+                path = self.find(name, dependencies, origin)
+                external[key] = self.file_hash(path) if path else None
+                if path:
+                    pending.append(
+                        (self.file_dependencies(path), os.path.dirname(path))
+                    )
+        return external
+
+
+class WheelInputs(object):
+    """Members of a wheel to repair, excluding its ``.dist-info`` directory,
+    with their content hash, and the dependencies of its shared libraries."""
+
+    def __init__(self, wheel_path, analyzer):
+        distribution, version, _, tag = parse_wheel_filename(wheel_path)
+        self.distribution = distribution
+        self.release = "%s-%s" % (distribution, version)
+        self.tag = "-".join(tag.split("-")[:2])
+        self.hashes = {}
+        self.libraries = {}
+        with zipfile.ZipFile(wheel_path) as archive:
+            for info in archive.infolist():
+                if is_dist_info(info.filename) or info.is_dir():
+                    continue
+                if is_shared_library(info.filename):
+                    data = archive.read(info)
+                    digest = hashlib.sha256(data).hexdigest()
+                    self.libraries[info.filename] = analyzer.dependencies(
+                        digest, lambda: data
+                    )
+                else:
+                    digest = member_hash(archive, info)
+                self.hashes[info.filename] = digest
+        self.external = analyzer.external_libraries(self.libraries)
+
+    def key(self, command_key):
+        """Return the cache key of the repair of these inputs by the command
+        identified by `command_key`."""
+        key = hashlib.sha256()
+        lines = [str(CACHE_VERSION), command_key, self.distribution, self.tag]
+        for name in sorted(self.hashes):
+            if name in self.libraries:
+                lines.append("%s %s" % (name, self.hashes[name]))
+            else:
+                lines.append(name)
+        for name, digest in sorted(self.external.items()):
+            lines.append("external %s %s" % (name, digest or "unresolved"))
+        key.update(("\n".join(lines) + "\n").encode("utf-8"))
+        return key.hexdigest()
+
+
+def write_json_atomically(path, value):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=directory)
+    with os.fdopen(handle, "w") as temp_file:
+        json.dump(value, temp_file)
+    os.replace(temp_path, path)
+
+
+def entry_dir_of(cache_dir, key):
+    return os.path.join(cache_dir, "entries", key[:2], key)
+
+
+class WheelRepair(object):
+    """Outcome of the repair of one wheel."""
+
+    def __init__(self, wheel_path, log_path):
+        self.wheel_path = wheel_path
+        self.log_path = log_path
+        self.key = None
+        self.returncode = None
+        self.duration = 0.0
+        self.cached = False
+        self.outputs = []
+
+    @property
+    def wheel_name(self):
+        return os.path.basename(self.wheel_path)
+
+    @property
+    def succeeded(self):
+        return self.returncode == 0
+
+
+def load_entry(entry_dir, inputs):
+    """Return the cache entry stored in `entry_dir` if it applies to
+    `inputs`, otherwise ``None`` and the reason why."""
+    try:
+        with open(os.path.join(entry_dir, "entry.json"), "r") as entry_file:
+            entry = json.load(entry_file)
+    except (OSError, ValueError):
+        return None, None
+    old_release = entry["release"].encode("utf-8")
+    for member in entry["members"]:
+        name = member["name"]
+        if member["input"] is not None and inputs.hashes.get(name) != member["input"]:
+            return None, "%s changed" % name
+        if entry["release"] == inputs.release:
+            continue
+        if old_release in name.encode("utf-8"):
+            return None, "%s depends on the version of %s" % (name, entry["release"])
+        if not is_shared_library(name):
+            with open(os.path.join(entry_dir, member["file"]), "rb") as member_file:
+                if old_release in member_file.read():
+                    return None, "%s depends on the version of %s" % (
+                        name,
+                        entry["release"],
+                    )
+    return entry, None
+
+
+def apply_entry(entry_dir, entry, wheel_path, output_dir):
+    """Write the repair of `wheel_path` described by the cache entry `entry`
+    in `output_dir`, and return the path of the written wheel."""
+    output_path, contents = retag_edit(wheel_path, entry["platform_tag"], output_dir)
+    files = dict(
+        (member["name"], os.path.join(entry_dir, member["file"]))
+        for member in entry["members"]
+    )
+    os.utime(os.path.join(entry_dir, "entry.json"))
+    return edit_wheel(
+        wheel_path,
+        output_path,
+        contents=contents,
+        files=files,
+        removals=entry["removed"],
+    )
+
+
+def store_entry(entry_dir, inputs, output_path):
+    """Store the changes made by the repair of `inputs` into the wheel
+    `output_path` in the cache entry `entry_dir`, which is only visible once
+    complete."""
+    temp_dir = "%s.%d.tmp" % (entry_dir, os.getpid())
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(os.path.join(temp_dir, "members"))
+    entry = {
+        "version": CACHE_VERSION,
+        "release": inputs.release,
+        "platform_tag": parse_wheel_filename(output_path)[3].split("-")[2],
+        "members": [],
+        "removed": [],
+    }
+    names = set()
+    with zipfile.ZipFile(output_path) as archive:
+        for info in archive.infolist():
+            if is_dist_info(info.filename) or info.is_dir():
+                continue
+            names.add(info.filename)
+            input_hash = inputs.hashes.get(info.filename)
+            if member_hash(archive, info) == input_hash:
+                continue
+            member_path = "members/%d" % len(entry["members"])
+            with archive.open(info) as source, open(
+                os.path.join(temp_dir, member_path), "wb"
+            ) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            mode = (info.external_attr >> 16) & 0o7777
+            if mode:
+                os.chmod(os.path.join(temp_dir, member_path), mode)
+            entry["members"].append(
+                {"name": info.filename, "input": input_hash, "file": member_path}
+            )
+    entry["removed"] = sorted(name for name in inputs.hashes if name not in names)
+    with open(os.path.join(temp_dir, "entry.json"), "w") as entry_file:
+        json.dump(entry, entry_file, indent=1)
+    try:
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        os.rename(temp_dir, entry_dir)
+    except OSError:
+        # Stored concurrently by another repair of the same wheel.
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+# Analyzers of the worker process, re-used by the repairs it runs.
+_analyzers = {}
+
+
+def repair_wheel(command, tool_args, output_dir, repair, cache=None):
+    """Repair one wheel, run in a worker process.
+
+    `cache` is ``None`` or a ``(cache_dir, tool, command_key)`` tuple. The
+    tool writes into a private directory so that the wheels it produced are
+    known, they are then moved to `output_dir` and stored in the cache.
+    """
+    start_time = time.time()
+    span = Span(
+        "repair-wheel",
+        track="%s/%s" % (current_track(), repair.wheel_name),
+        wheel=repair.wheel_name,
+        log=repair.log_path,
+    ).begin()
+    log_lines = []
+    inputs = None
+    entry_dir = None
+    if cache:
+        cache_dir, tool, command_key = cache
+        analyzer_key = (tool, tuple(tool_args), cache_dir)
+        if analyzer_key not in _analyzers:
+            _analyzers[analyzer_key] = LibraryAnalyzer(tool, tool_args, cache_dir)
+        try:
+            inputs = WheelInputs(repair.wheel_path, _analyzers[analyzer_key])
+        except (OSError, ValueError, zipfile.BadZipFile) as error:
+            log_lines.append("Not using the repair cache: %s" % error)
+        if inputs is not None:
+            repair.key = inputs.key(command_key)
+            entry_dir = entry_dir_of(cache_dir, repair.key)
+            entry, reason = load_entry(entry_dir, inputs)
+            if reason:
+                log_lines.append("Not re-using %s: %s" % (entry_dir, reason))
+            if entry is not None:
+                try:
+                    output_path = apply_entry(
+                        entry_dir, entry, repair.wheel_path, output_dir
+                    )
+                except (OSError, KeyError, ValueError) as error:
+                    log_lines.append("Failed to re-use %s: %s" % (entry_dir, error))
+                else:
+                    repair.outputs = [os.path.basename(output_path)]
+                    with open(repair.log_path, "w") as log_file:
+                        log_file.write(
+                            "Re-used the repair of %s cached in %s\n"
+                            % (entry["release"], entry_dir)
+                        )
+                    repair.cached = True
+                    repair.returncode = 0
+                    span.finish(repair.returncode)
+                    repair.duration = time.time() - start_time
+                    return repair
+
+    work_dir = tempfile.mkdtemp(prefix="wheel-repair-", dir=output_dir)
+    try:
+        repair_command = (
+            command + ["repair"] + list(tool_args) + ["-w", work_dir, repair.wheel_path]
+        )
+        with open(repair.log_path, "w") as log_file:
+            for line in log_lines:
+                log_file.write(line + "\n")
+            log_file.write(" ".join(repair_command) + "\n")
+            log_file.flush()
+            repair.returncode = subprocess.call(
+                repair_command, stdout=log_file, stderr=subprocess.STDOUT
+            )
+        if repair.succeeded:
+            repair.outputs = sorted(
+                name for name in os.listdir(work_dir) if name.endswith(".whl")
+            )
+            # Only the usual repairs, producing one wheel, are cached.
+            if entry_dir and len(repair.outputs) == 1:
+                store_entry(
+                    entry_dir, inputs, os.path.join(work_dir, repair.outputs[0])
+                )
+            for name in repair.outputs:
+                os.replace(os.path.join(work_dir, name), os.path.join(output_dir, name))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        span.finish(repair.returncode)
+    repair.duration = time.time() - start_time
+    return repair
+
+
+def directory_size(path):
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def prune_cache(cache_dir, max_size, max_age):
+    """Remove the cache entries unused for more than `max_age` seconds, then
+    the least recently used ones until the others fit in `max_size` bytes.
+
+    Return the number of entries removed and the number of bytes freed.
+    """
+    now = time.time()
+    removed = 0
+    freed = 0
+    # Layout of the first cache version, which stored whole wheels
+    legacy_dir = os.path.join(cache_dir, "wheels")
+    if os.path.isdir(legacy_dir):
+        freed += directory_size(legacy_dir)
+        shutil.rmtree(legacy_dir, ignore_errors=True)
+
+    entries = []
+    for entry_dir in glob.glob(os.path.join(cache_dir, "entries", "*", "*")):
+        try:
+            if entry_dir.endswith(".tmp"):
+                if now - os.path.getmtime(entry_dir) > TEMP_MAX_AGE:
+                    shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            used = os.path.getmtime(os.path.join(entry_dir, "entry.json"))
+        except OSError:
+            used = 0.0
+        entries.append((used, directory_size(entry_dir), entry_dir))
+    total = sum(size for _, size, _ in entries)
+    for used, size, entry_dir in sorted(entries):
+        if now - used <= max_age and total <= max_size:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        freed += size
+        removed += 1
+
+    for path in glob.glob(os.path.join(cache_dir, "analysis", "*", "*")):
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except OSError:
+            pass
+    return removed, freed
+
+
+def repair_wheels(
+    tool,
+    wheel_paths,
+    tool_args=(),
+    output_dir="dist",
+    executable=None,
+    jobs=None,
+    cache_dir=None,
+    log_dir=None,
+    cache_max_size=None,
+    cache_max_age=None,
+):
+    """Repair `wheel_paths` concurrently and return the list of
+    :class:`WheelRepair` in the order of `wheel_paths`.
+
+    If `cache_dir` is ``None``, repairs are not cached. Otherwise the cache is
+    pruned once the wheels are repaired, down to `cache_max_size` bytes and
+    removing the entries unused for `cache_max_age` days, see
+    :func:`default_cache_max_size` and :func:`default_cache_max_age`.
+    """
+    if tool not in SUPPORTED_TOOLS:
+        raise ValueError(
+            "Unsupported repair tool '%s'. Supported values are: %s"
+            % (tool, ", ".join(SUPPORTED_TOOLS))
+        )
+    wheel_paths = [os.path.abspath(path) for path in wheel_paths]
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    if log_dir is None:
+        log_dir = os.path.join(output_dir, "repair-logs")
+    os.makedirs(log_dir, exist_ok=True)
+    if jobs is None:
+        jobs = default_jobs(len(wheel_paths))
+
+    command = tool_command(tool, executable)
+    cache = None
+    if cache_dir:
+        cache_dir = os.path.abspath(cache_dir)
+        command_key = "%s\n%s" % (tool_version(command), "\n".join(tool_args))
+        cache = (cache_dir, tool, command_key)
+    repairs = []
+    for wheel_path in wheel_paths:
+        log_path = os.path.join(
+            log_dir, "%s.log" % os.path.splitext(os.path.basename(wheel_path))[0]
+        )
+        repairs.append(WheelRepair(wheel_path, log_path))
+
+    print(
+        "Repairing %d wheel(s) with %s using %d worker(s), logs are written in %s"
+        % (len(repairs), tool, jobs, log_dir)
+    )
+    sys.stdout.flush()
+
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(repair_wheel, command, tool_args, output_dir, repair, cache)
+            for repair in repairs
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            repair = future.result()
+            results[repair.wheel_path] = repair
+            if not repair.succeeded:
+                status = "FAILED"
+            elif repair.cached:
+                status = "Re-used cached repair"
+            else:
+                status = "Repaired"
+            print("[%s] %s in %.1fs" % (repair.wheel_name, status, repair.duration))
+            sys.stdout.flush()
+
+    if cache_dir:
+        if cache_max_size is None:
+            cache_max_size = default_cache_max_size()
+        if cache_max_age is None:
+            cache_max_age = default_cache_max_age()
+        removed, freed = prune_cache(cache_dir, cache_max_size, cache_max_age * 86400)
+        if removed or freed:
+            print(
+                "Removed %d entries (%.1f MiB) from the repair cache"
+                % (removed, freed / (1024.0 * 1024.0))
+            )
+    return [results[repair.wheel_path] for repair in repairs]
+
+
+def print_summary(repairs):
+    for repair in repairs:
+        if repair.succeeded:
+            continue
+        print("")
+        print("Last lines of %s:" % repair.log_path)
+        with open(repair.log_path, "r") as log_file:
+            lines = log_file.readlines()
+        sys.stdout.writelines(lines[-LOG_TAIL_LINES:])
+    print("")
+    print("Wheel repair summary:")
+    for repair in repairs:
+        if not repair.succeeded:
+            status = "FAILED"
+        else:
+            status = "CACHED" if repair.cached else "OK"
+        print("  %-60s %-7s %8.1fs" % (repair.wheel_name, status, repair.duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--tool", required=True, choices=SUPPORTED_TOOLS)
+    parser.add_argument(
+        "--executable",
+        default=None,
+        help="Repair tool executable, or Python interpreter providing it "
+        "(default: current interpreter)",
+    )
+    parser.add_argument(
+        "--output-dir", default="dist", help="Directory receiving the repaired wheels"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of wheels repaired at the same time "
+        "(default: ITK_WHEEL_REPAIR_JOBS or the number of cores)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=default_cache_dir(),
+        help="Directory caching the repairs and the library dependencies",
+    )
+    parser.add_argument(
+        "--cache-max-size",
+        default=None,
+        help="Size the cache is pruned to, for example 5G "
+        "(default: ITK_WHEEL_REPAIR_CACHE_MAX_SIZE or %s)" % DEFAULT_CACHE_MAX_SIZE,
+    )
+    parser.add_argument(
+        "--cache-max-age",
+        type=float,
+        default=None,
+        help="Age in days of the unused cache entries removed "
+        "(default: ITK_WHEEL_REPAIR_CACHE_MAX_AGE or %g)" % DEFAULT_CACHE_MAX_AGE_DAYS,
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Do not use the repair cache"
+    )
+    parser.add_argument(
+        "--log-dir",
+        default=None,
+        help="Directory where repair logs are written "
+        "(default: <output-dir>/repair-logs)",
+    )
+    parser.add_argument("wheels", nargs="+", help="Wheels to repair")
+    # Arguments of the repair tool follow "--", they are split before parsing
+    # since they can not be told apart from the wheels otherwise.
+    argv = sys.argv[1:]
+    tool_args = []
+    if "--" in argv:
+        separator = argv.index("--")
+        argv, tool_args = argv[:separator], argv[separator + 1 :]
+    args = parser.parse_args(argv)
+    try:
+        cache_max_size = (
+            None
+            if args.cache_max_size is None
+            else parse_cache_size(args.cache_max_size)
+        )
+    except ValueError as error:
+        parser.error(str(error))
+
+    repairs = repair_wheels(
+        args.tool,
+        args.wheels,
+        tool_args,
+        output_dir=args.output_dir,
+        executable=args.executable,
+        jobs=args.jobs,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        log_dir=args.log_dir,
+        cache_max_size=cache_max_size,
+        cache_max_age=args.cache_max_age,
+    )
+    print_summary(repairs)
+    if not all(repair.succeeded for repair in repairs):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
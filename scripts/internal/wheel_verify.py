@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+
+"""CLI installing the built ITK wheels for several interpreters and verifying
+them concurrently.
+
+For each interpreter, the wheels of the distribution directory are installed
+with ``pip install --target`` in a directory of its own, without accessing the
+package index, and numpy is installed the same way from the ``--find-links``
+directories (and ``ITK_WHEELHOUSE``) unless the interpreter provides it. The
+interpreters then run the smoke tests (``SMOKE_TESTS``) and the documentation
+tests (see ``docs_test_runner.py``) with this directory as ``PYTHONPATH``, the
+user site directory disabled and a ``HOME`` of their own, so that they share
+no state.
+
+The interpreters are verified at the same time. The results are printed as a
+matrix of the status and duration of each step for each interpreter, and
+written as JSON with ``--output``. The environments are kept in ``--work-dir``
+for later use, for example by the benchmarks, until the next verification.
+
+Usage::
+
+    wheel_verify.py [-h] [--dist-dir DIST_DIR] [--find-links FIND_LINKS]
+                    [--work-dir WORK_DIR] [--log-dir LOG_DIR] [--jobs JOBS]
+                    [--no-docs-tests] [--output OUTPUT]
+                    python [python ...]
+
+Interpreters are given as ``NAME=PYTHON`` or ``PYTHON``, in which case their
+name is the name of the directory holding their ``bin`` directory, for
+example ``cp311-cp311`` for ``/opt/python/cp311-cp311/bin/python``.
+
+The command exits with status 1 if a step failed for an interpreter.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from build_env import default_wheelhouse
+from build_scheduler import cpu_count
+from build_trace import Span, current_track
+
+SMOKE_TESTS = [
+    "from itk import ITKCommon",
+    "import itk; image = itk.Image[itk.UC, 2].New()",
+    "import itkConfig; itkConfig.LazyLoading = False; import itk",
+]
+
+STEPS = ["install", "smoke", "docs"]
+
+# Version of the format of the results. Increment it when their content
+# changes.
+RESULTS_VERSION = 1
+
+# Number of lines of a failed step log displayed in the summary.
+LOG_TAIL_LINES = 40
+
+DOCS_TEST_RUNNER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "docs_test_runner.py"
+)
+
+
+def parse_interpreter(value):
+    """Return the ``(name, executable)`` of the ``NAME=PYTHON`` or ``PYTHON``
+    string `value`."""
+    name, separator, executable = value.partition("=")
+    if separator:
+        return name, executable
+    executable = value
+    bin_dir = os.path.dirname(os.path.abspath(executable))
+    if os.path.basename(bin_dir).lower() in ("bin", "scripts"):
+        return os.path.basename(os.path.dirname(bin_dir)), executable
+    return os.path.basename(executable), executable
+
+
+def distribution_names(dist_dir):
+    """Return the names of the distributions of the wheels of `dist_dir`,
+    other than numpy."""
+    names = set()
+    for name in os.listdir(dist_dir):
+        if name.endswith(".whl"):
+            names.add(name.split("-")[0].replace("_", "-").lower())
+    names.discard("numpy")
+    return sorted(names)
+
+
+class Verification:
+    """Verification of the wheels with an interpreter."""
+
+    def __init__(self, name, python_executable, work_dir, log_dir):
+        self.name = name
+        self.python_executable = python_executable
+        self.work_dir = os.path.join(work_dir, name)
+        self.site_dir = os.path.join(self.work_dir, "site")
+        self.log_dir = log_dir
+        # Step name: {"status": ..., "duration": ..., "log": ...}
+        self.steps = {}
+        self.duration = 0.0
+        self.span = None
+
+    @property
+    def passed(self):
+        return bool(self.steps) and all(
+            step["status"] != "failed" for step in self.steps.values()
+        )
+
+    def environ(self, span):
+        env = span.environ()
+        env["PYTHONPATH"] = self.site_dir
+        env["PYTHONNOUSERSITE"] = "1"
+        env["HOME"] = os.path.join(self.work_dir, "home")
+        env.pop("PYTHONHOME", None)
+        return env
+
+    def run_step(self, step, commands):
+        """Run `commands` one after the other and record the result of
+        `step`."""
+        log_path = os.path.join(self.log_dir, "%s-%s.log" % (self.name, step))
+        span = Span(
+            step, track=self.span.track, parent=self.span.id, log=log_path
+        ).begin()
+        start = time.time()
+        returncode = 0
+        with open(log_path, "w") as log_file:
+            for command in commands:
+                log_file.write(" ".join(command) + "\n")
+                log_file.flush()
+                returncode = subprocess.call(
+                    command,
+                    cwd=self.work_dir,
+                    env=self.environ(span),
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                )
+                if returncode != 0:
+                    break
+        span.finish(returncode)
+        self.steps[step] = {
+            "status": "ok" if returncode == 0 else "failed",
+            "duration": time.time() - start,
+            "log": log_path,
+        }
+        return returncode == 0
+
+    def skip(self, step):
+        self.steps[step] = {"status": "skipped", "duration": 0.0, "log": None}
+
+    def has_numpy(self):
+        env = dict(os.environ, PYTHONNOUSERSITE="1")
+        return (
+            subprocess.call(
+                [self.python_executable, "-c", "import numpy"],
+                cwd=self.work_dir,
+                env=env,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            == 0
+        )
+
+    def run(self, dist_dir, find_links, docs_tests=True, docs_jobs=None):
+        start = time.time()
+        self.span = Span(
+            "verify",
+            track="%s/%s" % (current_track(), self.name),
+            python=self.python_executable,
+        ).begin()
+        try:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            os.makedirs(os.path.join(self.work_dir, "home"))
+            pip = [
+                self.python_executable,
+                "-m",
+                "pip",
+                "install",
+                "--no-index",
+                "--no-cache-dir",
+                "--no-deps",
+                "--target",
+                self.site_dir,
+            ]
+            for directory in [dist_dir] + list(find_links):
+                pip += ["--find-links", directory]
+            install = [pip + distribution_names(dist_dir)]
+            if not self.has_numpy():
+                install.append(pip + ["numpy"])
+            steps = [
+                ("install", install),
+                (
+                    "smoke",
+                    [[self.python_executable, "-c", test] for test in SMOKE_TESTS],
+                ),
+            ]
+            if docs_tests:
+                docs = [
+                    self.python_executable,
+                    DOCS_TEST_RUNNER,
+                    "--junit-xml",
+                    os.path.join(self.log_dir, "docs-tests-%s.xml" % self.name),
+                ]
+                if docs_jobs:
+                    docs += ["--jobs", str(docs_jobs)]
+                steps.append(("docs", [docs]))
+            failed = False
+            for step, commands in steps:
+                if failed:
+                    self.skip(step)
+                else:
+                    failed = not self.run_step(step, commands)
+            if not docs_tests:
+                self.skip("docs")
+        finally:
+            self.span.finish(0 if self.passed else 1)
+        self.duration = time.time() - start
+        return self
+
+
+def verify(
+    interpreters,
+    dist_dir="dist",
+    find_links=(),
+    work_dir=None,
+    log_dir=None,
+    jobs=None,
+    docs_tests=True,
+):
+    """Verify the wheels of `dist_dir` with the ``(name, executable)``
+    `interpreters` concurrently and return the list of :class:`Verification`
+    in the same order."""
+    dist_dir = os.path.abspath(dist_dir)
+    if not distribution_names(dist_dir):
+        raise ValueError("No wheel to verify in %s" % dist_dir)
+    find_links = [os.path.abspath(directory) for directory in find_links]
+    wheelhouse = default_wheelhouse()
+    if wheelhouse:
+        find_links.append(os.path.abspath(wheelhouse))
+    work_dir = os.path.abspath(work_dir or os.path.join("build", "verify"))
+    log_dir = os.path.abspath(log_dir or os.path.join(work_dir, "logs"))
+    os.makedirs(log_dir, exist_ok=True)
+    jobs = max(1, min(jobs or len(interpreters), len(interpreters)))
+    # Share the cores between the documentation tests of the interpreters
+    docs_jobs = max(1, cpu_count() // jobs)
+
+    verifications = [
+        Verification(name, executable, work_dir, log_dir)
+        for name, executable in interpreters
+    ]
+    print(
+        "Verifying the wheels of %s with %d interpreter(s), logs are written in %s"
+        % (dist_dir, len(verifications), log_dir)
+    )
+    sys.stdout.flush()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(
+                verification.run, dist_dir, find_links, docs_tests, docs_jobs
+            )
+            for verification in verifications
+        ]
+        for future in concurrent.futures.as_completed(futures):
+            verification = future.result()
+            print(
+                "[%s] %s in %.1fs"
+                % (
+                    verification.name,
+                    "Passed" if verification.passed else "FAILED",
+                    verification.duration,
+                )
+            )
+            sys.stdout.flush()
+    return verifications
+
+
+def write_results(verifications, path):
+    results = {
+        "version": RESULTS_VERSION,
+        "passed": all(verification.passed for verification in verifications),
+        "interpreters": dict(
+            (
+                verification.name,
+                {
+                    "python": verification.python_executable,
+                    "site_dir": verification.site_dir,
+                    "passed": verification.passed,
+                    "duration": verification.duration,
+                    "steps": verification.steps,
+                },
+            )
+            for verification in verifications
+        ),
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as file_:
+        json.dump(results, file_, indent=2, sort_keys=True)
+
+
+def print_summary(verifications):
+    for verification in verifications:
+        for step in STEPS:
+            result = verification.steps.get(step)
+            if not result or result["status"] != "failed":
+                continue
+            print("")
+            print("Last lines of %s:" % result["log"])
+            with open(result["log"], "r", errors="replace") as log_file:
+                lines = log_file.readlines()
+            sys.stdout.writelines(lines[-LOG_TAIL_LINES:])
+    print("")
+    print("Wheel verification summary:")
+    row_format = "  %-20s" + " %-16s" * len(STEPS) + " %8s"
+    print(row_format % (("INTERPRETER",) + tuple(s.upper() for s in STEPS) + ("TOTAL",)))
+    for verification in verifications:
+        cells = []
+        for step in STEPS:
+            result = verification.steps.get(step)
+            if not result or result["status"] == "skipped":
+                cells.append("skipped")
+            else:
+                cells.append(
+                    "%s %6.1fs"
+                    % ("OK" if result["status"] == "ok" else "FAILED", result["duration"])
+                )
+        print(
+            row_format
+            % ((verification.name,) + tuple(cells) + ("%.1fs" % verification.duration,))
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--dist-dir", default="dist", help="Directory of the wheels to verify"
+    )
+    parser.add_argument(
+        "--find-links",
+        action="append",
+        default=[],
+        help="Other directory of wheels, providing numpy. Can be repeated "
+        "(ITK_WHEELHOUSE is also used if it exists)",
+    )
+    parser.add_argument(
+        "--work-dir",
+        default=os.path.join("build", "verify"),
+        help="Directory of the environment of each interpreter",
+    )
+    parser.add_argument(
+        "--log-dir",
+        default=None,
+        help="Directory of the logs and JUnit XML files (default: WORK_DIR/logs)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of interpreters verified at the same time (default: all)",
+    )
+    parser.add_argument(
+        "--no-docs-tests",
+        dest="docs_tests",
+        action="store_false",
+        help="Skip the documentation tests",
+    )
+    parser.add_argument("--output", default=None, help="JSON file of the results")
+    parser.add_argument(
+        "interpreters",
+        metavar="python",
+        nargs="+",
+        help="Interpreter, NAME=PYTHON or PYTHON",
+    )
+    args = parser.parse_args()
+
+    interpreters = [parse_interpreter(value) for value in args.interpreters]
+    names = [name for name, _ in interpreters]
+    if len(set(names)) != len(names):
+        parser.error("Interpreter names must be unique: %s" % ", ".join(names))
+
+    try:
+        verifications = verify(
+            interpreters,
+            dist_dir=args.dist_dir,
+            find_links=args.find_links,
+            work_dir=args.work_dir,
+            log_dir=args.log_dir,
+            jobs=args.jobs,
+            docs_tests=args.docs_tests,
+        )
+    except ValueError as error:
+        parser.error(str(error))
+    print_summary(verifications)
+    if args.output:
+        write_results(verifications, args.output)
+        print("Wrote results to %s" % args.output)
+    if not all(verification.passed for verification in verifications):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,61 @@
-__all__ = ["DEFAULT_PY_ENVS", "venv_paths"]
+__all__ = [
+    "DEFAULT_PY_ENVS",
+    "python_arch",
+    "python_minor_version",
+    "split_abi3_py_envs",
+    "venv_paths",
+]
 
-from subprocess import check_call
 import os
 import shutil
 
+from build_env import ensure_venv
+
 DEFAULT_PY_ENVS = ["39-x64", "310-x64", "311-x64"]
 
 SCRIPT_DIR = os.path.dirname(__file__)
 ROOT_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, "..", ".."))
 
 
+def python_minor_version(python_version):
+    """Return the minor version associated with `python_version` (e.g. 11
+    for "311-x64")."""
+    return int(python_version.split("-")[0][1:])
+
+
+def python_arch(python_version):
+    """Return the architecture associated with `python_version` (e.g. "x64"
+    for "311-x64")."""
+    return python_version.partition("-")[2]
+
+
+def split_abi3_py_envs(py_envs):
+    """Return the Python environments for which ITK must be built when a single
+    stable ABI build is shared by all CPython >= 3.11 environments of the same
+    architecture.
+
+    A tuple ``(build_py_envs, abi3_aliases)`` is returned where ``abi3_aliases``
+    maps each skipped environment to the environment whose build it re-uses.
+    """
+    abi3_py_envs = [py_env for py_env in py_envs if python_minor_version(py_env) >= 11]
+    abi3_bases = {}
+    for py_env in sorted(abi3_py_envs, key=python_minor_version):
+        abi3_bases.setdefault(python_arch(py_env), py_env)
+    abi3_aliases = {}
+    for py_env in abi3_py_envs:
+        abi3_base = abi3_bases[python_arch(py_env)]
+        if py_env != abi3_base:
+            abi3_aliases[py_env] = abi3_base
+    build_py_envs = [py_env for py_env in py_envs if py_env not in abi3_aliases]
+    return build_py_envs, abi3_aliases
+
+
 def venv_paths(python_version):
 
-    # Create venv
+    # Create venv, unless it already exists
     venv_executable = "C:/Python%s/Scripts/virtualenv.exe" % (python_version)
     venv_dir = os.path.join(ROOT_DIR, "venv-%s" % python_version)
-    check_call([venv_executable, venv_dir])
+    ensure_venv([venv_executable], venv_dir)
 
     python_executable = os.path.join(venv_dir, "Scripts", "python.exe")
     python_include_dir = "C:/Python%s/include" % (python_version)
@@ -24,7 +64,7 @@ def venv_paths(python_version):
     #     with a given interpreter.
     xy_ver = python_version.split("-")[0]
 
-    if int(python_version.split("-")[0][1:]) >= 11:
+    if python_minor_version(python_version) >= 11:
         # Stable ABI
         python_library = "C:/Python%s/libs/python3.lib" % (python_version)
     else:
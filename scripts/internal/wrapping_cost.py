@@ -0,0 +1,640 @@
+#!/usr/bin/env python
+
+"""CLI attributing the build time and installed size of an ITK build tree to
+its modules and wheels.
+
+The time of every command recorded in the ``.ninja_log`` of a wrapped ITK
+build tree is attributed to an ITK module, and to the wheel packaging this
+module according to the wheel partition manifest
+(``ITKPythonPackageWheelPartition.json``). Commands are classified by their
+outputs:
+
+* ``castxml``: CastXML parsing of the wrapped classes (``.xml``)
+* ``swig``: generation of the SWIG interfaces (``.i``, ``.idx``, ``.mdx``,
+  ``.pyi``) and of the Python wrappers (``*Python.cpp``)
+* ``compile``: object files, of the wrappers and of the module libraries
+* ``link``: libraries and Python extension modules
+* ``other``: any other command
+
+A command belongs to the module whose build directory contains its outputs, or
+whose library or Python extension it links. The wrapping commands are also
+attributed to the wrapped class (``itkImage``, ``itkMedianImageFilter``, ...),
+along with its number of wrapped template instantiations, which grows with
+``ITK_WRAP_*`` options such as ``ITK_WRAP_double`` or ``ITK_WRAP_IMAGE_DIMS``.
+The installed size of each module is the size of its
+``<module>PythonWheelRuntimeLibraries`` component, as measured by
+``wheel_partition.py sizes``.
+
+Usage::
+
+    wrapping_cost.py collect [-h] --itk-binary-dir ITK_BINARY_DIR
+                             [--manifest MANIFEST] [--ninja-log NINJA_LOG]
+                             [--sizes SIZES | --no-sizes] [--jobs JOBS]
+                             [--cmake CMAKE] [--output OUTPUT]
+    wrapping_cost.py show [-h] [--by {module,wheel,class}]
+                          [--sort {name,castxml,swig,compile,link,time,bytes}]
+                          [--top TOP] report
+    wrapping_cost.py compare [-h] [--by {module,wheel,class}]
+                             [--sort {name,castxml,swig,compile,link,time,bytes}]
+                             [--top TOP] before after
+
+``collect`` writes the report of a build tree as JSON. ``show`` displays a
+report by module, wheel or wrapped class, and ``compare`` displays the
+differences between the reports of two builds, largest first.
+"""
+
+import argparse
+import json
+import os
+import re
+
+from build_trace import format_duration, read_ninja_log
+from wheel_partition import (
+    default_manifest_path,
+    format_size,
+    group_to_wheel,
+    load_manifest,
+    measure_sizes,
+)
+
+# Version of the format of the report. Increment it when its content changes.
+REPORT_VERSION = 1
+
+KINDS = ["castxml", "swig", "compile", "link", "other"]
+
+SORT_KEYS = ["name", "castxml", "swig", "compile", "link", "time", "bytes"]
+
+# Cost of the commands not attributed to a module, such as the generation of
+# the itk Python package.
+UNATTRIBUTED = "(unattributed)"
+
+_SWIG_SUFFIXES = ("Python.cpp", ".i", ".idx", ".mdx", ".pyi")
+_LINK_RE = re.compile(r"\.(so|dylib|a|lib|dll|pyd|exe)(\.[0-9]+)*$")
+_LIBRARY_NAME_RE = re.compile(r"^(?:lib|_)?([A-Za-z0-9_]+?)(?:-[0-9][0-9.]*)?\..*$")
+_TARGET_DIR_RE = re.compile(r"(?:^|/)CMakeFiles/([^/]+)\.dir/")
+_MODULE_NAME_RE = re.compile(r"itk_module[ \n]*(?:\([ \n]*)([A-Za-z0-9]*)")
+_INSTANTIATION_RE = re.compile(r"^\{.*\} \{.*\} \{.*\}$")
+
+
+def command_kind(outputs):
+    """Return the kind of the ninja command producing `outputs`."""
+    if any(output.endswith(".xml") for output in outputs):
+        return "castxml"
+    if any(output.endswith(_SWIG_SUFFIXES) for output in outputs):
+        return "swig"
+    if any(output.endswith((".o", ".obj")) for output in outputs):
+        return "compile"
+    if any(_LINK_RE.search(output) for output in outputs):
+        return "link"
+    return "other"
+
+
+def wrapped_class(output):
+    """Return the wrapped class generated or compiled by `output`, or
+    ``None``."""
+    name = os.path.basename(output)
+    for suffix in ("Python.cpp.o", "Python.cpp.obj", "Python.cpp", ".xml"):
+        if name.endswith(suffix) and len(name) > len(suffix):
+            return name[: -len(suffix)]
+    for suffix in (".i", ".idx", ".pyi"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+            # Extra SWIG interface written along with the main one
+            if name.endswith("_ext"):
+                name = name[: -len("_ext")]
+            return name
+    return None
+
+
+def module_directories(itk_source_dir):
+    """Return a dictionary associating the directory of every ITK module,
+    relative to the ITK source directory, with the module name."""
+    directories = {}
+    modules_dir = os.path.join(itk_source_dir, "Modules")
+    for root, dirs, files in os.walk(modules_dir):
+        if "itk-module.cmake" not in files:
+            continue
+        with open(os.path.join(root, "itk-module.cmake"), "r") as file_:
+            match = _MODULE_NAME_RE.search(file_.read())
+        if match and match.group(1):
+            relative = os.path.relpath(root, itk_source_dir).replace(os.sep, "/")
+            directories[relative] = match.group(1)
+        # Module directories are not nested
+        dirs[:] = []
+    return directories
+
+
+def read_wrapping_index(itk_binary_dir):
+    """Return the number of wrapped template instantiations of every wrapped
+    class, and the module of each class, read from the ``.idx`` and ``.mdx``
+    files of the wrapping."""
+    instantiations = {}
+    class_modules = {}
+    wrapping_dir = os.path.join(itk_binary_dir, "Wrapping")
+    for root, _, files in os.walk(wrapping_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith(".idx"):
+                with open(path, "r", errors="replace") as file_:
+                    instantiations[name[: -len(".idx")]] = sum(
+                        1 for line in file_ if _INSTANTIATION_RE.match(line.strip())
+                    )
+            elif name.endswith(".mdx"):
+                module = name[: -len(".mdx")]
+                with open(path, "r", errors="replace") as file_:
+                    for line in file_:
+                        line = os.path.basename(line.strip())
+                        if line.endswith(".idx"):
+                            class_modules[line[: -len(".idx")]] = module
+    return instantiations, class_modules
+
+
+def read_cache_entries(itk_binary_dir, pattern=r"^ITK_WRAP_"):
+    """Return the entries of the CMake cache of the ITK build tree whose name
+    matches `pattern`."""
+    entries = {}
+    cache = os.path.join(itk_binary_dir, "CMakeCache.txt")
+    if not os.path.exists(cache):
+        return entries
+    regex = re.compile(pattern)
+    with open(cache, "r") as file_:
+        for line in file_:
+            line = line.rstrip("\n")
+            if not line or line.startswith(("#", "//")) or "=" not in line:
+                continue
+            name_type, _, value = line.partition("=")
+            name = name_type.partition(":")[0]
+            if regex.search(name):
+                entries[name] = value
+    return entries
+
+
+def _new_cost():
+    cost = dict((kind, 0.0) for kind in KINDS)
+    cost["commands"] = 0
+    return cost
+
+
+class Attribution(object):
+    """Association of the outputs of an ITK build tree with ITK modules."""
+
+    def __init__(self, itk_binary_dir, module_dirs, class_modules):
+        self.itk_binary_dir = os.path.abspath(itk_binary_dir)
+        self.module_dirs = sorted(module_dirs.items())
+        self.class_modules = class_modules
+        self.target_modules = {}
+        self.modules = set(module_dirs.values())
+
+    def relative(self, output):
+        if os.path.isabs(output):
+            output = os.path.relpath(output, self.itk_binary_dir)
+        return output.replace(os.sep, "/")
+
+    def module_of_path(self, output):
+        output = self.relative(output)
+        for directory, module in self.module_dirs:
+            if output.startswith(directory + "/"):
+                return module
+        return None
+
+    def learn_targets(self, targets):
+        """Associate the CMake targets of the build with the module of their
+        object files."""
+        for target in targets:
+            for output in target.outputs:
+                match = _TARGET_DIR_RE.search(self.relative(output))
+                module = self.module_of_path(output)
+                if match and module:
+                    self.target_modules.setdefault(match.group(1), module)
+
+    def module_of(self, outputs):
+        for output in outputs:
+            module = self.module_of_path(output)
+            if module:
+                return module
+        for output in outputs:
+            name = os.path.basename(output)
+            match = _LIBRARY_NAME_RE.match(name)
+            if match and _LINK_RE.search(name):
+                library = match.group(1)
+                if library in self.target_modules:
+                    return self.target_modules[library]
+                if library in self.modules:
+                    return library
+            class_ = wrapped_class(output)
+            if class_ in self.class_modules:
+                return self.class_modules[class_]
+            stem = name.partition(".")[0]
+            if stem in self.modules:
+                return stem
+        return None
+
+
+def collect(
+    itk_binary_dir,
+    manifest=None,
+    ninja_log=None,
+    sizes=None,
+    jobs=None,
+    cmake_executable="cmake",
+):
+    """Return the report attributing the build time and installed size of the
+    ITK build tree `itk_binary_dir` to its modules.
+
+    `sizes` associates modules with their installed size; they are measured
+    if it is ``None``, and not reported if it is empty.
+    """
+    if manifest is None:
+        manifest = load_manifest(default_manifest_path(itk_binary_dir))
+    if ninja_log is None:
+        ninja_log = os.path.join(itk_binary_dir, ".ninja_log")
+    modules = manifest["modules"]
+
+    instantiations, class_modules = read_wrapping_index(itk_binary_dir)
+    attribution = Attribution(
+        itk_binary_dir, module_directories(manifest["itk_source_dir"]), class_modules
+    )
+    # Commands of incremental builds only cover what changed, use the last
+    # command of every output.
+    targets = read_ninja_log(ninja_log, last_run_only=False)
+    attribution.learn_targets(targets)
+
+    module_costs = dict((module, _new_cost()) for module in modules)
+    class_costs = {}
+    for target in targets:
+        kind = command_kind(target.outputs)
+        module = attribution.module_of(target.outputs)
+        if module not in module_costs:
+            module = UNATTRIBUTED
+        cost = module_costs.setdefault(module, _new_cost())
+        cost[kind] += target.duration
+        cost["commands"] += 1
+        if kind in ("castxml", "swig", "compile"):
+            classes = [wrapped_class(output) for output in target.outputs]
+            class_ = next((name for name in classes if name), None)
+            if class_ is not None:
+                class_cost = class_costs.setdefault(class_, _new_cost())
+                class_cost["module"] = class_modules.get(class_, module)
+                class_cost[kind] += target.duration
+                class_cost["commands"] += 1
+
+    if sizes is None:
+        sizes = measure_sizes(
+            itk_binary_dir,
+            sorted(modules),
+            jobs=jobs,
+            cmake_executable=cmake_executable,
+        )
+    for module, cost in module_costs.items():
+        info = modules.get(module, {})
+        cost["wheel_group"] = info.get("wheel_group")
+        cost["wrapped"] = bool(info.get("wrapped", False))
+        cost["installed_bytes"] = sizes.get(module) if sizes else None
+    for class_, cost in class_costs.items():
+        cost["instantiations"] = instantiations.get(class_)
+
+    return {
+        "version": REPORT_VERSION,
+        "itk_binary_dir": os.path.abspath(itk_binary_dir),
+        "ninja_log": os.path.abspath(ninja_log),
+        "partition_key": manifest["key"],
+        "wrapping_options": read_cache_entries(itk_binary_dir),
+        "modules": module_costs,
+        "classes": class_costs,
+    }
+
+
+def load_report(path):
+    with open(path, "r") as file_:
+        report = json.load(file_)
+    if report.get("version") != REPORT_VERSION:
+        raise ValueError(
+            "%s: unsupported report version %s" % (path, report.get("version"))
+        )
+    return report
+
+
+def rows(report, by="module"):
+    """Return a dictionary associating the name of every module, wheel or
+    wrapped class of `report` with its costs: the time of each kind of
+    command, the total ``time``, and the installed ``bytes`` (modules and
+    wheels) or template ``instantiations`` (classes)."""
+    result = {}
+    if by == "class":
+        for class_, cost in report["classes"].items():
+            row = dict((kind, cost[kind]) for kind in KINDS)
+            row["module"] = cost["module"]
+            row["instantiations"] = cost.get("instantiations")
+            result[class_] = row
+    else:
+        for module, cost in report["modules"].items():
+            if by == "wheel":
+                group = cost["wheel_group"]
+                name = group_to_wheel(group) if group else UNATTRIBUTED
+            else:
+                name = module
+            row = result.setdefault(
+                name, dict([(kind, 0.0) for kind in KINDS] + [("bytes", None)])
+            )
+            for kind in KINDS:
+                row[kind] += cost[kind]
+            if cost.get("installed_bytes") is not None:
+                row["bytes"] = (row["bytes"] or 0) + cost["installed_bytes"]
+            if by == "module":
+                row["wheel"] = (
+                    group_to_wheel(cost["wheel_group"]) if cost["wheel_group"] else ""
+                )
+    for row in result.values():
+        row["time"] = sum(row[kind] for kind in KINDS)
+    return result
+
+
+def _sort_value(row, key):
+    value = row.get(key)
+    return value if value is not None else 0
+
+
+def _sorted_names(names, key, value):
+    if key == "name":
+        return sorted(names)
+    return sorted(names, key=lambda name: (-abs(value(name)), name))
+
+
+def _format_bytes(size):
+    return format_size(size) if size is not None else "-"
+
+
+def _format_delta_bytes(before, after):
+    if before is None and after is None:
+        return "-"
+    delta = (after or 0) - (before or 0)
+    return ("+" if delta >= 0 else "-") + format_size(abs(delta))
+
+
+def _format_delta_time(delta):
+    return ("+" if delta >= 0 else "-") + format_duration(abs(delta))
+
+
+_ROW_FORMAT = "%-45s %-20s %10s %10s %10s %10s %10s %12s"
+
+
+def _label_column(by):
+    """Return the column displayed next to the name of each row."""
+    return {"module": "wheel", "class": "module"}.get(by)
+
+
+def _last_column(by):
+    return "instantiations" if by == "class" else "bytes"
+
+
+def _format_last(by, value):
+    if value is None:
+        return "-"
+    if by == "class":
+        return "%d" % value
+    return format_size(value)
+
+
+def _print_header(by):
+    label = _label_column(by)
+    print(
+        _ROW_FORMAT
+        % (
+            by.upper(),
+            (label or "").upper(),
+            "CASTXML",
+            "SWIG",
+            "COMPILE",
+            "LINK",
+            "TIME",
+            "INSTANCES" if by == "class" else "INSTALLED",
+        )
+    )
+
+
+def _print_options(report):
+    options = report.get("wrapping_options") or {}
+    if options:
+        print(
+            "Wrapping options: %s"
+            % ", ".join("%s=%s" % item for item in sorted(options.items()))
+        )
+
+
+def print_report(report, by="module", sort="time", top=None):
+    table = rows(report, by)
+    if sort == "bytes":
+        sort = _last_column(by)
+    names = _sorted_names(table, sort, lambda name: _sort_value(table[name], sort))
+    if top:
+        names = names[:top]
+    _print_options(report)
+    _print_header(by)
+    label = _label_column(by)
+    for name in names:
+        row = table[name]
+        print(
+            _ROW_FORMAT
+            % (
+                name,
+                row.get(label, "") if label else "",
+                format_duration(row["castxml"]),
+                format_duration(row["swig"]),
+                format_duration(row["compile"]),
+                format_duration(row["link"]),
+                format_duration(row["time"]),
+                _format_last(by, row[_last_column(by)]),
+            )
+        )
+    print(
+        _ROW_FORMAT
+        % (
+            "TOTAL (%d)" % len(table),
+            "",
+            format_duration(sum(row["castxml"] for row in table.values())),
+            format_duration(sum(row["swig"] for row in table.values())),
+            format_duration(sum(row["compile"] for row in table.values())),
+            format_duration(sum(row["link"] for row in table.values())),
+            format_duration(sum(row["time"] for row in table.values())),
+            _format_last(
+                by,
+                sum(_sort_value(row, _last_column(by)) for row in table.values()),
+            ),
+        )
+    )
+
+
+def compare(before, after, by="module", sort="time", top=None):
+    """Return the differences between the reports `before` and `after`, as a
+    list of ``(name, before_row, after_row)`` sorted by decreasing absolute
+    difference of `sort`. Rows missing from one of the reports are ``None``."""
+    before_rows = rows(before, by)
+    after_rows = rows(after, by)
+    if sort == "bytes":
+        sort = _last_column(by)
+    names = set(before_rows) | set(after_rows)
+
+    def delta(name):
+        return _sort_value(after_rows.get(name) or {}, sort) - _sort_value(
+            before_rows.get(name) or {}, sort
+        )
+
+    names = [
+        name
+        for name in _sorted_names(names, sort, delta)
+        if before_rows.get(name) != after_rows.get(name)
+    ]
+    if top:
+        names = names[:top]
+    return [(name, before_rows.get(name), after_rows.get(name)) for name in names]
+
+
+def print_comparison(before, after, by="module", sort="time", top=None):
+    options_before = before.get("wrapping_options") or {}
+    options_after = after.get("wrapping_options") or {}
+    for name in sorted(set(options_before) | set(options_after)):
+        if options_before.get(name) != options_after.get(name):
+            print(
+                "%s: %s -> %s"
+                % (name, options_before.get(name, "-"), options_after.get(name, "-"))
+            )
+    _print_header(by)
+    last = _last_column(by)
+    empty = dict((key, 0.0) for key in KINDS + ["time"])
+    for name, before_row, after_row in compare(before, after, by, sort, top):
+        old = before_row or dict(empty, **{last: None})
+        new = after_row or dict(empty, **{last: None})
+        if by == "class":
+            last_value = "%+d" % (_sort_value(new, last) - _sort_value(old, last))
+        else:
+            last_value = _format_delta_bytes(old[last], new[last])
+        label = _label_column(by)
+        status = ""
+        if before_row is None:
+            status = " (added)"
+        elif after_row is None:
+            status = " (removed)"
+        print(
+            _ROW_FORMAT
+            % (
+                name + status,
+                (new if after_row else old).get(label, "") if label else "",
+                _format_delta_time(new["castxml"] - old["castxml"]),
+                _format_delta_time(new["swig"] - old["swig"]),
+                _format_delta_time(new["compile"] - old["compile"]),
+                _format_delta_time(new["link"] - old["link"]),
+                _format_delta_time(new["time"] - old["time"]),
+                last_value,
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    collect_parser = subparsers.add_parser(
+        "collect", help="Write the report of an ITK build tree"
+    )
+    collect_parser.add_argument("--itk-binary-dir", required=True)
+    collect_parser.add_argument(
+        "--manifest",
+        default=None,
+        help="Wheel partition manifest (default: <itk-binary-dir>/%s)"
+        % os.path.basename(default_manifest_path("")),
+    )
+    collect_parser.add_argument(
+        "--ninja-log",
+        default=None,
+        help="Ninja log of the build (default: <itk-binary-dir>/.ninja_log)",
+    )
+    sizes_group = collect_parser.add_mutually_exclusive_group()
+    sizes_group.add_argument(
+        "--sizes",
+        default=None,
+        help="JSON file written by 'wheel_partition.py sizes' (default: measure "
+        "the sizes)",
+    )
+    sizes_group.add_argument(
+        "--no-sizes", action="store_true", help="Do not report installed sizes"
+    )
+    collect_parser.add_argument(
+        "--jobs", type=int, default=None, help="Number of concurrent installs"
+    )
+    collect_parser.add_argument("--cmake", default="cmake", help="CMake executable")
+    collect_parser.add_argument(
+        "--output", default="wrapping-cost.json", help="Output JSON file"
+    )
+
+    def add_display_arguments(display_parser):
+        display_parser.add_argument(
+            "--by",
+            choices=["module", "wheel", "class"],
+            default="module",
+            help="Display the costs by module, wheel or wrapped class",
+        )
+        display_parser.add_argument(
+            "--sort",
+            choices=SORT_KEYS,
+            default="time",
+            help="Sort key, 'bytes' sorts the wrapped classes by number of "
+            "instantiations",
+        )
+        display_parser.add_argument(
+            "--top", type=int, default=None, help="Number of rows to display"
+        )
+
+    show_parser = subparsers.add_parser("show", help="Display a report")
+    show_parser.add_argument("report")
+    add_display_arguments(show_parser)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Display the differences between the reports of two builds"
+    )
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    add_display_arguments(compare_parser)
+
+    args = parser.parse_args()
+
+    if args.command == "collect":
+        manifest = load_manifest(
+            args.manifest or default_manifest_path(args.itk_binary_dir)
+        )
+        sizes = None
+        if args.no_sizes:
+            sizes = {}
+        elif args.sizes:
+            with open(args.sizes, "r") as file_:
+                sizes = json.load(file_)
+        report = collect(
+            args.itk_binary_dir,
+            manifest=manifest,
+            ninja_log=args.ninja_log,
+            sizes=sizes,
+            jobs=args.jobs,
+            cmake_executable=args.cmake,
+        )
+        with open(args.output, "w") as file_:
+            json.dump(report, file_, indent=2, sort_keys=True)
+        print(
+            "Wrote report of %d module(s) to %s" % (len(report["modules"]), args.output)
+        )
+    elif args.command == "show":
+        print_report(load_report(args.report), args.by, args.sort, args.top)
+    elif args.command == "compare":
+        print_comparison(
+            load_report(args.before),
+            load_report(args.after),
+            args.by,
+            args.sort,
+            args.top,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+#!/usr/bin/env python
+
+"""CLI selecting the wrapped types of the ITK wheels and comparing the cost of
+the wrapping profiles.
+
+The pixel types and image dimensions wrapped for Python multiply the number of
+template instantiations, and therefore the build time, the size of the wheels
+and the time spent loading them. A wrapping profile is a named set of the
+``ITK_WRAP_*`` options passed to the ITK build and to the ``pyproject.toml``
+of every wheel:
+
+* ``minimal``: 2D images of the default ITK pixel types
+* ``standard``: 2D and 3D images of the default ITK pixel types
+* ``full``: 2D, 3D and 4D images, adding ``unsigned short``, ``double`` and
+  ``complex<double>`` pixels. This is the profile of the published wheels.
+
+The build drivers use the profile named by ``ITK_WRAPPING_PROFILE``
+(``windows_build_wheels.py --wrapping-profile``), ``full`` by default. The
+profile and the wrapping options of the ITK build are recorded in the
+``itk_wrapping_profile.json`` file of the ``.dist-info`` directory of every
+wheel.
+
+Usage::
+
+    wrapping_profiles.py list [-h]
+    wrapping_profiles.py cmake-args [-h] [profile]
+    wrapping_profiles.py property [-h] {description,docs_tests} [profile]
+    wrapping_profiles.py measure [-h] [--profile PROFILE]
+                                 [--itk-binary-dir ITK_BINARY_DIR]
+                                 [--python PYTHON] [--repeat REPEAT]
+                                 [--output OUTPUT]
+                                 [wheel ...]
+    wrapping_profiles.py compare [-h] measurement [measurement ...]
+
+``cmake-args`` prints the CMake options configuring ITK for a profile, one per
+line.
+``property`` prints a property of a profile, for example ``docs_tests`` is 1
+if the examples of ``docs/code`` can run with the wheels of the profile.
+
+``measure`` records the cost of the profile recorded in the wheels of a build:
+the time of the CastXML, SWIG, compile and link commands of the ``.ninja_log``
+of its ITK build tree, the size of its wheels, and the time taken by
+``import itk``, by the first instantiation of a wrapped type and by an import
+loading every module (``itkConfig.LazyLoading = False``) once the wheels are
+installed in a temporary directory. ``compare`` displays the measurements of several
+profiles side by side.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import zipfile
+
+from benchmark_results import install_wheels
+from build_trace import format_duration, read_ninja_log
+from wheel_partition import format_size
+from wrapping_cost import KINDS, command_kind
+
+PROFILE_ENV = "ITK_WRAPPING_PROFILE"
+
+# Name of the file recording the profile in the .dist-info directory of the
+# wheels, written by CMakeLists.txt.
+METADATA_FILE = "itk_wrapping_profile.json"
+
+DEFAULT_PROFILE = "full"
+
+# Version of the format of the measurements. Increment it when their content
+# changes.
+MEASUREMENT_VERSION = 1
+
+# ITK_WRAP_* options of every profile. Every profile sets all of them, so that
+# switching profile in an existing ITK build tree does not keep the options of
+# the previous one.
+PROFILES = {
+    "minimal": {
+        "description": "2D images of the default ITK pixel types",
+        "options": [
+            ("ITK_WRAP_unsigned_short", "BOOL", "OFF"),
+            ("ITK_WRAP_double", "BOOL", "OFF"),
+            ("ITK_WRAP_complex_double", "BOOL", "OFF"),
+            ("ITK_WRAP_IMAGE_DIMS", "STRING", "2"),
+        ],
+        # docs/code instantiates 3D images
+        "docs_tests": False,
+    },
+    "standard": {
+        "description": "2D and 3D images of the default ITK pixel types",
+        "options": [
+            ("ITK_WRAP_unsigned_short", "BOOL", "OFF"),
+            ("ITK_WRAP_double", "BOOL", "OFF"),
+            ("ITK_WRAP_complex_double", "BOOL", "OFF"),
+            ("ITK_WRAP_IMAGE_DIMS", "STRING", "2;3"),
+        ],
+        "docs_tests": True,
+    },
+    "full": {
+        "description": "2D, 3D and 4D images, adding unsigned short, double "
+        "and complex double pixels",
+        "options": [
+            ("ITK_WRAP_unsigned_short", "BOOL", "ON"),
+            ("ITK_WRAP_double", "BOOL", "ON"),
+            ("ITK_WRAP_complex_double", "BOOL", "ON"),
+            ("ITK_WRAP_IMAGE_DIMS", "STRING", "2;3;4"),
+        ],
+        "docs_tests": True,
+    },
+}
+
+# Code timed by 'measure', each snippet runs in a new interpreter.
+IMPORT_SNIPPETS = [
+    ("import", "import itk"),
+    ("first_use", "import itk; itk.Image[itk.UC, 2].New()"),
+    ("eager_import", "import itkConfig; itkConfig.LazyLoading = False; import itk"),
+]
+
+
+def default_profile():
+    """Return the profile named by ``ITK_WRAPPING_PROFILE``, or the default
+    profile."""
+    return os.environ.get(PROFILE_ENV) or DEFAULT_PROFILE
+
+
+def check_profile(profile):
+    if profile not in PROFILES:
+        raise ValueError(
+            "Unknown wrapping profile '%s', expected one of: %s"
+            % (profile, ", ".join(PROFILES))
+        )
+    return profile
+
+
+def itk_cmake_args(profile=None):
+    """Return the CMake options configuring ITK for the wrapping `profile`
+    (default: :func:`default_profile`)."""
+    profile = check_profile(profile or default_profile())
+    return ["-D%s:%s=%s" % option for option in PROFILES[profile]["options"]]
+
+
+def package_cmake_args(profile=None):
+    """Return the CMake options configuring the ``ITKPythonPackage`` project
+    of a wheel for the wrapping `profile`, which is recorded in the wheel."""
+    profile = check_profile(profile or default_profile())
+    return itk_cmake_args(profile) + [
+        "-DITKPythonPackage_WRAPPING_PROFILE:STRING=%s" % profile
+    ]
+
+
+def read_wheel_profile(wheel):
+    """Return the wrapping profile recorded in `wheel`, as a dictionary
+    providing its ``profile`` name and the ``options`` of the ITK build, or
+    ``None`` if it is not recorded."""
+    with zipfile.ZipFile(wheel) as archive:
+        for name in archive.namelist():
+            parts = name.split("/")
+            if (
+                len(parts) == 2
+                and parts[0].endswith(".dist-info")
+                and parts[1] == METADATA_FILE
+            ):
+                return json.loads(archive.read(name).decode("utf-8"))
+    return None
+
+
+def build_cost(ninja_log):
+    """Return the time of the commands of `ninja_log` by kind of command, and
+    in total."""
+    cost = dict((kind, 0.0) for kind in KINDS)
+    for target in read_ninja_log(ninja_log, last_run_only=False):
+        cost[command_kind(target.outputs)] += target.duration
+    cost["total"] = sum(cost.values())
+    return cost
+
+
+def time_snippet(python_executable, snippet, site_dir, repeat=5):
+    """Return the median time, in seconds, taken by `snippet` in `repeat` new
+    interpreters importing from `site_dir`, after a first run warming up the
+    file system cache."""
+    code = (
+        "import time\n"
+        "_start = time.perf_counter()\n"
+        "%s\n"
+        "print(time.perf_counter() - _start)\n" % snippet
+    )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = site_dir
+    times = []
+    for _ in range(repeat + 1):
+        output = subprocess.check_output(
+            [python_executable, "-c", code], cwd=site_dir, env=env
+        )
+        times.append(float(output.decode().strip().splitlines()[-1]))
+    return statistics.median(times[1:])
+
+
+def measure(
+    wheels, profile=None, itk_binary_dir=None, python_executable=None, repeat=5
+):
+    """Return the measurement of the cost of the profile of a build producing
+    `wheels`, using the ``.ninja_log`` of `itk_binary_dir` if any.
+
+    The profile and its options are read from the metadata of the wheels
+    unless `profile` is given.
+    """
+    python_executable = python_executable or sys.executable
+    recorded = None
+    for wheel in wheels:
+        recorded = read_wheel_profile(wheel)
+        if recorded:
+            break
+    if profile is None and recorded:
+        profile = recorded["profile"]
+        options = recorded["options"]
+    else:
+        profile = check_profile(profile or default_profile())
+        options = dict((name, value) for name, _, value in PROFILES[profile]["options"])
+    measurement = {
+        "version": MEASUREMENT_VERSION,
+        "profile": profile,
+        "options": options,
+        "build": None,
+        "wheels": dict(
+            (os.path.basename(wheel), os.path.getsize(wheel)) for wheel in wheels
+        ),
+        "import": {},
+    }
+    if itk_binary_dir:
+        measurement["build"] = build_cost(os.path.join(itk_binary_dir, ".ninja_log"))
+    if wheels:
+        site_dir = tempfile.mkdtemp(prefix="ipp-wrapping-profile-")
+        try:
+            install_wheels(python_executable, wheels, site_dir)
+            for name, snippet in IMPORT_SNIPPETS:
+                measurement["import"][name] = time_snippet(
+                    python_executable, snippet, site_dir, repeat
+                )
+        finally:
+            shutil.rmtree(site_dir, ignore_errors=True)
+    return measurement
+
+
+def load_measurement(path):
+    with open(path, "r") as file_:
+        measurement = json.load(file_)
+    if measurement.get("version") != MEASUREMENT_VERSION:
+        raise ValueError(
+            "%s: unsupported measurement version %s"
+            % (path, measurement.get("version"))
+        )
+    return measurement
+
+
+def _relative(value, reference):
+    if value is None or not reference:
+        return "-"
+    return "%+.0f%%" % (100.0 * (value - reference) / reference)
+
+
+def _columns(measurement):
+    """Return the compared values of `measurement`, ``None`` if unknown."""
+    build = measurement.get("build") or {}
+    imports = measurement.get("import") or {}
+    return [
+        build.get("castxml"),
+        build.get("swig"),
+        build.get("compile"),
+        build.get("link"),
+        build.get("total"),
+        sum(measurement["wheels"].values()) if measurement["wheels"] else None,
+        imports.get("import"),
+        imports.get("first_use"),
+        imports.get("eager_import"),
+    ]
+
+
+def print_comparison(measurements):
+    headers = [
+        "CASTXML",
+        "SWIG",
+        "COMPILE",
+        "LINK",
+        "BUILD",
+        "WHEELS",
+        "IMPORT",
+        "FIRST USE",
+        "EAGER",
+    ]
+    row_format = "%-10s %-8s" + " %10s" * len(headers)
+    print(row_format % tuple(["PROFILE", "DIMS"] + headers))
+
+    def format_value(index, value):
+        if value is None:
+            return "-"
+        if index == 5:
+            return format_size(value)
+        if index > 5:
+            return "%.0fms" % (value * 1000.0)
+        return format_duration(value)
+
+    for measurement in measurements:
+        print(
+            row_format
+            % tuple(
+                [
+                    measurement["profile"],
+                    measurement["options"].get("ITK_WRAP_IMAGE_DIMS", "-"),
+                ]
+                + [
+                    format_value(index, value)
+                    for index, value in enumerate(_columns(measurement))
+                ]
+            )
+        )
+
+    if len(measurements) < 2:
+        return
+    reference = measurements[0]
+    print("")
+    print("Relative to %s:" % reference["profile"])
+    for measurement in measurements[1:]:
+        print(
+            row_format
+            % tuple(
+                [measurement["profile"], ""]
+                + [
+                    _relative(value, reference_value)
+                    for value, reference_value in zip(
+                        _columns(measurement), _columns(reference)
+                    )
+                ]
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    subparsers.add_parser("list", help="List the wrapping profiles")
+
+    cmake_args_parser = subparsers.add_parser(
+        "cmake-args",
+        help="Print the CMake options configuring ITK for a profile, one per line",
+    )
+    cmake_args_parser.add_argument(
+        "profile",
+        nargs="?",
+        default=None,
+        help="Wrapping profile (default: %s or %s)" % (PROFILE_ENV, DEFAULT_PROFILE),
+    )
+
+    property_parser = subparsers.add_parser(
+        "property", help="Print a property of a profile"
+    )
+    property_parser.add_argument("name", choices=["description", "docs_tests"])
+    property_parser.add_argument(
+        "profile",
+        nargs="?",
+        default=None,
+        help="Wrapping profile (default: %s or %s)" % (PROFILE_ENV, DEFAULT_PROFILE),
+    )
+
+    measure_parser = subparsers.add_parser(
+        "measure", help="Measure the build time, wheel size and import time"
+    )
+    measure_parser.add_argument(
+        "--profile",
+        default=None,
+        help="Profile of the build (default: the profile recorded in the "
+        "wheels, %s or %s)" % (PROFILE_ENV, DEFAULT_PROFILE),
+    )
+    measure_parser.add_argument(
+        "--itk-binary-dir",
+        default=None,
+        help="ITK build tree of the build, whose .ninja_log is read",
+    )
+    measure_parser.add_argument(
+        "--python",
+        default=sys.executable,
+        help="Interpreter compatible with the wheels, numpy must be installed",
+    )
+    measure_parser.add_argument(
+        "--repeat", type=int, default=5, help="Number of timed runs of each import"
+    )
+    measure_parser.add_argument(
+        "--output",
+        default=None,
+        help="Output JSON file (default: wrapping-profile-<profile>.json)",
+    )
+    measure_parser.add_argument(
+        "wheels", metavar="wheel", nargs="*", help="Wheels produced by the build"
+    )
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare the measurements of several profiles"
+    )
+    compare_parser.add_argument(
+        "measurements",
+        metavar="measurement",
+        nargs="+",
+        help="JSON files written by the 'measure' command, the first one is "
+        "the reference",
+    )
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "list":
+            for name, profile in PROFILES.items():
+                print("%-10s %s" % (name, profile["description"]))
+                for option in profile["options"]:
+                    print("             -D%s:%s=%s" % option)
+        elif args.command == "cmake-args":
+            print("\n".join(itk_cmake_args(args.profile)))
+        elif args.command == "property":
+            profile = check_profile(args.profile or default_profile())
+            value = PROFILES[profile][args.name]
+            if isinstance(value, bool):
+                value = int(value)
+            print(value)
+        elif args.command == "measure":
+            if not args.wheels and not args.itk_binary_dir:
+                parser.error("at least one wheel or --itk-binary-dir is required")
+            measurement = measure(
+                args.wheels,
+                args.profile,
+                args.itk_binary_dir,
+                args.python,
+                args.repeat,
+            )
+            output = args.output or "wrapping-profile-%s.json" % measurement["profile"]
+            with open(output, "w") as file_:
+                json.dump(measurement, file_, indent=2, sort_keys=True)
+            print_comparison([measurement])
+            print("")
+            print("Measurement written to %s" % output)
+        elif args.command == "compare":
+            print_comparison([load_measurement(path) for path in args.measurements])
+    except ValueError as exc:
+        print("error: %s" % exc, file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -77,3 +77,22 @@ brew info ninja | grep --quiet 'Not installed' && brew install ninja
 NINJA_EXECUTABLE=$(which ninja)
 brew info cmake | grep --quiet 'Not installed' && brew install cmake
 CMAKE_EXECUTABLE=$(which cmake)
+
+# -----------------------------------------------------------------------
+# Compiler cache
+#
+# Set ITK_COMPILER_CACHE to ccache or sccache to cache compilation results in
+# ITK_COMPILER_CACHE_DIR. COMPILER_LAUNCHER_ARGS is set to the array of the
+# corresponding CMake options.
+COMPILER_LAUNCHER_ARGS=()
+if [[ -n ${ITK_COMPILER_CACHE} ]]; then
+  brew info ${ITK_COMPILER_CACHE} | grep --quiet 'Not installed' && brew install ${ITK_COMPILER_CACHE}
+  export ITK_COMPILER_CACHE
+  export ITK_COMPILER_CACHE_BASEDIR=${ITK_COMPILER_CACHE_BASEDIR:=$(cd ${SCRIPT_DIR}/.. && pwd)}
+  eval "$(python3 ${SCRIPT_DIR}/internal/compiler_cache.py shell-env)"
+  # One option per line. The bash of macOS has no mapfile.
+  while IFS= read -r arg; do
+    COMPILER_LAUNCHER_ARGS+=("${arg}")
+  done < <(python3 ${SCRIPT_DIR}/internal/compiler_cache.py cmake-args)
+  echo "Using compiler cache: ${COMPILER_LAUNCHER_ARGS[*]}"
+fi
@@ -53,7 +53,9 @@ for MODULE_INFO in ${ITK_MODULE_PREQ_TOPLEVEL//:/ }; do
   git checkout ${MODULE_TAG}
   cp ${script_dir}/macpython-download-cache-and-build-module-wheels.sh .
   echo "Building dependency ${MODULE_NAME}"
+  trace_begin module-dep module=${MODULE_NAME} tag=${MODULE_TAG}
   ./macpython-download-cache-and-build-module-wheels.sh $@
+  trace_end $?
   popd
 
   cp ./${MODULE_NAME}/include/* include/
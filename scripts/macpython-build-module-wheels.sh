@@ -38,8 +38,16 @@
 
 script_dir=$(cd $(dirname $0) || exit 1; pwd)
 
+# Record the timeline of the build in logs/build-trace.jsonl, reported when the
+# script exits. Module dependencies are recorded in the same trace.
+source "${script_dir}/internal/build-trace.sh"
+trace_start $PWD/logs/build-trace.jsonl
+trap 'trace_report python3' EXIT
+
 if [[ -n ${ITK_MODULE_PREQ} ]]; then
+  trace_begin module-deps
   source "${script_dir}/macpython-build-module-deps.sh"
+  trace_end
 fi
 
 # -----------------------------------------------------------------------
@@ -82,6 +90,7 @@ for VENV in "${VENVS[@]}"; do
     echo "Python3_EXECUTABLE:${Python3_EXECUTABLE}"
     echo "Python3_INCLUDE_DIR:${Python3_INCLUDE_DIR}"
 
+    trace_begin --track ${py_mm} build
     if [[ $(arch) == "arm64" ]]; then
       plat_name="macosx-15.0-arm64"
       osx_target="15.0"
@@ -99,7 +108,9 @@ for VENV in "${VENVS[@]}"; do
     export MACOSX_DEPLOYMENT_TARGET=${osx_target}
 
     if [[ -e $PWD/requirements-dev.txt ]]; then
+      trace_begin prepare-env
       ${Python3_EXECUTABLE} -m pip install --upgrade -r $PWD/requirements-dev.txt
+      trace_end
     fi
     itk_build_path="${build_path}"
     py_minor=$(echo $py_mm | cut -d '.' -f 2)
@@ -107,6 +118,10 @@ for VENV in "${VENVS[@]}"; do
     if test $py_minor -ge 11; then
       wheel_py_api=cp3$py_minor
     fi
+    compiler_cache_stats=$PWD/compiler-cache-stats-${py_mm}.log
+    rm -f ${compiler_cache_stats}
+    export CCACHE_STATSLOG=${compiler_cache_stats}
+    trace_begin package-wheel
     ${Python3_EXECUTABLE} -m build \
       --verbose \
       --wheel \
@@ -124,11 +139,23 @@ for VENV in "${VENVS[@]}"; do
       --config-setting=cmake.define.BUILD_TESTING:BOOL=OFF \
       --config-setting=cmake.define.Python3_EXECUTABLE:FILEPATH=${Python3_EXECUTABLE} \
       --config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR} \
+      "${COMPILER_LAUNCHER_ARGS[@]/#-D/--config-setting=cmake.define.}" \
       ${CMAKE_OPTIONS//'-D'/'--config-setting=cmake.define.'} \
     || exit 1
+    trace_end
+
+    if [[ -n ${ITK_COMPILER_CACHE} ]]; then
+      ${Python3_EXECUTABLE} ${SCRIPT_DIR}/internal/compiler_cache.py report \
+        --stats-log ${compiler_cache_stats} \
+        --title "Compiler cache for ${py_mm}"
+      rm -f ${compiler_cache_stats}
+    fi
+    trace_end
 done
 
+trace_begin repair-wheels
 for wheel in $PWD/dist/*.whl; do
   ${DELOCATE_LISTDEPS} $wheel # lists library dependencies
   ${DELOCATE_WHEEL} $wheel # copies library dependencies into wheel
 done
+trace_end
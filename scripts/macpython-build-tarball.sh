@@ -12,18 +12,18 @@ if test $(arch) == "arm64"; then
   tbb_contents=""
 fi
 
+script_dir=$(cd $(dirname $0) || exit 1; pwd)
+
 pushd /Users/svc-dashboard/D/P > /dev/null
 dot_clean ITKPythonPackage
-tar -cf ITKPythonBuilds-macosx${arch_postfix}.tar \
+# The tar stream is compressed on the fly into independent zstd frames, see
+# build_cache_archive.py.
+python3 ${script_dir}/internal/build_cache_archive.py create \
+  --output ./ITKPythonBuilds-macosx${arch_postfix}.tar.zst \
+  --level 10 \
   ITKPythonPackage/ITK-* \
   ${tbb_contents} \
   ITKPythonPackage/venvs \
   ITKPythonPackageRequiredExtractionDir.txt \
   ITKPythonPackage/scripts
-zstd -f \
-  -10 \
-  -T6 \
-  --long=31 \
-  ./ITKPythonBuilds-macosx${arch_postfix}.tar \
-  -o ./ITKPythonBuilds-macosx${arch_postfix}.tar.zst
 popd > /dev/null
@@ -15,6 +15,10 @@
 #   export DYLD_LIBRARY_PATH="/path/to/libs"
 #   scripts/macpython-build-module-wheels.sh 3.9
 #
+# The wrapped pixel types and image dimensions are selected by exporting
+# ITK_WRAPPING_PROFILE (minimal, standard or full, the default). See
+# scripts/internal/wrapping_profiles.py.
+#
 
 # -----------------------------------------------------------------------
 # These variables are set in common script:
@@ -35,6 +39,13 @@ SCRIPT_DIR=""
 script_dir=$(cd $(dirname $0) || exit 1; pwd)
 source "${script_dir}/macpython-build-common.sh"
 
+# -----------------------------------------------------------------------
+# Record the timeline of the build in logs/build-trace.jsonl, reported when the
+# script exits.
+source "${SCRIPT_DIR}/internal/build-trace.sh"
+trace_start ${SCRIPT_DIR}/../logs/build-trace.jsonl
+trap 'trace_report ${VENVS[0]}/bin/python' EXIT
+
 # -----------------------------------------------------------------------
 # Remove previous virtualenv's
 rm -rf ${SCRIPT_DIR}/../venvs
@@ -62,6 +73,14 @@ DELOCATE_PATCH=${VENV}/bin/delocate-patch
 
 build_type="Release"
 
+# Wrapping profile selecting the wrapped pixel types and image dimensions. The
+# examples of docs/code are only run if the profile wraps the types they use.
+export ITK_WRAPPING_PROFILE=${ITK_WRAPPING_PROFILE:=full}
+wrapping_profile_args=$(${Python3_EXECUTABLE} ${SCRIPT_DIR}/internal/wrapping_profiles.py cmake-args) || exit 1
+wrapping_profile_args=(${wrapping_profile_args})
+run_docs_tests=$(${Python3_EXECUTABLE} ${SCRIPT_DIR}/internal/wrapping_profiles.py property docs_tests)
+echo "Wrapping profile: ${ITK_WRAPPING_PROFILE}"
+
 if [[ $(arch) == "arm64" ]]; then
   osx_target="15.0"
   osx_arch="arm64"
@@ -79,6 +98,7 @@ tbb_dir=$PWD/oneTBB-prefix/lib/cmake/TBB
 n_processors=$(sysctl -n hw.ncpu)
 # So delocate can find the libs
 export DYLD_LIBRARY_PATH=${DYLD_LIBRARY_PATH}:$PWD/oneTBB-prefix/lib
+trace_begin superbuild ninja_log=$PWD/ITK-source/.ninja_log
 mkdir -p ITK-source
 pushd ITK-source > /dev/null 2>&1
   ${CMAKE_EXECUTABLE} -DITKPythonPackage_BUILD_PYTHON:PATH=0 \
@@ -88,9 +108,11 @@ pushd ITK-source > /dev/null 2>&1
     -DCMAKE_MAKE_PROGRAM:FILEPATH=${NINJA_EXECUTABLE} \
     -DCMAKE_OSX_DEPLOYMENT_TARGET:STRING=${osx_target} \
     -DCMAKE_OSX_ARCHITECTURES:STRING=${osx_arch} \
+    -DITKPythonPackage_COMPILER_LAUNCHER:STRING=${ITK_COMPILER_CACHE} \
       ${SCRIPT_DIR}/../
   ${NINJA_EXECUTABLE} -j$n_processors -l$n_processors
 popd > /dev/null 2>&1
+trace_end
 
 SINGLE_WHEEL=0
 
@@ -104,7 +126,10 @@ for VENV in "${VENVS[@]}"; do
     echo "Python3_EXECUTABLE:${Python3_EXECUTABLE}"
     echo "Python3_INCLUDE_DIR:${Python3_INCLUDE_DIR}"
 
+    trace_begin --track ${py_mm} build
+    trace_begin prepare-env
     ${Python3_EXECUTABLE} -m pip install --upgrade -r ${SCRIPT_DIR}/../requirements-dev.txt
+    trace_end
 
     if [[ $(arch) == "arm64" ]]; then
       plat_name="macosx-15.0-arm64"
@@ -131,6 +156,7 @@ for VENV in "${VENVS[@]}"; do
       # Configure pyproject.toml
       ${Python3_EXECUTABLE} ${PYPROJECT_CONFIGURE} "itk"
       # Generate wheel
+      trace_begin package-wheel wheel=itk
       ${Python3_EXECUTABLE} -m build \
         --verbose \
         --wheel \
@@ -146,8 +172,10 @@ for VENV in "${VENVS[@]}"; do
         --config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR} \
         --config-setting=cmake.define.Module_ITKTBB:BOOL=${use_tbb} \
         --config-setting=cmake.define.TBB_DIR:PATH=${tbb_dir} \
+        "${COMPILER_LAUNCHER_ARGS[@]/#-D/--config-setting=cmake.define.}" \
         . \
         ${CMAKE_OPTIONS}
+      trace_end
 
     else
 
@@ -156,6 +184,9 @@ for VENV in "${VENVS[@]}"; do
       echo "#"
 
       # Build ITK python
+      compiler_cache_stats=${build_path}/compiler-cache-stats.log
+      export CCACHE_STATSLOG=${compiler_cache_stats}
+      trace_begin itk-build ninja_log=${build_path}/.ninja_log
       (
         mkdir -p ${build_path} \
         && cd ${build_path} \
@@ -166,10 +197,7 @@ for VENV in "${VENVS[@]}"; do
           -DBUILD_TESTING:BOOL=OFF \
           -DCMAKE_OSX_DEPLOYMENT_TARGET:STRING=${osx_target} \
           -DCMAKE_OSX_ARCHITECTURES:STRING=${osx_arch} \
-          -DITK_WRAP_unsigned_short:BOOL=ON \
-          -DITK_WRAP_double:BOOL=ON \
-          -DITK_WRAP_complex_double:BOOL=ON \
-          -DITK_WRAP_IMAGE_DIMS:STRING="2;3;4" \
+          "${wrapping_profile_args[@]}" \
           -DPython3_EXECUTABLE:FILEPATH=${Python3_EXECUTABLE} \
           -DPython3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR} \
           -DWRAP_ITK_INSTALL_COMPONENT_IDENTIFIER:STRING=PythonWheel \
@@ -180,59 +208,89 @@ for VENV in "${VENVS[@]}"; do
           -DITK_WRAP_DOC:BOOL=ON \
           -DModule_ITKTBB:BOOL=${use_tbb} \
           -DTBB_DIR:PATH=${tbb_dir} \
+          "${COMPILER_LAUNCHER_ARGS[@]}" \
           ${CMAKE_OPTIONS} \
           -G Ninja \
           ${source_path} \
         && ninja -j$n_processors -l$n_processors \
         || exit 1
       )
+      trace_end
+      if [[ -n ${ITK_COMPILER_CACHE} ]]; then
+        ${Python3_EXECUTABLE} ${SCRIPT_DIR}/internal/compiler_cache.py report \
+          --stats-log ${compiler_cache_stats} \
+          --title "Compiler cache for $(basename ${build_path})"
+      fi
 
-      wheel_names=$(cat ${SCRIPT_DIR}/WHEEL_NAMES.txt)
-      for wheel_name in ${wheel_names}; do
-        # Configure pyproject.toml
-        ${Python3_EXECUTABLE} ${PYPROJECT_CONFIGURE} ${wheel_name}
-        # Generate wheel
-        ${Python3_EXECUTABLE} -m build \
-          --verbose \
-          --wheel \
-          --outdir dist \
-          --no-isolation \
-          --skip-dependency-check \
-          --config-setting=cmake.define.ITK_SOURCE_DIR:PATH=${source_path} \
-          --config-setting=cmake.define.ITK_BINARY_DIR:PATH=${build_path} \
-          --config-setting=cmake.define.CMAKE_OSX_DEPLOYMENT_TARGET:STRING=${osx_target} \
-          --config-setting=cmake.define.CMAKE_OSX_ARCHITECTURES:STRING=${osx_arch} \
-          --config-setting=cmake.define.ITKPythonPackage_USE_TBB:BOOL=${use_tbb} \
-          --config-setting=cmake.define.ITKPythonPackage_ITK_BINARY_REUSE:BOOL=ON \
-          --config-setting=cmake.define.ITKPythonPackage_WHEEL_NAME:STRING=${wheel_name} \
-          --config-setting=cmake.define.Python3_EXECUTABLE:FILEPATH=${Python3_EXECUTABLE} \
-          --config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR} \
-          . \
-          ${CMAKE_OPTIONS} \
-        || exit 1
-      done
+      # Compute the partition of ITK modules into wheels once, it is re-used
+      # when packaging every wheel.
+      trace_begin wheel-partition
+      ${Python3_EXECUTABLE} ${SCRIPT_DIR}/internal/wheel_partition.py manifest \
+        --cmake ${CMAKE_EXECUTABLE} \
+        --itk-source-dir ${source_path} \
+        --itk-binary-dir ${build_path}
+      trace_end
+
+      # Package the group wheels concurrently, each one in its own source and
+      # build directory. Set ITK_WHEEL_PACKAGING_JOBS to bound the number of
+      # wheels packaged at the same time.
+      trace_begin package-wheels
+      ${Python3_EXECUTABLE} ${SCRIPT_DIR}/internal/wheel_packaging.py \
+        --python ${Python3_EXECUTABLE} \
+        --output-dir dist \
+        --staging-dir ${SCRIPT_DIR}/../build/wheels-${py_mm} \
+        --log-dir ${SCRIPT_DIR}/../logs/wheels-${py_mm} \
+        -- \
+        --config-setting=cmake.define.ITK_SOURCE_DIR:PATH=${source_path} \
+        --config-setting=cmake.define.ITK_BINARY_DIR:PATH=${build_path} \
+        --config-setting=cmake.define.CMAKE_OSX_DEPLOYMENT_TARGET:STRING=${osx_target} \
+        --config-setting=cmake.define.CMAKE_OSX_ARCHITECTURES:STRING=${osx_arch} \
+        --config-setting=cmake.define.ITKPythonPackage_USE_TBB:BOOL=${use_tbb} \
+        --config-setting=cmake.define.ITKPythonPackage_ITK_BINARY_REUSE:BOOL=ON \
+        --config-setting=cmake.define.TBB_DIR:PATH=${tbb_dir} \
+        --config-setting=cmake.define.Python3_EXECUTABLE:FILEPATH=${Python3_EXECUTABLE} \
+        --config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=${Python3_INCLUDE_DIR} \
+        ${CMAKE_OPTIONS//'-D'/'--config-setting=cmake.define.'} \
+      || exit 1
+      trace_end
 
     fi
 
     # Remove unnecessary files for building against ITK
+    trace_begin cleanup
     find ${build_path} -name '*.cpp' -delete -o -name '*.xml' -delete
     rm -rf ${build_path}/Wrapping/Generators/castxml*
     find ${build_path} -name '*.o' -delete
+    trace_end
+    trace_end
 done
 
 if [[ $(arch) != "arm64" ]]; then
+  trace_begin repair-wheels
   for wheel in dist/itk_*.whl; do
     echo "Delocating $wheel"
     ${DELOCATE_LISTDEPS} $wheel # lists library dependencies
     ${DELOCATE_WHEEL} $wheel # copies library dependencies into wheel
   done
+  trace_end
 fi
 
 for VENV in "${VENVS[@]}"; do
+  trace_begin --track $(basename ${VENV}) test
+  trace_begin install
   ${VENV}/bin/pip install numpy
   ${VENV}/bin/pip install itk --no-cache-dir --no-index -f ${SCRIPT_DIR}/../dist
+  trace_end
+  trace_begin smoke-tests
   (cd $HOME && ${VENV}/bin/python -c 'import itk;')
   (cd $HOME && ${VENV}/bin/python -c 'import itk; image = itk.Image[itk.UC, 2].New()')
   (cd $HOME && ${VENV}/bin/python -c 'import itkConfig; itkConfig.LazyLoading = False; import itk;')
-  (cd $HOME && ${VENV}/bin/python ${SCRIPT_DIR}/../docs/code/test.py )
+  trace_end
+  if [[ ${run_docs_tests} == 1 ]]; then
+    trace_begin docs-tests
+    (cd $HOME && ${VENV}/bin/python ${SCRIPT_DIR}/internal/docs_test_runner.py \
+      --junit-xml ${SCRIPT_DIR}/../logs/docs-tests-$(basename ${VENV}).xml ) || exit 1
+    trace_end
+  fi
+  trace_end
 done
@@ -37,6 +37,8 @@
 #
 ########################################################################
 
+download_start=$(date +%s)
+
 # Install dependencies
 brew update
 brew install --quiet zstd aria2 gnu-tar doxygen ninja
@@ -91,6 +93,15 @@ if [[ ! -d /Users/svc-dashboard/D/P/ITKPythonPackage ]]; then
   mv ITKPythonPackage /Users/svc-dashboard/D/P/
 fi
 
+# Record the timeline of the module build in logs/build-trace.jsonl, reported
+# when the script exits.
+if [[ -f /Users/svc-dashboard/D/P/ITKPythonPackage/scripts/internal/build-trace.sh ]]; then
+  source /Users/svc-dashboard/D/P/ITKPythonPackage/scripts/internal/build-trace.sh
+  trace_start $PWD/logs/build-trace.jsonl
+  trap 'trace_report python3' EXIT
+  trace_record download ${download_start}
+fi
+
 # Optionally install baseline Python versions
 if [[ ! ${ITK_USE_LOCAL_PYTHON} ]]; then
   echo "Fetching Python frameworks"
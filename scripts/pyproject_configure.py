@@ -8,7 +8,9 @@ of the `wheel_name` positional parameter.
 
 Usage::
 
-    pyproject_configure.py [-h] [--output-dir OUTPUT_DIR] wheel_name
+    pyproject_configure.py [-h] [--output-dir OUTPUT_DIR] [--all]
+                           [--wrapping-profile PROFILE]
+                           [wheel_name ...]
 
     positional arguments:
       wheel_name
@@ -18,18 +20,35 @@ Usage::
       --output-dir OUTPUT_DIR
                             Output directory for configured 'pyproject.toml'
                             (default: /work)
+      --all                 Configure 'pyproject.toml' of every wheel read from
+                            'WHEEL_NAMES.txt' (or of the given wheel names) into
+                            '<output_dir>/<wheel_name>/pyproject.toml'
+                            (default: False)
+      --wrapping-profile PROFILE
+                            Wrapping profile selecting the ITK_WRAP_* options
+                            of the wheels, see
+                            'internal/wrapping_profiles.py' (default:
+                            ITK_WRAPPING_PROFILE, or full for the group wheels
+                            and the ITK defaults for the 'itk' wheel)
 
 
 Accepted values for `wheel_name` are ``itk`` and all values read from
 ``WHEEL_NAMES.txt``.
+
+Files are only written if their content changes, so that build trees
+associated with an unchanged ``pyproject.toml`` can be re-used.
 """
 
 import argparse
+import functools
 import os
 import re
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "internal"))
+
+from wrapping_profiles import package_cmake_args as wrapping_profile_cmake_args
 
 PARAMETER_OPTION_DEFAULTS = {
     "indent": 0,
@@ -85,45 +104,76 @@ def list_to_str(list_, newline=True):
     return sep.join(['"%s"' % item for item in list_])
 
 
+PARAMETER_PATTERN = re.compile(r"@([A-Za-z0-9_]+)@")
+
+
+@functools.lru_cache()
+def read_template(template_file):
+    """Return the lines of `template_file`, read only once per process."""
+    with open(template_file, "r") as file_:
+        return tuple(file_.readlines())
+
+
+def render(lines, parameters):
+    """Return the content obtained by substituting `parameters` in `lines`."""
+    # Compute the substitution of each parameter once instead of once per line.
+    values = {}
+    for key, value in parameters.items():
+        value = value.strip()
+        if not value and parameter_option(key, "remove_line_if_empty"):
+            values[key] = None
+            continue
+        block_indent = " " * parameter_option(key, "indent")
+        value = indent(value, block_indent)
+        newline_indent = " " * parameter_option(key, "newline_indent")
+        if value.strip() and parameter_option(key, "newline_if_set"):
+            value = "\n%s\n%s" % (value, newline_indent)
+        values[key] = value
+
+    updated_lines = []
+    for line in lines:
+        keys = [key for key in PARAMETER_PATTERN.findall(line) if key in values]
+        if any(values[key] is None for key in keys):
+            continue
+        for key in keys:
+            line = line.replace("@%s@" % key, values[key])
+        updated_lines.append(line)
+    return "".join(updated_lines)
+
+
+def write_if_changed(output_file, content):
+    """Write `content` into `output_file` unless it already has this content.
+
+    Return True if the file was written.
+    """
+    if os.path.exists(output_file):
+        with open(output_file, "r") as file_:
+            if file_.read() == content:
+                return False
+    with open(output_file, "w") as file_:
+        file_.write(content)
+    return True
+
+
 def configure(template_file, parameters, output_file):
     """Configure `template_file` into `output_file` given a dictionary of
     `parameters`.
-    """
-    updated_lines = []
-    with open(template_file, "r") as file_:
-        lines = file_.readlines()
-        for line in lines:
-            append = True
-            for key in parameters.keys():
-                value = parameters[key].strip()
-                if (
-                    key in line
-                    and not value
-                    and parameter_option(key, "remove_line_if_empty")
-                ):
-                    append = False
-                    break
-                block_indent = " " * parameter_option(key, "indent")
-                value = indent(value, block_indent)
-                newline_indent = " " * parameter_option(key, "newline_indent")
-                if value.strip() and parameter_option(key, "newline_if_set"):
-                    value = "\n%s\n%s" % (value, newline_indent)
-                line = line.replace("@%s@" % key, value)
-            if append:
-                updated_lines.append(line)
 
-    with open(output_file, "w") as file_:
-        file_.writelines(updated_lines)
+    Return True if `output_file` was written.
+    """
+    content = render(read_template(template_file), parameters)
+    return write_if_changed(output_file, content)
 
 
 def from_group_to_wheel(group):
     return "itk-%s" % group.lower()
 
 
-def update_wheel_pyproject_toml_parameters():
-    global PYPROJECT_PY_PARAMETERS
+def wheel_pyproject_toml_parameters(wrapping_profile=None):
+    """Return a dictionary associating each wheel name with its parameters."""
+    parameters = {}
     for wheel_name in get_wheel_names():
-        params = dict(ITK_PYPROJECT_PY_PARAMETERS)
+        params = dict(get_itk_pyproject_parameters(wrapping_profile))
 
         # generator
         params["PYPROJECT_GENERATOR"] = "python %s '%s'" % (SCRIPT_NAME, wheel_name)
@@ -181,11 +231,8 @@ def update_wheel_pyproject_toml_parameters():
 
         # cmake_args
         params["PYPROJECT_CMAKE_ARGS"] = list_to_str(
-            [
-                "-DITK_WRAP_unsigned_short:BOOL=ON",
-                "-DITK_WRAP_double:BOOL=ON",
-                "-DITK_WRAP_complex_double:BOOL=ON",
-                "-DITK_WRAP_IMAGE_DIMS:STRING=2;3;4",
+            wrapping_profile_cmake_args(wrapping_profile)
+            + [
                 "-DITK_WRAP_DOC:BOOL=ON",
                 "-DITKPythonPackage_WHEEL_NAME:STRING=%s" % wheel_name,
             ],
@@ -193,7 +240,7 @@ def update_wheel_pyproject_toml_parameters():
         )
 
         # install_requires
-        wheel_depends = get_wheel_dependencies()[wheel_name]
+        wheel_depends = list(get_wheel_dependencies()[wheel_name])
 
         # py_modules
         if wheel_name != "itk-core":
@@ -203,14 +250,17 @@ def update_wheel_pyproject_toml_parameters():
 
         params["PYPROJECT_DEPENDENCIES"] = list_to_str(wheel_depends)
 
-        PYPROJECT_PY_PARAMETERS[wheel_name] = params
+        parameters[wheel_name] = params
+    return parameters
 
 
+@functools.lru_cache()
 def get_wheel_names():
     with open(os.path.join(SCRIPT_DIR, "WHEEL_NAMES.txt"), "r") as _file:
-        return [wheel_name.strip() for wheel_name in _file.readlines()]
+        return tuple(wheel_name.strip() for wheel_name in _file.readlines())
 
 
+@functools.lru_cache()
 def get_version():
     from itkVersion import get_versions
 
@@ -227,6 +277,7 @@ def get_py_api():
         return "cp" + str(sys.version_info.major) + str(sys.version_info.minor)
 
 
+@functools.lru_cache()
 def get_wheel_dependencies():
     """Return a dictionary of ITK wheel dependencies."""
     all_depends = {}
@@ -256,41 +307,63 @@ def get_wheel_dependencies():
 SCRIPT_DIR = os.path.dirname(__file__)
 SCRIPT_NAME = os.path.basename(__file__)
 
-ITK_PYPROJECT_PY_PARAMETERS = {
-    "PYPROJECT_GENERATOR": "python %s '%s'" % (SCRIPT_NAME, "itk"),
-    "PYPROJECT_NAME": r"itk",
-    "PYPROJECT_VERSION": get_version(),
-    "PYPROJECT_CMAKE_ARGS": r"",
-    "PYPROJECT_PY_API": get_py_api(),
-    "PYPROJECT_PLATLIB": r"true",
-    "PYPROJECT_PY_MODULES": list_to_str(
-        [
-            "itkBase",
-            "itkConfig",
-            "itkExtras",
-            "itkHelpers",
-            "itkLazy",
-            "itkTemplate",
-            "itkTypes",
-            "itkVersion",
-            "itkBuildOptions",
-        ]
-    ),
-    "PYPROJECT_DOWNLOAD_URL": r"https://github.com/InsightSoftwareConsortium/ITK/releases",
-    "PYPROJECT_DESCRIPTION": r"ITK is an open-source toolkit for multidimensional image analysis",  # noqa: E501
-    "PYPROJECT_LONG_DESCRIPTION": r"ITK is an open-source, cross-platform library that "
-    "provides developers with an extensive suite of software "
-    "tools for image analysis. Developed through extreme "
-    "programming methodologies, ITK employs leading-edge "
-    "algorithms for registering and segmenting "
-    "multidimensional scientific images.",
-    "PYPROJECT_EXTRA_KEYWORDS": r'"scientific", "medical", "image", "imaging"',
-    "PYPROJECT_DEPENDENCIES": r"",
-}
 
-PYPROJECT_PY_PARAMETERS = {"itk": ITK_PYPROJECT_PY_PARAMETERS}
+@functools.lru_cache()
+def get_itk_pyproject_parameters(wrapping_profile=None):
+    """Return the parameters of the single ``itk`` wheel, also used as
+    defaults for the group wheels.
 
-update_wheel_pyproject_toml_parameters()
+    The single wheel is built with the default wrapping options of ITK unless
+    a profile is given, or selected with ``ITK_WRAPPING_PROFILE``.
+    """
+    if wrapping_profile or os.environ.get("ITK_WRAPPING_PROFILE"):
+        cmake_args = wrapping_profile_cmake_args(wrapping_profile)
+    else:
+        cmake_args = []
+    return {
+        "PYPROJECT_GENERATOR": "python %s '%s'" % (SCRIPT_NAME, "itk"),
+        "PYPROJECT_NAME": r"itk",
+        "PYPROJECT_VERSION": get_version(),
+        "PYPROJECT_CMAKE_ARGS": list_to_str(cmake_args, True),
+        "PYPROJECT_PY_API": get_py_api(),
+        "PYPROJECT_PLATLIB": r"true",
+        "PYPROJECT_PY_MODULES": list_to_str(
+            [
+                "itkBase",
+                "itkConfig",
+                "itkExtras",
+                "itkHelpers",
+                "itkLazy",
+                "itkTemplate",
+                "itkTypes",
+                "itkVersion",
+                "itkBuildOptions",
+            ]
+        ),
+        "PYPROJECT_DOWNLOAD_URL": r"https://github.com/InsightSoftwareConsortium/ITK/releases",
+        "PYPROJECT_DESCRIPTION": r"ITK is an open-source toolkit for multidimensional image analysis",  # noqa: E501
+        "PYPROJECT_LONG_DESCRIPTION": r"ITK is an open-source, cross-platform library that "
+        "provides developers with an extensive suite of software "
+        "tools for image analysis. Developed through extreme "
+        "programming methodologies, ITK employs leading-edge "
+        "algorithms for registering and segmenting "
+        "multidimensional scientific images.",
+        "PYPROJECT_EXTRA_KEYWORDS": r'"scientific", "medical", "image", "imaging"',
+        "PYPROJECT_DEPENDENCIES": r"",
+    }
+
+
+@functools.lru_cache()
+def get_pyproject_parameters(wrapping_profile=None):
+    """Return a dictionary associating ``itk`` and each name read from
+    ``WHEEL_NAMES.txt`` with its parameters, for the given wrapping profile
+    (default: ``ITK_WRAPPING_PROFILE`` or ``full``).
+
+    Parameters are computed on first use, and only once per process.
+    """
+    parameters = {"itk": get_itk_pyproject_parameters(wrapping_profile)}
+    parameters.update(wheel_pyproject_toml_parameters(wrapping_profile))
+    return parameters
 
 
 def main():
@@ -301,22 +374,56 @@ def main():
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
-    parser.add_argument("wheel_name")
+    parser.add_argument("wheel_names", metavar="wheel_name", nargs="*")
     parser.add_argument(
         "--output-dir",
         type=str,
         help="Output directory for configured 'pyproject.toml'",
         default=default_output_dir,
     )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="Configure 'pyproject.toml' of every wheel read from "
+        "'WHEEL_NAMES.txt' (or of the given wheel names) into "
+        "'<output_dir>/<wheel_name>/pyproject.toml'",
+    )
+    parser.add_argument(
+        "--wrapping-profile",
+        default=None,
+        help="Wrapping profile selecting the ITK_WRAP_* options of the wheels, "
+        "see 'internal/wrapping_profiles.py' (default: ITK_WRAPPING_PROFILE, or "
+        "full for the group wheels and the ITK defaults for the 'itk' wheel)",
+    )
     args = parser.parse_args()
     template = os.path.join(SCRIPT_DIR, "pyproject.toml.in")
-    if args.wheel_name not in PYPROJECT_PY_PARAMETERS.keys():
-        print("Unknown wheel name '%s'" % args.wheel_name)
-        sys.exit(1)
+    if not args.all and len(args.wheel_names) != 1:
+        parser.error("exactly one wheel_name is expected unless --all is given")
+    wheel_names = args.wheel_names
+    if args.all and not wheel_names:
+        wheel_names = get_wheel_names()
+    try:
+        parameters = get_pyproject_parameters(args.wrapping_profile)
+    except ValueError as exc:
+        parser.error(str(exc))
+    for wheel_name in wheel_names:
+        if wheel_name not in parameters.keys():
+            print("Unknown wheel name '%s'" % wheel_name)
+            sys.exit(1)
 
     # Configure 'pyproject.toml'
-    output_file = os.path.join(args.output_dir, "pyproject.toml")
-    configure(template, PYPROJECT_PY_PARAMETERS[args.wheel_name], output_file)
+    if not args.all:
+        output_file = os.path.join(args.output_dir, "pyproject.toml")
+        configure(template, parameters[wheel_names[0]], output_file)
+    else:
+        for wheel_name in wheel_names:
+            output_dir = os.path.join(args.output_dir, wheel_name)
+            os.makedirs(output_dir, exist_ok=True)
+            output_file = os.path.join(output_dir, "pyproject.toml")
+            if configure(template, parameters[wheel_name], output_file):
+                print("Configured %s" % output_file)
+            else:
+                print("Up-to-date %s" % output_file)
 
     # Configure or remove 'itk/__init__.py'
     # init_py = os.path.join(args.output_dir, "itk", "__init__.py")
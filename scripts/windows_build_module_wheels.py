@@ -7,7 +7,6 @@ import os
 import glob
 import sys
 import argparse
-import shutil
 from pathlib import Path
 
 SCRIPT_DIR = os.path.dirname(__file__)
@@ -18,27 +17,31 @@ print("ROOT_DIR: %s" % ROOT_DIR)
 
 sys.path.insert(0, os.path.join(SCRIPT_DIR, "internal"))
 
+from build_env import provision
+from build_trace import report as report_build_trace, span, start_trace
+from compiler_cache import (
+    cache_environment,
+    cmake_launcher_args,
+    compiler_launcher,
+    report as report_compiler_cache,
+)
 from wheel_builder_utils import push_dir, push_env
+from wheel_edit import read_metadata, rename_member
+from wheel_repair import (
+    default_cache_dir as default_repair_cache_dir,
+    print_summary as print_repair_summary,
+    repair_wheels,
+)
 from windows_build_common import DEFAULT_PY_ENVS, venv_paths
 
 
-def install_and_import(package):
-    """
-    Install package with pip and import in current script.
-    """
-    import importlib
-
-    try:
-        importlib.import_module(package)
-    except ImportError:
-        import pip
-
-        pip.main(["install", package])
-    finally:
-        globals()[package] = importlib.import_module(package)
-
+def build_wheels(
+    py_envs=DEFAULT_PY_ENVS, cleanup=True, cmake_options=[], compiler_cache=None
+):
+    # Configure the compiler cache for this process and the builds it spawns.
+    launcher = compiler_launcher(compiler_cache)
+    os.environ.update(cache_environment(compiler_cache, base_dir=ROOT_DIR))
 
-def build_wheels(py_envs=DEFAULT_PY_ENVS, cleanup=True, cmake_options=[]):
     for py_env in py_envs:
         (
             python_executable,
@@ -49,17 +52,17 @@ def build_wheels(py_envs=DEFAULT_PY_ENVS, cleanup=True, cmake_options=[]):
             path,
         ) = venv_paths(py_env)
 
-        with push_env(PATH="%s%s%s" % (path, os.pathsep, os.environ["PATH"])):
-            # Install dependencies
-            check_call([python_executable, "-m", "pip", "install", "pip", "--upgrade"])
+        with push_env(PATH="%s%s%s" % (path, os.pathsep, os.environ["PATH"])), span(
+            "build", track=py_env
+        ):
+            # Install dependencies, unless already installed
             requirements_file = os.path.join(ROOT_DIR, "requirements-dev.txt")
-            if os.path.exists(requirements_file):
-                check_call([pip, "install", "--upgrade", "-r", requirements_file])
-            check_call([pip, "install", "cmake"])
-            check_call([pip, "install", "scikit-build-core", "--upgrade"])
-
-            check_call([pip, "install", "ninja", "--upgrade"])
-            check_call([pip, "install", "delvewheel"])
+            with span("prepare-env"):
+                provision(
+                    python_executable,
+                    ["pip", "cmake", "scikit-build-core", "ninja", "delvewheel"],
+                    [requirements_file] if os.path.exists(requirements_file) else [],
+                )
 
             source_path = ROOT_DIR
             itk_build_path = os.path.abspath(
@@ -73,52 +76,62 @@ def build_wheels(py_envs=DEFAULT_PY_ENVS, cleanup=True, cmake_options=[]):
                 wheel_py_api = "cp3%s" % minor_version
             else:
                 wheel_py_api = ""
+            stats_log = os.path.join(ROOT_DIR, "compiler-cache-stats-%s.log" % py_env)
+            if os.path.exists(stats_log):
+                os.remove(stats_log)
+            os.environ["CCACHE_STATSLOG"] = stats_log
             # Generate wheel
-            check_call(
-                [
-                    python_executable,
-                    "-m",
-                    "build",
-                    "--verbose",
-                    "--wheel",
-                    "--outdir",
-                    "dist",
-                    "--no-isolation",
-                    "--skip-dependency-check",
-                    "--config-setting=wheel.py-api=%s" % wheel_py_api,
-                    "--config-setting=cmake.define.SKBUILD:BOOL=ON",
-                    "--config-setting=cmake.define.PY_SITE_PACKAGES_PATH:PATH=.",
-                    "--config-setting=cmake.args=" "-G Ninja" "",
-                    "--config-setting=cmake.define.CMAKE_BUILD_TYPE:STRING="
-                    "Release"
-                    "",
-                    "--config-setting=cmake.define.CMAKE_MAKE_PROGRAM:FILEPATH=%s"
-                    % ninja_executable,
-                    "--config-setting=cmake.define.ITK_DIR:PATH=%s" % itk_build_path,
-                    "--config-setting=cmake.define.WRAP_ITK_INSTALL_COMPONENT_IDENTIFIER:STRING=PythonWheel",
-                    "--config-setting=cmake.define.SWIG_EXECUTABLE:FILEPATH=%s/Wrapping/Generators/SwigInterface/swig/bin/swig.exe"
-                    % itk_build_path,
-                    "--config-setting=cmake.define.BUILD_TESTING:BOOL=OFF",
-                    "--config-setting=cmake.define.CMAKE_INSTALL_LIBDIR:STRING=lib",
-                    "--config-setting=cmake.define.Python3_EXECUTABLE:FILEPATH=%s"
-                    % python_executable,
-                    "--config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=%s"
-                    % python_include_dir,
-                    "--config-setting=cmake.define.Python3_INCLUDE_DIRS:PATH=%s"
-                    % python_include_dir,
-                    "--config-setting=cmake.define.Python3_LIBRARY:FILEPATH=%s"
-                    % python_library,
-                    "--config-setting=cmake.define.Python3_SABI_LIBRARY:FILEPATH=%s"
-                    % python_library,
-                ]
-                + [
-                    o.replace("-D", "--config-setting=cmake.define.")
-                    for o in cmake_options
-                ]
-                + [
-                    ".",
-                ]
-            )
+            with span("package-wheel"):
+                check_call(
+                    [
+                        python_executable,
+                        "-m",
+                        "build",
+                        "--verbose",
+                        "--wheel",
+                        "--outdir",
+                        "dist",
+                        "--no-isolation",
+                        "--skip-dependency-check",
+                        "--config-setting=wheel.py-api=%s" % wheel_py_api,
+                        "--config-setting=cmake.define.SKBUILD:BOOL=ON",
+                        "--config-setting=cmake.define.PY_SITE_PACKAGES_PATH:PATH=.",
+                        "--config-setting=cmake.args=" "-G Ninja" "",
+                        "--config-setting=cmake.define.CMAKE_BUILD_TYPE:STRING="
+                        "Release"
+                        "",
+                        "--config-setting=cmake.define.CMAKE_MAKE_PROGRAM:FILEPATH=%s"
+                        % ninja_executable,
+                        "--config-setting=cmake.define.ITK_DIR:PATH=%s"
+                        % itk_build_path,
+                        "--config-setting=cmake.define.WRAP_ITK_INSTALL_COMPONENT_IDENTIFIER:STRING=PythonWheel",
+                        "--config-setting=cmake.define.SWIG_EXECUTABLE:FILEPATH=%s/Wrapping/Generators/SwigInterface/swig/bin/swig.exe"
+                        % itk_build_path,
+                        "--config-setting=cmake.define.BUILD_TESTING:BOOL=OFF",
+                        "--config-setting=cmake.define.CMAKE_INSTALL_LIBDIR:STRING=lib",
+                        "--config-setting=cmake.define.Python3_EXECUTABLE:FILEPATH=%s"
+                        % python_executable,
+                        "--config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=%s"
+                        % python_include_dir,
+                        "--config-setting=cmake.define.Python3_INCLUDE_DIRS:PATH=%s"
+                        % python_include_dir,
+                        "--config-setting=cmake.define.Python3_LIBRARY:FILEPATH=%s"
+                        % python_library,
+                        "--config-setting=cmake.define.Python3_SABI_LIBRARY:FILEPATH=%s"
+                        % python_library,
+                    ]
+                    + [
+                        o.replace("-D", "--config-setting=cmake.define.")
+                        for o in cmake_launcher_args(launcher) + cmake_options
+                    ]
+                    + [
+                        ".",
+                    ]
+                )
+            if launcher is not None:
+                report_compiler_cache(
+                    stats_log=stats_log, title="Compiler cache for %s" % py_env
+                )
 
 
 def rename_wheel_init(py_env, filepath, add_module_name=True):
@@ -131,82 +144,64 @@ def rename_wheel_init(py_env, filepath, add_module_name=True):
     function. The renamed __init__ file will be executed by ITK's __init__ file
     when loading ITK.
     """
-    (
-        python_executable,
-        python_include_dir,
-        python_library,
-        pip,
-        ninja_executable,
-        path,
-    ) = venv_paths(py_env)
-
     # Get module info
-    install_and_import("pkginfo")
-    w = pkginfo.Wheel(filepath)
-    module_name = w.name.split("itk-")[-1]
-    module_version = w.version
-
-    dist_dir = os.path.dirname(filepath)
-    wheel_dir = os.path.join(
-        dist_dir, "itk_" + module_name.replace("-", "_") + "-" + module_version
-    )
-    init_dir = os.path.join(wheel_dir, "itk")
-    init_file = os.path.join(init_dir, "__init__.py")
-    init_file_module = os.path.join(
-        init_dir, "__init_" + module_name.split("-")[0] + "__.py"
-    )
+    module_name = read_metadata(filepath)["Name"].split("itk-")[-1]
 
-    # Unpack wheel and rename __init__ file if it exists.
-    check_call([python_executable, "-m", "wheel", "unpack", filepath, "-d", dist_dir])
-    if add_module_name and os.path.isfile(init_file):
-        shutil.move(init_file, init_file_module)
-    if not add_module_name and os.path.isfile(init_file_module):
-        shutil.move(init_file_module, init_file)
+    init_file = "itk/__init__.py"
+    init_file_module = "itk/__init_" + module_name.split("-")[0] + "__.py"
 
-    # Pack wheel and clean wheel folder
-    check_call([python_executable, "-m", "wheel", "pack", wheel_dir, "-d", dist_dir])
-    shutil.rmtree(wheel_dir)
+    # Rename the __init__ file in the wheel archive if it exists, the other
+    # members are copied without being recompressed.
+    if add_module_name:
+        rename_member(filepath, init_file, init_file_module)
+    else:
+        rename_member(filepath, init_file_module, init_file)
 
 
-def fixup_wheel(py_envs, filepath, lib_paths: str = "", exclude_libs: str = ""):
+def fixup_wheels(py_envs, lib_paths: str = "", exclude_libs: str = ""):
     lib_paths = ";".join(["C:/P/IPP/oneTBB-prefix/bin", lib_paths.strip()]).strip(";")
     print(f"Library paths for fixup: {lib_paths}")
 
     py_env = py_envs[0]
 
+    # shared library fix-up
+    wheels = glob.glob(os.path.join(ROOT_DIR, "dist", "*.whl"))
+    if not wheels:
+        return
+
     # Make sure the module __init_module__.py file has the expected name for
     # delvewheel, i.e., __init__.py.
-    rename_wheel_init(py_env, filepath, False)
+    for wheel in wheels:
+        rename_wheel_init(py_env, wheel, False)
 
     delve_wheel = os.path.join(
         "C:/P/IPP", "venv-" + py_env, "Scripts", "delvewheel.exe"
     )
-    check_call(
+    repairs = repair_wheels(
+        "delvewheel",
+        wheels,
         [
-            delve_wheel,
-            "repair",
             "--no-mangle-all",
             "--add-path",
             lib_paths,
             "--no-dll",
             exclude_libs,
             "--ignore-in-wheel",
-            "-w",
-            os.path.join(ROOT_DIR, "dist"),
-            filepath,
-        ]
+        ],
+        output_dir=os.path.join(ROOT_DIR, "dist"),
+        executable=delve_wheel,
+        cache_dir=default_repair_cache_dir(),
+        log_dir=os.path.join(ROOT_DIR, "build", "repair-logs"),
     )
+    print_repair_summary(repairs)
+    if not all(repair.succeeded for repair in repairs):
+        raise RuntimeError("Failed to repair wheel(s)")
 
     # The delve_wheel patch loading shared libraries is added to the module
     # __init__ file. Rename this file here to prevent conflicts on installation.
     # The renamed __init__ file will be executed when loading ITK.
-    rename_wheel_init(py_env, filepath)
-
-
-def fixup_wheels(py_envs, lib_paths: str = "", exclude_libs: str = ""):
-    # shared library fix-up
-    for wheel in glob.glob(os.path.join(ROOT_DIR, "dist", "*.whl")):
-        fixup_wheel(py_envs, wheel, lib_paths, exclude_libs)
+    for wheel in wheels:
+        rename_wheel_init(py_env, wheel)
 
 
 if __name__ == "__main__":
@@ -219,6 +214,13 @@ if __name__ == "__main__":
         default=DEFAULT_PY_ENVS,
         help='Target Python environment versions, e.g. "39-x64".',
     )
+    parser.add_argument(
+        "--compiler-cache",
+        choices=["ccache", "sccache"],
+        default=os.environ.get("ITK_COMPILER_CACHE") or None,
+        help="Compiler cache used to build the module. The cache directory is "
+        "read from ITK_COMPILER_CACHE_DIR.",
+    )
     parser.add_argument(
         "--no-cleanup",
         dest="cleanup",
@@ -244,7 +246,19 @@ if __name__ == "__main__":
     )
     args = parser.parse_args()
 
-    build_wheels(
-        cleanup=args.cleanup, py_envs=args.py_envs, cmake_options=args.cmake_options
-    )
-    fixup_wheels(args.py_envs, ";".join(args.lib_paths), ";".join(args.exclude_libs))
+    # Record the timeline of the build, reported once it is done or failed.
+    trace_started = start_trace(os.path.join(ROOT_DIR, "logs", "build-trace.jsonl"))
+    try:
+        build_wheels(
+            cleanup=args.cleanup,
+            py_envs=args.py_envs,
+            cmake_options=args.cmake_options,
+            compiler_cache=args.compiler_cache,
+        )
+        with span("repair-wheels"):
+            fixup_wheels(
+                args.py_envs, ";".join(args.lib_paths), ";".join(args.exclude_libs)
+            )
+    finally:
+        if trace_started:
+            report_build_trace()
@@ -21,18 +21,32 @@ print("ROOT_DIR: %s" % ROOT_DIR)
 print("ITK_SOURCE: %s" % ITK_SOURCE)
 
 sys.path.insert(0, os.path.join(SCRIPT_DIR, "internal"))
+from build_env import provision
+from build_trace import report as report_build_trace, span, start_trace
+from compiler_cache import (
+    cache_environment,
+    cmake_launcher_args,
+    compiler_launcher,
+    report as report_compiler_cache,
+)
 from wheel_builder_utils import push_dir, push_env
-from windows_build_common import DEFAULT_PY_ENVS, venv_paths
-
-
-def pip_install(python_dir, package, upgrade=True):
-    pip = os.path.join(python_dir, "Scripts", "pip.exe")
-    print("Installing %s using %s" % (package, pip))
-    args = [pip, "install"]
-    if upgrade:
-        args.append("--upgrade")
-    args.append(package)
-    check_call(args)
+from wheel_packaging import package_wheels, print_summary as print_packaging_summary
+from wheel_repair import (
+    default_cache_dir as default_repair_cache_dir,
+    print_summary as print_repair_summary,
+    repair_wheels,
+)
+from windows_build_common import (
+    DEFAULT_PY_ENVS,
+    python_minor_version,
+    split_abi3_py_envs,
+    venv_paths,
+)
+from wrapping_profiles import (
+    PROFILES as WRAPPING_PROFILES,
+    default_profile as default_wrapping_profile,
+    itk_cmake_args as wrapping_profile_cmake_args,
+)
 
 
 def prepare_build_env(python_version):
@@ -42,14 +56,14 @@ def prepare_build_env(python_version):
             "Aborting. python_dir [%s] does not exist." % python_dir
         )
 
-    venv = os.path.join(python_dir, "Scripts", "virtualenv.exe")
-    venv_dir = os.path.join(ROOT_DIR, "venv-%s" % python_version)
-    print("Creating python virtual environment: %s" % venv_dir)
-    if not os.path.exists(venv_dir):
-        check_call([venv, venv_dir])
-    pip_install(venv_dir, "scikit-build-core")
-    pip_install(venv_dir, "ninja")
-    pip_install(venv_dir, "delvewheel")
+    # Create the virtual environment and install the build and test
+    # requirements, both only if needed.
+    python_executable = venv_paths(python_version)[0]
+    provision(
+        python_executable,
+        ["delvewheel", "numpy"],
+        [os.path.join(ROOT_DIR, "requirements-dev.txt")],
+    )
 
 
 def build_wrapped_itk(
@@ -60,12 +74,19 @@ def build_wrapped_itk(
     python_executable,
     python_include_dir,
     python_library,
+    limited_api=False,
+    launcher=None,
+    wrapping_profile=None,
 ):
 
     tbb_dir = os.path.join(ROOT_DIR, "oneTBB-prefix", "lib", "cmake", "TBB")
 
+    limited_api_args = []
+    if limited_api:
+        limited_api_args.append("-DITK_USE_PYTHON_LIMITED_API:BOOL=ON")
+
     # Build ITK python
-    with push_dir(directory=build_path, make_directory=True):
+    with push_dir(directory=build_path, make_directory=True), span("configure"):
 
         check_call(
             [
@@ -77,10 +98,9 @@ def build_wrapped_itk(
                 "-DBUILD_TESTING:BOOL=OFF",
                 "-DSKBUILD:BOOL=ON",
                 "-DPython3_EXECUTABLE:FILEPATH=%s" % python_executable,
-                "-DITK_WRAP_unsigned_short:BOOL=ON",
-                "-DITK_WRAP_double:BOOL=ON",
-                "-DITK_WRAP_complex_double:BOOL=ON",
-                "-DITK_WRAP_IMAGE_DIMS:STRING=2;3;4",
+            ]
+            + wrapping_profile_cmake_args(wrapping_profile)
+            + [
                 "-DPython3_INCLUDE_DIR:PATH=%s" % python_include_dir,
                 "-DPython3_INCLUDE_DIRS:PATH=%s" % python_include_dir,
                 "-DPython3_LIBRARY:FILEPATH=%s" % python_library,
@@ -94,12 +114,47 @@ def build_wrapped_itk(
                 "-DDOXYGEN_EXECUTABLE:FILEPATH=C:/P/doxygen/doxygen.exe",
                 "-DModule_ITKTBB:BOOL=ON",
                 "-DTBB_DIR:PATH=%s" % tbb_dir,
+            ]
+            + limited_api_args
+            + cmake_launcher_args(launcher)
+            + [
                 "-G",
                 "Ninja",
                 source_path,
             ]
         )
-        check_call([ninja_executable])
+
+    with push_dir(directory=build_path), span(
+        "ninja", ninja_log=os.path.join(build_path, ".ninja_log")
+    ):
+        if launcher is None:
+            check_call([ninja_executable])
+        else:
+            # Only record the compiler cache outcome of this build
+            stats_log = os.path.join(build_path, "compiler-cache-stats.log")
+            if os.path.exists(stats_log):
+                os.remove(stats_log)
+            with push_env(CCACHE_STATSLOG=stats_log):
+                check_call([ninja_executable])
+            report_compiler_cache(
+                stats_log=stats_log,
+                title="Compiler cache for %s" % os.path.basename(build_path),
+            )
+
+    # Compute the partition of ITK modules into wheels once, it is re-used when
+    # packaging every wheel.
+    with span("wheel-partition"):
+        check_call(
+            [
+                python_executable,
+                os.path.join(SCRIPT_DIR, "internal", "wheel_partition.py"),
+                "manifest",
+                "--itk-source-dir",
+                source_path,
+                "--itk-binary-dir",
+                build_path,
+            ]
+        )
 
 
 def build_wheel(
@@ -109,6 +164,9 @@ def build_wheel(
     cleanup=True,
     wheel_names=None,
     cmake_options=[],
+    limited_api=False,
+    launcher=None,
+    wrapping_profile=None,
 ):
 
     (
@@ -120,18 +178,9 @@ def build_wheel(
         path,
     ) = venv_paths(python_version)
 
-    with push_env(PATH="%s%s%s" % (path, os.pathsep, os.environ["PATH"])):
-
-        # Install dependencies
-        check_call(
-            [
-                pip,
-                "install",
-                "--upgrade",
-                "-r",
-                os.path.join(ROOT_DIR, "requirements-dev.txt"),
-            ]
-        )
+    with push_env(PATH="%s%s%s" % (path, os.pathsep, os.environ["PATH"])), span(
+        "build", track=python_version
+    ):
 
         source_path = "%s/ITK" % ITK_SOURCE
         build_path = "%s/ITK-win_%s" % (ROOT_DIR, python_version)
@@ -148,43 +197,55 @@ def build_wheel(
             print("#")
 
             # Configure pyproject.toml
-            check_call([python_executable, pyproject_configure, "itk"])
-
-            # Generate wheel
+            # The ITK defaults are wrapped unless a profile is selected
+            profile_args = []
+            if wrapping_profile:
+                profile_args = ["--wrapping-profile", wrapping_profile]
             check_call(
-                [
-                    python_executable,
-                    "-m",
-                    "build",
-                    "--verbose",
-                    "--wheel",
-                    "--outdir",
-                    "dist",
-                    "--no-isolation",
-                    "--skip-dependency-check",
-                    "--config-setting=cmake.build-type=%s" % build_type,
-                    "--config-setting=cmake.define.ITK_SOURCE_DIR:PATH=%s"
-                    % source_path,
-                    "--config-setting=cmake.define.ITK_BINARY_DIR:PATH=%s" % build_path,
-                    "--config-setting=cmake.define.Python3_EXECUTABLE:FILEPATH=%s"
-                    % python_executable,
-                    "--config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=%s"
-                    % python_include_dir,
-                    "--config-setting=cmake.define.Python3_INCLUDE_DIRS:PATH=%s"
-                    % python_include_dir,
-                    "--config-setting=cmake.define.Python3_LIBRARY:FILEPATH=%s"
-                    % python_library,
-                    "--config-setting=cmake.define.DOXYGEN_EXECUTABLE:FILEPATH=C:/P/doxygen/doxygen.exe",
-                ]
-                + [
-                    o.replace("-D", "--config-setting=cmake.define.")
-                    for o in cmake_options
-                ]
-                + [
-                    ".",
-                ]
+                [python_executable, pyproject_configure] + profile_args + ["itk"]
             )
 
+            # Generate wheel
+            with span("package-wheel", wheel="itk"):
+                check_call(
+                    [
+                        python_executable,
+                        "-m",
+                        "build",
+                        "--verbose",
+                        "--wheel",
+                        "--outdir",
+                        "dist",
+                        "--no-isolation",
+                        "--skip-dependency-check",
+                        "--config-setting=cmake.build-type=%s" % build_type,
+                        "--config-setting=cmake.define.ITK_SOURCE_DIR:PATH=%s"
+                        % source_path,
+                        "--config-setting=cmake.define.ITK_BINARY_DIR:PATH=%s"
+                        % build_path,
+                        "--config-setting=cmake.define.Python3_EXECUTABLE:FILEPATH=%s"
+                        % python_executable,
+                        "--config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=%s"
+                        % python_include_dir,
+                        "--config-setting=cmake.define.Python3_INCLUDE_DIRS:PATH=%s"
+                        % python_include_dir,
+                        "--config-setting=cmake.define.Python3_LIBRARY:FILEPATH=%s"
+                        % python_library,
+                        "--config-setting=cmake.define.DOXYGEN_EXECUTABLE:FILEPATH=C:/P/doxygen/doxygen.exe",
+                    ]
+                    + [
+                        o.replace("-D", "--config-setting=cmake.define.")
+                        for o in cmake_launcher_args(launcher)
+                    ]
+                    + [
+                        o.replace("-D", "--config-setting=cmake.define.")
+                        for o in cmake_options
+                    ]
+                    + [
+                        ".",
+                    ]
+                )
+
         else:
 
             print("#")
@@ -199,6 +260,9 @@ def build_wheel(
                 python_executable,
                 python_include_dir,
                 python_library,
+                limited_api=limited_api,
+                launcher=launcher,
+                wrapping_profile=wrapping_profile,
             )
 
             # Build wheels
@@ -208,30 +272,22 @@ def build_wheel(
                         wheel_name.strip() for wheel_name in content.readlines()
                     ]
 
-            for wheel_name in wheel_names:
-                # Configure pyproject.toml
-                check_call([python_executable, pyproject_configure, wheel_name])
-
-                # Generate wheel
-                check_call(
+            # Package the group wheels concurrently, each one in its own
+            # source and build directory.
+            with span("package-wheels"):
+                builds = package_wheels(
+                    python_executable,
                     [
-                        python_executable,
-                        "-m",
-                        "build",
-                        "--verbose",
-                        "--wheel",
-                        "--outdir",
-                        "dist",
-                        "--no-isolation",
-                        "--skip-dependency-check",
                         "--config-setting=cmake.build-type=%s" % build_type,
                         "--config-setting=cmake.define.ITK_SOURCE_DIR:PATH=%s"
                         % source_path,
                         "--config-setting=cmake.define.ITK_BINARY_DIR:PATH=%s"
                         % build_path,
                         "--config-setting=cmake.define.ITKPythonPackage_ITK_BINARY_REUSE:BOOL=ON",
-                        "--config-setting=cmake.define.ITKPythonPackage_WHEEL_NAME:STRING=%s"
-                        % wheel_name,
+                        "--config-setting=cmake.define.TBB_DIR:PATH=%s"
+                        % os.path.join(
+                            ROOT_DIR, "oneTBB-prefix", "lib", "cmake", "TBB"
+                        ),
                         "--config-setting=cmake.define.Python3_EXECUTABLE:FILEPATH=%s"
                         % python_executable,
                         "--config-setting=cmake.define.Python3_INCLUDE_DIR:PATH=%s"
@@ -244,55 +300,85 @@ def build_wheel(
                     + [
                         o.replace("-D", "--config-setting=cmake.define.")
                         for o in cmake_options
-                    ]
-                    + [
-                        ".",
-                    ]
+                    ],
+                    wheel_names=wheel_names,
+                    output_dir=os.path.join(ROOT_DIR, "dist"),
+                    staging_dir=os.path.join(
+                        ROOT_DIR, "build", "wheels-%s" % python_version
+                    ),
+                    log_dir=os.path.join(
+                        ROOT_DIR, "logs", "wheels-%s" % python_version
+                    ),
+                    wrapping_profile=wrapping_profile,
+                )
+            print_packaging_summary(builds)
+            if not all(build.succeeded for build in builds):
+                raise RuntimeError(
+                    "Failed to package wheel(s): %s"
+                    % ", ".join(b.wheel_name for b in builds if not b.succeeded)
                 )
 
         # Remove unnecessary files for building against ITK
         if cleanup:
-            for root, _, file_list in os.walk(build_path):
-                for filename in file_list:
-                    extension = os.path.splitext(filename)[1]
-                    if extension in [".cpp", ".xml", ".obj", ".o"]:
-                        os.remove(os.path.join(root, filename))
-            shutil.rmtree(os.path.join(build_path, "Wrapping", "Generators", "CastXML"))
+            with span("cleanup"):
+                for root, _, file_list in os.walk(build_path):
+                    for filename in file_list:
+                        extension = os.path.splitext(filename)[1]
+                        if extension in [".cpp", ".xml", ".obj", ".o"]:
+                            os.remove(os.path.join(root, filename))
+                shutil.rmtree(
+                    os.path.join(build_path, "Wrapping", "Generators", "CastXML")
+                )
 
 
-def fixup_wheel(py_envs, filepath, lib_paths: str = ""):
+def link_build_tree(python_version, target_python_version):
+    """Make the ITK build tree of `python_version` point to the one of
+    `target_python_version`, so that modules can be built against either."""
+    build_path = "%s/ITK-win_%s" % (ROOT_DIR, python_version)
+    target_build_path = "%s/ITK-win_%s" % (ROOT_DIR, target_python_version)
+    if os.path.islink(build_path):
+        os.unlink(build_path)
+    elif os.path.isdir(build_path):
+        shutil.rmtree(build_path)
+    print("Linking %s to %s" % (build_path, target_build_path))
+    try:
+        os.symlink(target_build_path, build_path, target_is_directory=True)
+    except OSError:
+        # Creating symbolic links requires privileges, fallback to a junction.
+        check_call(["cmd", "/c", "mklink", "/J", build_path, target_build_path])
+
+
+def fixup_wheels(single_wheel, py_envs, lib_paths: str = ""):
     lib_paths = lib_paths.strip() if lib_paths.isspace() else lib_paths.strip() + ";"
     lib_paths += "C:/P/IPP/oneTBB-prefix/bin"
     print(f"Library paths for fixup: {lib_paths}")
 
     py_env = py_envs[0]
 
-    delve_wheel = os.path.join(ROOT_DIR, "venv-" + py_env, "Scripts", "delvewheel.exe")
-    check_call(
-        [
-            delve_wheel,
-            "repair",
-            "--no-mangle-all",
-            "--add-path",
-            lib_paths,
-            "--ignore-in-wheel",
-            "-w",
-            os.path.join(ROOT_DIR, "dist"),
-            filepath,
-        ]
-    )
-
-
-def fixup_wheels(single_wheel, py_envs, lib_paths: str = ""):
     # TBB library fix-up
     tbb_wheel = "itk_core"
     if single_wheel:
         tbb_wheel = "itk"
-    for wheel in glob.glob(os.path.join(ROOT_DIR, "dist", tbb_wheel + "*.whl")):
-        fixup_wheel(py_envs, wheel, lib_paths)
+    wheels = glob.glob(os.path.join(ROOT_DIR, "dist", tbb_wheel + "*.whl"))
+    if not wheels:
+        return
+    delve_wheel = os.path.join(ROOT_DIR, "venv-" + py_env, "Scripts", "delvewheel.exe")
+    with span("repair-wheels"):
+        repairs = repair_wheels(
+            "delvewheel",
+            wheels,
+            ["--no-mangle-all", "--add-path", lib_paths, "--ignore-in-wheel"],
+            output_dir=os.path.join(ROOT_DIR, "dist"),
+            executable=delve_wheel,
+            cache_dir=default_repair_cache_dir(),
+            log_dir=os.path.join(ROOT_DIR, "build", "repair-logs"),
+        )
+    print_repair_summary(repairs)
+    if not all(repair.succeeded for repair in repairs):
+        raise RuntimeError("Failed to repair wheel(s)")
 
 
-def test_wheels(python_env):
+def test_wheels(python_env, docs_tests=True):
     (
         python_executable,
         python_include_dir,
@@ -301,11 +387,25 @@ def test_wheels(python_env):
         ninja_executable,
         path,
     ) = venv_paths(python_env)
-    check_call([pip, "install", "numpy"])
-    check_call([pip, "install", "itk", "--no-cache-dir", "--no-index", "-f", "dist"])
-    print("Wheel successfully installed.")
-    check_call([python_executable, os.path.join(ROOT_DIR, "docs/code/test.py")])
-    print("Documentation tests passed.")
+    with span("test", track=python_env):
+        with span("install"):
+            check_call(
+                [pip, "install", "itk", "--no-cache-dir", "--no-index", "-f", "dist"]
+            )
+        print("Wheel successfully installed.")
+        if not docs_tests:
+            print("Documentation tests skipped: types not wrapped by the profile.")
+            return
+        with span("docs-tests"):
+            check_call(
+                [
+                    python_executable,
+                    os.path.join(SCRIPT_DIR, "internal", "docs_test_runner.py"),
+                    "--junit-xml",
+                    os.path.join(ROOT_DIR, "logs", "docs-tests-%s.xml" % python_env),
+                ]
+            )
+        print("Documentation tests passed.")
 
 
 def build_wheels(
@@ -314,10 +414,24 @@ def build_wheels(
     cleanup=False,
     wheel_names=None,
     cmake_options=[],
+    abi3_single_build=False,
+    compiler_cache=None,
+    wrapping_profile=None,
 ):
 
     for py_env in py_envs:
-        prepare_build_env(py_env)
+        with span("prepare-env", track=py_env):
+            prepare_build_env(py_env)
+
+    # Configure the compiler cache for this process and the builds it spawns.
+    launcher = compiler_launcher(compiler_cache)
+    os.environ.update(cache_environment(compiler_cache, base_dir=ROOT_DIR))
+
+    # When building a single stable ABI tree, CPython >= 3.11 environments
+    # re-use the wheels built with the oldest of them.
+    build_py_envs, abi3_aliases = list(py_envs), {}
+    if abi3_single_build:
+        build_py_envs, abi3_aliases = split_abi3_py_envs(py_envs)
 
     build_type = "Release"
 
@@ -325,32 +439,32 @@ def build_wheels(
 
         cmake_executable = "cmake.exe"
         tools_venv = os.path.join(ROOT_DIR, "venv-" + py_envs[0])
-        ninja_executable = shutil.which("ninja.exe")
-        if ninja_executable is None:
-            pip_install(tools_venv, "ninja")
-            ninja_executable = os.path.join(tools_venv, "Scripts", "ninja.exe")
+        # ninja is installed in every environment by prepare_build_env()
+        ninja_executable = shutil.which("ninja.exe") or os.path.join(
+            tools_venv, "Scripts", "ninja.exe"
+        )
 
         # Build standalone project and populate archive cache
-        check_call(
-            [
-                cmake_executable,
-                "-DCMAKE_BUILD_TYPE:STRING=%s" % build_type,
-                "-DITKPythonPackage_BUILD_PYTHON:PATH=0",
-                "-G",
-                "Ninja",
-                "-DCMAKE_MAKE_PROGRAM:FILEPATH=%s" % ninja_executable,
-                ROOT_DIR,
-            ]
-        )
+        with span("superbuild-configure"):
+            check_call(
+                [
+                    cmake_executable,
+                    "-DCMAKE_BUILD_TYPE:STRING=%s" % build_type,
+                    "-DITKPythonPackage_BUILD_PYTHON:PATH=0",
+                    "-G",
+                    "Ninja",
+                    "-DCMAKE_MAKE_PROGRAM:FILEPATH=%s" % ninja_executable,
+                    "-DITKPythonPackage_COMPILER_LAUNCHER:STRING=%s"
+                    % (launcher or "").replace("\\", "/"),
+                    ROOT_DIR,
+                ]
+            )
 
-        check_call([ninja_executable])
+        with span("superbuild", ninja_log=os.path.join(ITK_SOURCE, ".ninja_log")):
+            check_call([ninja_executable])
 
     # Compile wheels re-using standalone project and archive cache
-    for py_env in py_envs:
-        tools_venv = os.path.join(ROOT_DIR, "venv-" + py_env)
-        ninja_executable = shutil.which("ninja.exe")
-        if ninja_executable is None:
-            pip_install(tools_venv, "ninja")
+    for py_env in build_py_envs:
         build_wheel(
             py_env,
             build_type,
@@ -358,8 +472,15 @@ def build_wheels(
             cleanup=cleanup,
             wheel_names=wheel_names,
             cmake_options=cmake_options,
+            limited_api=abi3_single_build and python_minor_version(py_env) >= 11,
+            launcher=launcher,
+            wrapping_profile=wrapping_profile,
         )
 
+    for py_env, abi3_py_env in abi3_aliases.items():
+        print("Re-using abi3 wheels built with %s for %s" % (abi3_py_env, py_env))
+        link_build_tree(py_env, abi3_py_env)
+
 
 def main(wheel_names=None):
     parser = argparse.ArgumentParser(
@@ -376,6 +497,28 @@ def main(wheel_names=None):
         default=DEFAULT_PY_ENVS,
         help='Target Python environment versions, e.g. "39-x64".',
     )
+    parser.add_argument(
+        "--abi3-single-build",
+        action="store_true",
+        help="Build ITK once against the Python limited API and re-use the "
+        "resulting abi3 wheels for all CPython >= 3.11 environments.",
+    )
+    parser.add_argument(
+        "--compiler-cache",
+        choices=["ccache", "sccache"],
+        default=os.environ.get("ITK_COMPILER_CACHE") or None,
+        help="Compiler cache used to build ITK. The cache directory is read "
+        "from ITK_COMPILER_CACHE_DIR.",
+    )
+    parser.add_argument(
+        "--wrapping-profile",
+        choices=sorted(WRAPPING_PROFILES),
+        default=os.environ.get("ITK_WRAPPING_PROFILE") or None,
+        help="Wrapping profile selecting the wrapped pixel types and image "
+        "dimensions, see scripts/internal/wrapping_profiles.py (default: "
+        "ITK_WRAPPING_PROFILE, or full, except for --single-wheel which wraps "
+        "the ITK defaults).",
+    )
     parser.add_argument(
         "--no-cleanup",
         dest="cleanup",
@@ -395,16 +538,28 @@ def main(wheel_names=None):
     )
     args = parser.parse_args()
 
-    build_wheels(
-        single_wheel=args.single_wheel,
-        cleanup=args.cleanup,
-        py_envs=args.py_envs,
-        wheel_names=wheel_names,
-        cmake_options=args.cmake_options,
-    )
-    fixup_wheels(args.single_wheel, args.py_envs, ";".join(args.lib_paths))
-    for py_env in args.py_envs:
-        test_wheels(py_env)
+    # Record the timeline of the build, reported once it is done or failed.
+    trace_started = start_trace(os.path.join(ROOT_DIR, "logs", "build-trace.jsonl"))
+    try:
+        build_wheels(
+            single_wheel=args.single_wheel,
+            cleanup=args.cleanup,
+            py_envs=args.py_envs,
+            wheel_names=wheel_names,
+            cmake_options=args.cmake_options,
+            abi3_single_build=args.abi3_single_build,
+            compiler_cache=args.compiler_cache,
+            wrapping_profile=args.wrapping_profile,
+        )
+        fixup_wheels(args.single_wheel, args.py_envs, ";".join(args.lib_paths))
+        docs_tests = WRAPPING_PROFILES[
+            args.wrapping_profile or default_wrapping_profile()
+        ]["docs_tests"]
+        for py_env in args.py_envs:
+            test_wheels(py_env, docs_tests)
+    finally:
+        if trace_started:
+            report_build_trace()
 
 
 if __name__ == "__main__":